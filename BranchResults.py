@@ -0,0 +1,222 @@
+"""
+Module for branch results: power flows, currents, loading and losses of every line and transformer
+
+Filename: BranchResults.py
+Author: Justin Lipner, Bailey Stout
+Date: 2026-10-19
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from Circuit import Circuit
+from Reports import ReportColumn, ReportTable
+
+# report layout, built once and shared by every branch results table
+BRANCH_REPORT = ReportTable([ReportColumn("Name", style="text"), ReportColumn("From", style="general"),
+                             ReportColumn("To", style="general"), ReportColumn("P from (MW)", 3),
+                             ReportColumn("Q from (MVAR)", 3), ReportColumn("P to (MW)", 3), ReportColumn("Q to (MVAR)", 3),
+                             ReportColumn("I from (A)", 3), ReportColumn("I to (A)", 3), ReportColumn("Loading (%)", 3),
+                             ReportColumn("P loss (MW)", 3), ReportColumn("Q loss (MVAR)", 3)])
+
+
+def calc_branch_flows(branches: dict, V):
+    """
+    Complex power and current at both ends of every branch. V may hold one voltage vector or a batch of
+    scenarios, one per row, and the results have the matching shape.
+    :param branches: Branch arrays from Circuit.calc_branch_arrays
+    :param V: Complex bus voltages in pu, shape (buses,) or (scenarios, buses)
+    :return: (Sf, St, If, It) np.ndarray of complex pu values
+    """
+    Vf = V[..., branches["from"]]
+    Vt = V[..., branches["to"]]
+    If = branches["yff"]*Vf + branches["yft"]*Vt
+    It = branches["ytf"]*Vf + branches["ytt"]*Vt
+    return Vf*np.conj(If), Vt*np.conj(It), If, It
+
+
+def calc_branch_matrices(branches: dict, num_buses: int):
+    """
+    Sparse incidence and end admittance matrices of the branches, so that Yf V is the current into each
+    branch at its from end and Cf V is its from end voltage.
+    :param branches: Branch arrays from Circuit.calc_branch_arrays
+    :param num_buses: Number of buses
+    :return: (Cf, Ct, Yf, Yt) scipy.sparse.csr_matrix
+    """
+    nl = len(branches["from"])
+    rows = np.arange(nl)
+    f, t = branches["from"], branches["to"]
+    shape = (nl, num_buses)
+    Cf = sparse.csr_matrix((np.ones(nl), (rows, f)), shape=shape)
+    Ct = sparse.csr_matrix((np.ones(nl), (rows, t)), shape=shape)
+    Yf = sparse.csr_matrix((np.concatenate((branches["yff"], branches["yft"])), (np.tile(rows, 2), np.concatenate((f, t)))),
+                           shape=shape)
+    Yt = sparse.csr_matrix((np.concatenate((branches["ytf"], branches["ytt"])), (np.tile(rows, 2), np.concatenate((f, t)))),
+                           shape=shape)
+    return Cf, Ct, Yf, Yt
+
+
+def calc_dSbr_dV(Cbr, Ybr, V):
+    """
+    Power at one end of each branch and its sparse derivatives with respect to the voltage angles and magnitudes
+    :param Cbr: Incidence of the branch end buses
+    :param Ybr: Branch end admittances
+    :param V: Complex bus voltages
+    :return: (S, dS/dangle, dS/dmagnitude)
+    """
+    I = Ybr @ V
+    Vend = Cbr @ V
+    diagV = sparse.diags(V)
+    diagVnorm = sparse.diags(V/np.abs(V))
+    diagI = sparse.diags(I.conj())
+    dS_dd = 1j*(diagI @ Cbr @ diagV - sparse.diags(Vend) @ (Ybr @ diagV).conj())
+    dS_dV = sparse.diags(Vend) @ (Ybr @ diagVnorm).conj() + diagI @ Cbr @ diagVnorm
+    return Vend*I.conj(), dS_dd.tocsr(), dS_dV.tocsr()
+
+
+class BranchResults:
+    """
+    Computes branch flows, currents, loading and losses for every line and transformer in one pass over the
+    branch arrays. Loading is the larger end current over the rated current: the conductor ampacity times the
+    conductors per bundle for lines, and the power rating at each winding's voltage for transformers.
+    Branches without a rating have NaN loading.
+    """
+    def __init__(self, circuit: Circuit):
+        """
+        Constructor for BranchResults
+        :param circuit: Circuit whose lines and transformers are reported
+        """
+        with circuit.lock:
+            branches = circuit.calc_branch_arrays()
+            n = len(circuit.transmission_lines) + len(circuit.transformers)  # lines and transformers come first
+            self.branches = {key: value[:n] for key, value in branches.items()}
+            self.powerbase = circuit.powerbase
+
+            base_kv = np.array([bus.base_kv for bus in sorted(circuit.buses.values(), key=lambda bus: bus.index)])
+            self.base_current_from = self.powerbase/(np.sqrt(3)*base_kv[self.branches["from"]])  # A per pu
+            self.base_current_to = self.powerbase/(np.sqrt(3)*base_kv[self.branches["to"]])
+
+            ratings = [line.bundle.conductor.ampacity*line.bundle.num_conductors if line.bundle is not None else np.nan
+                       for line in circuit.transmission_lines.values()]
+            self.rating_from = np.array(ratings + [xfmr.power_rating/(np.sqrt(3)*xfmr.bus1.base_kv) if xfmr.power_rating else np.nan
+                                                   for xfmr in circuit.transformers.values()], dtype=float)
+            self.rating_to = np.array(ratings + [xfmr.power_rating/(np.sqrt(3)*xfmr.bus2.base_kv) if xfmr.power_rating else np.nan
+                                                 for xfmr in circuit.transformers.values()], dtype=float)
+        self.names = self.branches["name"]
+
+
+    def calc_batch(self, V):
+        """
+        Branch results for one or many voltage scenarios.
+        :param V: Complex bus voltages in pu, shape (buses,) or (scenarios, buses)
+        :return: dict of np.ndarray, each shaped (branches,) or (scenarios, branches)
+        """
+        Sf, St, If, It = calc_branch_flows(self.branches, np.asarray(V, dtype=complex))
+        I_from = np.abs(If)*self.base_current_from
+        I_to = np.abs(It)*self.base_current_to
+        loading = np.maximum(I_from/self.rating_from, I_to/self.rating_to)*100
+        losses = (Sf + St)*self.powerbase
+        return {"S_from": Sf*self.powerbase, "S_to": St*self.powerbase, "I_from": I_from, "I_to": I_to,
+                "loading": loading, "P_loss": losses.real, "Q_loss": losses.imag}
+
+
+    def calc_report(self, V):
+        """
+        Branch results for one voltage solution as arrays in branch order.
+        :param V: Complex bus voltages in pu
+        :return: dict of column name -> np.ndarray
+        """
+        results = self.calc_batch(V)
+        return {"Name": self.names, "From": self.branches["from"]+1, "To": self.branches["to"]+1,
+                "P from (MW)": results["S_from"].real/1e6, "Q from (MVAR)": results["S_from"].imag/1e6,
+                "P to (MW)": results["S_to"].real/1e6, "Q to (MVAR)": results["S_to"].imag/1e6,
+                "I from (A)": results["I_from"], "I to (A)": results["I_to"],
+                "Loading (%)": results["loading"], "P loss (MW)": results["P_loss"]/1e6,
+                "Q loss (MVAR)": results["Q_loss"]/1e6}
+
+
+    def calc(self, V):
+        """
+        Branch results table for one voltage solution.
+        :param V: Complex bus voltages in pu
+        :return: pd.DataFrame
+        """
+        return pd.DataFrame(self.calc_report(V))
+
+
+    def screen_overloads(self, V, limit: float = 100.0):
+        """
+        Finds branches loaded above the limit in every scenario with one array comparison.
+        :param V: Complex bus voltages in pu, shape (buses,) or (scenarios, buses)
+        :param limit: Loading limit in percent
+        :return: pd.DataFrame with one row per overloaded branch and scenario
+        """
+        loading = np.atleast_2d(self.calc_batch(V)["loading"])
+        scenario, branch = np.nonzero(loading > limit)
+        return pd.DataFrame({"Scenario": scenario, "Name": self.names[branch], "Loading (%)": loading[scenario, branch]})
+
+
+    def print_data(self, V):
+        """
+        Prints the branch results and total losses
+        :param V: Complex bus voltages in pu
+        :return:
+        """
+        report = self.calc_report(V)
+        print(BRANCH_REPORT.render(report))
+        print(f"Total losses: {report['P loss (MW)'].sum():.3f} MW, {report['Q loss (MVAR)'].sum():.3f} MVAR")
+
+
+# validation tests
+if __name__ == '__main__':
+    import io
+    import time
+    import contextlib
+    from Validations import CreateSevenPowerBusSystem, CreateSyntheticCase
+
+    circ = CreateSevenPowerBusSystem()
+    with contextlib.redirect_stdout(io.StringIO()):
+        circ.do_newton_raph()
+    results = BranchResults(circ)
+    results.print_data(circ.voltages)
+
+    # the same flows one line at a time from yprim, the way they were found before
+    V = circ.voltages
+    flows = results.calc_batch(V)
+    difference = 0
+    for k, line in enumerate(circ.transmission_lines.values()):
+        Vline = np.array([V[line.bus1.index-1], V[line.bus2.index-1]])
+        S = Vline*np.conj(line.yprim.to_numpy() @ Vline)*circ.powerbase
+        difference = max(difference, abs(S[0] - flows["S_from"][k]), abs(S[1] - flows["S_to"][k]))
+    print(f"Largest difference from the yprim flows: {difference:.3e} VA")
+    injected = np.sum(circ.voltages*np.conj(circ.get_Ybus() @ circ.voltages)).real*circ.powerbase
+    print(f"Total injected power: {injected/1e6:.3f} MW")
+    print()
+
+    print("***20000 bus synthetic case, 100 scenarios***")
+    circ = CreateSyntheticCase(20000)
+    with contextlib.redirect_stdout(io.StringIO()):
+        circ.do_newton_raph(sparse=True)
+    rng = np.random.default_rng(0)
+    scenarios = circ.voltages*(1 + 0.001*rng.standard_normal((100, circ.count)))
+
+    start = time.perf_counter()
+    results = BranchResults(circ)
+    setup = time.perf_counter() - start
+    start = time.perf_counter()
+    batch = results.calc_batch(scenarios)
+    print(f"setup {setup:.3f} s, {len(results.names)} branches x 100 scenarios: {time.perf_counter()-start:.3f} s")
+
+    # ratings are not part of the MATPOWER case, so a 100 MVA limit is screened instead
+    results.rating_from = 100e6/results.powerbase*results.base_current_from
+    results.rating_to = 100e6/results.powerbase*results.base_current_to
+    start = time.perf_counter()
+    overloads = results.screen_overloads(scenarios)
+    print(f"screening: {time.perf_counter()-start:.3f} s, {len(overloads)} branch overloads")
+
+    start = time.perf_counter()
+    for s in range(10):
+        for k in range(len(results.names)):
+            f, t = results.branches["from"][k], results.branches["to"][k]
+            Sf = scenarios[s, f]*np.conj(results.branches["yff"][k]*scenarios[s, f] + results.branches["yft"][k]*scenarios[s, t])
+    print(f"per branch loop for Sf alone, 10 of the scenarios: {time.perf_counter()-start:.3f} s")
@@ -0,0 +1,246 @@
+"""
+Module for breaker duty: fault point X/R ratios and asymmetrical interrupting currents at every bus
+
+Filename: BreakerDuty.py
+Author: Justin Lipner, Bailey Stout
+Date: 2026-10-19
+"""
+
+import numpy as np
+import pandas as pd
+from Circuit import Circuit
+from FaultScreening import assemble_sparse, calc_Zbus
+
+FAULT_TYPES = ["3ph", "SLG", "LL", "DLG"]
+
+
+def calc_driving_point(Y):
+    """
+    Driving point impedance of every bus from one factorization, infinite at buses with no path to the reference.
+    :param Y: Sparse admittance matrix
+    :return: np.ndarray
+    """
+    Z, grounded = calc_Zbus(Y)
+    diagonal = np.diag(Z).copy()
+    diagonal[~grounded] = np.inf
+    return diagonal
+
+
+class BreakerDuty:
+    """
+    Symmetrical, asymmetrical interrupting and peak fault currents at every bus for three phase, single line
+    to ground, line to line and double line to ground faults. Symmetrical currents come from the same sequence
+    networks ThreePhaseFault and UnsymmetricalFaults use. The X/R ratio at the fault point comes, as in
+    IEEE C37.010, from separate resistance-only and reactance-only networks, each factored once, that leave out
+    loads and shunt charging. All buses and fault types are evaluated together from the driving point values.
+    """
+    def __init__(self, circuit: Circuit, parting_time: float = 3.0, default_xr: float = 40.0, zbus=None):
+        """
+        Constructor for BreakerDuty
+        :param circuit: Circuit object
+        :param parting_time: Breaker contact parting time in cycles
+        :param default_xr: X/R given to machines and elements that have no resistance
+        :param zbus: SequenceZbus kept up to date with the circuit, used instead of factoring the sequence networks
+        """
+        self.circuit = circuit
+        self.parting_time = parting_time
+        self.default_xr = default_xr
+        self.zbus = zbus
+        with circuit.lock:
+            self.buses = sorted(circuit.buses, key=lambda name: circuit.buses[name].index)
+            self.count = circuit.count
+            self.branches = {sequence: circuit.calc_branch_arrays(sequence) for sequence in [1, 0, 2]}
+            self.shunts = dict(zip([1, 0, 2], circuit.calc_fault_shunts()))
+            gens = list(circuit.generators.values())
+            self.gen_bus = np.array([circuit.buses[gen.bus].index-1 for gen in gens], dtype=int)
+            Y0 = np.array([gen.Y0prim for gen in gens], dtype=complex)
+            with np.errstate(divide="ignore"):
+                self.machines = {1: np.array([gen.X1 for gen in gens], dtype=complex),
+                                 0: np.where(Y0 != 0, 1/np.where(Y0 != 0, Y0, 1), 0),
+                                 2: np.array([gen.X2 for gen in gens], dtype=complex)}  # impedances, 0 for none
+            voltages = circuit.voltages
+            self.V = np.ones(circuit.count, dtype=complex) if voltages is None else np.asarray(voltages, dtype=complex)
+            self.base_current = circuit.powerbase/(np.sqrt(3)*np.array([circuit.buses[bus].base_kv for bus in self.buses]))/1e3
+            self.freq = circuit.settings.freq
+        self.duty = None  # will become a pd.DataFrame
+
+
+    def split_impedance(self, z):
+        """
+        Resistance and reactance of impedances, with default_xr supplying the resistance of any that have none.
+        :param z: np.ndarray of complex impedances
+        :return: (R, X) np.ndarray
+        """
+        X = z.imag
+        return np.maximum(z.real, np.abs(X)/self.default_xr), X
+
+
+    def calc_separate_networks(self, sequence: int):
+        """
+        Thevenin resistance and reactance at every bus from the resistance-only and reactance-only networks of a
+        sequence. Series branches enter with their series impedance and machines with their reactances; elements
+        that only connect one side to ground in this sequence, like a grounded wye-delta transformer in the zero
+        sequence, enter as shunts. Loads, line charging and shunt devices are left out.
+        :param sequence: 0, 1 or 2
+        :return: (R, X) np.ndarray of pu values per bus
+        """
+        branches = self.branches[sequence]
+        i, j = branches["from"], branches["to"]
+        series = (i != j) & (branches["yft"] != 0)
+        grounding = (i != j) & (branches["yft"] == 0) & (branches["ytf"] == 0)
+        z = -1/branches["yft"][series]  # off-nominal taps are taken as nominal here
+
+        ends = [i[grounding], j[grounding]]
+        shunt = [branches["yff"][grounding], branches["ytt"][grounding]]
+        ground_bus = np.concatenate([end[y != 0] for end, y in zip(ends, shunt)] + [self.gen_bus[self.machines[sequence] != 0]])
+        ground_z = np.concatenate([1/y[y != 0] for y in shunt] + [self.machines[sequence][self.machines[sequence] != 0]])
+
+        values = []
+        for part in [0, 1]:
+            series_value = self.split_impedance(z)[part]
+            ground_value = self.split_impedance(ground_z)[part]
+            g = 1/series_value
+            network = {"from": i[series], "to": j[series], "yff": g, "yft": -g, "ytf": -g, "ytt": g}
+            shunts = np.bincount(ground_bus, 1/ground_value, minlength=self.count).astype(float)
+            values.append(calc_driving_point(assemble_sparse(network, self.count, shunts)).real)
+        return values[0], values[1]
+
+
+    def calc_sequence_impedances(self):
+        """
+        Complex driving point impedance of every bus in each sequence, as the fault classes model the networks.
+        :return: dict of sequence -> np.ndarray
+        """
+        if self.zbus is not None:
+            return {sequence: np.diag(self.zbus.get_Zbus(sequence)).copy() for sequence in [1, 0, 2]}
+        return {sequence: calc_driving_point(assemble_sparse(self.branches[sequence], self.count, self.shunts[sequence]))
+                for sequence in [1, 0, 2]}
+
+
+    def calc_duty(self):
+        """
+        Fault currents and multiplying factors at every bus for every fault type. The symmetrical current is
+        the largest phase current of a bolted fault; the interrupting current at contact parting multiplies it by
+        sqrt(1 + 2 exp(-4 pi t/(X/R))), t in cycles, and the peak is sqrt(2)(1 + exp(-pi/(X/R))) times it. Where
+        the separate networks have no ground path that the full networks do (through line charging alone), the
+        X/R of the complex Thevenin impedance is used.
+        :return: pd.DataFrame with a row per bus and fault type
+        """
+        Z = self.calc_sequence_impedances()
+        R1, X1 = self.calc_separate_networks(1)
+        R0, X0 = self.calc_separate_networks(0)
+        R2, X2 = self.calc_separate_networks(2)
+        V = self.V
+        a = np.exp(2j*np.pi/3)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            I1 = V/(Z[1] + Z[2]*Z[0]/(Z[2] + Z[0]))
+            I2 = -I1*Z[0]/(Z[2] + Z[0])
+            I0 = -I1*Z[2]/(Z[2] + Z[0])
+            dlg = np.where(np.isinf(Z[0]), np.sqrt(3)*np.abs(V/(Z[1] + Z[2])),
+                           np.maximum(np.abs(I0 + a**2*I1 + a*I2), np.abs(I0 + a*I1 + a**2*I2)))
+            symmetrical = np.stack((np.abs(V/Z[1]), 3*np.abs(V/(Z[0] + Z[1] + Z[2])), np.sqrt(3)*np.abs(V/(Z[1] + Z[2])), dlg))
+            parallel_X = np.where(np.isinf(X0), X2, X2*X0/(X2 + X0))
+            parallel_R = np.where(np.isinf(R0), R2, R2*R0/(R2 + R0))
+            xr = np.stack((X1/R1, (X1 + X2 + X0)/(R1 + R2 + R0), (X1 + X2)/(R1 + R2), (X1 + parallel_X)/(R1 + parallel_R)))
+            total = np.stack((Z[1], Z[0] + Z[1] + Z[2], Z[1] + Z[2], Z[1] + Z[2]*Z[0]/(Z[2] + Z[0])))
+            xr = np.where(np.isfinite(xr), xr, np.abs(total.imag/total.real))
+        # no path to ground leaves a ground fault without current, and without an X/R
+        multiplier = np.where(symmetrical == 0, 1.0, np.sqrt(1 + 2*np.exp(-4*np.pi*self.parting_time/xr)))
+        peak = np.where(symmetrical == 0, np.sqrt(2), np.sqrt(2)*(1 + np.exp(-np.pi/xr)))
+
+        kA = symmetrical*self.base_current
+        self.duty = pd.DataFrame({"Bus": np.tile(self.buses, len(FAULT_TYPES)),
+                                  "Fault": np.repeat(FAULT_TYPES, self.count),
+                                  "X/R": xr.ravel(), "Sym (pu)": symmetrical.ravel(), "Sym (kA)": kA.ravel(),
+                                  "MF": multiplier.ravel(), "Asym (kA)": (kA*multiplier).ravel(),
+                                  "Peak (kA)": (kA*peak).ravel()})
+        return self.duty
+
+
+    def check_ratings(self, ratings: dict):
+        """
+        Buses whose asymmetrical interrupting or peak current exceeds their breakers' ratings.
+        :param ratings: Bus name -> (interrupting rating, peak rating) in kA
+        :return: pd.DataFrame of the worst fault type at each overdutied bus, with the percentage of each rating used
+        """
+        if self.duty is None:
+            self.calc_duty()
+        duty = self.duty[self.duty["Bus"].isin(list(ratings))].copy()
+        rating = np.array([ratings[bus] for bus in duty["Bus"]], dtype=float).reshape(-1, 2)
+        duty["Interrupting (%)"] = duty["Asym (kA)"]/rating[:, 0]*100
+        duty["Peak (%)"] = duty["Peak (kA)"]/rating[:, 1]*100
+        duty = duty[(duty["Interrupting (%)"] > 100) | (duty["Peak (%)"] > 100)]
+        worst = duty.groupby("Bus")["Interrupting (%)"].idxmax()
+        return duty.loc[worst].set_index("Bus")
+
+
+    def print_data(self):
+        """
+        Prints the breaker duty at every bus for its worst fault type.
+        :return:
+        """
+        if self.duty is None:
+            self.calc_duty()
+        worst = self.duty.loc[self.duty.groupby("Bus", sort=False)["Asym (kA)"].idxmax()]
+        print(f"Breaker duty at {self.parting_time} cycle contact parting:")
+        print(worst.set_index("Bus").round(4).to_string())
+
+
+# validation tests
+if __name__ == '__main__':
+    import io
+    import time
+    import contextlib
+    from Circuit import ThreePhaseFault, UnsymmetricalFaults
+    from Validations import CreateSevenPowerBusSystem, CreateSyntheticCase
+
+    circ = CreateSevenPowerBusSystem()
+    with contextlib.redirect_stdout(io.StringIO()):
+        circ.do_newton_raph()
+    breaker = BreakerDuty(circ)
+    duty = breaker.calc_duty()
+    breaker.print_data()
+    print()
+
+    # the symmetrical currents against the fault classes, bus by bus
+    largest = 0
+    for bus in circ.buses.values():
+        symfault = ThreePhaseFault(circ, bus.index)
+        unsymfault = UnsymmetricalFaults(circ, bus.index)
+        with contextlib.redirect_stdout(io.StringIO()):
+            symfault.calc_fault_values()
+            currents = {"3ph": abs(symfault.Ifn)}
+            for fault, solve in [("SLG", unsymfault.SLG_fault_values), ("LL", unsymfault.LL_fault_values),
+                                 ("DLG", unsymfault.DLG_fault_values)]:
+                solve()
+                currents[fault] = np.max(np.abs(unsymfault.Ipn))
+        for fault, current in currents.items():
+            row = duty[(duty["Bus"] == bus.name) & (duty["Fault"] == fault)]
+            largest = max(largest, abs(row["Sym (pu)"].iloc[0] - current))
+    print("Largest difference from the fault classes' phase currents:", largest)
+    print("Multiplying factor at X/R 0.001 and 1000:",
+          np.round(np.sqrt(1 + 2*np.exp(-4*np.pi*3/np.array([0.001, 1000]))), 4))
+    print("Overdutied with 40 kA / 100 kA breakers everywhere:")
+    print(breaker.check_ratings({bus: (40, 100) for bus in circ.buses})[["Fault", "Asym (kA)", "Interrupting (%)", "Peak (%)"]].round(1).to_string())
+    print()
+
+    circ = CreateSyntheticCase(2000)
+    for gen in circ.generators.values():  # MATPOWER cases carry no machine reactances or grounding
+        gen.X1 = gen.calc_X1(0.2)
+        gen.X2 = gen.calc_X2(0.2)
+        gen.X0 = gen.calc_X0(0.05)
+        gen.Zn = 0.0
+        gen.Y0prim = gen.calc_Y0prim()
+    with contextlib.redirect_stdout(io.StringIO()):
+        circ.do_newton_raph(sparse=True)
+    circ.get_Ybus()
+    print("***synthetic 2000 bus case***")
+    start = time.perf_counter()
+    duty = BreakerDuty(circ).calc_duty()
+    print(f"every bus and fault type: {time.perf_counter()-start:.3f} s")
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        ThreePhaseFault(circ, 1).calc_fault_values()
+    print(f"one three phase fault with ThreePhaseFault: {time.perf_counter()-start:.3f} s")
+    print(duty.groupby("Fault")[["X/R", "Sym (kA)", "MF", "Asym (kA)"]].max().round(3).to_string())
@@ -11,22 +11,58 @@ class Bus:
     """
     Bus class to implement bus functionality
     """
-    def __init__(self, name: str, base_kv: float, index: int):
+    def __init__(self, name: str, base_kv: float, index: int, results: dict = None):
         """
         Constructor for bus class
         :param name: Name of bus
         :param base_kv: Base voltage of bus
         :param index: Index of bus
+        :param results: The circuit's power flow result arrays, shared by all of its buses
         """
         self.name = name
         self.base_kv = base_kv*1e3
         self.index = index
-        self.Vpu = 1 # per unit voltage
-        self.V = base_kv # actual voltage.
-        self.angle = 0.0
+        self.results = {} if results is None else results  # "Vpu" and "angle" arrays in bus index order once solved
+        self._Vpu = 1 # per unit voltage
+        self._V = base_kv # actual voltage.
+        self._angle = 0.0
         self.real_power = 0.0
         self.reactive_power = 0.0
         self.type = "PQ" # bus type
+        self.area = 1 # interchange area
+
+
+    @property
+    def Vpu(self):
+        """
+        Per unit voltage, read from the circuit's latest power flow results
+        :return: float
+        """
+        if "Vpu" in self.results:
+            return self.results["Vpu"][self.index-1]
+        return self._Vpu
+
+
+    @property
+    def V(self):
+        """
+        Actual voltage, read from the circuit's latest power flow results
+        :return: float
+        """
+        if "Vpu" in self.results:
+            return self.base_kv*self.results["Vpu"][self.index-1]
+        return self._V
+
+
+    @property
+    def angle(self):
+        """
+        Voltage angle in radians, read from the circuit's latest power flow results
+        :return: float
+        """
+        if "angle" in self.results:
+            return self.results["angle"][self.index-1]
+        return self._angle
     
 
     def set_bus_v(self, v: float):
@@ -35,8 +71,11 @@ class Bus:
         :param v:
         :return:
         """
-        self.Vpu = v
-        self.V = self.base_kv*v
+        if "Vpu" in self.results:
+            self.results["Vpu"][self.index-1] = v
+        else:
+            self._Vpu = v
+            self._V = self.base_kv*v
     
 
     def set_angle(self, a: float):
@@ -45,7 +84,10 @@ class Bus:
         :param a:
         :return:
         """
-        self.angle = a
+        if "angle" in self.results:
+            self.results["angle"][self.index-1] = a
+        else:
+            self._angle = a
 
 
     def set_type(self, t: str):
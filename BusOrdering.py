@@ -0,0 +1,183 @@
+"""
+Module for fill reducing bus orderings used before sparse factorization
+
+Filename: BusOrdering.py
+Author: Justin Lipner, Bailey Stout
+Date: 2026-10-19
+"""
+
+import hashlib
+import heapq
+import numpy as np
+from scipy import sparse
+from scipy.sparse.csgraph import reverse_cuthill_mckee, breadth_first_order
+
+
+def topology_key(num_buses: int, from_bus, to_bus):
+    """
+    Hashes which buses are connected, ignoring element parameters and order.
+    :param num_buses: Number of buses
+    :param from_bus: Zero based from bus of each branch
+    :param to_bus: Zero based to bus of each branch
+    :return: str
+    """
+    edges = np.unique(np.sort(np.column_stack((from_bus, to_bus)), axis=1), axis=0)
+    digest = hashlib.blake2b(str(num_buses).encode(), digest_size=16)
+    digest.update(np.ascontiguousarray(edges, dtype=np.int64).tobytes())
+    return digest.hexdigest()
+
+
+def calc_adjacency(num_buses: int, from_bus, to_bus):
+    """
+    Builds the symmetric bus adjacency pattern of the network, without self loops.
+    :param num_buses: Number of buses
+    :param from_bus: Zero based from bus of each branch
+    :param to_bus: Zero based to bus of each branch
+    :return: scipy.sparse.csr_matrix
+    """
+    from_bus = np.asarray(from_bus)
+    to_bus = np.asarray(to_bus)
+    series = from_bus != to_bus  # shunt elements connect a bus to itself
+    rows = np.concatenate((from_bus[series], to_bus[series]))
+    cols = np.concatenate((to_bus[series], from_bus[series]))
+    adjacency = sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(num_buses, num_buses))
+    adjacency.data[:] = 1
+    return adjacency
+
+
+def rcm_ordering(adjacency):
+    """
+    Reverse Cuthill-McKee ordering, which keeps the matrix banded.
+    :param adjacency: Bus adjacency pattern
+    :return: np.ndarray of bus indexes in elimination order
+    """
+    return np.asarray(reverse_cuthill_mckee(adjacency, symmetric_mode=True), dtype=int)
+
+
+def amd_ordering(adjacency):
+    """
+    Minimum degree ordering: repeatedly eliminates the bus with the fewest connections and joins its
+    neighbors, which is what the elimination does to the matrix. Degrees are kept exactly, the quantity
+    AMD approximates, which is cheap on power networks because buses have few connections.
+    :param adjacency: Bus adjacency pattern
+    :return: np.ndarray of bus indexes in elimination order
+    """
+    indptr, indices = adjacency.indptr, adjacency.indices
+    neighbors = [set(indices[indptr[k]:indptr[k+1]].tolist()) for k in range(adjacency.shape[0])]
+    heap = [(len(neighbors[k]), k) for k in range(len(neighbors))]
+    heapq.heapify(heap)
+    eliminated = np.zeros(len(neighbors), dtype=bool)
+    order = []
+
+    while heap:
+        degree, k = heapq.heappop(heap)
+        if eliminated[k] or degree != len(neighbors[k]):  # stale heap entry
+            continue
+        eliminated[k] = True
+        order.append(k)
+
+        clique = neighbors[k]
+        for n in clique:
+            neighbors[n].discard(k)
+            neighbors[n] |= clique
+            neighbors[n].discard(n)
+            heapq.heappush(heap, (len(neighbors[n]), n))
+        neighbors[k] = set()
+
+    return np.array(order, dtype=int)
+
+
+def calc_ordering(num_buses: int, from_bus, to_bus, method: str = "amd"):
+    """
+    Computes a fill reducing ordering of the buses.
+    :param num_buses: Number of buses
+    :param from_bus: Zero based from bus of each branch
+    :param to_bus: Zero based to bus of each branch
+    :param method: "amd" (minimum degree) or "rcm" (reverse Cuthill-McKee)
+    :return: np.ndarray of bus indexes in elimination order
+    """
+    adjacency = calc_adjacency(num_buses, from_bus, to_bus)
+    if method == "amd":
+        return amd_ordering(adjacency)
+    elif method == "rcm":
+        return rcm_ordering(adjacency)
+    raise ValueError(f"{method} is not a bus ordering. Use 'amd' or 'rcm'")
+
+
+def calc_state_ordering(ordering, pvpq, pq):
+    """
+    Orders the power flow unknowns to follow a bus ordering, keeping each bus's angle and magnitude
+    next to each other so the Jacobian has the same structure as the network.
+    :param ordering: Bus indexes in elimination order
+    :param pvpq: Zero based PQ and PV buses, in bus order (angle unknowns)
+    :param pq: Zero based PQ buses, in bus order (magnitude unknowns)
+    :return: np.ndarray of positions in the [angles, magnitudes] state vector
+    """
+    num_buses = len(ordering)
+    angle = np.full(num_buses, -1)
+    magnitude = np.full(num_buses, -1)
+    angle[pvpq] = np.arange(len(pvpq))
+    magnitude[pq] = len(pvpq) + np.arange(len(pq))
+
+    state = np.column_stack((angle[ordering], magnitude[ordering])).ravel()
+    return state[state >= 0]
+
+
+def calc_tree_ordering(num_buses: int, from_bus, to_bus, root: int):
+    """
+    Breadth first ordering of a radial network from its root, so every bus comes after the bus feeding it.
+    Parallel branches count as one connection.
+    :param num_buses: Number of buses
+    :param from_bus: Zero based from bus of each branch
+    :param to_bus: Zero based to bus of each branch
+    :param root: Zero based bus the network is fed from
+    :return: (bus indexes in order, parent of each bus with -1 at the root), None if the network has a loop or is split
+    """
+    adjacency = calc_adjacency(num_buses, from_bus, to_bus)
+    if adjacency.nnz != 2*(num_buses-1):
+        return None
+    order, parent = breadth_first_order(adjacency, root, directed=False, return_predecessors=True)
+    if len(order) != num_buses:
+        return None
+    parent = parent.astype(int)
+    parent[root] = -1
+    return order.astype(int), parent
+
+
+# validation tests
+if __name__ == '__main__':
+    import io
+    import time
+    import contextlib
+    from CaseImporter import import_case, build_circuit, synthetic_case
+    from Solution import SparseNewtonRaphson
+
+    rng = np.random.default_rng(0)
+    cases = [import_case("Case_Files/case14.m")]
+    for n in [2500, 10000]:
+        case = synthetic_case(n)
+        # real cases are not numbered in a helpful order, so the grid buses are shuffled
+        mapping = dict(zip(range(1, n+1), rng.permutation(n) + 1))
+        for table, columns in [("bus", ["number"]), ("gen", ["bus"]), ("branch", ["from", "to"])]:
+            for column in columns:
+                case[table][column] = case[table][column].map(mapping)
+        case["bus"] = case["bus"].sort_values("number")
+        cases.append(build_circuit(case, f"synthetic{n}"))
+
+    for circ in cases:
+        print(f"***{circ.name}: {circ.count} buses***")
+        for ordering in [None, "rcm", "amd", "colamd"]:
+            if ordering is None and circ.count > 5000:
+                print(f"{str(ordering):>7}: skipped, the factors would not fit in memory")
+                continue
+            start = time.perf_counter()
+            solver = SparseNewtonRaphson(circ, False, ordering)
+            setup = time.perf_counter() - start
+
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                solver.newton_raph()
+            elapsed = time.perf_counter() - start
+            print(f"{str(ordering):>7}: L+U nonzeros = {solver.factor_nnz:>8}, ordering {setup:.3f} s, "
+                  f"solve {elapsed:.3f} s ({solver.iterations} iterations, converged = {solver.converged})")
+        print()
@@ -0,0 +1,534 @@
+"""
+Module to import network cases from standard file formats (MATPOWER .m and PSS/E RAW v33)
+
+Filename: CaseImporter.py
+Author: Justin Lipner, Bailey Stout
+Date: 2026-10-19
+"""
+
+import csv
+import re
+import numpy as np
+import pandas as pd
+from Circuit import Circuit
+from MatrixIO import resolve_path
+
+
+bus_columns = ["number", "type", "Pd", "Qd", "Gs", "Bs", "area", "Vm", "Va", "baseKV"]
+gen_columns = ["bus", "Pg", "Qg", "Qmax", "Qmin", "Vg", "mBase", "status", "Pmax", "Pmin"]
+branch_columns = ["from", "to", "R", "X", "B", "rateA", "rateB", "rateC", "tap", "shift", "status"]
+
+# PSS/E sections in the order they appear in a v33 RAW file
+psse_sections = ["bus", "load", "fixed shunt", "generator", "branch", "transformer", "area", "two-terminal dc",
+                 "vsc dc", "impedance correction", "multi-terminal dc", "multi-section line", "zone",
+                 "inter-area transfer", "owner", "facts", "switched shunt", "gne", "induction machine"]
+
+
+def import_case(path: str, name: str = None):
+    """
+    Imports a case file into a new circuit. The format is picked from the file extension.
+    :param path: Path to a MATPOWER (.m) or PSS/E RAW (.raw) file
+    :param name: Name of the circuit, defaults to the file name
+    :return: Circuit
+    """
+    case = read_case(path)
+    if name is None:
+        name = case["name"]
+    return build_circuit(case, name)
+
+
+def read_case(path: str):
+    """
+    Reads a case file into tables that follow the MATPOWER column layout.
+    :param path: Path to a MATPOWER (.m) or PSS/E RAW (.raw) file
+    :return: dict with baseMVA, bus, gen, branch and gencost
+    """
+    if path.lower().endswith(".m"):
+        return read_matpower(path)
+    elif path.lower().endswith(".raw"):
+        return read_psse(path)
+    raise ValueError(f"{path} is not a MATPOWER (.m) or PSS/E (.raw) file")
+
+
+def read_matpower(path: str):
+    """
+    Reads a MATPOWER version 2 case file. Each matrix is converted with a single numpy parse.
+    :param path: Path to the .m file
+    :return: dict with baseMVA, bus, gen, branch and gencost
+    """
+    with open(resolve_path(path)) as file:
+        text = file.read()
+    text = re.sub(r"%[^\n]*", "", text)  # removes comments
+
+    name = re.search(r"function\s+\w+\s*=\s*(\w+)", text)
+    baseMVA = float(re.search(r"mpc\.baseMVA\s*=\s*([-+\d.eE]+)", text).group(1))
+
+    bus = matpower_matrix(text, "bus", bus_columns)
+    gen = matpower_matrix(text, "gen", gen_columns)
+    branch = matpower_matrix(text, "branch", branch_columns)
+    gencost = None
+    if re.search(r"mpc\.gencost\s*=", text):
+        gencost = matpower_matrix(text, "gencost", None)
+    return matpower_case(name.group(1) if name else "case", baseMVA, bus, gen, branch, gencost)
+
+
+def matpower_case(name: str, baseMVA: float, bus: pd.DataFrame, gen: pd.DataFrame, branch: pd.DataFrame,
+                  gencost: pd.DataFrame = None):
+    """
+    Completes MATPOWER tables, read from a file or made in memory, with element names and transformer flags.
+    :param name: Name of the case
+    :param baseMVA: System base power in MVA
+    :param bus: Bus table
+    :param gen: Generator table
+    :param branch: Branch table
+    :param gencost: Generator cost table, None if the case has none
+    :return: dict with baseMVA, bus, gen, branch and gencost
+    """
+    branch["transformer"] = (branch["tap"] != 0) | (branch["shift"] != 0)
+    branch["tap"] = branch["tap"].where(branch["tap"] != 0, 1.0)
+    branch["name"] = "L" + pd.Series(np.arange(1, len(branch)+1), index=branch.index).astype(str)
+    branch.loc[branch["transformer"], "name"] = branch["name"].str.replace("L", "T", n=1)
+    gen["name"] = "Gen" + pd.Series(np.arange(1, len(gen)+1), index=gen.index).astype(str)
+    gen["X1"] = 0.0
+    if "Pmax" not in gen:  # short gen tables leave the real power unlimited
+        gen["Pmax"] = np.inf
+        gen["Pmin"] = 0.0
+    return {"name": name, "baseMVA": baseMVA, "bus": bus, "gen": gen, "branch": branch, "gencost": gencost}
+
+
+def matpower_matrix(text: str, field: str, columns: list[str]):
+    """
+    Parses one "mpc.field = [ ... ];" matrix.
+    :param text: File contents without comments
+    :param field: Name of the matrix
+    :param columns: Names for the leading columns, None to use numbers
+    :return: pd.DataFrame
+    """
+    body = re.search(rf"mpc\.{field}\s*=\s*\[(.*?)\]", text, re.S).group(1)
+    rows = [row for row in body.split(";") if row.strip() != ""]
+    if len(rows) == 0:
+        return pd.DataFrame(columns=columns)
+
+    width = len(rows[0].split())
+    return matpower_table(np.array(" ".join(rows).split(), dtype=float).reshape(-1, width), columns)
+
+
+def matpower_table(data: np.ndarray, columns: list[str]):
+    """
+    Makes a table from a MATPOWER matrix.
+    :param data: Matrix with one row per element
+    :param columns: Names for the leading columns, None to use numbers
+    :return: pd.DataFrame
+    """
+    table = pd.DataFrame(data)
+
+    if columns is not None:
+        table = table.iloc[:, :len(columns)]
+        table.columns = columns[:table.shape[1]]
+    return table
+
+
+def read_psse(path: str):
+    """
+    Reads a PSS/E RAW version 33 case file. Bus, load, fixed shunt, generator, branch, two and three
+    winding transformer and switched shunt data are used; the other sections are skipped.
+    :param path: Path to the .raw file
+    :return: dict with baseMVA, bus, gen, branch and gencost
+    """
+    with open(resolve_path(path)) as file:
+        lines = file.read().splitlines()
+
+    header = split_record(lines[0])
+    baseMVA = float(header[1])
+    if len(header) > 2 and int(float(header[2])) != 33:
+        print(f"WARNING: {path} is RAW version {header[2]}, reading it as version 33.")
+
+    records = {}
+    pos = 3
+    for section in psse_sections:
+        records[section] = []
+        while pos < len(lines):
+            fields = split_record(lines[pos])
+            if len(fields) == 0:
+                pos += 1
+                continue
+            if fields[0] == "Q":
+                break
+            if fields[0] == "0":
+                pos += 1
+                break
+
+            if section == "transformer":
+                # two winding transformers use 4 lines and three winding transformers use 5
+                count = 4 if int(float(fields[2])) == 0 else 5
+                records[section].append([split_record(line) for line in lines[pos:pos+count]])
+                pos += count
+            else:
+                records[section].append(fields)
+                pos += 1
+
+    bus = psse_table(records["bus"], {"number": 0, "name": 1, "baseKV": 2, "type": 3, "area": 4, "Vm": 7, "Va": 8})
+    bus[["Pd", "Qd", "Gs", "Bs"]] = 0.0
+
+    # loads are kept as constant power, with the constant current and admittance parts taken at 1 pu
+    load = psse_table(records["load"], {"bus": 0, "status": 2, "PL": 5, "QL": 6, "IP": 7, "IQ": 8, "YP": 9, "YQ": 10})
+    load = load[load["status"] == 1]
+    add_to_buses(bus, load["bus"], Pd=load["PL"]+load["IP"], Qd=load["QL"]+load["IQ"], Gs=load["YP"], Bs=load["YQ"])
+
+    shunt = psse_table(records["fixed shunt"], {"bus": 0, "status": 2, "GL": 3, "BL": 4})
+    shunt = shunt[shunt["status"] == 1]
+    add_to_buses(bus, shunt["bus"], Gs=shunt["GL"], Bs=shunt["BL"])
+
+    switched = psse_table(records["switched shunt"], {"bus": 0, "status": 3, "BINIT": 9})
+    switched = switched[switched["status"] == 1]
+    add_to_buses(bus, switched["bus"], Bs=switched["BINIT"])
+
+    gen = psse_table(records["generator"], {"bus": 0, "id": 1, "Pg": 2, "Qg": 3, "Qmax": 4, "Qmin": 5, "Vg": 6,
+                                            "mBase": 8, "X1": 10, "status": 14, "Pmax": 16, "Pmin": 17})
+    gen["name"] = "Gen" + gen["bus"].astype(int).astype(str) + "_" + gen["id"].astype(str)
+
+    line = psse_table(records["branch"], {"from": 0, "to": 1, "ckt": 2, "R": 3, "X": 4, "B": 5, "rateA": 6,
+                                          "rateB": 7, "rateC": 8, "GI": 9, "BI": 10, "GJ": 11, "BJ": 12, "status": 13})
+    line["to"] = line["to"].abs()  # a negative bus number marks the metered end
+    on = line[line["status"] == 1]
+    add_to_buses(bus, on["from"], Gs=on["GI"]*baseMVA, Bs=on["BI"]*baseMVA)
+    add_to_buses(bus, on["to"], Gs=on["GJ"]*baseMVA, Bs=on["BJ"]*baseMVA)
+    line["tap"] = 1.0
+    line["shift"] = 0.0
+    line["transformer"] = False
+    line["name"] = "L" + line["from"].astype(int).astype(str) + "_" + line["to"].astype(int).astype(str) + "_" + line["ckt"].astype(str)
+
+    bus, xfmr = psse_transformers(records["transformer"], bus, baseMVA)
+    branch = pd.concat([line[branch_columns + ["transformer", "name"]], xfmr], ignore_index=True)
+    bus = bus[bus_columns + ["name"]]
+
+    title = lines[1].strip() if len(lines) > 1 else "case"
+    return {"name": title, "baseMVA": baseMVA, "bus": bus, "gen": gen, "branch": branch, "gencost": None}
+
+
+def split_record(line: str):
+    """
+    Splits one RAW record into fields. Comments after a "/" outside of quotes are dropped.
+    :param line: Line of the file
+    :return: list[str]
+    """
+    line = re.match(r"(?:[^'/]|'[^']*')*", line).group(0)
+    if "," in line:
+        fields = next(csv.reader([line], quotechar="'", skipinitialspace=True))
+    else:
+        fields = re.findall(r"'[^']*'|\S+", line)
+    return [field.strip().strip("'").strip() for field in fields]
+
+
+def psse_table(records: list, columns: dict):
+    """
+    Builds a table from RAW records, keeping the named columns.
+    :param records: List of split records
+    :param columns: Column name to field position
+    :return: pd.DataFrame
+    """
+    text = {"name", "id", "ckt"}
+    table = pd.DataFrame(records).reindex(columns=range(max(columns.values())+1))
+    table = table.iloc[:, list(columns.values())]
+    table.columns = list(columns.keys())
+    for column in table.columns:
+        if column in text:
+            table[column] = table[column].fillna("").astype(str)
+        else:
+            table[column] = pd.to_numeric(table[column], errors="coerce").fillna(0.0)
+    return table
+
+
+def add_to_buses(bus: pd.DataFrame, numbers: pd.Series, **values):
+    """
+    Sums per element values into the bus table columns.
+    :param bus: Bus table
+    :param numbers: Bus number of each element
+    :param values: Column name to per element values
+    :return:
+    """
+    if len(numbers) == 0:
+        return
+    totals = pd.DataFrame({name: np.asarray(value, dtype=float) for name, value in values.items()})
+    totals = totals.groupby(np.asarray(numbers, dtype=float)).sum()
+    rows = pd.Index(bus["number"]).get_indexer(totals.index)
+    for name in totals.columns:
+        bus.loc[bus.index[rows[rows >= 0]], name] += totals[name].to_numpy()[rows >= 0]
+
+
+def psse_transformers(records: list, bus: pd.DataFrame, baseMVA: float):
+    """
+    Converts RAW transformer records into branch rows. Three winding transformers are replaced by
+    three two winding transformers connected to a new star bus.
+    :param records: Transformer records, each a list of split lines
+    :param bus: Bus table, star buses are appended to it
+    :param baseMVA: System base
+    :return: (bus table, transformer branch table)
+    """
+    if len(records) == 0:
+        return bus, pd.DataFrame(columns=branch_columns + ["transformer", "name"])
+
+    def field(line: int, position: int, default=0.0):
+        values = [record[line][position] if len(record) > line and len(record[line]) > position else default for record in records]
+        return pd.to_numeric(pd.Series(values), errors="coerce").fillna(default).to_numpy()
+
+    I, J, K = field(0, 0), field(0, 1), field(0, 2)
+    CW, CZ, CM = field(0, 4, 1), field(0, 5, 1), field(0, 6, 1)
+    MAG1, MAG2, STAT = field(0, 7), field(0, 8), field(0, 11, 1)
+    ckt = pd.Series([record[0][3] if len(record[0]) > 3 else "1" for record in records])
+    kv = bus.set_index("number")["baseKV"]
+
+    # winding pairs 1-2, 2-3, 3-1 converted to pu on the system base
+    Z = []
+    for pair in range(3):
+        R, X, S = field(1, 3*pair), field(1, 3*pair+1), field(1, 3*pair+2, baseMVA)
+        Z.append(transformer_impedance(R, X, CZ, S, baseMVA))
+
+    # off nominal turns ratio of each winding in pu of its bus base
+    ratio = []
+    for winding, number in enumerate([I, J, K]):
+        line = 2 + winding
+        windv, nomv = field(line, 0, 1.0), field(line, 1)
+        base = kv.reindex(number).to_numpy()
+        nomv = np.where(nomv == 0, base, nomv)
+        ratio.append(np.select([CW == 2, CW == 3], [windv/base, windv*nomv/base], windv))
+    angle = [field(2, 2), field(3, 2), field(4, 2)]
+
+    # magnetizing admittance is placed at the winding 1 bus
+    G = np.where(CM == 1, MAG1, MAG1/1e6/baseMVA)
+    B = np.where(CM == 1, MAG2, -np.sqrt(np.maximum(MAG2**2-G**2, 0)))
+    add_to_buses(bus, pd.Series(I[STAT != 0]), Gs=G[STAT != 0]*baseMVA, Bs=B[STAT != 0]*baseMVA)
+
+    names = "T" + pd.Series(I.astype(int)).astype(str) + "_" + pd.Series(J.astype(int)).astype(str) + "_" + ckt
+    two = K == 0
+    rows = [pd.DataFrame({"from": I[two], "to": J[two], "R": Z[0][two].real, "X": Z[0][two].imag,
+                          "tap": ratio[0][two]/ratio[1][two], "shift": angle[0][two]-angle[1][two],
+                          "status": (STAT[two] != 0).astype(float), "name": names[two].to_numpy()})]
+
+    three = ~two
+    if three.any():
+        star = bus["number"].max() + 1 + np.arange(three.sum())
+        star_bus = pd.DataFrame({"number": star, "name": "STAR", "baseKV": kv.reindex(I[three]).to_numpy(),
+                                 "type": 1, "area": 1, "Vm": 1.0, "Va": 0.0, "Pd": 0.0, "Qd": 0.0, "Gs": 0.0, "Bs": 0.0})
+        bus = pd.concat([bus, star_bus], ignore_index=True)
+
+        # star equivalent impedance of each winding
+        Z12, Z23, Z31 = Z[0][three], Z[1][three], Z[2][three]
+        Zstar = [(Z12+Z31-Z23)/2, (Z12+Z23-Z31)/2, (Z23+Z31-Z12)/2]
+        out = [STAT[three] == 4, STAT[three] == 2, STAT[three] == 3]
+        for winding, number in enumerate([I, J, K]):
+            rows.append(pd.DataFrame({"from": number[three], "to": star, "R": Zstar[winding].real,
+                                      "X": Zstar[winding].imag, "tap": ratio[winding][three],
+                                      "shift": angle[winding][three],
+                                      "status": ((STAT[three] != 0) & ~out[winding]).astype(float),
+                                      "name": (names[three] + f"_W{winding+1}").to_numpy()}))
+
+    xfmr = pd.concat(rows, ignore_index=True)
+    xfmr["B"] = 0.0
+    xfmr[["rateA", "rateB", "rateC"]] = 0.0
+    xfmr["transformer"] = True
+    return bus, xfmr[branch_columns + ["transformer", "name"]]
+
+
+def transformer_impedance(R, X, CZ, S, baseMVA: float):
+    """
+    Converts RAW transformer impedance data to pu on the system base.
+    :param R: Resistance data (pu, or load loss in W when CZ=3)
+    :param X: Reactance data (pu, or impedance magnitude when CZ=3)
+    :param CZ: Impedance data code
+    :param S: Winding base MVA
+    :param baseMVA: System base
+    :return: np.ndarray of complex
+    """
+    S = np.where(S == 0, baseMVA, S)
+    Rw = np.where(CZ == 3, R/1e6/S, R)
+    Xw = np.where(CZ == 3, np.sqrt(np.maximum(X**2-Rw**2, 0)), X)
+    scale = np.where(CZ == 1, 1.0, baseMVA/S)
+    return (Rw + 1j*Xw)*scale
+
+
+def build_circuit(case: dict, name: str):
+    """
+    Creates a circuit from case tables. Every element type is added with one bulk call. Isolated buses,
+    out of service elements and elements connected to isolated buses are left out. Generators on PQ buses
+    are added as negative loads, as MATPOWER does. Buses without a base voltage are given 1 kV.
+    :param case: Tables from read_case
+    :param name: Name of the circuit
+    :return: Circuit
+    """
+    circ = Circuit(name)
+    circ.change_power_base(case["baseMVA"])
+
+    bus = case["bus"][case["bus"]["type"] != 4]
+    numbers = bus["number"].to_numpy()
+    bus_name = bus_names(numbers)
+    circ.add_buses(bus_name, np.where(bus["baseKV"] > 0, bus["baseKV"], 1.0))
+    circ.set_bus_areas(bus_name, bus["area"].to_numpy())
+
+    # generators on slack and PV buses regulate voltage, the rest are treated as negative loads
+    gen = case["gen"]
+    gen = gen[(gen["status"] > 0) & gen["bus"].isin(numbers)]
+    bus_type = pd.Series(bus["type"].to_numpy(), index=numbers).reindex(gen["bus"]).to_numpy()
+    regulating = gen[(bus_type == 2) | (bus_type == 3)]
+    fixed = gen[(bus_type != 2) & (bus_type != 3)]
+
+    if len(regulating) != 0:
+        slack = numbers[bus["type"].to_numpy() == 3]
+        slack = [bus_names(slack)[0]] if len(slack) != 0 and slack[0] in set(regulating["bus"]) else [None]
+        circ.add_generators(list(regulating["name"]), bus_names(regulating["bus"]), regulating["Vg"].to_numpy(),
+                            regulating["Pg"].to_numpy(), regulating["Qmax"].to_numpy()*1e6,
+                            np.where(regulating["mBase"] > 0, regulating["mBase"], case["baseMVA"]),
+                            regulating["X1"].to_numpy(), slack[0], regulating["Qmin"].to_numpy()*1e6)
+        c2, c1, c0 = gen_costs(case["gencost"], regulating.index, len(case["gen"]))
+        circ.add_generator_costs(list(regulating["name"]), c2, c1, c0, regulating["Pmin"].to_numpy(),
+                                 regulating["Pmax"].to_numpy())
+
+    loaded = bus[(bus["Pd"] != 0) | (bus["Qd"] != 0)]
+    load_names = ["Load" + str(int(n)) for n in loaded["number"]] + list(fixed["name"])
+    load_buses = bus_names(loaded["number"]) + bus_names(fixed["bus"])
+    circ.add_loads(load_names, load_buses, np.concatenate((loaded["Pd"], -fixed["Pg"])),
+                   np.concatenate((loaded["Qd"], -fixed["Qg"])))
+
+    shunt = bus[(bus["Gs"] != 0) | (bus["Bs"] != 0)]
+    circ.add_shunts(["Shunt" + str(int(n)) for n in shunt["number"]], bus_names(shunt["number"]),
+                    shunt["Gs"].to_numpy(), shunt["Bs"].to_numpy())
+
+    branch = case["branch"]
+    branch = branch[(branch["status"] > 0) & branch["from"].isin(numbers) & branch["to"].isin(numbers)]
+    line = branch[~branch["transformer"]]
+    xfmr = branch[branch["transformer"]]
+    circ.add_tlines_from_parameters(list(line["name"]), bus_names(line["from"]), bus_names(line["to"]),
+                                    line["R"].to_numpy(), line["X"].to_numpy(), line["B"].to_numpy())
+    circ.add_transformers_from_parameters(list(xfmr["name"]), bus_names(xfmr["from"]), bus_names(xfmr["to"]),
+                                          xfmr["R"].to_numpy(), xfmr["X"].to_numpy(), taps=xfmr["tap"].to_numpy(),
+                                          shifts=xfmr["shift"].to_numpy())
+    return circ
+
+
+def gen_costs(gencost: pd.DataFrame, rows, num_gens: int):
+    """
+    Quadratic cost coefficients of the given generators from a MATPOWER gencost table. Only polynomial
+    costs (model 2) of up to second order are used; other generators are given no cost.
+    :param gencost: gencost table, None if the case has none
+    :param rows: Rows of the generators in the gen table
+    :param num_gens: Number of rows in the gen table, the real power costs come first
+    :return: (c2, c1, c0) np.ndarray in $/MW^2h, $/MWh and $/h
+    """
+    costs = np.zeros((len(rows), 3))
+    if gencost is None or len(gencost) < num_gens:
+        return costs[:, 0], costs[:, 1], costs[:, 2]
+
+    table = gencost.iloc[:num_gens].to_numpy()[np.asarray(rows, dtype=int)]
+    for k, row in enumerate(table):
+        n = int(row[3])
+        if row[0] != 2 or n > 3:
+            print(f"Generator cost row {rows[k]+1} is not a polynomial of second order or less. It is ignored.")
+            continue
+        costs[k, 3-n:] = row[4:4+n]
+    return costs[:, 0], costs[:, 1], costs[:, 2]
+
+
+def bus_names(numbers):
+    """
+    Names buses after their case numbers.
+    :param numbers: Bus numbers
+    :return: list[str]
+    """
+    return list("bus" + pd.Series(np.asarray(numbers)).astype(int).astype(str))
+
+
+def synthetic_matrices(n: int):
+    """
+    MATPOWER bus, generator and branch matrices of a case with n buses laid out on a square grid. Every
+    tenth bus has a generator and every 25th branch is an off nominal transformer.
+    :param n: Number of buses
+    :return: (bus, gen, branch) np.ndarray
+    """
+    side = int(np.ceil(np.sqrt(n)))
+    numbers = np.arange(1, n+1)
+    types = np.where(numbers % 10 == 6, 2, 1)
+    types[0] = 3
+    bus = np.column_stack((numbers, types, np.where(types == 1, 10.0, 0.0), np.where(types == 1, 3.0, 0.0),
+                           np.zeros(n), np.zeros(n), np.ones(n), np.ones(n), np.zeros(n), np.full(n, 230.0)))
+
+    gen_bus = numbers[types != 1]
+    gen = np.column_stack((gen_bus, np.full(len(gen_bus), 10.0*(n-len(gen_bus))/len(gen_bus)), np.zeros(len(gen_bus)),
+                           np.full(len(gen_bus), 9999.0), np.full(len(gen_bus), -9999.0), np.ones(len(gen_bus)),
+                           np.full(len(gen_bus), 100.0), np.ones(len(gen_bus))))
+
+    right = numbers[(numbers % side != 0) & (numbers < n)]
+    down = numbers[numbers + side <= n]
+    f = np.concatenate((right, down))
+    t = np.concatenate((right + 1, down + side))
+    m = len(f)
+    branch = np.column_stack((f, t, np.full(m, 0.002), np.full(m, 0.05), np.full(m, 0.002), np.zeros((m, 3)),
+                              np.where(np.arange(m) % 25 == 0, 1.0, 0.0), np.zeros(m), np.ones(m)))
+    return bus, gen, branch
+
+
+def synthetic_case(n: int):
+    """
+    The synthetic grid case as tables in memory, like read_matpower returns them.
+    :param n: Number of buses
+    :return: dict with baseMVA, bus, gen, branch and gencost
+    """
+    bus, gen, branch = synthetic_matrices(n)
+    return matpower_case(f"synthetic{n}", 100.0, matpower_table(bus, bus_columns), matpower_table(gen, gen_columns),
+                         matpower_table(branch, branch_columns))
+
+
+def synthetic_matpower(n: int, path: str):
+    """
+    Writes the synthetic grid case as a MATPOWER file, used to benchmark the importer.
+    :param n: Number of buses
+    :param path: Destination .m file
+    :return:
+    """
+    bus, gen, branch = synthetic_matrices(n)
+    with open(resolve_path(path), "w") as file:
+        file.write(f"function mpc = synthetic{n}\nmpc.version = '2';\nmpc.baseMVA = 100;\n")
+        for field, data in [("bus", bus), ("gen", gen), ("branch", branch)]:
+            file.write(f"mpc.{field} = [\n")
+            np.savetxt(file, data, fmt="%.6g", delimiter="\t", newline=";\n")
+            file.write("];\n")
+
+
+# validation tests
+if __name__ == '__main__':
+    import os
+    import tempfile
+    import time
+
+    matpower = import_case("Case_Files/case14.m")
+    psse = import_case("Case_Files/case14.raw")
+    print(f"MATPOWER case14: {matpower.count} buses, {len(matpower.transmission_lines)} lines, "
+          f"{len(matpower.transformers)} transformers, {len(matpower.generators)} generators")
+    print(f"PSS/E case14: {psse.count} buses, {len(psse.transmission_lines)} lines, "
+          f"{len(psse.transformers)} transformers, {len(psse.generators)} generators")
+    # the RAW file also has an out of service 5-12 line with line shunts, which must not reach the Ybus
+    print("Ybus difference:", np.max(np.abs(matpower.calc_Ybus() - psse.calc_Ybus())))
+    matpower.do_newton_raph()
+
+    # generator outputs against MATPOWER's runpf, with the loads at buses 2, 3 and 6 taken off the injections
+    import io
+    import contextlib
+    from Solution import SparseNewtonRaphson
+    solver = SparseNewtonRaphson(matpower, False)
+    solver.set_tolerance(1e-10)
+    with contextlib.redirect_stdout(io.StringIO()):
+        matpower.apply_results(*solver.newton_raph())
+    generation = np.array([[gen.real_power, gen.reactive_power] for gen in matpower.generators.values()])/1e6
+    runpf = np.array([[232.39, -16.55], [40.0, 43.56], [0.0, 25.08], [0.0, 12.73], [0.0, 17.62]])
+    print("Largest generator PG/QG difference from MATPOWER:", np.max(np.abs(generation - runpf)))
+
+    for n in [1000, 10000, 20000]:
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, f"synthetic{n}.m")
+            synthetic_matpower(n, path)
+            start = time.perf_counter()
+            circ = import_case(path)
+            elapsed = time.perf_counter() - start
+            start = time.perf_counter()
+            branches = circ.calc_branch_arrays()
+            print(f"{n} buses, {len(circ.transmission_lines)+len(circ.transformers)} branches: "
+                  f"import {elapsed:.3f} s, branch arrays {time.perf_counter()-start:.3f} s")
@@ -7,7 +7,7 @@ Author: Justin Lipner, Bailey Stout
 Date: 2025-02-03
 """
 
-from Component import Load, Generator, Reactor, Capacitor
+from Component import Load, Generator, Reactor, Capacitor, Shunt, Equivalent
 import numpy as np
 from Bus import Bus
 from TransmissionLine import TransmissionLine
@@ -15,22 +15,42 @@ from Bundle import Bundle
 from Geometry import Geometry
 from Transformer import Transformer
 from Conductor import Conductor
-from Settings import settings
+from Settings import Settings, settings as default_settings
 from math import sin, cos
 import pandas as pd
+import threading
+from scipy import sparse
+from Reports import ReportColumn, ReportTable, ReportWriter
+
+# report layouts, built once and shared by every circuit
+BUS_REPORT = ReportTable([ReportColumn("Number", style="general"), ReportColumn("Name", style="text"),
+                          ReportColumn("Nom kV", style="general"), ReportColumn("PU Volt", 5, "general"),
+                          ReportColumn("Volt (kV)", 3, "general"), ReportColumn("Angle(Deg)", 3, "general"),
+                          ReportColumn("Load MW", style="general"), ReportColumn("Load MVAR", style="general"),
+                          ReportColumn("Gen MW", 2, "general"), ReportColumn("Gen MVAR", 2, "general"),
+                          ReportColumn("Shunt MVAR", 2, "general")])
+FAULT_CURRENT_REPORT = ReportTable([ReportColumn("Magnitude", 3), ReportColumn("Phase A Angle", 2),
+                                    ReportColumn("Phase B Angle", 2), ReportColumn("Phase C Angle", 2)], index="Bus")
+PHASE_CURRENT_REPORT = ReportTable([ReportColumn("Magnitude(pu)", 3), ReportColumn("Angle(deg)", 2)], index="Phase")
+FAULT_VOLTAGE_REPORT = ReportTable([ReportColumn("Phase A", 5), ReportColumn("Phase B", 5), ReportColumn("Phase C", 5),
+                                    ReportColumn("Phase A Angle", 2), ReportColumn("Phase B Angle", 2),
+                                    ReportColumn("Phase C Angle", 2)], index="Bus")
 
 #  This class "creates" circuits.
 class Circuit:
     """
     Circuit class to hold information about system
     """
-    def __init__(self, name: str):
+    def __init__(self, name: str, settings: Settings = None):
         """
         Constructor for the circuit class
         :param name: Name of circuit
+        :param settings: System settings, defaults to a copy of the global settings
         """
         self.name = name
-        self.powerbase = settings.powerbase
+        self.settings = default_settings.copy() if settings is None else settings
+        self.powerbase = self.settings.powerbase
+        self.lock = threading.RLock()  # guards Ybus and results so solves can run from several threads
 
         self.buses = {}
         self.conductors = {}
@@ -42,6 +62,9 @@ class Circuit:
         self.generators = {}
         self.reactors = {}
         self.capacitors = {}
+        self.shunts = {}
+        self.equivalents = {}  # admittances left by a network reduction
+        self.interchanges = {}  # scheduled net export of each controlled area in MW
 
         self.count = 0
         self.slack_bus = str
@@ -51,12 +74,30 @@ class Circuit:
         self.pq_and_pv_indexes = []
         self.bus_order = []
 
+        self.branches = None # flat arrays of every element's yprim entries
         self.Ybus = None # system admittance matrix
+        self.Ybus_sparse = None # system admittance matrix in compressed sparse row form
+        self.orderings = {} # fill reducing bus orderings by (method, topology)
         self.x = None # stores bus voltages and angles after power flow is ran
         self.y = None # stores bus power injections after power flow is ran
         self.voltages = None
+        self.bus_results = {} # bus voltage and angle arrays from the last power flow, read directly by the buses
+        self.sensitivity = None # voltage and angle sensitivities at the last Newton-Raphson solution
+        self.load_model = None # per bus load model arrays, rebuilt after the loads change
         
         self.changed = False
+        self.sparse_changed = False
+
+
+    def mark_changed(self):
+        """
+        Flags that elements were added so the admittance matrices are rebuilt before the next solve.
+        :return:
+        """
+        self.changed = True
+        self.sparse_changed = True
+        self.sensitivity = None
+        self.load_model = None
 
 
     def change_power_base(self, p: float):
@@ -65,8 +106,8 @@ class Circuit:
         :param p: New base power.
         :return:
         """
-        settings.set_powerbase(p)
-        self.powerbase = p*1e6
+        self.settings.set_powerbase(p)
+        self.powerbase = self.settings.powerbase
 
 
     def change_frequency(self, f: float):
@@ -75,7 +116,7 @@ class Circuit:
         :param f: New system frequency.
         :return:
         """
-        settings.set_freq(f)
+        self.settings.set_freq(f)
 
     
     def add_bus(self, name: str, voltage: float):
@@ -90,7 +131,7 @@ class Circuit:
 
         else:
             self.count += 1
-            bus = Bus(name, voltage, self.count)
+            bus = Bus(name, voltage, self.count, self.bus_results)
             self.buses.update({name: bus})
             self.pq_indexes.append(self.count)
             self.bus_order.append(self.count)
@@ -116,6 +157,7 @@ class Circuit:
         load = Load(name, bus, real, reactive)
         self.loads.update({name: load})
         self.buses[bus].set_power(-real*1e6, -reactive*1e6)
+        self.load_model = None
 
 
     def add_tline_from_geometry(self, name: str, bus1: str, bus2: str, bundle: str, geometry: str,
@@ -135,9 +177,10 @@ class Circuit:
             print(f"{name} already exists. No changes to circuit")
             return
         
-        tline = TransmissionLine(name, self.get_bus(bus1), self.get_bus(bus2), self.get_bundle(bundle), self.get_geometry(geometry), length)
+        tline = TransmissionLine(name, self.get_bus(bus1), self.get_bus(bus2), self.get_bundle(bundle), self.get_geometry(geometry), length,
+                                 settings=self.settings)
         self.transmission_lines.update({name: tline})
-        self.changed = True
+        self.mark_changed()
 
     
     def add_tline_from_parameters(self, name: str, bus1: str, bus2: str, R: float, X: float, B: float):
@@ -156,9 +199,9 @@ class Circuit:
             print(f"{name} already exists. No changes to circuit")
             return
         
-        tline = TransmissionLine.from_parameters(name, self.get_bus(bus1), self.get_bus(bus2), R, X, B)
+        tline = TransmissionLine.from_parameters(name, self.get_bus(bus1), self.get_bus(bus2), R, X, B, self.settings)
         self.transmission_lines.update({name: tline})
-        self.changed = True
+        self.mark_changed()
     
     
     def add_transformer(self, name: str, type: str, bus1: str, bus2: str, power_rating: float,
@@ -178,12 +221,12 @@ class Circuit:
             return
         
         transformer = Transformer(name, type, self.get_bus(bus1), self.get_bus(bus2), power_rating, impedance_percent,
-                                      x_over_r_ratio, gnd_impedance)
+                                      x_over_r_ratio, gnd_impedance, settings=self.settings)
         self.transformers.update({name: transformer})
-        self.changed = True
+        self.mark_changed()
     
 
-    def add_generator(self, name: str, bus: str, voltage: float, real_power: float, pos_imp = 0.0, neg_imp = 0.0, zero_imp = 0.0, gnd_imp = 0.0, var_limit = float('inf')):
+    def add_generator(self, name: str, bus: str, voltage: float, real_power: float, pos_imp = 0.0, neg_imp = 0.0, zero_imp = 0.0, gnd_imp = 0.0, var_limit = float('inf'), mva_base = None):
         """
         Adds a generator to system.
         :param name: Name of transformer
@@ -195,6 +238,7 @@ class Circuit:
         :param zero_imp: Zero sequence impedance
         :param gnd_imp: Ground sequence impedance
         :param var_limit: Maximum VARs the generator can safely output
+        :param mva_base: Machine base the impedances are given on, defaults to real_power
         :return:
         """
         if name in self.generators:
@@ -206,7 +250,7 @@ class Circuit:
             return
     
         if len(self.generators) == 0:
-            gen = Generator(name, bus, voltage, real_power, pos_imp, neg_imp, zero_imp, gnd_imp, var_limit)
+            gen = Generator(name, bus, voltage, real_power, pos_imp, neg_imp, zero_imp, gnd_imp, var_limit, mva_base, self.settings)
             self.generators.update({name: gen})
             self.buses[bus].type = "Slack"
             self.slack_bus = bus
@@ -215,7 +259,7 @@ class Circuit:
             self.buses[bus].set_power(real_power*1e6, 0)
         
         else:
-            gen = Generator(name, bus, voltage, real_power, pos_imp, neg_imp, zero_imp, gnd_imp, var_limit)
+            gen = Generator(name, bus, voltage, real_power, pos_imp, neg_imp, zero_imp, gnd_imp, var_limit, mva_base, self.settings)
             self.generators.update({name: gen})
             self.buses[bus].type = "PV"
             self.pq_indexes.remove(self.buses[bus].index)
@@ -280,9 +324,9 @@ class Circuit:
             print("Name already exists. No changes to circuit")
         
         else:
-            reactor = Reactor(name, mvar, self.get_bus(bus1), self.get_bus(bus2))
+            reactor = Reactor(name, mvar, self.get_bus(bus1), self.get_bus(bus2), self.settings)
             self.reactors.update({name: reactor})
-            self.changed = True
+            self.mark_changed()
     """
 
     def add_shunt_reactor(self, name: str, mvar: float, bus: str):
@@ -291,9 +335,9 @@ class Circuit:
             print("Name already exists. No changes to circuit")
         
         else:
-            reactor = Reactor(name, mvar, self.get_bus(bus))
+            reactor = Reactor(name, mvar, self.get_bus(bus), settings=self.settings)
             self.reactors.update({name: reactor})
-            self.changed = True
+            self.mark_changed()
 
     """
     def add_series_capacitor(self, name: str, mvar: float, bus1: str, bus2: str):
@@ -302,9 +346,9 @@ class Circuit:
             print("Name already exists. No changes to circuit")
         
         else:
-            capacitor = Capacitor(name, mvar, self.get_bus(bus1), self.get_bus(bus2))
+            capacitor = Capacitor(name, mvar, self.get_bus(bus1), self.get_bus(bus2), self.settings)
             self.capacitors.update({name: capacitor})
-            self.changed = True
+            self.mark_changed()
     """
 
     def add_shunt_capacitor(self, name: str, mvar: float, bus: str):
@@ -313,9 +357,534 @@ class Circuit:
             print("Name already exists. No changes to circuit")
         
         else:
-            capacitor = Capacitor(name, mvar, self.get_bus(bus))
+            capacitor = Capacitor(name, mvar, self.get_bus(bus), settings=self.settings)
             self.capacitors.update({name: capacitor})
-            self.changed = True
+            self.mark_changed()
+
+
+    def add_shunt(self, name: str, mw: float, mvar: float, bus: str):
+        """
+        Adds a fixed shunt admittance to the system.
+        :param name: Name of shunt
+        :param mw: Real power consumed at 1 pu voltage
+        :param mvar: Reactive power supplied at 1 pu voltage (positive is capacitive)
+        :param bus: Bus connection
+        :return:
+        """
+        if name in self.shunts:
+            print("Name already exists. No changes to circuit")
+
+        else:
+            shunt = Shunt(name, mw, mvar, self.get_bus(bus), self.settings)
+            self.shunts.update({name: shunt})
+            self.mark_changed()
+
+
+    def add_buses(self, names: list[str], voltages):
+        """
+        Adds many buses to the system at once. Used by the case importer instead of one add_bus call per bus.
+        :param names: Names of buses
+        :param voltages: Rated voltages of buses
+        :return:
+        """
+        names = [str(name) for name in names]
+        voltages = np.asarray(voltages, dtype=float)
+        existing = [name for name in names if name in self.buses]
+        if len(existing) != 0 or len(set(names)) != len(names):
+            print(f"Duplicate bus names given ({existing[:5]}...). No changes to circuit")
+            return
+
+        indexes = list(range(self.count+1, self.count+len(names)+1))
+        self.buses.update({name: Bus(name, voltages[k], indexes[k], self.bus_results) for k, name in enumerate(names)})
+        self.count += len(names)
+        self.pq_indexes.extend(indexes)
+        self.bus_order.extend(indexes)
+        self.mark_changed()
+
+
+    def add_loads(self, names: list[str], buses: list[str], real, reactive):
+        """
+        Adds many loads to the system at once. Bus power injections are summed per bus before being applied.
+        :param names: Names of loads
+        :param buses: Bus connections
+        :param real: Loads' real power usage
+        :param reactive: Loads' reactive power usage
+        :return:
+        """
+        if not self.check_new_names(names, self.loads) or not self.check_buses(buses):
+            return
+
+        real = np.asarray(real, dtype=float)
+        reactive = np.asarray(reactive, dtype=float)
+        self.loads.update({name: Load(name, buses[k], real[k], reactive[k]) for k, name in enumerate(names)})
+        self.add_bus_power(buses, -real*1e6, -reactive*1e6)
+        self.load_model = None
+
+
+    def set_load_models(self, names: list[str], zip_p=None, zip_q=None, exponent_p: float = None, exponent_q: float = None):
+        """
+        Gives loads a voltage dependent model. With V in pu a load's real power is P (z V^2 + i V + p) for
+        zip_p = (z, i, p), or P V^exponent_p, and likewise for its reactive power. The loads at one bus
+        may have different ZIP fractions but only one real and one reactive power exponent.
+        :param names: Names of loads
+        :param zip_p: Constant impedance, current and power fractions of the real power, adding to 1
+        :param zip_q: Constant impedance, current and power fractions of the reactive power, adding to 1
+        :param exponent_p: Exponent of the real power, replaces zip_p
+        :param exponent_q: Exponent of the reactive power, replaces zip_q
+        :return:
+        """
+        missing = [name for name in names if name not in self.loads]
+        if len(missing) != 0:
+            print(f"{missing[:5]} do not exist. No changes to circuit.")
+            return
+        for fractions in [zip_p, zip_q]:
+            if fractions is not None and (len(fractions) != 3 or abs(sum(fractions) - 1) > 1e-6):
+                print(f"ZIP fractions {fractions} do not add to 1. No changes to circuit.")
+                return
+
+        # one exponent per bus keeps the model in per bus arrays
+        changed = set(names)
+        exponents = pd.DataFrame([(load.bus, exponent_p, exponent_q) if load.name in changed else
+                                  (load.bus, load.exponent_p, load.exponent_q) for load in self.loads.values()],
+                                 columns=["bus", "P", "Q"])
+        counts = exponents.groupby("bus")[["P", "Q"]].nunique()
+        if np.any(counts.to_numpy() > 1):
+            print(f"Loads at {list(counts.index[np.any(counts.to_numpy() > 1, axis=1)])[:5]} would have different "
+                  f"exponents. No changes to circuit.")
+            return
+
+        for name in names:
+            self.loads[name].set_model(zip_p, zip_q, exponent_p, exponent_q)
+        self.load_model = None
+
+
+    def get_load_model(self):
+        """
+        Per bus arrays of the load model in bus index order, built once after the loads change. "P" and "Q"
+        are the loads at 1 pu voltage in W and VAR, "Pz", "Pi" and "Pe" the constant impedance, constant current
+        and exponential parts of "P" with "ep" its exponent, and likewise for "Q". The rest is constant power.
+        :return: dict of np.ndarray, with "dependent" False when every load is constant power
+        """
+        if self.load_model is not None and len(self.load_model["P"]) == self.count:
+            return self.load_model
+        loads = list(self.loads.values())
+        index = np.array([self.buses[load.bus].index-1 for load in loads], dtype=int)
+        terms = np.array([[load.real_power, load.reactive_power, *load.calc_terms()] for load in loads],
+                         dtype=float).reshape(len(loads), 10)
+        model = {}
+        for k, key in enumerate(["P", "Q", "Pz", "Pi", "Pe", "ep", "Qz", "Qi", "Qe", "eq"]):
+            model[key] = np.zeros(self.count)
+            if key in ["ep", "eq"]:
+                model[key][index] = terms[:, k]  # the same at every load of a bus with an exponential part
+            else:
+                np.add.at(model[key], index, terms[:, k])
+        model["dependent"] = bool(np.any(terms[:, [2, 3, 4, 6, 7, 8]] != 0))
+        self.load_model = model
+        return model
+
+
+    def calc_load_power(self, Vpu):
+        """
+        Power drawn by the loads at every bus at the given voltages.
+        :param Vpu: Bus voltage magnitudes in pu, in bus index order
+        :return: np.ndarray of complex pu power
+        """
+        model = self.get_load_model()
+        Vpu = np.asarray(Vpu, dtype=float)
+        power = []
+        for kind, exponent in [("P", "ep"), ("Q", "eq")]:
+            z, i, e = model[f"{kind}z"], model[f"{kind}i"], model[f"{kind}e"]
+            constant = model[kind] - z - i - e
+            power.append(constant + z*Vpu**2 + i*Vpu + e*Vpu**model[exponent])
+        return (power[0] + 1j*power[1])/self.powerbase
+
+
+    def calc_load_admittances(self):
+        """
+        Loads as constant admittances drawing their power at the latest power flow voltages, or at each bus's
+        own set voltage before a power flow is run, as the fault studies model them.
+        :return: np.ndarray of complex pu admittances per bus, in bus index order
+        """
+        if "Vpu" in self.bus_results:
+            Vpu = np.asarray(self.bus_results["Vpu"], dtype=float)
+        else:
+            Vpu = np.ones(self.count)
+            for bus in self.buses.values():
+                Vpu[bus.index-1] = bus.Vpu
+        return np.conj(self.calc_load_power(Vpu))/Vpu**2
+
+
+    def calc_fault_shunts(self):
+        """
+        Admittances the fault studies add for generators and loads (constant impedance at the solved voltage),
+        matching ThreePhaseFault and UnsymmetricalFaults.
+        :return: (positive, zero, negative sequence) np.ndarray of pu shunt admittances per bus
+        """
+        shunts = np.zeros(self.count, dtype=complex)
+        shunts0 = np.zeros(self.count, dtype=complex)
+        shunts2 = np.zeros(self.count, dtype=complex)
+        for gen in self.generators.values():
+            index = self.buses[gen.bus].index-1
+            shunts[index] += 1/gen.X1
+            shunts0[index] += gen.Y0prim
+            shunts2[index] += 1/gen.X2
+
+        loads = self.calc_load_admittances()
+        shunts += loads
+        shunts2 += loads
+        return shunts, shunts0, shunts2
+
+
+    def add_generators(self, names: list[str], buses: list[str], voltages, real_powers, var_limits=None,
+                       mva_bases=None, pos_imps=None, slack: str = None, var_mins=None):
+        """
+        Adds many generators to the system at once. The slack bus is the given one, or the first generator's
+        bus if the circuit doesn't have a slack bus yet. Every other generator bus becomes a PV bus, and
+        several generators may share a bus.
+        :param names: Names of generators
+        :param buses: Bus connections
+        :param voltages: Operating voltages in pu
+        :param real_powers: Real power outputs
+        :param var_limits: Maximum VARs each generator can safely output
+        :param mva_bases: Machine bases the impedances are given on
+        :param pos_imps: Positive sequence impedances
+        :param slack: Name of the slack bus
+        :param var_mins: Lowest VARs each generator can output, defaults to minus the var limits
+        :return:
+        """
+        if not self.check_new_names(names, self.generators) or not self.check_buses(buses):
+            return
+
+        n = len(names)
+        voltages = np.broadcast_to(np.asarray(voltages, dtype=float), n)
+        real_powers = np.asarray(real_powers, dtype=float)
+        var_limits = np.full(n, float('inf')) if var_limits is None else np.asarray(var_limits, dtype=float)
+        mva_bases = [None]*n if mva_bases is None else np.asarray(mva_bases, dtype=float)
+        pos_imps = np.zeros(n) if pos_imps is None else np.asarray(pos_imps, dtype=float)
+
+        for k, name in enumerate(names):
+            gen = Generator(name, buses[k], voltages[k], real_powers[k], pos_imps[k], 0.0, 0.0, None, var_limits[k], mva_bases[k], self.settings)
+            if var_mins is not None:
+                gen.var_min = float(var_mins[k])
+            self.generators.update({name: gen})
+
+        if isinstance(self.slack_index, int):
+            slack = self.slack_bus
+        elif slack is None:
+            slack = buses[0]
+        self.slack_bus = slack
+        self.slack_index = self.buses[slack].index
+
+        gen_buses = set(buses) | {slack}
+        gen_indexes = {self.buses[bus].index for bus in gen_buses}
+        for bus in gen_buses:
+            self.buses[bus].type = "Slack" if bus == slack else "PV"
+
+        self.pq_indexes = [i for i in self.pq_indexes if i not in gen_indexes]
+        self.pv_indexes = [i for i in self.pv_indexes if i != self.slack_index]
+        self.pv_indexes.extend(sorted(i for i in gen_indexes if i != self.slack_index and i not in self.pv_indexes))
+        self.add_bus_power(buses, real_powers*1e6, np.zeros(n))
+
+
+    def add_generator_costs(self, names: list[str], c2, c1, c0, p_min=None, p_max=None):
+        """
+        Sets the quadratic cost curves and real power limits of generators, used by the optimal power flow.
+        :param names: Names of generators
+        :param c2: Quadratic cost coefficients in $/MW^2h
+        :param c1: Linear cost coefficients in $/MWh
+        :param c0: Fixed costs in $/h
+        :param p_min: Minimum real power outputs in MW, unchanged if None
+        :param p_max: Maximum real power outputs in MW, unchanged if None
+        :return:
+        """
+        unknown = [name for name in names if name not in self.generators]
+        if len(unknown) != 0:
+            print(f"{unknown[:5]} do not exist. No changes to circuit")
+            return
+
+        n = len(names)
+        c2, c1, c0 = (np.broadcast_to(np.asarray(c, dtype=float), n) for c in (c2, c1, c0))
+        for k, name in enumerate(names):
+            gen = self.generators[name]
+            gen.cost = (float(c2[k]), float(c1[k]), float(c0[k]))
+            if p_min is not None:
+                gen.p_min = float(np.broadcast_to(p_min, n)[k])*1e6
+            if p_max is not None:
+                gen.p_max = float(np.broadcast_to(p_max, n)[k])*1e6
+
+
+    def add_tlines_from_parameters(self, names: list[str], buses1: list[str], buses2: list[str], R, X, B):
+        """
+        Adds many transmission lines to the system at once from per unit parameters.
+        :param names: Names of transmission lines
+        :param buses1: First bus connections
+        :param buses2: Second bus connections
+        :param R: per unit resistances
+        :param X: per unit reactances
+        :param B: per unit shunt admittances
+        :return:
+        """
+        if not self.check_new_names(names, self.transmission_lines) or not self.check_buses(buses1) or not self.check_buses(buses2):
+            return
+
+        lines = TransmissionLine.from_arrays(names, [self.buses[bus] for bus in buses1], [self.buses[bus] for bus in buses2], R, X, B, self.settings)
+        self.transmission_lines.update({line.name: line for line in lines})
+        self.mark_changed()
+
+
+    def add_transformers_from_parameters(self, names: list[str], buses1: list[str], buses2: list[str], R, X, types=None,
+                                         taps=None, shifts=None):
+        """
+        Adds many ungrounded transformers to the system at once from per unit parameters on the system base.
+        :param names: Names of transformers
+        :param buses1: First bus connections
+        :param buses2: Second bus connections
+        :param R: per unit resistances
+        :param X: per unit reactances
+        :param types: Connection types, Y-Y by default
+        :param taps: Off nominal turns ratios at the first buses, 1 by default
+        :param shifts: Phase shifts in degrees, 0 by default
+        :return:
+        """
+        if not self.check_new_names(names, self.transformers) or not self.check_buses(buses1) or not self.check_buses(buses2):
+            return
+
+        types = ["Y-Y"]*len(names) if types is None else types
+        xfmrs = Transformer.from_arrays(names, types, [self.buses[bus] for bus in buses1], [self.buses[bus] for bus in buses2], R, X,
+                                        self.settings, taps, shifts)
+        self.transformers.update({xfmr.name: xfmr for xfmr in xfmrs})
+        self.mark_changed()
+
+
+    def set_transformer_taps(self, names: list[str], taps=None, shifts=None):
+        """
+        Changes transformer turns ratios and phase shifts. The new yprim entries are written straight into
+        copies of the branch arrays and admittance matrices already built, so nothing else is rebuilt.
+        :param names: Names of transformers
+        :param taps: Off nominal turns ratios at the first buses, unchanged if None
+        :param shifts: Phase shifts in degrees, unchanged if None
+        :return:
+        """
+        missing = [name for name in names if name not in self.transformers]
+        if len(missing) != 0:
+            print(f"{missing[:5]} do not exist. No changes to circuit.")
+            return
+
+        n = len(names)
+        taps = [None]*n if taps is None else np.broadcast_to(np.asarray(taps, dtype=float), n)
+        shifts = [None]*n if shifts is None else np.broadcast_to(np.asarray(shifts, dtype=float), n)
+        with self.lock:
+            for k, name in enumerate(names):
+                self.transformers[name].set_tap(taps[k], shifts[k])
+            update_dense = self.Ybus is not None and not self.changed
+            update_sparse = self.Ybus_sparse is not None and not self.sparse_changed
+            self.mark_changed()  # the matrices updated in place below are flagged current again
+            if self.branches is None or not (update_dense or update_sparse):
+                return  # rebuilt from the transformers before the next solve
+
+            # transformers follow the transmission lines in the branch arrays
+            position = {name: k for k, name in enumerate(self.transformers)}
+            rows = len(self.transmission_lines) + np.array([position[name] for name in names], dtype=int)
+            values = np.array([self.transformers[name].calc_branch_values() for name in names], dtype=complex).reshape(n, 4)
+            change = values - np.column_stack([self.branches[key][rows] for key in ["yff", "yft", "ytf", "ytt"]])
+            self.branches = dict(self.branches)  # solvers built earlier keep the old arrays
+            for k, key in enumerate(["yff", "yft", "ytf", "ytt"]):
+                self.branches[key] = self.branches[key].copy()
+                self.branches[key][rows] = values[:, k]
+
+            from_bus, to_bus = self.branches["from"][rows], self.branches["to"][rows]
+            entries = (np.concatenate((from_bus, from_bus, to_bus, to_bus)), np.concatenate((from_bus, to_bus, from_bus, to_bus)))
+            change = change.T.ravel()
+            if update_dense:
+                self.Ybus = self.Ybus.copy()  # solvers built earlier keep the old matrix
+                np.add.at(self.Ybus, entries, change)
+                self.changed = False
+            if update_sparse:
+                self.Ybus_sparse = (self.Ybus_sparse + sparse.csr_matrix((change, entries), shape=(self.count, self.count))).tocsr()
+                self.sparse_changed = False
+
+
+    def add_tap_control(self, name: str, bus: str, voltage: float, tap_min: float = 0.9, tap_max: float = 1.1,
+                        step: float = 0.00625):
+        """
+        Has a transformer's tap hold a bus voltage when the power flow is run with tap control.
+        :param name: Name of transformer
+        :param bus: Regulated bus, usually the transformer's second bus
+        :param voltage: Target voltage in pu
+        :param tap_min: Lowest tap
+        :param tap_max: Highest tap
+        :param step: Tap step
+        :return:
+        """
+        if name not in self.transformers:
+            print(f"{name} does not exist. No changes to circuit.")
+            return
+
+        if bus not in self.buses:
+            print(f"{bus} does not exist. No changes to circuit.")
+            return
+
+        self.transformers[name].set_control(self.buses[bus], voltage, tap_min, tap_max, step)
+
+
+    def set_bus_areas(self, names: list[str], areas):
+        """
+        Assigns buses to interchange areas.
+        :param names: Bus names
+        :param areas: Area numbers
+        :return:
+        """
+        if not self.check_buses(names):
+            return
+
+        areas = np.broadcast_to(np.asarray(areas, dtype=int), len(names))
+        for name, area in zip(names, areas):
+            self.buses[name].area = int(area)
+
+
+    def set_participation_factors(self, names: list[str], factors):
+        """
+        Sets how the generators share the mismatch when the power flow is run with a distributed slack.
+        Factors are normalized within the system and within each area with an interchange schedule;
+        a group whose factors are all zero shares in proportion to the machine ratings.
+        :param names: Names of generators
+        :param factors: Participation factors
+        :return:
+        """
+        missing = [name for name in names if name not in self.generators]
+        if len(missing) != 0:
+            print(f"{missing[:5]} do not exist. No changes to circuit.")
+            return
+
+        factors = np.broadcast_to(np.asarray(factors, dtype=float), len(names))
+        if np.any(factors < 0):
+            print("Participation factors must not be negative. No changes to circuit.")
+            return
+        for name, factor in zip(names, factors):
+            self.generators[name].participation = float(factor)
+
+
+    def set_generator_dynamics(self, names: list[str], H, D=0.0):
+        """
+        Sets the classical machine model parameters used by transient stability.
+        :param names: Names of generators
+        :param H: Inertia constants in s on each machine's base
+        :param D: Damping in pu power per pu speed on each machine's base
+        :return:
+        """
+        missing = [name for name in names if name not in self.generators]
+        if len(missing) != 0:
+            print(f"{missing[:5]} do not exist. No changes to circuit.")
+            return
+
+        H = np.broadcast_to(np.asarray(H, dtype=float), len(names))
+        D = np.broadcast_to(np.asarray(D, dtype=float), len(names))
+        if np.any(H <= 0) or np.any(D < 0):
+            print("Inertia constants must be positive and damping must not be negative. No changes to circuit.")
+            return
+        for name, inertia, damping in zip(names, H, D):
+            self.generators[name].H = float(inertia)
+            self.generators[name].D = float(damping)
+
+
+    def add_area_interchange(self, area: int, export: float):
+        """
+        Schedules an area's net export over its tie lines, held by the area's own generators when the
+        power flow is run with a distributed slack. The area with the slack bus takes the rest.
+        :param area: Area number
+        :param export: Net export in MW, negative for imports
+        :return:
+        """
+        areas = {bus.area for bus in self.buses.values()}
+        if area not in areas:
+            print(f"Area {area} does not exist. No changes to circuit.")
+            return
+
+        if isinstance(self.slack_bus, str) and self.slack_bus in self.buses and self.buses[self.slack_bus].area == area:
+            print(f"Area {area} has the slack bus and takes the system mismatch. No changes to circuit.")
+            return
+
+        self.interchanges[area] = export
+
+
+    def add_shunts(self, names: list[str], buses: list[str], mw, mvar):
+        """
+        Adds many fixed shunts to the system at once.
+        :param names: Names of shunts
+        :param buses: Bus connections
+        :param mw: Real power consumed at 1 pu voltage
+        :param mvar: Reactive power supplied at 1 pu voltage
+        :return:
+        """
+        if not self.check_new_names(names, self.shunts) or not self.check_buses(buses):
+            return
+
+        mw = np.asarray(mw, dtype=float)
+        mvar = np.asarray(mvar, dtype=float)
+        self.shunts.update({name: Shunt(name, mw[k], mvar[k], self.buses[buses[k]], self.settings) for k, name in enumerate(names)})
+        self.mark_changed()
+
+
+    def add_equivalents(self, names: list[str], buses1: list[str], buses2: list[str], y, y0=None, y2=None):
+        """
+        Adds admittance matrix entries from a network reduction. A name whose two buses are the same is a shunt.
+        :param names: Names of equivalents
+        :param buses1: First bus connections
+        :param buses2: Second bus connections
+        :param y: Positive sequence (yff, yft, ytf, ytt) rows in pu
+        :param y0: Zero sequence (yff, yft, ytf, ytt) rows in pu, zero by default
+        :param y2: Negative sequence (yff, yft, ytf, ytt) rows in pu, the positive sequence values by default
+        :return:
+        """
+        if not self.check_new_names(names, self.equivalents) or not self.check_buses(buses1) or not self.check_buses(buses2):
+            return
+
+        y = np.asarray(y, dtype=complex).reshape(len(names), 4)
+        y0 = np.zeros_like(y) if y0 is None else np.asarray(y0, dtype=complex).reshape(len(names), 4)
+        y2 = y if y2 is None else np.asarray(y2, dtype=complex).reshape(len(names), 4)
+        self.equivalents.update({name: Equivalent(name, self.buses[buses1[k]], self.buses[buses2[k]], y[k], y0[k], y2[k])
+                                 for k, name in enumerate(names)})
+        self.mark_changed()
+
+
+    def add_bus_power(self, buses: list[str], real, reactive):
+        """
+        Sums power injections per bus and applies each bus total once.
+        :param buses: Bus names
+        :param real: Real power injections in W
+        :param reactive: Reactive power injections in VAR
+        :return:
+        """
+        totals = pd.DataFrame({"bus": buses, "P": real, "Q": reactive}).groupby("bus", sort=False).sum()
+        for bus, P, Q in zip(totals.index, totals["P"].to_numpy(), totals["Q"].to_numpy()):
+            self.buses[bus].set_power(P, Q)
+
+
+    def check_new_names(self, names: list[str], elements: dict):
+        """
+        Checks that none of the given names are in use, printing a message if any are.
+        :param names: Names to add
+        :param elements: Dictionary the names will be added to
+        :return: bool
+        """
+        existing = [name for name in names if name in elements]
+        if len(existing) != 0 or len(set(names)) != len(names):
+            print(f"Duplicate names given ({existing[:5]}...). No changes to circuit")
+            return False
+        return True
+
+
+    def check_buses(self, buses: list[str]):
+        """
+        Checks that every given bus exists, printing a message if any don't.
+        :param buses: Bus names
+        :return: bool
+        """
+        missing = [bus for bus in buses if bus not in self.buses]
+        if len(missing) != 0:
+            print(f"{missing[:5]} do not exist. No changes to circuit.")
+            return False
+        return True
 
 
     def get_conductor(self, name: str):
@@ -354,63 +923,154 @@ class Circuit:
         return self.geometries[name]
 
 
+    def calc_branch_arrays(self, sequence: int = 1):
+        """
+        Collects the yprim entries of every branch and shunt element into flat arrays.
+        :param sequence: 1 for positive sequence values, 0 for zero sequence values, 2 for negative sequence
+                         values (the positive sequence values, except for phase shifts and reduced network equivalents)
+        :return: dict of np.ndarray
+        """
+        elements = [*self.transmission_lines.values(), *self.transformers.values()]
+        if sequence == 1:
+            elements += [*self.reactors.values(), *self.capacitors.values(), *self.shunts.values(), *self.equivalents.values()]
+            values = [element.calc_branch_values() for element in elements]
+        elif sequence == 2:
+            # transformers and reduced network equivalents have their own negative sequence values
+            values = [element.calc_branch_values() for element in self.transmission_lines.values()]
+            values += [element.calc_branch_values(2) for element in self.transformers.values()]
+            elements += [*self.reactors.values(), *self.capacitors.values(), *self.shunts.values()]
+            values += [element.calc_branch_values() for element in elements[len(values):]]
+            elements += [*self.equivalents.values()]
+            values += [element.calc_branch_values(2) for element in self.equivalents.values()]
+        else:
+            elements += [*self.equivalents.values()]
+            values = [element.calc_branch_values(0) for element in elements]
+
+        values = np.array(values, dtype=complex).reshape(len(elements), 4)
+        branches = {"name": np.array([element.name for element in elements], dtype=object),
+                    "from": np.array([element.bus1.index-1 for element in elements], dtype=int),
+                    "to": np.array([element.bus2.index-1 for element in elements], dtype=int),
+                    "yff": values[:, 0], "yft": values[:, 1], "ytf": values[:, 2], "ytt": values[:, 3]}
+        return branches
+
+
+    def assemble_Ybus(self, branches: dict):
+        """
+        Adds every element's yprim entries into an admittance matrix in one pass.
+        :param branches: Branch arrays from calc_branch_arrays
+        :return: np.ndarray
+        """
+        num_buses = len(self.buses)
+        y_bus = np.zeros((num_buses, num_buses), dtype=complex)
+        from_bus = branches["from"]
+        to_bus = branches["to"]
+
+        # entries are interleaved per element so they are summed in the same order as element by element assembly
+        rows = np.stack((from_bus, from_bus, to_bus, to_bus), axis=1).ravel()
+        cols = np.stack((from_bus, to_bus, from_bus, to_bus), axis=1).ravel()
+        values = np.stack((branches["yff"], branches["yft"], branches["ytf"], branches["ytt"]), axis=1).ravel()
+        np.add.at(y_bus, (rows, cols), values)
+        return y_bus
+
+
     def calc_Ybus(self):
         """
         Calculates systems admittance matrix.
         :return: Admittance matrix (list[list[complex double]])
         """
-        num_buses = len(self.buses)
-        y_bus = np.zeros((num_buses, num_buses), dtype=complex)
+        with self.lock:
+            branches = self.calc_branch_arrays()
+            y_bus = self.assemble_Ybus(branches)
+            self.branches = branches
+            self.Ybus = y_bus
+            self.changed = False
+        return y_bus
 
-        # Iterate through line impedance
-        for line in self.transmission_lines.values():
-            from_bus = line.bus1.index-1
-            to_bus = line.bus2.index-1
-            y_bus[from_bus, from_bus] += line.yprim.iloc[0, 0]
-            y_bus[from_bus, to_bus] += line.yprim.iloc[0, 1]
-            y_bus[to_bus, from_bus] += line.yprim.iloc[1, 0]
-            y_bus[to_bus, to_bus] += line.yprim.iloc[1, 1]
-
-        # Iterate through XFMR impedance
-        for xfmr in self.transformers.values():
-            from_bus = xfmr.bus1.index-1
-            to_bus = xfmr.bus2.index-1
-            y_bus[from_bus, from_bus] += xfmr.yprim.iloc[0, 0]
-            y_bus[from_bus, to_bus] += xfmr.yprim.iloc[0, 1]
-            y_bus[to_bus, from_bus] += xfmr.yprim.iloc[1, 0]
-            y_bus[to_bus, to_bus] += xfmr.yprim.iloc[1, 1]
-
-        # Iterate through reactor dictionary
-        for reactor in self.reactors.values():
-            from_bus = reactor.bus1.index-1
-            to_bus = reactor.bus2.index-1
-            y_bus[from_bus, from_bus] += reactor.Yprim.iloc[0, 0]
-            y_bus[from_bus, to_bus] += reactor.Yprim.iloc[0, 1]
-            y_bus[to_bus, from_bus] += reactor.Yprim.iloc[1, 0]
-            y_bus[to_bus, to_bus] += reactor.Yprim.iloc[1, 1]
-        
-        # Iterate through capacitor dictionary
-        for capacitor in self.capacitors.values():
-            from_bus = capacitor.bus1.index-1
-            to_bus = capacitor.bus2.index-1
-            y_bus[from_bus, from_bus] += capacitor.Yprim.iloc[0, 0]
-            y_bus[from_bus, to_bus] += capacitor.Yprim.iloc[0, 1]
-            y_bus[to_bus, from_bus] += capacitor.Yprim.iloc[1, 0]
-            y_bus[to_bus, to_bus] += capacitor.Yprim.iloc[1, 1]
-
-        self.Ybus = y_bus
+
+    def get_Ybus(self):
+        """
+        Returns the system's admittance matrix, recalculating it first if elements were added since it was last built.
+        :return: np.ndarray
+        """
+        with self.lock:
+            if self.changed == True or self.Ybus is None:
+                self.calc_Ybus()
+            return self.Ybus
+
+
+    def calc_Ybus_sparse(self):
+        """
+        Calculates the system's admittance matrix as a sparse matrix, for systems too large for a dense one.
+        :return: scipy.sparse.csr_matrix
+        """
+        with self.lock:
+            branches = self.calc_branch_arrays()
+            from_bus = branches["from"]
+            to_bus = branches["to"]
+            rows = np.concatenate((from_bus, from_bus, to_bus, to_bus))
+            cols = np.concatenate((from_bus, to_bus, from_bus, to_bus))
+            values = np.concatenate((branches["yff"], branches["yft"], branches["ytf"], branches["ytt"]))
+            y_bus = sparse.csr_matrix((values, (rows, cols)), shape=(self.count, self.count))  # duplicates are summed
+            self.branches = branches
+            self.Ybus_sparse = y_bus
+            self.sparse_changed = False
         return y_bus
+
+
+    def get_Ybus_sparse(self):
+        """
+        Returns the sparse admittance matrix, recalculating it first if elements were added since it was last built.
+        :return: scipy.sparse.csr_matrix
+        """
+        with self.lock:
+            if self.sparse_changed == True or self.Ybus_sparse is None:
+                self.calc_Ybus_sparse()
+            return self.Ybus_sparse
+
+
+    def get_bus_ordering(self, method: str = "amd"):
+        """
+        Returns a fill reducing ordering of the buses. The ordering only depends on which buses are connected,
+        so it is computed once per topology and reused by every later solve.
+        :param method: "amd" (minimum degree) or "rcm" (reverse Cuthill-McKee)
+        :return: np.ndarray of zero based bus indexes, in elimination order
+        """
+        from BusOrdering import calc_ordering, topology_key
+        with self.lock:
+            if self.sparse_changed == True or self.branches is None:
+                self.calc_Ybus_sparse()
+            from_bus = self.branches["from"]
+            to_bus = self.branches["to"]
+            key = (method, topology_key(self.count, from_bus, to_bus))
+            if key not in self.orderings:
+                self.orderings[key] = calc_ordering(self.count, from_bus, to_bus, method)
+            return self.orderings[key]
     
 
+    def get_tree_ordering(self):
+        """
+        Returns the breadth first ordering of a radial network from its slack bus. Like the fill reducing
+        orderings it is computed once per topology.
+        :return: (bus indexes in order, parent of each bus), None if the network is not radial
+        """
+        from BusOrdering import calc_tree_ordering, topology_key
+        with self.lock:
+            if self.sparse_changed == True or self.branches is None:
+                self.calc_Ybus_sparse()
+            from_bus = self.branches["from"]
+            to_bus = self.branches["to"]
+            key = ("tree", self.slack_index-1, topology_key(self.count, from_bus, to_bus))
+            if key not in self.orderings:
+                self.orderings[key] = calc_tree_ordering(self.count, from_bus, to_bus, self.slack_index-1)
+            return self.orderings[key]
+
+
     def print_Ybus(self):
         """
         Prints power the system's Ybus matrix.
         :return:
         """
         self.Ybusdf = pd.DataFrame(data=self.Ybus.round(2), index=self.bus_order, columns=self.bus_order)
-        pd.set_option('display.max_rows', None)
-        pd.set_option('display.max_columns', None)
-        pd.set_option('display.width', 1000)
         print(self.Ybusdf.to_string())
 
 
@@ -433,18 +1093,20 @@ class Circuit:
         self.pv_indexes.append(self.buses[old].index)
 
 
-    def compute_power_injection(self, x, pq_and_pv_indexes, pv_indexes, pq_indexes):
+    def compute_power_injection(self, x, pq_and_pv_indexes, pv_indexes, pq_indexes, Ybus=None):
         """
         Calculates the power injection at each bus.
         :param x: Dataframe that holds bus voltages and angles
         :param pq_and_pv_indexes: List containing each PQ and PV bus index
         :param pv_indexes: List containing each PV bus index
         :param pq_indexes: List containing each PQ bus index
+        :param Ybus: Admittance matrix to use, defaults to the circuit's
         :return:
         """
-        N = self.count
-        Ymag = np.abs(self.Ybus)
-        theta = np.angle(self.Ybus)
+        Ybus = self.Ybus if Ybus is None else Ybus
+        N = len(Ybus)
+        Ymag = np.abs(Ybus)
+        theta = np.angle(Ybus)
         
         d = x[x.index.str.startswith('d')]
         V = x[x.index.str.startswith('V')]
@@ -478,24 +1140,54 @@ class Circuit:
         return y
 
 
-    def do_newton_raph(self, var_limit=False):
+    def do_newton_raph(self, var_limit=False, sparse=False, ordering="amd", strategy="full", reuse=4, krylov=False,
+                       tap_control=False, distributed_slack=False):
         """
         Uses the Newton-Raphson algorithm to solve for the system's bus voltages and angles.
+        :param var_limit: Include VAR limiting calculation
+        :param sparse: Use sparse matrices, for large systems
+        :param ordering: Bus ordering for the sparse factorization, "amd", "rcm", "colamd" or None
+        :param strategy: Newton step strategy, "full", "iwamoto", "backtracking" or "dishonest"
+        :param reuse: Most iterations one factorization is used for in dishonest mode
+        :param krylov: Solve each Newton step with preconditioned GMRES instead of a sparse LU, for very large systems
+        :param tap_control: Adjust the taps of transformers with a regulated bus, see add_tap_control
+        :param distributed_slack: Share the mismatch among the generators by their participation factors and
+                                  hold the area interchange schedules, see set_participation_factors
         :return:
         """
-        from Solution import NewtonRaphson
-        if self.changed == True:
-            self.calc_Ybus()
-            self.changed = False
-        solution = NewtonRaphson(self, var_limit)
-        self.x, self.y = solution.newton_raph()
-        self.voltages = self.to_rectangular()
-        self.update_voltages_and_angles()
-        self.update_generator_power()
-        self.update_reactor_power()
-        self.update_capacitor_power()
-        self.print_data()
-        print()
+        from Solution import NewtonRaphson, SparseNewtonRaphson, KrylovNewtonRaphson
+        if not self.is_connected():
+            self.do_island_power_flow(method="newton_raph", var_limit=var_limit, sparse=sparse or krylov, ordering=ordering,
+                                      strategy=strategy, reuse=reuse, krylov=krylov, tap_control=tap_control,
+                                      distributed_slack=distributed_slack)
+            return
+
+        if krylov:
+            solution = KrylovNewtonRaphson(self, var_limit, ordering)
+        elif sparse:
+            solution = SparseNewtonRaphson(self, var_limit, ordering)
+        else:
+            solution = NewtonRaphson(self, var_limit)
+        solution.set_strategy(strategy, reuse)
+        solution.set_tap_control(tap_control)
+        solution.set_distributed_slack(distributed_slack)
+        x, y = solution.newton_raph()
+        if strategy != "full":
+            print(f"{strategy} Newton-Raphson: {solution.iterations} iterations, {solution.factorizations} Jacobian "
+                  f"factorizations, {solution.factorizations_saved} saved")
+        if krylov:
+            statistics = solution.get_statistics()
+            print(f"Newton-Krylov: {len(statistics)} Newton iterations, {statistics['GMRES iterations'].sum()} GMRES "
+                  f"iterations, {solution.factor_nnz} preconditioner nonzeros")
+        if distributed_slack:
+            print(solution.get_slack_summary().round(3).to_string(index=False))
+        if tap_control and solution.tap_controls is not None:
+            controls = solution.tap_controls
+            self.set_transformer_taps(controls["name"], controls["tap"])
+            taps = ", ".join(f"{name} {tap:.5f}" for name, tap in zip(controls["name"][:5], controls["tap"][:5]))
+            print(f"Tap control: {solution.tap_rounds} adjustments, taps {taps}{', ...' if len(controls['name']) > 5 else ''}")
+        self.apply_results(x, y)
+        self.sensitivity = solution.get_sensitivity() if solution.converged else None
 
     
     def do_fast_decoupled(self, var_limit=False):
@@ -504,18 +1196,32 @@ class Circuit:
         :return:
         """
         from Solution import FastDecoupled
-        if self.changed == True:
-            self.calc_Ybus()
-            self.changed = False
+        if not self.is_connected():
+            self.do_island_power_flow(method="fast_decoupled", var_limit=var_limit)
+            return
+
+        if self.get_load_model()["dependent"]:
+            print("WARNING: The fast decoupled power flow treats every load as constant power.")
         solution = FastDecoupled(self, var_limit)
-        self.x, self.y = solution.fast_decoupled()
-        self.voltages = self.to_rectangular()
-        self.update_voltages_and_angles()
-        self.update_generator_power()
-        self.update_reactor_power()
-        self.update_capacitor_power()
-        self.print_data()
-        print()
+        x, y = solution.fast_decoupled()
+        self.apply_results(x, y)
+
+    
+    def do_backward_forward_sweep(self):
+        """
+        Uses the backward/forward sweep to solve for the bus voltages and angles of a radial feeder. Networks
+        with loops or PV buses are solved with the sparse Newton-Raphson instead.
+        :return:
+        """
+        from Solution import BackwardForwardSweep
+        if len(self.pv_indexes) != 0 or self.get_tree_ordering() is None:
+            print(f"{self.name} is not a radial feeder supplied only from its slack bus. Solving with the sparse Newton-Raphson instead.")
+            self.do_newton_raph(sparse=True)
+            return
+
+        solution = BackwardForwardSweep(self)
+        x, y = solution.backward_forward_sweep()
+        self.apply_results(x, y)
 
     
     def do_dc_power_flow(self):
@@ -524,77 +1230,258 @@ class Circuit:
         :return:
         """
         from Solution import DCPowerFlow
-        if self.changed == True:
-            self.calc_Ybus()
-            self.changed = False
+        if not self.is_connected():
+            self.do_island_power_flow(method="dc_power_flow")
+            return
+
+        if self.get_load_model()["dependent"]:
+            print("WARNING: The DC power flow treats every load as constant power.")
         solution = DCPowerFlow(self)
-        self.x, self.y = solution.dc_power_flow()
-        self.update_voltages_and_angles()
-        self.update_generator_power()
-        self.print_data(True)
-        print()
+        x, y = solution.dc_power_flow()
+        self.apply_results(x, y, True)
+
+
+    def do_optimal_power_flow(self, dc=False, vmin=0.94, vmax=1.06, limits: dict = None):
+        """
+        Dispatches the generators at least cost, applies the dispatch and runs the matching power flow.
+        :param dc: Use the DC network model, otherwise the AC model
+        :param vmin: Lowest bus voltage in pu for the AC model
+        :param vmax: Highest bus voltage in pu for the AC model
+        :param limits: Line and transformer name -> MVA limit, overriding their ratings
+        :return: OptimalPowerFlow, which can be solved again to warm start re-dispatch
+        """
+        from OptimalPowerFlow import OptimalPowerFlow
+        opf = OptimalPowerFlow(self, vmin, vmax, limits)
+        converged = opf.solve_dc() if dc else opf.solve_ac()
+        if not converged:
+            return opf
+        opf.apply()
+        if dc:
+            self.do_dc_power_flow()
+        else:
+            self.do_newton_raph(sparse=True)
+        return opf
+
+
+    def is_connected(self):
+        """
+        Checks that every bus is connected to every other one. A split network makes the power flow
+        Jacobian singular, so those circuits are solved one island at a time instead.
+        :return: bool
+        """
+        from Topology import find_islands
+        with self.lock:
+            if self.count <= 1:
+                return True
+            if (self.changed and self.sparse_changed) or self.branches is None:  # neither matrix has the latest branches
+                branches = self.calc_branch_arrays()
+            else:
+                branches = self.branches
+            return find_islands(self.count, branches["from"], branches["to"]).max() == 0
+
+
+    def do_island_power_flow(self, outages: list[str] = None, method: str = "newton_raph", var_limit=False, sparse=False,
+                             max_workers: int = None, **options):
+        """
+        Solves the power flow of each electrical island separately, after taking the given branches out of
+        service. Islands without a generator are de-energized. With a distributed slack each island shares
+        its own mismatch, and holds the interchange schedules of the areas in it.
+        :param outages: Names of branches that are out of service
+        :param method: "newton_raph", "fast_decoupled" or "dc_power_flow"
+        :param var_limit: Include VAR limiting calculation
+        :param sparse: Use sparse matrices, for large systems
+        :param max_workers: Number of threads used for large islands
+        :param options: ordering, strategy, reuse, krylov, tap_control and distributed_slack, as in do_newton_raph
+        :return: TopologyProcessor with the islands that were solved
+        """
+        from Topology import TopologyProcessor
+        if method != "newton_raph" and len(options) != 0:
+            print(f"WARNING: {sorted(options)} only apply to the Newton-Raphson power flow and are ignored.")
+            options = {}
+        topology = TopologyProcessor(self, outages)
+        print(f"{self.name} has {len(topology.islands)} islands, {len(topology.dead_buses)} de-energized buses. "
+              f"Solving each island separately.")
+        x, y = topology.solve(method, var_limit, sparse, max_workers, **options)
+        controls = [island.tap_controls for island in topology.islands if island.tap_controls is not None]
+        if len(controls) != 0:
+            self.set_transformer_taps([name for c in controls for name in c["name"]], np.concatenate([c["tap"] for c in controls]))
+        self.apply_results(x, y, method == "dc_power_flow")
+        return topology
+
+
+    def apply_results(self, x, y, dcpowerflow=False):
+        """
+        Stores a power flow solution in the circuit and updates the buses and elements with it. The solvers
+        only work on their own copies of the circuit data, so this is the one place a solve changes the circuit.
+        :param x: Bus angles and voltages
+        :param y: Bus power injections
+        :param dcpowerflow: Solution came from the DC power flow
+        :return:
+        """
+        with self.lock:
+            self.x, self.y = x, y
+            self.update_voltages_and_angles()
+            self.update_generator_power(dcpowerflow)
+            if not dcpowerflow:
+                self.voltages = self.to_rectangular()
+                self.update_reactor_power()
+                self.update_capacitor_power()
+                self.update_shunt_power()
+            self.print_data(dcpowerflow)
+            print()
+
+
+    def __getstate__(self):
+        """
+        Leaves the lock and the factored sensitivities out when a circuit is pickled, e.g. to send it to another process.
+        :return: dict
+        """
+        state = self.__dict__.copy()
+        del state["lock"]
+        state["sensitivity"] = None
+        return state
+
+
+    def __setstate__(self, state):
+        """
+        Restores a pickled circuit with a new lock.
+        :param state: Pickled attributes
+        :return:
+        """
+        self.__dict__.update(state)
+        self.lock = threading.RLock()
     
 
     def to_rectangular(self):
         """Converts the magnitude and angle values of the bus voltages into rectangular complex voltages
         :return:
         """
-        mag = self.x[self.x.index.str.startswith("V")].to_numpy()
-        angles = self.x[self.x.index.str.startswith("d")].to_numpy()
-        N = len(mag)
-        V = np.zeros(N, dtype=complex)
-        for i in range(N):
-            V[i] = mag[i]*(cos(angles[i])+1j*sin(angles[i]))
-        return V
+        mag = self.bus_results["Vpu"]
+        angles = self.bus_results["angle"]
+        return mag*(np.cos(angles)+1j*np.sin(angles))
     
 
     def update_voltages_and_angles(self):
         """
-        Updates the voltages and angles at each bus with the values calculated in the power flow results.
+        Updates the voltages and angles at each bus with the values calculated in the power flow results. The
+        buses read their values from these arrays, so nothing is done per bus.
         :return:
         """
-        d = self.x[self.x.index.str.startswith("d")]
-        V = self.x[self.x.index.str.startswith("V")]
-
-        for bus in self.buses:
-            index = self.buses[bus].index-1
-            self.buses[bus].set_bus_v(V.iloc[index, 0])
-            self.buses[bus].set_angle(d.iloc[index, 0])
+        x = self.x.to_numpy()[:, 0]
+        self.bus_results["angle"] = x[:self.count].copy()
+        self.bus_results["Vpu"] = x[self.count:].copy()
     
 
-    def update_generator_power(self):
+    def update_generator_power(self, dcpowerflow=False):
         """
         Updates the power delivered by each generator using the results from the most recent power flow calculation.
+        A bus's generation is its injection plus its load, shared by machine rating where a bus has several.
+        :param dcpowerflow: Solution came from the DC power flow, which has no reactive power
         :return:
         """
-        P = self.y[self.y.index.str.startswith("P")]
-        Q = self.y[self.y.index.str.startswith("Q")]
-
-        for gen in self.generators.values():
-            index = self.buses[gen.bus].index-1
-            gen.set_power(P.iloc[index, 0]*settings.powerbase/1e6, Q.iloc[index, 0]*settings.powerbase/1e6)
+        y = self.y.to_numpy()[:, 0]
+        gens = list(self.generators.values())
+        index = np.array([self.buses[gen.bus].index-1 for gen in gens], dtype=int)
+        load = self.calc_load_power(self.bus_results["Vpu"])
+        mva = np.array([gen.mva_base for gen in gens], dtype=float)
+        share = mva/np.bincount(index, mva, minlength=self.count)[index]
+        P = (y[index] + load.real[index])*share*self.powerbase/1e6
+        Q = y[self.count+index]*share*self.powerbase/1e6
+        if not dcpowerflow:
+            Q += load.imag[index]*share*self.powerbase/1e6
+
+        for gen, real, reactive in zip(gens, P, Q):
+            gen.set_power(real, reactive)
     
 
     def update_reactor_power(self):
         """
-        Updates the power absored by each reactor using the results from the most recent power flow calculation.
+        Updates the power absored by each shunt reactor using the results from the most recent power flow calculation.
+        Assumes constant impedance.
         :return:
         """
-        for reactor in self.reactors.values():
-            index = self.buses[reactor.bus1.name].index-1
-            V_reactor = self.voltages[index]  # actual bus voltage found after power flow
-            reactor.update_power(V_reactor)
+        reactors = [reactor for reactor in self.reactors.values() if reactor.type == "shunt"]
+        index = np.array([reactor.bus1.index-1 for reactor in reactors], dtype=int)
+        X = np.array([reactor.Zpu.imag for reactor in reactors])
+        Q = -np.abs(self.voltages[index]**2)/X*self.settings.powerbase  # actual bus voltages found after power flow
+
+        for reactor, reactive in zip(reactors, Q):
+            reactor.Q = reactive
 
 
     def update_capacitor_power(self):
         """
-        Updates the power delivered by each capacitor using the results from the most recent power flow calculation.
+        Updates the power delivered by each shunt capacitor using the results from the most recent power flow
+        calculation. Assumes constant impedance.
+        :return:
+        """
+        capacitors = [capacitor for capacitor in self.capacitors.values() if capacitor.type == "shunt"]
+        index = np.array([capacitor.bus1.index-1 for capacitor in capacitors], dtype=int)
+        X = np.array([capacitor.Zpu.imag for capacitor in capacitors])
+        Q = -np.abs(self.voltages[index]**2)/X*self.settings.powerbase  # actual bus voltages found after power flow
+
+        for capacitor, reactive in zip(capacitors, Q):
+            capacitor.Q = reactive
+
+
+    def update_shunt_power(self):
+        """
+        Updates the power absorbed by each fixed shunt using the results from the most recent power flow calculation.
         :return:
         """
-        for capacitor in self.capacitors.values():
-            index = self.buses[capacitor.bus1.name].index-1
-            V_capacitor = self.voltages[index]  # actual bus voltage found after power flow
-            capacitor.update_power(V_capacitor)
+        shunts = list(self.shunts.values())
+        index = np.array([shunt.bus1.index-1 for shunt in shunts], dtype=int)
+        Y = np.array([shunt.Ypu for shunt in shunts], dtype=complex)
+        V2 = np.abs(self.voltages[index])**2
+        P = V2*Y.real*self.settings.powerbase
+        Q = V2*Y.imag*self.settings.powerbase
+
+        for shunt, real, reactive in zip(shunts, P, Q):
+            shunt.P = real
+            shunt.Q = reactive
+
+
+    def calc_branch_results(self):
+        """
+        Flows, currents, loading and losses of every line and transformer from the most recent power flow.
+        :return: pd.DataFrame
+        """
+        from BranchResults import BranchResults
+        if self.voltages is None:
+            print("Run a power flow before calculating branch results.")
+            return None
+        return BranchResults(self).calc(self.voltages)
+
+
+    def calc_bus_report(self, dcpowerflow=False):
+        """
+        Bus results of the most recent power flow as arrays in bus index order.
+        :param dcpowerflow: Leave out reactive load, as in the DC power flow
+        :return: dict of column name -> np.ndarray
+        """
+        x = self.x.to_numpy()[:, 0]
+        buses = sorted(self.buses.values(), key=lambda bus: bus.index)
+        base_kv = np.array([bus.base_kv for bus in buses])/1e3
+        index = {bus.name: k for k, bus in enumerate(buses)}
+
+        def total(elements, bus_of, power):
+            values = np.zeros(self.count)
+            elements = list(elements)
+            if len(elements) != 0:
+                np.add.at(values, [index[bus_of(element)] for element in elements], [power(element)/1e6 for element in elements])
+            return values
+
+        gens = self.generators.values()
+        shunts = list(self.reactors.values()) + list(self.capacitors.values()) + list(self.shunts.values())
+        return {"Number": np.array([bus.index for bus in buses]), "Name": np.array([bus.name for bus in buses]),
+                "Nom kV": base_kv, "PU Volt": x[self.count:], "Volt (kV)": x[self.count:]*base_kv,
+                "Angle(Deg)": np.rad2deg(x[:self.count]),
+                "Load MW": total(self.loads.values(), lambda load: load.bus, lambda load: load.real_power),
+                "Load MVAR": np.zeros(self.count) if dcpowerflow else
+                             total(self.loads.values(), lambda load: load.bus, lambda load: load.reactive_power),
+                "Gen MW": total(gens, lambda gen: gen.bus, lambda gen: gen.real_power),
+                "Gen MVAR": total(gens, lambda gen: gen.bus, lambda gen: gen.reactive_power),
+                "Shunt MVAR": total(shunts, lambda shunt: shunt.bus1.name, lambda shunt: shunt.Q)}
 
 
     def print_data(self, dcpowerflow=False):
@@ -602,75 +1489,33 @@ class Circuit:
         Prints necessary information from system.
         :return:
         """
-        x = self.x.to_numpy()
-        angles = np.rad2deg(x[0:self.count]).round(3)
-        pu_voltages = x[self.count:].round(5)
-        voltages = []
-        nominal_voltages = []
-        number = []
-        name = []
-
-        load_mw = np.zeros((self.count, 1))
-        load_mvar = np.zeros((self.count, 1))
-        gen_mw = np.zeros((self.count, 1))
-        gen_mvar = np.zeros((self.count, 1))
-        shunt_mvar = np.zeros((self.count, 1))
-
-        for bus in self.buses.values():
-            nominal_voltages.append(bus.base_kv/1e3)
-            voltages.append((bus.V/1e3).round(3))
-            number.append(bus.index)
-            name.append(bus.name)
-        
-        if dcpowerflow==False:
-            for load in self.loads.values():
-                index = self.buses[load.bus].index-1
-                load_mw[index, 0] = load.real_power/1e6
-                load_mvar[index, 0] = load.reactive_power/1e6
-        else:
-            for load in self.loads.values():
-                index = self.buses[load.bus].index-1
-                load_mw[index, 0] = load.real_power/1e6
-        
-        for gen in self.generators.values():
-            index = self.buses[gen.bus].index-1
-            gen_mw[index, 0] = round(gen.real_power/1e6, 2)
-            gen_mvar[index, 0] = round(gen.reactive_power/1e6, 2)
-        
-        for reactor in self.reactors.values():
-            index = self.buses[reactor.bus1.name].index-1
-            shunt_mvar[index, 0] = round(reactor.Q/1e6, 2)
-        
-        for capacitor in self.capacitors.values():
-            index = self.buses[capacitor.bus1.name].index-1
-            shunt_mvar[index, 0] = round(capacitor.Q/1e6, 2)
-            
-        voltages = np.array([voltages]).T
-        nominal_voltages = np.array([nominal_voltages]).T
-        number = np.array([number]).T
-        name = np.array([name]).T
-        data = np.concatenate((number, name, nominal_voltages, pu_voltages, voltages, angles, load_mw, load_mvar, gen_mw, gen_mvar, shunt_mvar), axis=1)
-
-        datadf = pd.DataFrame(data=data, index=self.bus_order, columns=["Number", "Name", "Nom kV", "PU Volt", "Volt (kV)", "Angle(Deg)", "Load MW", "Load MVAR", "Gen MW", "Gen MVAR", "Shunt MVAR"])
-        pd.set_option('display.max_rows', None)
-        pd.set_option('display.max_columns', None)
-        pd.set_option('display.width', 1000)
-        print(datadf.to_string())
-        
+        print(BUS_REPORT.render(self.calc_bus_report(dcpowerflow), self.bus_order))
+
+
+    def write_results(self, path: str, dcpowerflow=False):
+        """
+        Writes the bus results of the most recent power flow to a file.
+        :param path: Destination .csv, .jsonl, .parquet or .txt file
+        :param dcpowerflow: Leave out reactive load, as in the DC power flow
+        :return:
+        """
+        BUS_REPORT.write(path, self.calc_bus_report(dcpowerflow))
+
 
 
 # This class does symmetrical/three phase fault analysis.
 class ThreePhaseFault():
-    def __init__(self, circuit: Circuit, faultbus: int):
+    def __init__(self, circuit: Circuit, faultbus: int, zbus=None):
         """
         Constructor for the ThreePhaseFault class.
         :param circuit: Circuit object
         :param faultbus: Bus index to run fault analysis on
+        :param zbus: SequenceZbus kept up to date with the circuit, used instead of inverting the admittance matrix
         """
         self.circuit = circuit
         self.faultbus = faultbus
         self.faultYbus = self.calc_faultYbus()
-        self.faultZbus = np.linalg.inv(self.faultYbus)
+        self.faultZbus = np.linalg.inv(self.faultYbus) if zbus is None else zbus.get_Zbus(1)
         self.Ifn = float  # fault current
         self.Ipn = None  # phase current, will become an np.ndarray
         self.fault_voltages = None  # will become an np.ndarray
@@ -686,19 +1531,8 @@ class ThreePhaseFault():
             index = self.circuit.buses[gen.bus].index-1
             Ybus[index, index] += 1/(gen.X1)
         
-        # calculates impedance for each load in the system
-        if len(self.circuit.loads) != 0:
-            for load in self.circuit.loads.values():
-                bus = load.bus # bus name as a string
-                Vbase = self.circuit.buses[bus].base_kv
-                V = self.circuit.buses[bus].V
-                index = self.circuit.buses[bus].index
-                I = np.conjugate(load.S/V)
-                Zbase = Vbase**2/self.circuit.powerbase
-                Z = V/I
-                Zpu = Z/Zbase
-                Ybus[index-1, index-1] += 1/Zpu
-                
+        # every load as a constant admittance at its prefault voltage
+        Ybus[np.diag_indices_from(Ybus)] += self.circuit.calc_load_admittances()
         return Ybus
     
 
@@ -726,14 +1560,20 @@ class ThreePhaseFault():
         """
         print("Fault current:")
         angle = np.rad2deg(np.angle(self.Ifn))
-        angles = np.round(np.array([angle, angle+240, angle+120]), 2)
-        magnitude = np.round(np.abs(self.Ifn), 3)
-        current = np.concatenate(([magnitude], angles)).reshape(1, 4)
-        current_df = pd.DataFrame(current, index=[f"Bus{self.faultbus}"], columns=["Magnitude", "Phase A Angle", "Phase B Angle", "Phase C Angle"])
-        pd.set_option('display.max_rows', None)
-        pd.set_option('display.max_columns', None)
-        pd.set_option('display.width', 1000)
-        print(current_df.to_string())
+        data = {"Magnitude": [np.abs(self.Ifn)], "Phase A Angle": [angle], "Phase B Angle": [angle+240],
+                "Phase C Angle": [angle+120]}
+        print(FAULT_CURRENT_REPORT.render(data, [f"Bus{self.faultbus}"]))
+
+
+    def calc_voltage_report(self):
+        """
+        Phase voltage magnitudes and angles at every bus during the fault
+        :return: dict of column name -> np.ndarray
+        """
+        magnitudes = np.abs(self.fault_voltages)
+        angles = np.rad2deg(np.angle(self.fault_voltages))
+        return {"Phase A": magnitudes, "Phase B": magnitudes, "Phase C": magnitudes,
+                "Phase A Angle": angles, "Phase B Angle": angles-120, "Phase C Angle": angles+120}
 
 
     def print_voltages(self):
@@ -742,35 +1582,42 @@ class ThreePhaseFault():
         :return:
         """
         print("Fault Voltages:")
-        fault_angles = np.rad2deg(np.angle(self.fault_voltages))
-        fault_angles = np.round(np.array([fault_angles, fault_angles-120, fault_angles+120]).T, 2)
-        fault_voltages = np.round(np.array([np.abs(self.fault_voltages), np.abs(self.fault_voltages), np.abs(self.fault_voltages)]).T, 5)
-        fault_voltages_df = pd.DataFrame(np.block([fault_voltages, fault_angles]), index=self.circuit.bus_order, columns=["Phase A", "Phase B", "Phase C", "Phase A Angle", "Phase B Angle"
-                                                                                                                                                                ,"Phase C Angle"])
-        pd.set_option('display.max_rows', None)
-        pd.set_option('display.max_columns', None)
-        pd.set_option('display.width', 1000)
-        print(fault_voltages_df.to_string())
+        print(FAULT_VOLTAGE_REPORT.render(self.calc_voltage_report(), self.circuit.bus_order))
+
+
+    def write_voltages(self, path: str):
+        """
+        Writes the fault voltages at every bus to a file.
+        :param path: Destination .csv, .jsonl, .parquet or .txt file
+        :return:
+        """
+        FAULT_VOLTAGE_REPORT.write(path, self.calc_voltage_report(), self.circuit.bus_order)
 
 
 
 # This class does unsymmetrical fault analysis.
 class UnsymmetricalFaults():
-    def __init__(self, circuit: Circuit, faultbus: int):
+    def __init__(self, circuit: Circuit, faultbus: int, zbus=None):
         """
         Constructor for the UnsymmetricalFaults class.
         :param circuit: Circuit object
         :param faultbus: Bus index to run fault analysis on
+        :param zbus: SequenceZbus kept up to date with the circuit, used instead of inverting the admittance matrices
         """
         self.circuit = circuit
         self.faultbus = faultbus
         self.voltages = self.circuit.voltages
         self.Y0bus = self.calc_zero()
-        self.Z0bus = np.linalg.inv(self.Y0bus)
         self.Ypbus = self.calc_positive()
-        self.Zpbus = np.linalg.inv(self.Ypbus)
         self.Ynbus = self.calc_negative()
-        self.Znbus = np.linalg.inv(self.Ynbus)
+        if zbus is None:
+            self.Z0bus = np.linalg.inv(self.Y0bus)
+            self.Zpbus = np.linalg.inv(self.Ypbus)
+            self.Znbus = np.linalg.inv(self.Ynbus)
+        else:
+            self.Z0bus = zbus.get_Zbus(0)
+            self.Zpbus = zbus.get_Zbus(1)
+            self.Znbus = zbus.get_Zbus(2)
         self.Ifn = float
         self.Ipn = None
         self.fault_voltages = None
@@ -789,22 +1636,8 @@ class UnsymmetricalFaults():
             index = bus.index-1
             Ybus0[index, index] += gen.Y0prim
         
-        for line in self.circuit.transmission_lines.values():
-            i = line.bus1.index-1
-            j = line.bus2.index-1
-            Ybus0[i, i] += line.yprim0.iloc[0, 0]
-            Ybus0[i, j] += line.yprim0.iloc[0, 1]
-            Ybus0[j, i] += line.yprim0.iloc[1, 0]
-            Ybus0[j, j] += line.yprim0.iloc[1, 1]
-        
-        for xfmr in self.circuit.transformers.values():
-            i = xfmr.bus1.index-1
-            j = xfmr.bus2.index-1
-            Ybus0[i, i] += xfmr.yprim0.iloc[0, 0]
-            Ybus0[i, j] += xfmr.yprim0.iloc[0, 1]
-            Ybus0[j, i] += xfmr.yprim0.iloc[1, 0]
-            Ybus0[j, j] += xfmr.yprim0.iloc[1, 1]
-
+        branches = self.circuit.calc_branch_arrays(0)
+        Ybus0 += self.circuit.assemble_Ybus(branches)
         return Ybus0
 
 
@@ -819,19 +1652,8 @@ class UnsymmetricalFaults():
             index = self.circuit.buses[gen.bus].index-1
             Ybus[index, index] += 1/(gen.X1)
         
-        # calculates impedance for each load in the system
-        if len(self.circuit.loads) != 0:
-            for load in self.circuit.loads.values():
-                bus = load.bus  # bus name as a string
-                Vbase = self.circuit.buses[bus].base_kv
-                V = self.circuit.buses[bus].V
-                index = self.circuit.buses[bus].index
-                I = np.conjugate(load.S/V)
-                Zbase = Vbase**2/self.circuit.powerbase
-                Z = V/I
-                Zpu = Z/Zbase
-                Ybus[index-1, index-1] += 1/Zpu
-
+        # every load as a constant admittance at its prefault voltage
+        Ybus[np.diag_indices_from(Ybus)] += self.circuit.calc_load_admittances()
         return Ybus
     
 
@@ -840,24 +1662,13 @@ class UnsymmetricalFaults():
         Calculates system's zero sequence admittance matrix.
         :return: np.ndarray
         """
-        Ynbus = self.circuit.Ybus.copy()
+        Ynbus = self.circuit.assemble_Ybus(self.circuit.calc_branch_arrays(2))
 
         for gen in self.circuit.generators.values():
             index = self.circuit.buses[gen.bus].index-1
             Ynbus[index, index] += 1/(gen.X2)
         
-        if len(self.circuit.loads) != 0:
-            for load in self.circuit.loads.values():
-                bus = load.bus  # bus name as a string
-                Vbase = self.circuit.buses[bus].base_kv
-                V = self.circuit.buses[bus].V
-                index = self.circuit.buses[bus].index
-                I = np.conjugate(load.S/V)
-                Zbase = Vbase**2/self.circuit.powerbase
-                Z = V/I
-                Zpu = Z/Zbase
-                Ynbus[index-1, index-1] += 1/Zpu
-                
+        Ynbus[np.diag_indices_from(Ynbus)] += self.circuit.calc_load_admittances()
         return Ynbus
     
 
@@ -915,9 +1726,6 @@ class UnsymmetricalFaults():
         :return:
         """
         self.Y0df = pd.DataFrame(data=self.Y0bus.round(2), index=self.circuit.bus_order, columns=self.circuit.bus_order)
-        pd.set_option('display.max_rows', None)
-        pd.set_option('display.max_columns', None)
-        pd.set_option('display.width', 1000)
         print(self.Y0df.to_string())
 
     
@@ -927,9 +1735,6 @@ class UnsymmetricalFaults():
         :return:
         """
         self.Ypdf = pd.DataFrame(data=self.Ypbus.round(2), index=self.circuit.bus_order, columns=self.circuit.bus_order)
-        pd.set_option('display.max_rows', None)
-        pd.set_option('display.max_columns', None)
-        pd.set_option('display.width', 1000)
         print(self.Ypdf.to_string())
 
 
@@ -939,9 +1744,6 @@ class UnsymmetricalFaults():
         :return:
         """
         self.Yndf = pd.DataFrame(data=self.Ynbus.round(2), index=self.circuit.bus_order, columns=self.circuit.bus_order)
-        pd.set_option('display.max_rows', None)
-        pd.set_option('display.max_columns', None)
-        pd.set_option('display.width', 1000)
         print(self.Yndf.to_string())
     
 
@@ -951,31 +1753,38 @@ class UnsymmetricalFaults():
         :return:
         """
         print(f"Fault current: {np.abs(self.Ifn).round(3)} pu")
-        angles = np.rad2deg(np.angle(self.Ipn)).round(2)
-        magnitude = np.abs(self.Ipn).round(3)
-        data = np.concatenate((magnitude, angles), axis=1)
-    
         print("Subtransient Phase Current")
-        current_df = pd.DataFrame(data, index=["A", "B", "C"], columns=["Magnitude(pu)", "Angle(deg)"])
-        pd.set_option('display.max_rows', None)
-        pd.set_option('display.max_columns', None)
-        pd.set_option('display.width', 1000)
-        print(current_df.to_string())
+        data = {"Magnitude(pu)": np.abs(self.Ipn[:, 0]), "Angle(deg)": np.rad2deg(np.angle(self.Ipn[:, 0]))}
+        print(PHASE_CURRENT_REPORT.render(data, ["A", "B", "C"]))
         print()
 
 
+    def calc_voltage_report(self):
+        """
+        Phase voltage magnitudes and angles at every bus during the fault
+        :return: dict of column name -> np.ndarray
+        """
+        magnitudes = np.abs(self.fault_voltages)
+        angles = np.rad2deg(np.angle(self.fault_voltages))
+        return {"Phase A": magnitudes[:, 0], "Phase B": magnitudes[:, 1], "Phase C": magnitudes[:, 2],
+                "Phase A Angle": angles[:, 0], "Phase B Angle": angles[:, 1], "Phase C Angle": angles[:, 2]}
+
+
     def print_voltages(self):
         """
         Prints the systems fault voltages for the chosen fault.
         :return:
         """
-        fault_angles = np.rad2deg(np.angle(self.fault_voltages)).round(2)
-        fault_voltages_df = pd.DataFrame(np.block([np.abs(self.fault_voltages).round(5), fault_angles]), index=self.circuit.bus_order, columns=["Phase A", "Phase B", "Phase C", 
-                                                                                                                               "Phase A Angle", "Phase B Angle","Phase C Angle"])
-        pd.set_option('display.max_rows', None)
-        pd.set_option('display.max_columns', None)
-        pd.set_option('display.width', 1000)
-        print(fault_voltages_df.to_string())
+        print(FAULT_VOLTAGE_REPORT.render(self.calc_voltage_report(), self.circuit.bus_order))
+
+
+    def write_voltages(self, path: str):
+        """
+        Writes the fault voltages at every bus to a file.
+        :param path: Destination .csv, .jsonl, .parquet or .txt file
+        :return:
+        """
+        FAULT_VOLTAGE_REPORT.write(path, self.calc_voltage_report(), self.circuit.bus_order)
     
 
 # validation tests
@@ -1,20 +1,22 @@
 #  This class contains various components used in electrical circuits. 
 #  Component is a parent class for all the child "component" classes.
 from math import acos
-from Settings import settings
+from Settings import Settings, settings as default_settings
 import pandas as pd
 
 
 class Reactor:
-    def __init__(self, name: str, mvar: float, bus1: str, bus2: str = None):
+    def __init__(self, name: str, mvar: float, bus1: str, bus2: str = None, settings: Settings = None):
         """
         Constructor for Reactor class
         :param name: Name of reactor
         :param mvar: MVAR rating
         :param bus1: First bus connection
         :param bus2: Second bus connection
+        :param settings: System settings, defaults to the global settings
         """
         self.name = name
+        self.settings = default_settings if settings is None else settings
         self.bus1 = bus1
         self.bus2 = bus1 if bus2 == None else bus2
         self.type = "shunt" if bus2 == None else "series"
@@ -22,7 +24,7 @@ class Reactor:
         self.Q = mvar*1e6  # actual reactive power
         self.base_kv = bus1.base_kv  # base kv taken from the bus
 
-        self.Zbase = self.base_kv**2/settings.powerbase
+        self.Zbase = self.base_kv**2/self.settings.powerbase
         self.Z = 1j*self.base_kv**2/self.Q
         self.Zpu = self.Z/self.Zbase
 
@@ -36,18 +38,22 @@ class Reactor:
         Calculates the primitive admittance matrix based on the reactor's connection type."
         :return: pd.DataFrame
         """
-        if self.type == "series":
-            from_bus = self.bus1.index
-            to_bus = self.bus2.index
-            yprim = [[self.Ypu, -self.Ypu], [-self.Ypu, self.Ypu]]
-            df = pd.DataFrame(yprim, index=[from_bus, to_bus], columns=[from_bus, to_bus])
+        yff, yft, ytf, ytt = self.calc_branch_values()
+        from_bus = self.bus1.index
+        to_bus = self.bus2.index
+        yprim = [[yff, yft], [ytf, ytt]]
+        df = pd.DataFrame(yprim, index=[from_bus, to_bus], columns=[from_bus, to_bus])
+        return df
 
-        elif self.type == "shunt":
-            bus = self.bus1.index
-            yprim = [[self.Ypu, 0], [0, 0]]
-            df = pd.DataFrame(yprim, index=[bus, bus], columns=[bus, bus])
 
-        return df
+    def calc_branch_values(self):
+        """
+        Calculates the primitive admittance entries as a flat tuple for vectorized Ybus assembly.
+        :return: (yff, yft, ytf, ytt)
+        """
+        if self.type == "series":
+            return self.Ypu, -self.Ypu, -self.Ypu, self.Ypu
+        return self.Ypu, 0, 0, 0
   
 
     def update_power(self, v):
@@ -56,22 +62,24 @@ class Reactor:
         :param v: The voltage the reactor is operating at.
         """
         if self.type == "shunt":
-            self.Q = -abs(v**2)/(self.Zpu.imag)*settings.powerbase
+            self.Q = -abs(v**2)/(self.Zpu.imag)*self.settings.powerbase
         else:
             pass
         
 
 
 class Capacitor:
-    def __init__(self, name: str, mvar: float, bus1: str, bus2: str = None):
+    def __init__(self, name: str, mvar: float, bus1: str, bus2: str = None, settings: Settings = None):
         """
         Constructor for Capacitor class
         :param name: Name of reactor
         :param mvar: MVAR rating
         :param bus1: First bus connection
         :param bus2: Second bus connection
+        :param settings: System settings, defaults to the global settings
         """
         self.name = name
+        self.settings = default_settings if settings is None else settings
         self.bus1 = bus1
         self.bus2 = bus1 if bus2 == None else bus2
         self.type = "shunt" if bus2 == None else "series"
@@ -79,7 +87,7 @@ class Capacitor:
         self.Q = -mvar*1e6  # actual reactive power
         self.base_kv = bus1.base_kv  # base kv taken from the bus
 
-        self.Zbase = self.base_kv**2/settings.powerbase
+        self.Zbase = self.base_kv**2/self.settings.powerbase
         self.Z = 1j*self.base_kv**2/self.Q
         self.Zpu = self.Z/self.Zbase
 
@@ -93,18 +101,22 @@ class Capacitor:
         Calculates the primitive admittance matrix based on the capacitor's connection type."
         :return: pd.DataFrame
         """
-        if self.type == "series":
-            from_bus = self.bus1.index
-            to_bus = self.bus2.index
-            yprim = [[self.Ypu, -self.Ypu], [-self.Ypu, self.Ypu]]
-            df = pd.DataFrame(yprim, index=[from_bus, to_bus], columns=[from_bus, to_bus])
+        yff, yft, ytf, ytt = self.calc_branch_values()
+        from_bus = self.bus1.index
+        to_bus = self.bus2.index
+        yprim = [[yff, yft], [ytf, ytt]]
+        df = pd.DataFrame(yprim, index=[from_bus, to_bus], columns=[from_bus, to_bus])
+        return df
 
-        elif self.type == "shunt":
-            bus = self.bus1.index
-            yprim = [[self.Ypu, 0], [0, 0]]
-            df = pd.DataFrame(yprim, index=[bus, bus], columns=[bus, bus])
 
-        return df
+    def calc_branch_values(self):
+        """
+        Calculates the primitive admittance entries as a flat tuple for vectorized Ybus assembly.
+        :return: (yff, yft, ytf, ytt)
+        """
+        if self.type == "series":
+            return self.Ypu, -self.Ypu, -self.Ypu, self.Ypu
+        return self.Ypu, 0, 0, 0
     
 
     def update_power(self, v):
@@ -113,12 +125,88 @@ class Capacitor:
         :param v: The voltage the reactor is operating at.
         """
         if self.type == "shunt":
-            self.Q = -abs(v**2)/(self.Zpu.imag)*settings.powerbase
+            self.Q = -abs(v**2)/(self.Zpu.imag)*self.settings.powerbase
         else:
             pass
 
 
 
+class Shunt:
+    """
+    Class to represent fixed shunt admittances, such as the bus shunts found in imported cases
+    """
+    def __init__(self, name: str, mw: float, mvar: float, bus1: str, settings: Settings = None):
+        """
+        Constructor for Shunt class
+        :param name: Name of shunt
+        :param mw: Real power consumed at 1 pu voltage
+        :param mvar: Reactive power supplied at 1 pu voltage (positive is capacitive)
+        :param bus1: Bus connection
+        :param settings: System settings, defaults to the global settings
+        """
+        self.name = name
+        self.settings = default_settings if settings is None else settings
+        self.bus1 = bus1
+        self.bus2 = bus1
+        self.type = "shunt"
+
+        self.P = mw*1e6  # actual real power consumed
+        self.Q = mvar*1e6  # actual reactive power supplied
+        self.Ypu = (self.P + 1j*self.Q)/self.settings.powerbase
+
+
+    def calc_branch_values(self):
+        """
+        Calculates the primitive admittance entries as a flat tuple for vectorized Ybus assembly.
+        :return: (yff, yft, ytf, ytt)
+        """
+        return self.Ypu, 0, 0, 0
+
+
+    def update_power(self, v):
+        """
+        Calculates the power consumption. Assumes constant impedance.
+        :param v: The voltage the shunt is operating at.
+        """
+        self.P = abs(v)**2*self.Ypu.real*self.settings.powerbase
+        self.Q = abs(v)**2*self.Ypu.imag*self.settings.powerbase
+
+
+
+class Equivalent:
+    """
+    Class to represent admittance matrix entries left by a network reduction. A series equivalent couples two
+    buses and a shunt equivalent sits on one bus.
+    """
+    def __init__(self, name: str, bus1, bus2, y, y0=(0, 0, 0, 0), y2=None):
+        """
+        Constructor for Equivalent class
+        :param name: Name of equivalent
+        :param bus1: First bus connection
+        :param bus2: Second bus connection, the same bus for a shunt equivalent
+        :param y: Positive sequence entries (yff, yft, ytf, ytt) in pu
+        :param y0: Zero sequence entries (yff, yft, ytf, ytt) in pu
+        :param y2: Negative sequence entries (yff, yft, ytf, ytt) in pu, the positive sequence entries by default
+        """
+        self.name = name
+        self.bus1 = bus1
+        self.bus2 = bus2
+        self.type = "shunt" if bus1 is bus2 else "series"
+        self.y = tuple(y)
+        self.y0 = tuple(y0)
+        self.y2 = self.y if y2 is None else tuple(y2)
+
+
+    def calc_branch_values(self, sequence: int = 1):
+        """
+        Returns the admittance matrix entries as a flat tuple for vectorized Ybus assembly.
+        :param sequence: 1 for positive sequence values, 0 for zero sequence values, 2 for negative sequence values
+        :return: (yff, yft, ytf, ytt)
+        """
+        return {1: self.y, 0: self.y0, 2: self.y2}[sequence]
+
+
+
 class Load:
     """
     Class to represent load objects
@@ -137,8 +225,45 @@ class Load:
         self.reactive_power = reactive_power*1e6
         self.Smag = (self.real_power**2 + self.reactive_power**2)**(1/2)
         self.S = self.real_power + 1j*self.reactive_power
-        self.pf = self.real_power/self.Smag
+        self.pf = self.real_power/self.Smag if self.Smag != 0 else 1.0
         self.angle = acos(self.pf)
+        # voltage dependence as constant impedance, current and power fractions (ZIP), or as an exponent
+        # that replaces them when given; constant power by default
+        self.zip_p = (0.0, 0.0, 1.0)
+        self.zip_q = (0.0, 0.0, 1.0)
+        self.exponent_p = None
+        self.exponent_q = None
+
+
+    def set_model(self, zip_p=None, zip_q=None, exponent_p: float = None, exponent_q: float = None):
+        """
+        Sets how the load's power changes with its bus voltage. With V in pu the real power is
+        P (z V^2 + i V + p) for zip_p = (z, i, p), or P V^exponent_p, and likewise for the reactive power.
+        :param zip_p: Constant impedance, current and power fractions of the real power, adding to 1
+        :param zip_q: Constant impedance, current and power fractions of the reactive power, adding to 1
+        :param exponent_p: Exponent of the real power, replaces zip_p
+        :param exponent_q: Exponent of the reactive power, replaces zip_q
+        :return:
+        """
+        self.zip_p = (0.0, 0.0, 1.0) if zip_p is None else tuple(float(value) for value in zip_p)
+        self.zip_q = (0.0, 0.0, 1.0) if zip_q is None else tuple(float(value) for value in zip_q)
+        self.exponent_p = exponent_p
+        self.exponent_q = exponent_q
+
+
+    def calc_terms(self):
+        """
+        Voltage dependent parts of the load, everything but its constant power share.
+        :return: [P z, P i, P exponential, P exponent, Q z, Q i, Q exponential, Q exponent] in W and VAR at 1 pu
+        """
+        terms = []
+        for power, fractions, exponent in [(self.real_power, self.zip_p, self.exponent_p),
+                                           (self.reactive_power, self.zip_q, self.exponent_q)]:
+            if exponent is None:
+                terms += [power*fractions[0], power*fractions[1], 0.0, 0.0]
+            else:
+                terms += [0.0, 0.0, power, float(exponent)]
+        return terms
 
 
 
@@ -146,7 +271,7 @@ class Generator:
     """
     Class to represent generator objects
     """
-    def __init__(self, name: str, bus: str, voltage: float, real_power: float, sub_transient_reactance = 0.0, neg_impedance = 0.0, zero_impedance = 0.0, gnd_impedance = None, var_limit = float('inf')):
+    def __init__(self, name: str, bus: str, voltage: float, real_power: float, sub_transient_reactance = 0.0, neg_impedance = 0.0, zero_impedance = 0.0, gnd_impedance = None, var_limit = float('inf'), mva_base = None, settings: Settings = None):
         """
         Constructor for Generator class
         :param name: Name of generator
@@ -158,18 +283,29 @@ class Generator:
         :param zero_impedance: Zero impedance
         :param gnd_impedance: Ground impedance
         :param var_limit: VAR Limit
+        :param mva_base: Machine base the reactances are given on, defaults to the real power rating
+        :param settings: System settings, defaults to the global settings
         """
         self.name = name
+        self.settings = default_settings if settings is None else settings
         self.bus = bus
         self.voltage = voltage
         self.real_power = real_power*1e6
         self.reactive_power = 0.
+        self.mva_base = self.real_power if mva_base == None else mva_base*1e6
         self.X0 = self.calc_X0(zero_impedance)
         self.X1 = self.calc_X1(sub_transient_reactance)
         self.X2 = self.calc_X2(neg_impedance)
         self.Zn = gnd_impedance
         self.Y0prim = self.calc_Y0prim()
         self.var_limit = var_limit
+        self.var_min = -var_limit  # lowest reactive output, used by the optimal power flow
+        self.p_min = 0.0  # real power limits in W, used by the optimal power flow
+        self.p_max = float('inf')
+        self.cost = (0.0, 0.0, 0.0)  # c2 ($/MW^2h), c1 ($/MWh), c0 ($/h) of the quadratic cost curve
+        self.participation = 0.0  # share of the mismatch taken with a distributed slack
+        self.H = 5.0  # inertia constant in s on the machine base, used by transient stability
+        self.D = 0.0  # damping in pu power per pu speed on the machine base
     
 
     def calc_X0(self, X0):
@@ -178,7 +314,7 @@ class Generator:
         :param X0: Reactance
         :return:
         """
-        X0 = 1j*X0*settings.powerbase/self.real_power
+        X0 = 1j*X0*self.settings.powerbase/self.mva_base
         return X0
 
 
@@ -188,7 +324,7 @@ class Generator:
         :param X1: Reactance
         :return:
         """
-        X1 = 1j*X1*settings.powerbase/self.real_power
+        X1 = 1j*X1*self.settings.powerbase/self.mva_base
         return X1
 
 
@@ -198,7 +334,7 @@ class Generator:
         :param X2: Reactance
         :return:
         """
-        X2 = 1j*X2*settings.powerbase/self.real_power
+        X2 = 1j*X2*self.settings.powerbase/self.mva_base
         return X2
 
 
@@ -0,0 +1,319 @@
+"""
+Module for continuation power flow (PV curves and maximum loadability)
+
+Filename: ContinuationPowerFlow.py
+Author: Justin Lipner, Bailey Stout
+Date: 2026-10-19
+"""
+
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from scipy.linalg import lu_factor, lu_solve
+from Circuit import Circuit
+from Solution import NewtonRaphson
+
+
+class PVCurve:
+    """
+    Class to hold one traced PV curve
+    """
+    def __init__(self, buses: list[str], lambdas: list[float], voltages: list, direction, powerbase: float,
+                 factorizations: int, converged: bool):
+        """
+        Constructor for PVCurve
+        :param buses: Bus names in index order
+        :param lambdas: Loading parameter at each point
+        :param voltages: Bus voltage magnitudes at each point
+        :param direction: Complex power injection added per unit of lambda
+        :param powerbase: System base power
+        :param factorizations: Number of Jacobian factorizations used to trace the curve
+        :param converged: The nose point was located
+        """
+        self.buses = buses
+        self.lambdas = np.array(lambdas)
+        self.voltages = pd.DataFrame(np.array(voltages), index=self.lambdas, columns=buses)
+        self.voltages.index.name = "lambda"
+        self.direction = direction
+        self.factorizations = factorizations
+        self.converged = converged
+
+        nose = int(np.argmax(self.lambdas))
+        self.lambda_max = self.lambdas[nose]
+        self.nose_voltages = self.voltages.iloc[nose]
+        self.margin = -self.lambda_max*direction.real[direction.real < 0].sum()*powerbase  # added load at the nose in W
+
+
+    def print_data(self):
+        """
+        Prints the maximum loadability point
+        :return:
+        """
+        print(f"Maximum loadability: lambda = {self.lambda_max:.4f}, margin = {self.margin/1e6:.2f} MW "
+              f"({len(self.lambdas)} points, {self.factorizations} factorizations)")
+        weakest = self.nose_voltages.idxmin()
+        print(f"Weakest bus at the nose: {weakest}, V = {self.nose_voltages[weakest]:.4f} pu")
+
+
+
+class ContinuationPowerFlow:
+    """
+    Continuation power flow with tangent predictor, pseudo-arclength corrector and step size control. Each
+    Newton step uses NewtonRaphson's vectorized mismatch and Jacobian, augmented with the loading parameter.
+    """
+    def __init__(self, circuit: Circuit, tolerance: float = 1e-6, step: float = 0.2, min_step: float = 1e-4,
+                 max_step: float = 2.0, max_iterations: int = 10):
+        """
+        Constructor for ContinuationPowerFlow
+        :param circuit: Circuit to study
+        :param tolerance: Mismatch tolerance in pu
+        :param step: First arclength step
+        :param min_step: Smallest step, sets how precisely the nose is located
+        :param max_step: Largest step
+        :param max_iterations: Corrector iterations before a step is cut in half
+        """
+        self.solver = NewtonRaphson(circuit, False)
+        self.pvpq, self.pq = self.solver.calc_bus_sets()
+        self.S0 = self.solver.calc_specified_power()
+        self.buses = list(circuit.buses)
+        self.bus_index = {name: bus.index-1 for name, bus in circuit.buses.items()}
+        self.powerbase = self.solver.powerbase
+        self.tolerance = tolerance
+        self.step = step
+        self.min_step = min_step
+        self.max_step = max_step
+        self.max_iterations = max_iterations
+        self.base = None  # solved base case (angles, magnitudes)
+        self.base_factorizations = 0
+
+
+    def calc_direction(self, direction=None):
+        """
+        Converts a load increase direction into complex power injections per unit of lambda.
+        :param direction: None to scale every load and generator with the base case, a dict of
+                          bus name -> (MW, MVAR) load increase, or an array of complex pu injections per bus
+        :return: np.ndarray of complex
+        """
+        if direction is None:
+            dS = self.S0.copy()
+            dS[self.solver.slack_index] = 0
+            return dS
+
+        if isinstance(direction, dict):
+            dS = np.zeros(len(self.buses), dtype=complex)
+            for bus, (mw, mvar) in direction.items():
+                dS[self.bus_index[bus]] -= (mw + 1j*mvar)*1e6/self.powerbase
+            return dS
+
+        return np.asarray(direction, dtype=complex)
+
+
+    def voltages(self, Va, Vm):
+        """
+        Builds complex bus voltages from the state variables.
+        :param Va: Angles at PQ and PV buses
+        :param Vm: Magnitudes at PQ buses
+        :return: np.ndarray of complex
+        """
+        angle = np.zeros(len(self.buses))
+        magnitude = self.solver.voltage_setpoints.copy()
+        angle[self.pvpq] = Va
+        magnitude[self.pq] = Vm
+        return magnitude*np.exp(1j*angle)
+
+
+    def solve_base(self):
+        """
+        Solves the base case (lambda = 0) with Newton-Raphson from a flat start.
+        :return: (angles, magnitudes) of the state buses
+        """
+        if self.base is not None:
+            return self.base
+
+        Va = np.zeros(len(self.pvpq))
+        Vm = np.ones(len(self.pq))
+        for i in range(self.max_iterations*5):
+            V = self.voltages(Va, Vm)
+            mismatch = self.solver.calc_mismatch(V, self.S0)
+            if np.max(np.abs(mismatch)) < self.tolerance:
+                self.base = (Va, Vm)
+                return self.base
+            dx = np.linalg.solve(self.solver.calc_jacobian(V), mismatch)
+            self.base_factorizations += 1
+            Va = Va + dx[:len(Va)]
+            Vm = Vm + dx[len(Va):]
+
+        raise RuntimeError("Base case did not converge.")
+
+
+    def tangent(self, z, dS, previous):
+        """
+        Predictor direction: the tangent to the solution curve, oriented along the previous tangent.
+        :param z: State [angles, magnitudes, lambda]
+        :param dS: Injection direction, reduced to the mismatch rows
+        :param previous: Previous tangent
+        :return: np.ndarray, unit length
+        """
+        n = len(self.pvpq)
+        V = self.voltages(z[:n], z[n:-1])
+        A = np.vstack((np.column_stack((self.solver.calc_jacobian(V), -dS)), previous))
+        rhs = np.zeros(len(z))
+        rhs[-1] = 1
+        t = lu_solve(lu_factor(A), rhs)
+        return t/np.linalg.norm(t)
+
+
+    def correct(self, z, dS, dS_full, tangent, z_previous, sigma):
+        """
+        Pseudo-arclength corrector: Newton's method on the power flow equations plus the arclength condition.
+        :param z: Predicted state
+        :param dS: Injection direction, reduced to the mismatch rows
+        :param dS_full: Injection direction at every bus
+        :param tangent: Predictor tangent
+        :param z_previous: Last accepted state
+        :param sigma: Arclength step
+        :return: (corrected state or None, factorizations used)
+        """
+        n = len(self.pvpq)
+        for i in range(self.max_iterations):
+            V = self.voltages(z[:n], z[n:-1])
+            F = np.append(-self.solver.calc_mismatch(V, self.S0 + z[-1]*dS_full), tangent @ (z - z_previous) - sigma)
+            if np.max(np.abs(F)) < self.tolerance:
+                return z, i
+            A = np.vstack((np.column_stack((self.solver.calc_jacobian(V), -dS)), tangent))
+            z = z - lu_solve(lu_factor(A), F)
+        return None, self.max_iterations
+
+
+    def trace(self, direction=None, max_points: int = 500):
+        """
+        Traces the PV curve along a load increase direction up to the maximum loadability point.
+        :param direction: Load increase direction, see calc_direction
+        :param max_points: Maximum number of accepted points
+        :return: PVCurve
+        """
+        Va, Vm = self.solve_base()
+        dS_full = self.calc_direction(direction)
+        dS = np.concatenate((dS_full.real[self.pvpq], dS_full.imag[self.pq]))
+
+        z = np.concatenate((Va, Vm, [0.0]))
+        t = np.zeros(len(z))
+        t[-1] = 1
+        t = self.tangent(z, dS, t)
+        factorizations = 1
+        lambdas = [0.0]
+        voltages = [np.abs(self.voltages(Va, Vm))]
+
+        sigma = self.step
+        approaching = False  # the nose was overshot, so steps only get smaller from here
+        converged = False
+        while len(lambdas) < max_points:
+            z_new, iterations = self.correct(z + sigma*t, dS, dS_full, t, z, sigma)
+            factorizations += iterations
+            if z_new is None:
+                if sigma <= self.min_step:
+                    break
+                sigma = max(sigma/2, self.min_step)
+                continue
+
+            t_new = self.tangent(z_new, dS, t)
+            factorizations += 1
+            if t_new[-1] < 0:  # lambda has started to decrease, so the step went past the nose
+                if sigma <= self.min_step:
+                    converged = True
+                    z = z_new if z_new[-1] > z[-1] else z
+                    lambdas.append(z[-1])
+                    voltages.append(np.abs(self.voltages(z[:len(Va)], z[len(Va):-1])))
+                    break
+                approaching = True
+                sigma = max(sigma/2, self.min_step)
+                continue
+
+            z, t = z_new, t_new
+            lambdas.append(z[-1])
+            voltages.append(np.abs(self.voltages(z[:len(Va)], z[len(Va):-1])))
+            if iterations <= 3 and not approaching:
+                sigma = min(sigma*1.5, self.max_step)
+
+        return PVCurve(self.buses, lambdas, voltages, dS_full, self.powerbase, factorizations, converged)
+
+
+    def trace_batch(self, directions: list, max_workers: int = None):
+        """
+        Traces PV curves for several load increase directions. The base case is solved once and shared,
+        and the directions are traced in parallel threads.
+        :param directions: List of load increase directions, see calc_direction
+        :param max_workers: Number of threads
+        :return: list[PVCurve]
+        """
+        self.solve_base()
+        with ThreadPoolExecutor(max_workers) as pool:
+            return list(pool.map(self.trace, directions))
+
+
+def repeated_power_flow(cpf: ContinuationPowerFlow, direction=None, step: float = 0.1):
+    """
+    Finds the maximum loadability the old way, with flat start Newton-Raphson solves at increasing
+    loading and bisection once the solves stop converging. Used to compare against the continuation method.
+    :param cpf: ContinuationPowerFlow holding the system
+    :param direction: Load increase direction
+    :param step: Loading increment
+    :return: (maximum lambda, factorizations)
+    """
+    dS = cpf.calc_direction(direction)
+    factorizations = 0
+
+    def converges(lam):
+        nonlocal factorizations
+        Va = np.zeros(len(cpf.pvpq))
+        Vm = np.ones(len(cpf.pq))
+        for i in range(50):
+            V = cpf.voltages(Va, Vm)
+            mismatch = cpf.solver.calc_mismatch(V, cpf.S0 + lam*dS)
+            if np.max(np.abs(mismatch)) < cpf.tolerance:
+                return np.min(np.abs(V)) > 0.3  # rejects the low voltage solution
+            dx = np.linalg.solve(cpf.solver.calc_jacobian(V), mismatch)
+            factorizations += 1
+            Va = Va + dx[:len(Va)]
+            Vm = Vm + dx[len(Va):]
+        return False
+
+    low = 0.0
+    while converges(low + step):
+        low += step
+    high = low + step
+    while high - low > cpf.min_step:
+        middle = (low + high)/2
+        if converges(middle):
+            low = middle
+        else:
+            high = middle
+    return low, factorizations
+
+
+# validation tests
+if __name__ == '__main__':
+    import time
+    from Validations import CreateSevenPowerBusSystem
+    from CaseImporter import import_case
+
+    for circ in [CreateSevenPowerBusSystem(), import_case("Case_Files/case14.m")]:
+        print(f"***{circ.name}***")
+        cpf = ContinuationPowerFlow(circ)
+        start = time.perf_counter()
+        curve = cpf.trace()
+        elapsed = time.perf_counter() - start
+        curve.print_data()
+        print(f"continuation: {elapsed:.3f} s")
+
+        start = time.perf_counter()
+        lambda_max, factorizations = repeated_power_flow(cpf)
+        print(f"repeated flat start solves: lambda = {lambda_max:.4f}, {factorizations} factorizations, "
+              f"{time.perf_counter()-start:.3f} s")
+
+        loads = [bus for bus in circ.buses if cpf.S0[cpf.bus_index[bus]].real < 0]
+        curves = cpf.trace_batch([{bus: (100, 30)} for bus in loads])
+        for bus, curve in zip(loads, curves):
+            print(f"100 MW + 30 MVAR steps at {bus}: lambda = {curve.lambda_max:.4f}, "
+                  f"V = {curve.nose_voltages[bus]:.4f} pu, {curve.factorizations} factorizations")
+        print()
@@ -0,0 +1,254 @@
+"""
+Module for short circuit duty screening under single branch outages with low rank Zbus updates
+
+Filename: FaultScreening.py
+Author: Justin Lipner, Bailey Stout
+Date: 2026-10-19
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.linalg import splu
+from scipy.sparse.csgraph import connected_components
+from Circuit import Circuit
+
+
+def assemble_sparse(branches: dict, count: int, shunts=None):
+    """
+    Sparse admittance matrix from branch arrays, with optional shunt admittances on the diagonal.
+    :param branches: Branch arrays from calc_branch_arrays
+    :param count: Number of buses
+    :param shunts: np.ndarray of pu shunt admittances per bus
+    :return: scipy.sparse.csc_matrix
+    """
+    rows = np.concatenate((branches["from"], branches["from"], branches["to"], branches["to"]))
+    cols = np.concatenate((branches["from"], branches["to"], branches["from"], branches["to"]))
+    values = np.concatenate((branches["yff"], branches["yft"], branches["ytf"], branches["ytt"]))
+    Y = sparse.csc_matrix((values, (rows, cols)), shape=(count, count))
+    if shunts is not None:
+        Y = Y + sparse.diags(shunts)
+    return Y.tocsc()
+
+
+def calc_Zbus(Y):
+    """
+    Impedance matrix from one sparse LU factorization of the admittance matrix. Buses with no path to ground,
+    in parts of the network without any shunt admittance (often the case in the zero sequence), are left out
+    of the factorization, and their rows and columns are zero.
+    :param Y: Sparse admittance matrix
+    :return: (np.ndarray impedance matrix, np.ndarray bool mask of the grounded buses)
+    """
+    Y = sparse.csr_matrix(Y)
+    shunt = np.abs(np.asarray(Y.sum(axis=1)).ravel()) > 1e-10*np.asarray(abs(Y).sum(axis=1)).ravel()
+    labels = connected_components(Y != 0, directed=False)[1]
+    grounded = np.isin(labels, labels[shunt])
+    index = np.flatnonzero(grounded)
+    Z = np.zeros(Y.shape, dtype=complex)
+    if len(index) != 0:
+        lu = splu(Y[index][:, index].tocsc())
+        Z[np.ix_(index, index)] = lu.solve(np.eye(len(index), dtype=Y.dtype))
+    return Z, grounded
+
+
+def calc_outage_diagonals(Z, branches: dict, rows, chunk: int = 64):
+    """
+    Diagonal of the impedance matrix with each branch removed. Taking a branch out adds U C U^T to Ybus, with
+    U = [e_from, e_to] and C the negated 2x2 branch admittance, so by the Woodbury identity
+        Z' = Z - (Z U) C (I + U^T Z U C)^-1 (U^T Z)
+    which is a rank one change for a series branch and rank two when it has shunt charging. Only the columns
+    and rows of Z at the branch ends are used, and outages are processed a chunk at a time.
+    :param Z: Impedance matrix of the intact network
+    :param branches: Branch arrays from calc_branch_arrays
+    :param rows: Positions in the branch arrays of the outaged branches
+    :param chunk: Outages per vectorized block
+    :return: np.ndarray with a row of diagonals per outage, NaN where the outage leaves a part of the network
+             without a path to ground
+    """
+    diagonal = np.diag(Z)
+    result = np.empty((len(rows), Z.shape[0]), dtype=complex)
+    identity = np.eye(2)
+    for start in range(0, len(rows), chunk):
+        k = np.asarray(rows[start:start+chunk], dtype=int)
+        ends = np.stack((branches["from"][k], branches["to"][k]), axis=1)  # (K, 2)
+        C = -np.stack((np.stack((branches["yff"][k], branches["yft"][k]), axis=1),
+                       np.stack((branches["ytf"][k], branches["ytt"][k]), axis=1)), axis=1)  # (K, 2, 2)
+        ZU = Z[:, ends].transpose(1, 0, 2)  # (K, N, 2)
+        UZ = Z[ends, :]  # (K, 2, N)
+        S = Z[ends[:, :, None], ends[:, None, :]]  # U^T Z U, (K, 2, 2)
+        A = identity + S @ C
+        det = A[:, 0, 0]*A[:, 1, 1] - A[:, 0, 1]*A[:, 1, 0]
+        islanding = np.abs(det) < 1e-9
+        det[islanding] = 1.0
+        inverse = np.stack((np.stack((A[:, 1, 1], -A[:, 0, 1]), axis=1),
+                            np.stack((-A[:, 1, 0], A[:, 0, 0]), axis=1)), axis=1)/det[:, None, None]
+        M = C @ inverse
+        result[start:start+len(k)] = diagonal - np.einsum("kma,kab,kbm->km", ZU, M, UZ)
+        result[start+np.flatnonzero(islanding)] = np.nan
+    return result
+
+
+class FaultDutyScreening:
+    """
+    Maximum short circuit duty at every bus under every single branch outage. Each sequence admittance
+    matrix, built as ThreePhaseFault and UnsymmetricalFaults build theirs, is factored once, and each outage
+    only updates the Zbus diagonals the fault currents depend on, so the full set of studies needs no further
+    factorizations. Faults are bolted, with prefault voltages from the last power flow, or 1 pu before one.
+    """
+    def __init__(self, circuit: Circuit, outages: list[str] = None, chunk: int = 64):
+        """
+        Constructor for FaultDutyScreening
+        :param circuit: Circuit object
+        :param outages: Names of the branches to take out one at a time, every transmission line and transformer
+                        if not given
+        :param chunk: Outages per vectorized block
+        """
+        self.circuit = circuit
+        self.chunk = chunk
+        with circuit.lock:
+            shunts, shunts0, shunts2 = circuit.calc_fault_shunts()
+            self.branches = [circuit.calc_branch_arrays(sequence) for sequence in [1, 0, 2]]
+            self.shunts = [shunts, shunts0, shunts2]
+            self.buses = sorted(circuit.buses, key=lambda name: circuit.buses[name].index)
+            voltages = circuit.voltages
+            self.V = np.ones(circuit.count, dtype=complex) if voltages is None else np.asarray(voltages, dtype=complex)
+            self.base_kv = np.array([circuit.buses[bus].base_kv for bus in self.buses], dtype=float)
+            self.powerbase = circuit.powerbase
+            series = [*circuit.transmission_lines, *circuit.transformers]
+
+        if outages is None:
+            outages = series
+        missing = [name for name in outages if name not in series]
+        if len(missing) != 0:
+            raise ValueError(f"{missing[:5]} are not transmission lines or transformers of {circuit.name}")
+        self.outages = list(outages)
+        self.three_phase = None  # will become a pd.DataFrame of fault currents in pu
+        self.SLG = None  # will become a pd.DataFrame of fault currents in pu
+
+
+    def calc_diagonals(self):
+        """
+        Zbus diagonals of each sequence network, intact and under every outage.
+        :return: list of np.ndarray (positive, zero, negative sequence), intact diagonal in the first row
+        """
+        count = len(self.buses)
+        diagonals = []
+        for branches, shunts in zip(self.branches, self.shunts):
+            Z, grounded = calc_Zbus(assemble_sparse(branches, count, shunts))
+            position = {name: k for k, name in enumerate(branches["name"])}
+            rows = [position[name] for name in self.outages]
+            result = np.vstack((np.diag(Z)[None, :], calc_outage_diagonals(Z, branches, rows, self.chunk)))
+            result[:, ~grounded] = np.inf  # no path to ground means no fault current in that sequence
+            diagonals.append(result)
+        return diagonals
+
+
+    def screen(self):
+        """
+        Three phase and single line to ground fault currents at every bus, intact and under every outage.
+        :return: (three phase, SLG) pd.DataFrame of pu fault currents, a row per case and a column per bus
+        """
+        Z1, Z0, Z2 = self.calc_diagonals()
+        index = ["intact", *self.outages]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.three_phase = pd.DataFrame(np.abs(self.V/Z1), index=index, columns=self.buses)
+            self.SLG = pd.DataFrame(3*np.abs(self.V/(Z0 + Z1 + Z2)), index=index, columns=self.buses)
+        return self.three_phase, self.SLG
+
+
+    def calc_worst(self):
+        """
+        Largest fault current at each bus over the intact case and every outage, and the case that causes it.
+        Outages that leave part of the network without a path to ground are skipped.
+        :return: pd.DataFrame with a row per bus
+        """
+        if self.three_phase is None:
+            self.screen()
+        base_current = self.powerbase/(np.sqrt(3)*self.base_kv)/1e3  # kA
+        data = {}
+        for label, duty in [("3ph", self.three_phase), ("SLG", self.SLG)]:
+            values = duty.fillna(-np.inf)
+            data[f"{label} (pu)"] = values.max().to_numpy()
+            data[f"{label} (kA)"] = data[f"{label} (pu)"]*base_current
+            data[f"{label} case"] = values.idxmax().to_numpy()
+            data[f"{label} increase (%)"] = (data[f"{label} (pu)"]/duty.loc["intact"].to_numpy() - 1)*100
+        return pd.DataFrame(data, index=self.buses)
+
+
+    def print_data(self):
+        """
+        Prints the worst case fault duty at every bus.
+        :return:
+        """
+        worst = self.calc_worst()
+        skipped = int(self.three_phase.iloc[1:].isna().all(axis=1).sum())
+        print(f"Fault duty screening: {len(self.outages)} outages at {len(self.buses)} buses")
+        if skipped != 0:
+            print(f"WARNING: {skipped} outages island part of the network and were skipped.")
+        print(worst.round(4).to_string())
+
+
+# validation tests
+if __name__ == '__main__':
+    import io
+    import time
+    import contextlib
+    from Circuit import ThreePhaseFault, UnsymmetricalFaults
+    from Validations import CreateSevenPowerBusSystem, CreateSyntheticCase
+
+    def brute_force(screening, outage, sequence):
+        """
+        Zbus diagonal with the branch removed, from a full inversion.
+        """
+        branches = screening.branches[sequence]
+        keep = branches["name"] != outage
+        Y = assemble_sparse({key: value[keep] for key, value in branches.items()}, len(screening.buses),
+                            screening.shunts[sequence]).toarray()
+        grounded = np.abs(Y).sum(axis=1) > 0
+        diagonal = np.full(len(Y), np.inf, dtype=complex)
+        diagonal[grounded] = np.diag(np.linalg.inv(Y[np.ix_(grounded, grounded)]))
+        return diagonal
+
+    circ = CreateSevenPowerBusSystem()
+    with contextlib.redirect_stdout(io.StringIO()):
+        circ.do_newton_raph()
+    screening = FaultDutyScreening(circ)
+    screening.print_data()
+    print()
+
+    # the intact case against the existing fault classes at bus 1
+    symfault = ThreePhaseFault(circ, 1)
+    unsymfault = UnsymmetricalFaults(circ, 1)
+    I = circ.voltages[0]/(unsymfault.Z0bus[0, 0] + unsymfault.Zpbus[0, 0] + unsymfault.Znbus[0, 0])
+    print("Intact bus1 3ph:", np.round(screening.three_phase.iloc[0, 0], 6), "ThreePhaseFault:",
+          np.round(abs(circ.voltages[0]/symfault.faultZbus[0, 0]), 6))
+    print("Intact bus1 SLG:", np.round(screening.SLG.iloc[0, 0], 6), "UnsymmetricalFaults:", np.round(abs(3*I), 6))
+    error = max(np.nanmax(np.abs(np.abs(1/screening.calc_diagonals()[sequence][1:][k]) - np.abs(1/brute_force(screening, outage, sequence))))
+                for sequence in range(3) for k, outage in enumerate(screening.outages))
+    print("Largest difference in 1/Zkk from inverting every outage:", error)
+    print()
+
+    circ = CreateSyntheticCase(1500)
+    for gen in circ.generators.values():  # MATPOWER cases carry no machine reactances
+        gen.X1 = gen.calc_X1(0.2)
+        gen.X2 = gen.calc_X2(0.2)
+    with contextlib.redirect_stdout(io.StringIO()):
+        circ.do_newton_raph(sparse=True)
+    screening = FaultDutyScreening(circ)
+    print(f"***synthetic 1500 bus case, {len(screening.outages)} outages***")
+    start = time.perf_counter()
+    screening.screen()
+    elapsed = time.perf_counter() - start
+    print(f"screening every outage: {elapsed:.3f} s")
+
+    sample = screening.outages[::len(screening.outages)//10][:10]
+    start = time.perf_counter()
+    direct = [brute_force(screening, outage, 0) for outage in sample]
+    per_outage = (time.perf_counter() - start)/len(sample)
+    print(f"inverting per outage: {per_outage:.3f} s, about {per_outage*len(screening.outages):.1f} s for every outage")
+    positions = [screening.outages.index(outage) + 1 for outage in sample]
+    Z1 = screening.V/screening.three_phase.to_numpy()[positions]
+    print("Largest difference in |Zkk| on the sampled outages:", np.max(np.abs(np.abs(Z1) - np.abs(direct))))
+    worst = screening.calc_worst()
+    print("Buses whose worst 3ph duty comes from an outage:", int((worst["3ph case"] != "intact").sum()))
+    print(worst.sort_values("3ph increase (%)", ascending=False).head(5).round(3).to_string())
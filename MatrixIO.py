@@ -0,0 +1,226 @@
+"""
+Module for bulk reading and writing of complex matrices and results
+
+Filename: MatrixIO.py
+Author: Justin Lipner, Bailey Stout
+Date: 2026-10-19
+"""
+
+import os
+import numpy as np
+import pandas as pd
+
+
+main_dir = os.path.dirname(os.path.realpath(__file__))
+
+
+def resolve_path(path: str):
+    """
+    Turns a path into an absolute path for this machine. Relative paths are taken from the project folder
+    and Windows style backslashes are converted so the same paths work on every OS.
+    :param path: Absolute or project relative path
+    :return: Absolute path (str)
+    """
+    path = path.replace("\\", "/")
+    if not os.path.isabs(path):
+        path = os.path.join(main_dir, path)
+    return os.path.normpath(path)
+
+
+def parse_complex(values):
+    """
+    Converts a table of PowerWorld style entries ("1.46 - j14.63", numbers or NaN) into complex numbers.
+    The j is moved to the end of each entry with numpy string operations so the whole table is converted
+    in one cast instead of a per element loop.
+    :param values: 2D array-like of strings/numbers
+    :return: np.ndarray of complex
+    """
+    text = pd.DataFrame(values).fillna(0).to_numpy().astype(str)
+    text = np.strings.replace(text, " ", "")
+    imaginary = np.strings.find(text, "j") >= 0
+    text = np.strings.replace(text, "j", "")
+    text = np.where(imaginary, np.strings.add(text, "j"), text)
+    text = np.where(np.strings.str_len(text) == 0, "0", text)
+    return text.astype(complex)
+
+
+def read_complex_excel(path: str):
+    """
+    Reads a PowerWorld admittance matrix export (two header columns, one header row).
+    :param path: Path to the .xlsx file
+    :return: np.ndarray of complex
+    """
+    dataframe = pd.read_excel(resolve_path(path))
+    return parse_complex(dataframe.iloc[1:, 2:])
+
+
+def read_complex_csv(path: str, chunk_rows: int = 4096):
+    """
+    Reads a complex matrix written by write_complex_csv, or any csv of complex literals, in chunks.
+    :param path: Path to the csv file
+    :param chunk_rows: Number of rows parsed at a time
+    :return: np.ndarray of complex
+    """
+    chunks = []
+    for chunk in pd.read_csv(resolve_path(path), header=None, dtype=str, chunksize=chunk_rows):
+        chunks.append(parse_complex(chunk))
+
+    if len(chunks) == 0:
+        return np.zeros((0, 0), dtype=complex)
+
+    return np.vstack(chunks)
+
+
+def write_complex_csv(data, path: str, chunk_rows: int = 4096, decimals: int = 6):
+    """
+    Writes a complex matrix to csv. Each chunk of rows is formatted with a single string operation
+    and appended to the file, so the whole text never has to be held in memory.
+    :param data: 2D array-like of complex
+    :param path: Destination csv file
+    :param chunk_rows: Number of rows formatted and written at a time
+    :param decimals: Number of decimals written for the real and imaginary parts
+    :return:
+    """
+    with MatrixWriter(path, decimals=decimals) as writer:
+        data = np.atleast_2d(data)
+        for start in range(0, data.shape[0], chunk_rows):
+            writer.write(data[start:start+chunk_rows])
+
+
+def save_matrix(data, path: str):
+    """
+    Saves a matrix in numpy's native binary format, which keeps complex values exactly.
+    :param data: Array to save
+    :param path: Destination .npy file
+    :return:
+    """
+    np.save(resolve_path(path), np.asarray(data))
+
+
+def load_matrix(path: str, mmap: bool = False):
+    """
+    Loads a matrix saved by save_matrix or MatrixWriter.
+    :param path: Path to the .npy file
+    :param mmap: Memory map the file instead of reading it all at once
+    :return: np.ndarray
+    """
+    return np.load(resolve_path(path), mmap_mode="r" if mmap else None)
+
+
+class MatrixWriter:
+    """
+    Streams a large result matrix to disk in chunks of rows. The format is picked from the file
+    extension: ".npy" is written through a memory map, anything else is written as csv.
+    """
+    def __init__(self, path: str, shape: tuple = None, dtype=complex, decimals: int = 6):
+        """
+        Constructor for MatrixWriter
+        :param path: Destination file
+        :param shape: Full matrix shape, required for .npy output
+        :param dtype: Data type for .npy output
+        :param decimals: Number of decimals for csv output
+        """
+        self.path = resolve_path(path)
+        self.binary = self.path.endswith(".npy")
+        self.shape = shape
+        self.dtype = dtype
+        self.decimals = decimals
+        self.row = 0  # next row to be written
+        self.file = None
+
+        if self.binary and shape is None:
+            raise ValueError("shape must be given when streaming to a .npy file")
+
+
+    def __enter__(self):
+        folder = os.path.dirname(self.path)
+        if folder != "":
+            os.makedirs(folder, exist_ok=True)
+
+        if self.binary:
+            self.file = np.lib.format.open_memmap(self.path, mode="w+", dtype=self.dtype, shape=self.shape)
+        else:
+            self.file = open(self.path, "w", newline="")
+        return self
+
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+    def write(self, rows):
+        """
+        Appends a block of rows to the file.
+        :param rows: 2D array-like holding the next rows of the matrix
+        :return:
+        """
+        rows = np.atleast_2d(rows)
+        if self.binary:
+            self.file[self.row:self.row+rows.shape[0]] = rows
+        else:
+            self.file.write(self.format_rows(rows))
+        self.row += rows.shape[0]
+
+
+    def format_rows(self, rows):
+        """
+        Formats a block of rows as csv text in one operation.
+        :param rows: 2D array
+        :return: str
+        """
+        n, m = rows.shape
+        if np.iscomplexobj(rows):
+            cell = f"%.{self.decimals}f%+.{self.decimals}fj"
+            values = np.empty((n, 2*m))
+            values[:, 0::2] = rows.real
+            values[:, 1::2] = rows.imag
+        else:
+            cell = f"%.{self.decimals}f"
+            values = rows.astype(float)
+
+        line = ",".join([cell]*m) + "\n"
+        return (line*n) % tuple(values.ravel())
+
+
+    def close(self):
+        """
+        Flushes and closes the file.
+        :return:
+        """
+        if self.file is None:
+            return
+
+        if self.binary:
+            self.file.flush()
+            del self.file
+        else:
+            self.file.close()
+        self.file = None
+
+
+# validation tests
+if __name__ == '__main__':
+    import tempfile
+    import time
+
+    Ybus = read_complex_excel(r"Excel_Files\SevenBus\7bus_Ybus_matrix.xlsx")
+    print(Ybus)
+
+    N = 2000
+    rng = np.random.default_rng(0)
+    data = rng.standard_normal((N, N)) + 1j*rng.standard_normal((N, N))
+    with tempfile.TemporaryDirectory() as folder:
+        start = time.perf_counter()
+        write_complex_csv(data, os.path.join(folder, "matrix.csv"))
+        print(f"csv write {N}x{N}: {time.perf_counter()-start:.3f} s")
+
+        start = time.perf_counter()
+        back = read_complex_csv(os.path.join(folder, "matrix.csv"))
+        print(f"csv read {N}x{N}: {time.perf_counter()-start:.3f} s, max error = {np.max(np.abs(back-data)):.2e}")
+
+        start = time.perf_counter()
+        with MatrixWriter(os.path.join(folder, "matrix.npy"), shape=data.shape) as writer:
+            for i in range(0, N, 500):
+                writer.write(data[i:i+500])
+        print(f"npy streamed write {N}x{N}: {time.perf_counter()-start:.3f} s, "
+              f"exact = {np.array_equal(load_matrix(os.path.join(folder, 'matrix.npy')), data)}")
@@ -0,0 +1,299 @@
+"""
+Module for network reduction: Kron reduced and Ward equivalent circuits of a study area
+
+Filename: NetworkReduction.py
+Author: Justin Lipner, Bailey Stout
+Date: 2026-10-19
+"""
+
+import copy
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import splu
+from Circuit import Circuit
+from Component import Generator
+
+
+def kron_reduce(Ybus, retained, boundary=None):
+    """
+    Eliminates every bus that is not retained: Yred = Yrr - Yre Yee^-1 Yer. Only the retained buses connected
+    to the eliminated ones (the boundary) change, so only their columns are solved for.
+    :param Ybus: Admittance matrix, dense or sparse
+    :param retained: Zero based indexes of the retained buses
+    :param boundary: Positions in retained of the boundary buses, found from Ybus if not given
+    :return: np.ndarray, admittance matrix of the retained buses
+    """
+    Ybus = sparse.csr_matrix(Ybus)
+    retained = np.asarray(retained, dtype=int)
+    external = np.setdiff1d(np.arange(Ybus.shape[0]), retained)
+    Yrr = Ybus[retained][:, retained].toarray()
+    if len(external) == 0:
+        return Yrr
+
+    Yre = Ybus[retained][:, external]
+    Yer = Ybus[external][:, retained]
+    if boundary is None:
+        boundary = np.flatnonzero(np.asarray(abs(Yre).sum(axis=1)).ravel())
+
+    Yee = Ybus[external][:, external].tocsc()
+    X = splu(Yee).solve(Yer[:, boundary].toarray())
+    Yrr[np.ix_(boundary, boundary)] -= Yre[boundary] @ X
+    return Yrr
+
+
+class NetworkReduction:
+    """
+    Reduces a circuit to a set of retained buses. The Ward equivalent is for power flow: the external network
+    is replaced by equivalent admittances and its injections are moved to the boundary buses. The fault
+    equivalent also folds the external generators and loads into the admittances, as the fault studies model
+    them. Both are ordinary circuits, so the existing solvers and fault classes accept them.
+    """
+    def __init__(self, circuit: Circuit, retained: list[str]):
+        """
+        Constructor for NetworkReduction
+        :param circuit: Circuit to reduce
+        :param retained: Names of the buses in the study area
+        """
+        missing = [bus for bus in retained if bus not in circuit.buses]
+        if len(missing) != 0:
+            raise ValueError(f"{missing[:5]} are not buses of {circuit.name}")
+
+        self.circuit = circuit
+        with circuit.lock:
+            self.Ybus = circuit.get_Ybus_sparse()
+            self.retained = np.sort([circuit.buses[bus].index-1 for bus in set(retained)])
+        names = {bus.index-1: name for name, bus in circuit.buses.items()}
+        self.buses = [names[i] for i in self.retained]
+        self.external = np.setdiff1d(np.arange(circuit.count), self.retained)
+
+        Yre = self.Ybus[self.retained][:, self.external]
+        self.boundary = np.flatnonzero(np.asarray(abs(Yre).sum(axis=1)).ravel())  # positions in self.retained
+
+
+    def calc_voltages(self):
+        """
+        Bus voltages the equivalent is built around: the last power flow solution, or a flat profile.
+        :return: np.ndarray of complex
+        """
+        voltages = self.circuit.voltages
+        if voltages is None or len(voltages) != self.circuit.count:
+            return np.ones(self.circuit.count, dtype=complex)
+        return np.asarray(voltages, dtype=complex)
+
+
+    def calc_ward_injections(self):
+        """
+        Power injections that move the external network's currents onto the boundary buses. Around a solved
+        case the external currents come from the solution and the reduced case reproduces it; otherwise the
+        external injections are converted to currents at flat voltage, the classical Ward equivalent.
+        :return: np.ndarray of complex pu injections at the retained buses
+        """
+        V = self.calc_voltages()
+        if self.circuit.voltages is None:
+            S = np.array([bus.real_power + 1j*bus.reactive_power for bus in self.circuit.buses.values()])/self.circuit.powerbase
+            index = np.array([bus.index-1 for bus in self.circuit.buses.values()])
+            I = np.zeros(self.circuit.count, dtype=complex)
+            I[index] = np.conj(S)
+        else:
+            I = self.Ybus @ V
+
+        Ie = I[self.external]
+        if len(Ie) == 0:
+            return np.zeros(len(self.retained), dtype=complex)
+        Yee = self.Ybus[self.external][:, self.external].tocsc()
+        dI = self.Ybus[self.retained][:, self.external] @ splu(Yee).solve(Ie)
+        return -V[self.retained]*np.conj(dI)
+
+
+    def calc_fault_shunts(self):
+        """
+        Admittances the fault studies add for generators and loads (constant impedance at the solved voltage),
+        matching ThreePhaseFault and UnsymmetricalFaults.
+        :return: (positive, zero, negative sequence) np.ndarray of pu shunt admittances per bus
+        """
+        return self.circuit.calc_fault_shunts()
+
+
+    def build_circuit(self, name: str, Yred, Yred0, Yred2, injections, fault: bool):
+        """
+        Builds a circuit of the retained buses. Retained generators and loads are copied, and the reduced
+        admittance matrix becomes series and shunt equivalents.
+        :param name: Name of the new circuit
+        :param Yred: Positive sequence reduced admittance matrix
+        :param Yred0: Zero sequence reduced admittance matrix
+        :param Yred2: Negative sequence reduced admittance matrix
+        :param injections: Complex pu power added at each retained bus
+        :param fault: The machines and loads that the fault studies add back are left out of Yred
+        :return: Circuit
+        """
+        circuit = self.circuit
+        sub = Circuit(name, circuit.settings)
+        sub.add_buses(self.buses, [circuit.buses[bus].base_kv/1e3 for bus in self.buses])
+        for k, bus in enumerate(self.buses):
+            original = circuit.buses[bus]
+            sub.buses[bus].real_power = original.real_power + injections[k].real*circuit.powerbase
+            sub.buses[bus].reactive_power = original.reactive_power + injections[k].imag*circuit.powerbase
+            sub.buses[bus].set_bus_v(original.Vpu)
+            sub.buses[bus].set_angle(original.angle)
+
+        retained = set(self.buses)
+        sub.loads = {name: copy.copy(load) for name, load in circuit.loads.items() if load.bus in retained}
+        sub.generators = {name: copy.copy(gen) for name, gen in circuit.generators.items() if gen.bus in retained}
+
+        if fault:  # the fault classes add these admittances back for the retained buses
+            shunts, shunts0, shunts2 = self.calc_fault_shunts()
+            Yred = Yred - np.diag(shunts[self.retained])
+            Yred0 = Yred0 - np.diag(shunts0[self.retained])
+            Yred2 = Yred2 - np.diag(shunts2[self.retained])
+
+        rows, cols = np.nonzero(np.triu(np.abs(Yred) + np.abs(Yred0) + np.abs(Yred2) > 1e-12, k=1))
+        names = [f"Eq_{self.buses[i]}_{self.buses[j]}" for i, j in zip(rows, cols)]
+        zeros = np.zeros(len(rows))
+        y = np.column_stack((zeros, Yred[rows, cols], Yred[cols, rows], zeros))
+        y0 = np.column_stack((zeros, Yred0[rows, cols], Yred0[cols, rows], zeros))
+        y2 = np.column_stack((zeros, Yred2[rows, cols], Yred2[cols, rows], zeros))
+
+        # whatever the series equivalents don't account for on the diagonal is a shunt
+        keep = np.flatnonzero(np.abs(np.diag(Yred)) + np.abs(np.diag(Yred0)) + np.abs(np.diag(Yred2)) > 1e-12)
+        names += [f"Eq_{self.buses[i]}" for i in keep]
+        shunts = [np.zeros((len(keep), 4), dtype=complex) for Y in [Yred, Yred0, Yred2]]
+        for shunt, Y in zip(shunts, [Yred, Yred0, Yred2]):
+            shunt[:, 0] = np.diag(Y)[keep]
+        buses1 = [self.buses[i] for i in np.concatenate((rows, keep))]
+        buses2 = [self.buses[i] for i in np.concatenate((cols, keep))]
+        sub.add_equivalents(names, buses1, buses2, np.vstack((y, shunts[0])), np.vstack((y0, shunts[1])), np.vstack((y2, shunts[2])))
+
+        slack = circuit.slack_bus if circuit.slack_bus in retained else None
+        if slack is None and not fault and len(self.boundary) != 0:
+            # the external slack's output is now a boundary injection, so a boundary bus holds the angle reference
+            slack = self.buses[self.boundary[np.argmax(np.abs(injections[self.boundary]))]]
+            sub.generators[f"{slack}_equivalent"] = Generator(f"{slack}_equivalent", slack, circuit.buses[slack].Vpu, 0.0,
+                                                              mva_base=circuit.powerbase/1e6, settings=circuit.settings)
+
+        gen_buses = {gen.bus for gen in sub.generators.values()}
+        for bus in sub.buses.values():
+            bus.type = "Slack" if bus.name == slack else "PV" if bus.name in gen_buses else "PQ"
+        sub.slack_bus = slack
+        sub.slack_index = sub.buses[slack].index if slack is not None else int
+        sub.pv_indexes = [bus.index for bus in sub.buses.values() if bus.type == "PV"]
+        sub.pq_indexes = [bus.index for bus in sub.buses.values() if bus.type == "PQ"]
+
+        V = self.calc_voltages()[self.retained]
+        sub.voltages = V
+        sub.get_Ybus()
+        return sub
+
+
+    def calc_zero_sequence_Ybus(self):
+        """
+        Zero sequence admittance matrix of the full circuit, without generator grounding.
+        :return: scipy.sparse.csr_matrix
+        """
+        branches = self.circuit.calc_branch_arrays(0)
+        rows = np.concatenate((branches["from"], branches["from"], branches["to"], branches["to"]))
+        cols = np.concatenate((branches["from"], branches["to"], branches["from"], branches["to"]))
+        values = np.concatenate((branches["yff"], branches["yft"], branches["ytf"], branches["ytt"]))
+        return sparse.csr_matrix((values, (rows, cols)), shape=(self.circuit.count, self.circuit.count))
+
+
+    def ward_equivalent(self):
+        """
+        Power flow equivalent of the retained buses.
+        :return: Circuit
+        """
+        Yred = kron_reduce(self.Ybus, self.retained, self.boundary)
+        return self.build_circuit(f"{self.circuit.name} Ward equivalent", Yred, np.zeros_like(Yred), Yred,
+                                  self.calc_ward_injections(), False)
+
+
+    def fault_equivalent(self):
+        """
+        Fault study equivalent of the retained buses. The external generators and loads are folded into each
+        sequence network before reduction, so fault currents at retained buses match the full circuit. Prefault
+        voltages are taken from the full circuit's last power flow.
+        :return: Circuit
+        """
+        shunts, shunts0, shunts2 = self.calc_fault_shunts()
+        Y = self.Ybus + sparse.diags(shunts)
+        Y0 = self.calc_zero_sequence_Ybus() + sparse.diags(shunts0)
+        Y2 = self.Ybus + sparse.diags(shunts2)
+
+        # buses with no zero sequence path at all don't affect the other buses and would make Yee singular
+        grounded = np.flatnonzero(np.asarray(abs(Y0).sum(axis=1)).ravel())
+        retained0 = np.intersect1d(grounded, self.retained)
+        Yred0 = np.zeros((len(self.retained), len(self.retained)), dtype=complex)
+        position = np.searchsorted(self.retained, retained0)
+        Yred0[np.ix_(position, position)] = kron_reduce(Y0[grounded][:, grounded], np.searchsorted(grounded, retained0))
+
+        return self.build_circuit(f"{self.circuit.name} fault equivalent", kron_reduce(Y, self.retained), Yred0,
+                                  kron_reduce(Y2, self.retained), np.zeros(len(self.retained), dtype=complex), True)
+
+
+# validation tests
+if __name__ == '__main__':
+    import io
+    import time
+    import contextlib
+    from Circuit import ThreePhaseFault, UnsymmetricalFaults
+    from Validations import CreateSevenPowerBusSystem, CreateSyntheticCase
+    from CaseImporter import import_case
+
+    def quiet(function, *args):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return function(*args)
+
+    print("***7 bus system reduced to buses 2 to 6***")
+    circ = CreateSevenPowerBusSystem()
+    quiet(circ.do_newton_raph)
+    retained = ["bus2", "bus3", "bus4", "bus5", "bus6"]
+    reduction = NetworkReduction(circ, retained)
+    ward = reduction.ward_equivalent()
+    quiet(ward.do_newton_raph)
+    full_V = circ.voltages[reduction.retained]
+    print("Ward equivalent voltage difference:", np.max(np.abs(np.abs(ward.voltages) - np.abs(full_V))))
+
+    fault = reduction.fault_equivalent()
+    largest = 0
+    for bus in retained:
+        full = ThreePhaseFault(circ, circ.buses[bus].index)
+        reduced = ThreePhaseFault(fault, fault.buses[bus].index)
+        quiet(full.calc_fault_values)
+        quiet(reduced.calc_fault_values)
+        full_slg = UnsymmetricalFaults(circ, circ.buses[bus].index)
+        reduced_slg = UnsymmetricalFaults(fault, fault.buses[bus].index)
+        quiet(full_slg.SLG_fault_values)
+        quiet(reduced_slg.SLG_fault_values)
+        print(f"{bus}: three phase {abs(full.Ifn):.4f} / {abs(reduced.Ifn):.4f} pu, "
+              f"SLG {abs(full_slg.Ifn):.4f} / {abs(reduced_slg.Ifn):.4f} pu (full / reduced)")
+        largest = max(largest, abs(full.Ifn - reduced.Ifn), abs(full_slg.Ifn - reduced_slg.Ifn))
+    print("Largest fault current difference, full vs reduced:", largest)
+    if largest > 1e-6:
+        print("WARNING: the fault equivalent does not reproduce the full circuit's fault currents.")
+    print()
+
+    print("***case14 reduced to buses 6 to 14, slack outside the study area***")
+    circ = import_case("Case_Files/case14.m")
+    quiet(circ.do_newton_raph)
+    retained = [f"bus{i}" for i in range(6, 15)]
+    reduction = NetworkReduction(circ, retained)
+    ward = reduction.ward_equivalent()
+    quiet(ward.do_newton_raph)
+    print(f"{len(ward.equivalents)} equivalents, slack {ward.slack_bus}")
+    print("Ward equivalent voltage difference:", np.max(np.abs(np.abs(ward.voltages) - np.abs(circ.voltages[reduction.retained]))))
+    print()
+
+    circ = CreateSyntheticCase(10000)
+
+    print("***synthetic 10000 bus grid reduced to a 20 x 20 study area***")
+    start = time.perf_counter()
+    quiet(circ.do_newton_raph, False, True)
+    print(f"full sparse Newton-Raphson: {time.perf_counter()-start:.3f} s")
+    retained = [f"bus{100*row + column + 1}" for row in range(40, 60) for column in range(40, 60)]
+    start = time.perf_counter()
+    ward = NetworkReduction(circ, retained).ward_equivalent()
+    reduce_time = time.perf_counter() - start
+    start = time.perf_counter()
+    quiet(ward.do_newton_raph, False, True)
+    print(f"reduction to {ward.count} buses: {reduce_time:.3f} s, reduced Newton-Raphson: {time.perf_counter()-start:.3f} s")
+    full_V = np.array([circ.voltages[circ.buses[bus].index-1] for bus in ward.buses])
+    print("Ward equivalent voltage difference:", np.max(np.abs(np.abs(ward.voltages) - np.abs(full_V))))
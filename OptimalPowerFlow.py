@@ -0,0 +1,506 @@
+"""
+Module for optimal power flow: generator dispatch at least cost with DC and AC network models
+
+Filename: OptimalPowerFlow.py
+Author: Justin Lipner, Bailey Stout
+Date: 2026-10-19
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.linalg import splu
+from Circuit import Circuit
+from Solution import calc_dS_dV
+from BranchResults import BranchResults, calc_branch_matrices, calc_dSbr_dV
+
+
+def interior_point(evaluate, hessian, x0, lam0=None, mu0=None, tolerance: float = 1e-6, max_iterations: int = 150):
+    """
+    Primal-dual interior point method for min f(x) subject to g(x) = 0 and h(x) <= 0. Each step solves
+    the sparse KKT system once. Multipliers from an earlier solve may be given to warm start.
+    :param evaluate: Function x -> (f, df, g, dg, h, dh) with dg and dh sparse
+    :param hessian: Function (x, lam, mu) -> sparse Hessian of the Lagrangian
+    :param x0: Starting point
+    :param lam0: Starting equality multipliers
+    :param mu0: Starting inequality multipliers
+    :param tolerance: Feasibility, gradient, complementarity and cost tolerance
+    :param max_iterations: Iterations before giving up
+    :return: dict with x, f, lam, mu, z, iterations and converged
+    """
+    xi = 0.99995  # fraction of the step to the boundary
+    sigma = 0.1  # centering parameter
+    x = np.array(x0, dtype=float)
+    f, df, g, dg, h, dh = evaluate(x)
+    niq = len(h)
+
+    if mu0 is None:
+        z = np.maximum(-h, 1.0)
+        mu = np.maximum(1.0/z, 1.0) if niq else np.zeros(0)
+        gamma = 1.0
+    else:  # warm start: keep the slacks near the active constraints and the old multipliers
+        z = np.maximum(-h, 1e-5)
+        mu = np.maximum(mu0, 1e-10)
+        gamma = sigma*(z @ mu)/max(niq, 1)
+    lam = np.zeros(len(g)) if lam0 is None else np.array(lam0, dtype=float)
+
+    converged = False
+    iterations = 0
+    for iterations in range(max_iterations+1):
+        Lx = df + dg.T @ lam + dh.T @ mu
+        feascond = max(np.max(np.abs(g), initial=0), np.max(h, initial=0))/(1 + max(np.max(np.abs(x)), np.max(z, initial=0)))
+        gradcond = np.max(np.abs(Lx))/(1 + max(np.max(np.abs(lam), initial=0), np.max(mu, initial=0)))
+        compcond = (z @ mu)/(1 + np.max(np.abs(x)))
+        if iterations > 0:
+            costcond = abs(f - f_old)/(1 + abs(f_old))
+            if max(feascond, gradcond, compcond, costcond) < tolerance:
+                converged = True
+                break
+        if iterations == max_iterations or not np.all(np.isfinite(x)):
+            break
+
+        dh_zinv = dh.T @ sparse.diags(1/z)
+        M = hessian(x, lam, mu) + dh_zinv @ sparse.diags(mu) @ dh
+        N = Lx + dh_zinv @ (mu*h + gamma)
+        KKT = sparse.bmat([[M, dg.T], [dg, None]], format="csc")
+        step = splu(KKT).solve(-np.concatenate((N, g)))
+        dx, dlam = step[:len(x)], step[len(x):]
+        dz = -h - z - dh @ dx
+        dmu = -mu + (gamma - mu*dz)/z
+
+        alphap = min(xi*np.min(-z[dz < 0]/dz[dz < 0], initial=np.inf), 1.0)
+        alphad = min(xi*np.min(-mu[dmu < 0]/dmu[dmu < 0], initial=np.inf), 1.0)
+        x = x + alphap*dx
+        z = z + alphap*dz
+        lam = lam + alphad*dlam
+        mu = mu + alphad*dmu
+        if niq:
+            gamma = sigma*(z @ mu)/niq
+
+        f_old = f
+        f, df, g, dg, h, dh = evaluate(x)
+
+    return {"x": x, "f": f, "lam": lam, "mu": mu, "z": z, "iterations": iterations, "converged": converged}
+
+
+def d2Sbus_dV2(Ybus, V, lam):
+    """
+    Second derivatives of lam times the bus power injections, with respect to the voltage angles and magnitudes
+    :param Ybus: Sparse admittance matrix
+    :param V: Complex bus voltages
+    :param lam: Multiplier of each bus
+    :return: (Gaa, Gav, Gva, Gvv) complex scipy.sparse matrices
+    """
+    Ibus = Ybus @ V
+    diagV = sparse.diags(V)
+    A = sparse.diags(lam*V)
+    B = Ybus @ diagV
+    C = A @ B.conj()
+    D = Ybus.conj().T @ diagV
+    E = diagV.conj() @ (D @ sparse.diags(lam) - sparse.diags(D @ lam))
+    F = C - A @ sparse.diags(Ibus.conj())
+    G = sparse.diags(1/np.abs(V))
+    Gaa = E + F
+    Gva = 1j*G @ (E - F)
+    return Gaa, Gva.T, Gva, G @ (C + C.T) @ G
+
+
+def d2Sbr_dV2(Cbr, Ybr, V, lam):
+    """
+    Second derivatives of lam times the branch end powers, with respect to the voltage angles and magnitudes
+    :param Cbr: Sparse incidence of the branch end buses
+    :param Ybr: Sparse branch end admittances, so that Ybr V is the branch end current
+    :param V: Complex bus voltages
+    :param lam: Multiplier of each branch
+    :return: (Haa, Hav, Hva, Hvv) complex scipy.sparse matrices
+    """
+    diagV = sparse.diags(V)
+    A = Ybr.conj().T @ sparse.diags(lam) @ Cbr
+    B = diagV.conj() @ A @ diagV
+    D = sparse.diags((A @ V)*V.conj())
+    E = sparse.diags((A.T @ V.conj())*V)
+    F = B + B.T
+    G = sparse.diags(1/np.abs(V))
+    Hva = 1j*G @ (B - B.T - D + E)
+    return F - D - E, Hva.T, Hva, G @ F @ G
+
+
+class OptimalPowerFlow:
+    """
+    Optimal power flow on a circuit's network model. solve_dc dispatches the generators with a lossless
+    DC network, a quadratic program, and solve_ac with the full AC power flow equations, voltage limits
+    and generator VAR limits. Both use the same interior point method on sparse matrices and limit the
+    power flow through rated lines and transformers. Each solve starts from the last solution of the
+    same kind, or from the circuit's last power flow, so re-dispatch after small load changes takes
+    few iterations.
+    """
+    def __init__(self, circuit: Circuit, vmin=0.94, vmax=1.06, limits: dict = None, tolerance: float = 1e-6,
+                 cost_scale: float = 1e-4):
+        """
+        Constructor for OptimalPowerFlow
+        :param circuit: Circuit to dispatch, with generator costs and limits set
+        :param vmin: Lowest bus voltage in pu, one value or one per bus
+        :param vmax: Highest bus voltage in pu, one value or one per bus
+        :param limits: Line and transformer name -> MVA limit, overriding the conductor and transformer ratings
+        :param tolerance: Interior point tolerance
+        :param cost_scale: Scale applied to the cost in $/h inside the interior point method
+        """
+        self.circuit = circuit
+        self.tolerance = tolerance
+        self.cost_scale = cost_scale
+        with circuit.lock:
+            self.Ybus = circuit.get_Ybus_sparse()
+            self.count = circuit.count
+            self.powerbase = circuit.powerbase
+            self.slack_index = circuit.slack_index-1
+            self.buses = [bus.name for bus in sorted(circuit.buses.values(), key=lambda bus: bus.index)]
+            branches = circuit.calc_branch_arrays()
+            results = BranchResults(circuit)
+
+            generators = list(circuit.generators.values())
+            self.generators = [gen.name for gen in generators]
+            self.gen_buses = np.array([circuit.buses[gen.bus].index-1 for gen in generators], dtype=int)
+            self.c2, self.c1, self.c0 = np.array([gen.cost for gen in generators], dtype=float).reshape(-1, 3).T
+            self.p_min = np.array([gen.p_min for gen in generators], dtype=float)/self.powerbase
+            self.p_max = np.array([gen.p_max for gen in generators], dtype=float)/self.powerbase
+            self.q_min = np.array([gen.var_min for gen in generators], dtype=float)/self.powerbase
+            self.q_max = np.array([gen.var_limit for gen in generators], dtype=float)/self.powerbase
+
+        ng = len(self.generators)
+        self.Cg = sparse.csr_matrix((np.ones(ng), (self.gen_buses, np.arange(ng))), shape=(self.count, ng))
+        self.vmin = np.broadcast_to(np.asarray(vmin, dtype=float), self.count)
+        self.vmax = np.broadcast_to(np.asarray(vmax, dtype=float), self.count)
+
+        # MVA limits of the rated lines and transformers, from the ratings at the from end
+        rating = np.sqrt(3)*results.rating_from*results.powerbase/results.base_current_from
+        rating = pd.Series(rating, index=results.names)
+        if limits is not None:
+            rating.update(pd.Series(limits, dtype=float))
+        limited = np.flatnonzero(np.isfinite(rating.to_numpy()) & (rating.to_numpy() > 0))
+        self.limited = results.names[limited]
+        self.s_max = rating.to_numpy()[limited]*1e6/self.powerbase
+        self.Cf, self.Ct, self.Yf, self.Yt = calc_branch_matrices({key: value[limited] for key, value in results.branches.items()},
+                                                                  self.count)
+
+        # the DC model keeps the series susceptance of every branch
+        series = branches["from"] != branches["to"]
+        b = branches["yft"][series].imag  # 1/x of each series branch
+        C = sparse.csr_matrix((np.concatenate((np.ones(series.sum()), -np.ones(series.sum()))),
+                               (np.tile(np.arange(series.sum()), 2), np.concatenate((branches["from"][series], branches["to"][series])))),
+                              shape=(series.sum(), self.count))
+        self.Bbus = (C.T @ sparse.diags(b) @ C).tocsr()
+        self.Bf = (self.Cf - self.Ct).multiply(results.branches["yft"][limited].imag[:, None]).tocsr()
+
+        self.loads = None
+        self.last = {"ac": None, "dc": None}  # interior point results of the last solves
+        self.converged = None
+        self.iterations = 0
+        self.cost = None
+        self.dispatch = None
+        self.lmp = None
+        self.voltages = None
+
+
+    def calc_loads(self):
+        """
+        Reads the present loads from the circuit and sums them per bus.
+        :return: np.ndarray of complex pu loads
+        """
+        with self.circuit.lock:
+            loads = list(self.circuit.loads.values())
+            index = np.array([self.circuit.buses[load.bus].index-1 for load in loads], dtype=int)
+            S = np.array([load.real_power + 1j*load.reactive_power for load in loads], dtype=complex)
+        Sd = np.zeros(self.count, dtype=complex)
+        np.add.at(Sd, index, S)
+        return Sd/self.powerbase
+
+
+    def calc_cost(self, Pg):
+        """
+        Scaled cost and its first and second derivatives with respect to the pu generator outputs
+        :param Pg: Generator real power in pu
+        :return: (f, df, d2f)
+        """
+        P = Pg*self.powerbase/1e6
+        base = self.powerbase/1e6
+        f = np.sum(self.c2*P**2 + self.c1*P + self.c0)
+        return self.cost_scale*f, self.cost_scale*(2*self.c2*P + self.c1)*base, self.cost_scale*2*self.c2*base**2
+
+
+    def calc_bounds(self, lower, upper, offset: int, n: int):
+        """
+        Linear inequality rows for the finite variable limits
+        :param lower: Lower limits of a block of variables
+        :param upper: Upper limits of a block of variables
+        :param offset: Position of the block in x
+        :param n: Length of x
+        :return: (A, b) so that A x <= b
+        """
+        low = np.flatnonzero(np.isfinite(lower))
+        high = np.flatnonzero(np.isfinite(upper))
+        columns = np.concatenate((high, low)) + offset
+        values = np.concatenate((np.ones(len(high)), -np.ones(len(low))))
+        A = sparse.csr_matrix((values, (np.arange(len(columns)), columns)), shape=(len(columns), n))
+        return A, np.concatenate((upper[high], -lower[low]))
+
+
+    def start_point(self, kind: str, warm_start: bool):
+        """
+        Starting point of a solve: the last solution of the same kind, else the circuit's last power flow
+        and present dispatch, else a flat start at the generator voltages.
+        :param kind: "ac" or "dc"
+        :param warm_start: Use the last solution
+        :return: (x, lam, mu)
+        """
+        if warm_start and self.last[kind] is not None:
+            last = self.last[kind]
+            return last["x"], last["lam"], last["mu"]
+
+        with self.circuit.lock:
+            results = self.circuit.bus_results
+            if "Vpu" in results:
+                Va, Vm = np.array(results["angle"], dtype=float), np.array(results["Vpu"], dtype=float)
+            else:
+                Va, Vm = np.zeros(self.count), np.ones(self.count)
+                Vm[self.gen_buses] = [self.circuit.generators[name].voltage for name in self.generators]
+            Pg = np.array([self.circuit.generators[name].real_power for name in self.generators])/self.powerbase
+            Qg = np.array([self.circuit.generators[name].reactive_power for name in self.generators])/self.powerbase
+        Pg = np.clip(Pg, self.p_min, self.p_max)
+        if kind == "dc":
+            return np.concatenate((Va, Pg)), None, None
+        Vm = np.clip(Vm, self.vmin, self.vmax)
+        return np.concatenate((Va, Vm, Pg, np.clip(Qg, self.q_min, self.q_max))), None, None
+
+
+    def solve_dc(self, warm_start: bool = True, max_iterations: int = 150):
+        """
+        DC optimal power flow: x = [angles, generator real power], losses and reactive power are ignored.
+        :param warm_start: Start from the last DC solution
+        :param max_iterations: Interior point iterations before giving up
+        :return: bool, True if converged
+        """
+        nb, ng, nl = self.count, len(self.generators), len(self.limited)
+        n = nb + ng
+        Pd = self.calc_loads().real
+        dg = sparse.vstack([sparse.hstack([self.Bbus, -self.Cg]),
+                            sparse.csr_matrix(([1.0], ([0], [self.slack_index])), shape=(1, n))], format="csr")
+        A, b = self.calc_bounds(self.p_min, self.p_max, nb, n)
+        Af = sparse.hstack([self.Bf, sparse.csr_matrix((nl, ng))])
+        dh = sparse.vstack([Af, -Af, A], format="csr")
+        limit = np.concatenate((self.s_max, self.s_max, b))
+
+        def evaluate(x):
+            f, df, _ = self.calc_cost(x[nb:])
+            g = np.concatenate((dg[:nb] @ x + Pd, [x[self.slack_index]]))
+            return f, np.concatenate((np.zeros(nb), df)), g, dg, dh @ x - limit, dh
+
+        def hessian(x, lam, mu):
+            return sparse.diags(np.concatenate((np.zeros(nb), self.calc_cost(x[nb:])[2])), format="csr")
+
+        x0, lam0, mu0 = self.start_point("dc", warm_start)
+        result = interior_point(evaluate, hessian, x0, lam0, mu0, self.tolerance, max_iterations)
+        self.last["dc"] = result
+        x = result["x"]
+        self.set_results(result, x[nb:], np.zeros(ng), None, result["lam"][:nb])
+        return result["converged"]
+
+
+    def evaluate_ac(self, x, Sd):
+        """
+        AC cost, power balance and branch flow limits with their derivatives
+        :param x: [angles, magnitudes, generator real power, generator reactive power]
+        :param Sd: Complex bus loads
+        :return: (f, df, g, dg, h, dh)
+        """
+        nb, ng = self.count, len(self.generators)
+        n = 2*nb + 2*ng
+        V = x[nb:2*nb]*np.exp(1j*x[:nb])
+        Sg = x[2*nb:2*nb+ng] + 1j*x[2*nb+ng:]
+
+        f, dfP, _ = self.calc_cost(x[2*nb:2*nb+ng])
+        df = np.zeros(n)
+        df[2*nb:2*nb+ng] = dfP
+
+        mismatch = V*np.conj(self.Ybus @ V) + Sd - self.Cg @ Sg
+        g = np.concatenate((mismatch.real, mismatch.imag, [x[self.slack_index]]))
+        dS_dVa, dS_dVm = calc_dS_dV(self.Ybus, V)
+        dg = sparse.vstack([sparse.bmat([[dS_dVa.real, dS_dVm.real, -self.Cg, None],
+                                         [dS_dVa.imag, dS_dVm.imag, None, -self.Cg]]),
+                            sparse.csr_matrix(([1.0], ([0], [self.slack_index])), shape=(1, n))], format="csr")
+
+        flows = self.calc_branch_derivatives(V)
+        h = [np.abs(S)**2 - self.s_max**2 for S, _, _ in flows]
+        dh = [sparse.hstack([2*(sparse.diags(S.real) @ dSa.real + sparse.diags(S.imag) @ dSa.imag),
+                             2*(sparse.diags(S.real) @ dSm.real + sparse.diags(S.imag) @ dSm.imag),
+                             sparse.csr_matrix((len(S), 2*ng))]) for S, dSa, dSm in flows]
+        A, b = self.bounds
+        h = np.concatenate(h + [A @ x - b])
+        dh = sparse.vstack(dh + [A], format="csr")
+        return f, df, g, dg, h, dh
+
+
+    def calc_branch_derivatives(self, V):
+        """
+        Power at both ends of the limited branches and its derivatives with respect to the voltage angles and magnitudes
+        :param V: Complex bus voltages
+        :return: [(Sf, dSf/dangle, dSf/dmagnitude), (St, dSt/dangle, dSt/dmagnitude)]
+        """
+        return [calc_dSbr_dV(self.Cf, self.Yf, V), calc_dSbr_dV(self.Ct, self.Yt, V)]
+
+
+    def hessian_ac(self, x, lam, mu):
+        """
+        Hessian of the AC Lagrangian
+        :param x: [angles, magnitudes, generator real power, generator reactive power]
+        :param lam: Power balance multipliers
+        :param mu: Inequality multipliers, branch limits first
+        :return: scipy.sparse.csr_matrix
+        """
+        nb, ng, nl = self.count, len(self.generators), len(self.limited)
+        V = x[nb:2*nb]*np.exp(1j*x[:nb])
+
+        P = d2Sbus_dV2(self.Ybus, V, lam[:nb])
+        Q = d2Sbus_dV2(self.Ybus, V, lam[nb:2*nb])
+        H = [p.real + q.imag for p, q in zip(P, Q)]
+
+        if nl:
+            for (S, dSa, dSm), (C, Y), m in zip(self.calc_branch_derivatives(V), [(self.Cf, self.Yf), (self.Ct, self.Yt)],
+                                                 [mu[:nl], mu[nl:2*nl]]):
+                diagmu = sparse.diags(m)
+                Saa, Sav, Sva, Svv = d2Sbr_dV2(C, Y, V, S.conj()*m)
+                H[0] = H[0] + 2*(Saa + dSa.T @ diagmu @ dSa.conj()).real
+                H[1] = H[1] + 2*(Sav + dSa.T @ diagmu @ dSm.conj()).real
+                H[2] = H[2] + 2*(Sva + dSm.T @ diagmu @ dSa.conj()).real
+                H[3] = H[3] + 2*(Svv + dSm.T @ diagmu @ dSm.conj()).real
+
+        cost = sparse.diags(np.concatenate((self.calc_cost(x[2*nb:2*nb+ng])[2], np.zeros(ng))))
+        return sparse.bmat([[H[0], H[1], None], [H[2], H[3], None], [None, None, cost]], format="csr")
+
+
+    def solve_ac(self, warm_start: bool = True, max_iterations: int = 150):
+        """
+        AC optimal power flow: x = [angles, magnitudes, generator real power, generator reactive power].
+        :param warm_start: Start from the last AC solution
+        :param max_iterations: Interior point iterations before giving up
+        :return: bool, True if converged
+        """
+        nb, ng = self.count, len(self.generators)
+        n = 2*nb + 2*ng
+        Sd = self.calc_loads()
+        bounds = [self.calc_bounds(low, high, offset, n) for low, high, offset in
+                  [(self.vmin, self.vmax, nb), (self.p_min, self.p_max, 2*nb), (self.q_min, self.q_max, 2*nb+ng)]]
+        self.bounds = (sparse.vstack([A for A, _ in bounds], format="csr"), np.concatenate([b for _, b in bounds]))
+
+        x0, lam0, mu0 = self.start_point("ac", warm_start)
+        result = interior_point(lambda x: self.evaluate_ac(x, Sd), self.hessian_ac, x0, lam0, mu0,
+                                self.tolerance, max_iterations)
+        self.last["ac"] = result
+        x = result["x"]
+        self.set_results(result, x[2*nb:2*nb+ng], x[2*nb+ng:], x[nb:2*nb]*np.exp(1j*x[:nb]), result["lam"][:nb])
+        return result["converged"]
+
+
+    def set_results(self, result: dict, Pg, Qg, V, lam_P):
+        """
+        Stores the dispatch, cost and locational marginal prices of a solve.
+        :param result: Interior point result
+        :param Pg: Generator real power in pu
+        :param Qg: Generator reactive power in pu
+        :param V: Complex bus voltages, None for the DC model
+        :param lam_P: Real power balance multipliers
+        :return:
+        """
+        self.converged = result["converged"]
+        self.iterations = result["iterations"]
+        self.cost = result["f"]/self.cost_scale
+        self.voltages = V
+        P = Pg*self.powerbase/1e6
+        self.dispatch = pd.DataFrame({"Generator": self.generators, "Bus": [self.buses[k] for k in self.gen_buses],
+                                      "P (MW)": P, "Q (MVAR)": Qg*self.powerbase/1e6,
+                                      "Cost ($/h)": self.c2*P**2 + self.c1*P + self.c0})
+        self.lmp = pd.Series(lam_P/self.cost_scale/(self.powerbase/1e6), index=self.buses, name="LMP ($/MWh)")
+        if not self.converged:
+            print(f"WARNING: Optimal power flow did not converge in {self.iterations} iterations.")
+
+
+    def apply(self):
+        """
+        Sets the generators to the optimal dispatch, and to the optimal voltages after an AC solve, so the
+        next power flow of the circuit uses them.
+        :return:
+        """
+        Sd = self.calc_loads()*self.powerbase
+        Pg = self.Cg @ self.dispatch["P (MW)"].to_numpy()*1e6
+        with self.circuit.lock:
+            for name, P, Q in zip(self.generators, self.dispatch["P (MW)"].to_numpy(), self.dispatch["Q (MVAR)"].to_numpy()):
+                gen = self.circuit.generators[name]
+                gen.real_power = P*1e6
+                gen.reactive_power = Q*1e6
+                if self.voltages is not None:
+                    gen.voltage = abs(self.voltages[self.circuit.buses[gen.bus].index-1])
+            for k in np.unique(self.gen_buses):  # generator buses inject the dispatch less their loads
+                bus = self.circuit.buses[self.buses[k]]
+                bus.real_power = Pg[k] - Sd[k].real
+                bus.reactive_power = -Sd[k].imag
+
+
+    def print_data(self):
+        """
+        Prints the dispatch, total cost and the range of prices
+        :return:
+        """
+        print(self.dispatch.round(3).to_string(index=False))
+        print(f"Total cost: {self.cost:.2f} $/h, {self.iterations} iterations, converged = {self.converged}")
+        print(f"LMP: {self.lmp.min():.2f} to {self.lmp.max():.2f} $/MWh")
+
+
+# validation tests
+if __name__ == '__main__':
+    import io
+    import time
+    import contextlib
+    from CaseImporter import import_case
+    from Validations import CreateSyntheticCase
+
+    # MATPOWER reaches 8081.53 $/h (AC) and 7642.59 $/h (DC)
+    circ = import_case("Case_Files/case14.m")
+    opf = OptimalPowerFlow(circ)
+    print("***case14 DC-OPF***")
+    opf.solve_dc()
+    opf.print_data()
+    print()
+    print("***case14 AC-OPF***")
+    opf.solve_ac()
+    opf.print_data()
+    opf.apply()
+    with contextlib.redirect_stdout(io.StringIO()):
+        circ.do_newton_raph()
+    print("Power flow at the AC dispatch, largest voltage difference:", np.max(np.abs(circ.voltages - opf.voltages)))
+    print()
+
+    # intraday re-dispatch: the same OPF is solved again after each load change
+    circ = CreateSyntheticCase(2500)
+    rng = np.random.default_rng(0)
+    names = list(circ.generators)
+    circ.add_generator_costs(names, rng.uniform(0.005, 0.05, len(names)), rng.uniform(10, 40, len(names)), 0, 0, 250)
+    with contextlib.redirect_stdout(io.StringIO()):
+        circ.do_newton_raph(sparse=True)
+    opf = OptimalPowerFlow(circ)
+
+    print("***synthetic 2500 bus case, loads change 1 % between runs***")
+    for name, solve in [("DC", opf.solve_dc), ("AC", opf.solve_ac)]:
+        for warm_start in [False, True]:
+            solve(warm_start=False)
+            for step in range(3):
+                for load in circ.loads.values():
+                    circ.buses[load.bus].set_power(-0.01*load.real_power, -0.01*load.reactive_power)
+                    load.real_power *= 1.01
+                    load.reactive_power *= 1.01
+                start = time.perf_counter()
+                solve(warm_start=warm_start)
+                print(f"{name}, warm start = {warm_start}: {opf.cost:.2f} $/h, {opf.iterations} iterations, "
+                      f"{time.perf_counter()-start:.3f} s")
+            for load in circ.loads.values():
+                load.real_power /= 1.01**3
+                load.reactive_power /= 1.01**3
+                circ.buses[load.bus].set_power(load.real_power*(1.01**3 - 1), load.reactive_power*(1.01**3 - 1))
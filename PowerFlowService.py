@@ -0,0 +1,258 @@
+"""
+Module to serve power flow solves to asyncio applications
+
+Filename: PowerFlowService.py
+Author: Justin Lipner, Bailey Stout
+Date: 2026-10-19
+"""
+
+import asyncio
+import hashlib
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from Circuit import Circuit
+
+
+methods = ["newton_raph", "fast_decoupled", "dc_power_flow"]
+
+
+class PowerFlowResult:
+    """
+    Class to hold the result of one power flow solve
+    """
+    def __init__(self, key: str, circuit: str, method: str, buses: list[str], x: pd.DataFrame, y: pd.DataFrame,
+                 converged: bool, iterations: int, solve_time: float):
+        """
+        Constructor for PowerFlowResult
+        :param key: Request key the result was solved for
+        :param circuit: Name of the circuit
+        :param method: Solution method
+        :param buses: Bus names in index order
+        :param x: Bus angles and voltages from the solver
+        :param y: Bus power injections from the solver
+        :param converged: Solver converged
+        :param iterations: Number of iterations taken
+        :param solve_time: Time spent in the solver in seconds
+        """
+        N = len(buses)
+        self.key = key
+        self.circuit = circuit
+        self.method = method
+        self.buses = buses
+        self.angles = np.rad2deg(x.to_numpy()[:N, 0])
+        self.voltages = x.to_numpy()[N:, 0]
+        self.P = y.to_numpy()[:N, 0]
+        self.Q = y.to_numpy()[N:, 0]
+        self.converged = converged
+        self.iterations = iterations
+        self.solve_time = solve_time
+
+
+    def to_frame(self):
+        """
+        Bus results as a table
+        :return: pd.DataFrame
+        """
+        return pd.DataFrame({"Name": self.buses, "PU Volt": self.voltages, "Angle(Deg)": self.angles,
+                             "P (pu)": self.P, "Q (pu)": self.Q}, index=np.arange(1, len(self.buses)+1))
+
+
+    def to_dict(self):
+        """
+        Result as plain python types, ready to be sent as JSON
+        :return: dict
+        """
+        return {"key": self.key, "circuit": self.circuit, "method": self.method, "converged": self.converged,
+                "iterations": self.iterations, "solve_time": self.solve_time,
+                "buses": {name: {"V": float(self.voltages[k]), "angle": float(self.angles[k]),
+                                 "P": float(self.P[k]), "Q": float(self.Q[k])} for k, name in enumerate(self.buses)}}
+
+
+def request_key(circuit: Circuit, method: str, var_limit: bool):
+    """
+    Hashes everything a solve depends on: the branch admittances, bus types and injections, the load models,
+    generator setpoints and the solve options. Requests with equal keys give the same result.
+    :param circuit: Circuit to solve
+    :param method: Solution method
+    :param var_limit: Include VAR limiting
+    :return: str
+    """
+    with circuit.lock:
+        circuit.get_Ybus()
+        branches = circuit.branches
+        digest = hashlib.blake2b(f"{method}|{var_limit}|{circuit.slack_index}|{circuit.powerbase}".encode(), digest_size=16)
+        for column in ["from", "to", "yff", "yft", "ytf", "ytt"]:
+            digest.update(np.ascontiguousarray(branches[column]).tobytes())
+        digest.update(str([(bus.index, bus.type, bus.real_power, bus.reactive_power) for bus in circuit.buses.values()]).encode())
+        digest.update(str([(gen.bus, gen.voltage, gen.var_limit) for gen in circuit.generators.values()]).encode())
+        model = circuit.get_load_model()
+        for name in ["P", "Q", "Pz", "Pi", "Pe", "ep", "Qz", "Qi", "Qe", "eq"]:
+            digest.update(np.ascontiguousarray(model[name], dtype=float).tobytes())
+    return digest.hexdigest()
+
+
+def prepare_solve(circuit: Circuit, method: str, var_limit: bool):
+    """
+    Computes the request key and creates the solver in one locked step, so the solver's copy of the
+    circuit is the one the key describes.
+    :param circuit: Circuit to solve
+    :param method: Solution method
+    :param var_limit: Include VAR limiting
+    :return: (key, bus names, solver)
+    """
+    from Solution import NewtonRaphson, FastDecoupled, DCPowerFlow
+    with circuit.lock:
+        key = request_key(circuit, method, var_limit)
+        if method == "newton_raph":
+            solver = NewtonRaphson(circuit, var_limit)
+        elif method == "fast_decoupled":
+            solver = FastDecoupled(circuit, var_limit)
+        else:
+            solver = DCPowerFlow(circuit)
+        return key, list(circuit.buses), solver
+
+
+def run_solve(key: str, circuit: str, method: str, buses: list[str], solver):
+    """
+    Runs a prepared solver. Nothing in the circuit is changed.
+    :param key: Request key
+    :param circuit: Name of the circuit
+    :param method: Solution method
+    :param buses: Bus names in index order
+    :param solver: Solver from prepare_solve
+    :return: PowerFlowResult
+    """
+    start = time.perf_counter()
+    if method == "newton_raph":
+        x, y = solver.newton_raph()
+    elif method == "fast_decoupled":
+        x, y = solver.fast_decoupled()
+    else:
+        x, y = solver.dc_power_flow()
+    elapsed = time.perf_counter() - start
+    converged = getattr(solver, "converged", True)
+    iterations = getattr(solver, "iterations", 1)
+    return PowerFlowResult(key, circuit, method, buses, x, y, converged, iterations, elapsed)
+
+
+class PowerFlowService:
+    """
+    Runs power flow solves for asyncio code without blocking the event loop. Solves run on a bounded
+    thread pool and identical requests that arrive while one is being solved share its result.
+    """
+    def __init__(self, max_workers: int = 4, max_pending: int = 256, coalesce: bool = True):
+        """
+        Constructor for PowerFlowService
+        :param max_workers: Number of solver threads
+        :param max_pending: Maximum number of requests admitted at once, later requests wait
+        :param coalesce: Share one solve between identical concurrent requests
+        """
+        self.executor = ThreadPoolExecutor(max_workers, thread_name_prefix="powerflow")
+        self.pending = asyncio.Semaphore(max_pending)
+        self.coalesce = coalesce
+        self.in_flight = {}  # request key -> future of the solve in progress
+        self.requests = 0
+        self.solves = 0
+        self.coalesced = 0
+
+
+    async def __aenter__(self):
+        return self
+
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.close()
+
+
+    async def solve(self, circuit: Circuit, method: str = "newton_raph", var_limit: bool = False):
+        """
+        Solves the circuit's power flow. The circuit itself is not updated with the result.
+        :param circuit: Circuit to solve
+        :param method: "newton_raph", "fast_decoupled" or "dc_power_flow"
+        :param var_limit: Include VAR limiting (not used by the DC power flow)
+        :return: PowerFlowResult
+        """
+        if method not in methods:
+            raise ValueError(f"{method} is not a solution method. Use one of {methods}")
+
+        loop = asyncio.get_running_loop()
+        self.requests += 1
+        async with self.pending:
+            key, buses, solver = await loop.run_in_executor(self.executor, prepare_solve, circuit, method, var_limit)
+
+            if self.coalesce and key in self.in_flight:
+                self.coalesced += 1
+                return await asyncio.shield(self.in_flight[key])
+
+            self.solves += 1
+            future = loop.run_in_executor(self.executor, run_solve, key, circuit.name, method, buses, solver)
+            if self.coalesce:
+                self.in_flight[key] = future
+                future.add_done_callback(lambda done: self.in_flight.pop(key) if self.in_flight.get(key) is done else None)
+            return await asyncio.shield(future)
+
+
+    def close(self):
+        """
+        Waits for running solves and shuts the thread pool down.
+        :return:
+        """
+        self.executor.shutdown(wait=True)
+
+
+async def benchmark(service: PowerFlowService, circuits: list[Circuit], clients: int, requests: int):
+    """
+    Runs concurrent clients against a service, each sending requests that cycle through the circuits.
+    :param service: Service under test
+    :param circuits: Circuits to request
+    :param clients: Number of concurrent clients
+    :param requests: Requests sent by each client
+    :return: (requests per second, p50 latency, p99 latency)
+    """
+    latencies = []
+
+    async def client(c: int):
+        for r in range(requests):
+            start = time.perf_counter()
+            await service.solve(circuits[(c+r) % len(circuits)])
+            latencies.append(time.perf_counter()-start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(c) for c in range(clients)))
+    total = time.perf_counter()-start
+    return len(latencies)/total, np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+# validation tests
+if __name__ == '__main__':
+    from Validations import CreateSevenPowerBusSystem
+
+    circuits = []
+    for k in range(4):
+        circ = CreateSevenPowerBusSystem()
+        circ.add_load("Load4", "bus2", 10*k, 5*k)
+        circuits.append(circ)
+
+    async def main():
+        async with PowerFlowService() as service:
+            result = await service.solve(circuits[0])
+            print(result.to_frame())
+            print(f"converged = {result.converged}, iterations = {result.iterations}")
+            print()
+
+        clients, requests = 32, 8
+        start = time.perf_counter()
+        for r in range(clients*requests):
+            prepare = prepare_solve(circuits[r % len(circuits)], "newton_raph", False)
+            run_solve(prepare[0], "", "newton_raph", prepare[1], prepare[2])
+        print(f"blocking handler: {clients*requests/(time.perf_counter()-start):.1f} req/s")
+
+        for coalesce in [False, True]:
+            async with PowerFlowService(coalesce=coalesce) as service:
+                throughput, p50, p99 = await benchmark(service, circuits, clients, requests)
+                print(f"service, coalesce = {coalesce}: {throughput:.1f} req/s, p50 = {p50*1e3:.1f} ms, "
+                      f"p99 = {p99*1e3:.1f} ms, {service.solves} solves for {service.requests} requests")
+
+    asyncio.run(main())
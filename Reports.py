@@ -0,0 +1,366 @@
+"""
+Module for formatting result tables for printing and streaming them to csv, json lines and parquet files
+
+Filename: Reports.py
+Author: Justin Lipner, Bailey Stout
+Date: 2026-10-19
+"""
+
+import os
+import numpy as np
+from MatrixIO import resolve_path
+
+# JSON escapes of the characters that can't appear in a string as they are
+json_escapes = {"\\": "\\\\", '"': '\\"', "\n": "\\n", "\r": "\\r", "\t": "\\t"}
+json_escapes.update({chr(k): f"\\u{k:04x}" for k in range(32) if chr(k) not in json_escapes})
+
+
+def escape_json(text):
+    """
+    Escapes strings for JSON, replacing only the characters that occur in them.
+    :param text: np.ndarray of str
+    :return: np.ndarray of str
+    """
+    present = set("".join(text.tolist()))
+    for character, escape in json_escapes.items():  # backslashes first, so the added ones are left alone
+        if character in present:
+            text = np.strings.replace(text, character, escape)
+    return text
+
+
+class ReportColumn:
+    """
+    One column of a report and how its values are written
+    """
+    def __init__(self, name: str, decimals: int = None, style: str = "fixed"):
+        """
+        Constructor for ReportColumn
+        :param name: Column header
+        :param decimals: Decimals the values are rounded to, None to keep them as they are
+        :param style: "fixed" for numbers with the same decimals down the column, "general" for each number
+                      in its shortest form, or "text" for strings
+        """
+        if style not in ["fixed", "general", "text"]:
+            raise ValueError(f"{style} is not a column style. Use 'fixed', 'general' or 'text'")
+        self.name = name
+        self.decimals = decimals
+        self.style = style
+
+
+class ReportTable:
+    """
+    Layout of a result table, built once and reused for every report with that layout. Each column is
+    formatted from its result array with numpy string operations, and the lines of the csv and json lines
+    files are filled from one format string per block of rows, so no per value Python code runs.
+    Printed tables are laid out like pandas' DataFrame.to_string.
+    """
+    def __init__(self, columns: list[ReportColumn], index: str = None):
+        """
+        Constructor for ReportTable
+        :param columns: Columns in order
+        :param index: Name of the row labels when they are written to a file, None to leave them out
+        """
+        self.columns = columns
+        self.names = [column.name for column in columns]
+        self.index = index
+        self.templates = {}  # line format strings for each file format, made the first time they are needed
+
+
+    def get_columns(self, data: dict, index=None):
+        """
+        The data as arrays in column order, led by the row labels if the table writes them.
+        :param data: Column name -> array
+        :param index: Row labels
+        :return: (list[ReportColumn], list[np.ndarray])
+        """
+        columns, values = list(self.columns), [np.asarray(data[name]) for name in self.names]
+        if self.index is not None and index is not None:
+            columns.insert(0, ReportColumn(self.index, style="text" if np.asarray(index).dtype.kind in "OUS" else "general"))
+            values.insert(0, np.asarray(index))
+        return columns, values
+
+
+    def format_column(self, column: ReportColumn, values, display: bool = False):
+        """
+        Formats a column of values as strings.
+        :param column: Column layout
+        :param values: Column values
+        :param display: Format for printing, where fixed columns drop the trailing zeros every value has
+        :return: np.ndarray of str
+        """
+        values = np.asarray(values)
+        if column.style == "text" or values.dtype.kind in "OUS":
+            return values.astype(str)
+        if column.decimals is not None:
+            values = np.round(values.astype(float), column.decimals)
+        if column.style == "general":
+            return values.astype(str)
+
+        decimals = 6 if column.decimals is None else column.decimals
+        text = np.char.mod(f"%.{decimals}f", values.astype(float))
+        if display:
+            # like pandas, trim the decimals to the fewest that still show every value, keeping at least one
+            while decimals > 1 and np.all(np.strings.endswith(text[np.isfinite(values)], "0")):
+                decimals -= 1
+                text = np.char.mod(f"%.{decimals}f", values.astype(float))
+            text = np.where(values >= 0, np.strings.add(" ", text), text)
+        return np.where(np.isnan(values), "NaN", text)
+
+
+    def render(self, data: dict, index=None):
+        """
+        Lays the table out as text.
+        :param data: Column name -> array
+        :param index: Row labels, printed on the left
+        :return: str
+        """
+        return "\n".join(self.render_lines(data, index))
+
+
+    def render_lines(self, data: dict, index=None, chunk_rows: int = None):
+        """
+        Lays the table out as text, a block of lines at a time. The column widths come from every row so the
+        blocks line up.
+        :param data: Column name -> array
+        :param index: Row labels, printed on the left
+        :param chunk_rows: Rows in each block, None for all of them
+        :return: generator of str, the header first
+        """
+        cells = []
+        headers = []
+        for column in self.columns:
+            text = self.format_column(column, data[column.name], display=True)
+            if column.style == "fixed":
+                headers.append(" " + column.name)
+            else:
+                headers.append(column.name)
+                text = np.strings.add(" ", text)
+            cells.append(text)
+
+        n = len(cells[0]) if len(cells) != 0 else 0
+        widths = [max(len(header), int(np.max(np.strings.str_len(text), initial=0))) for header, text in zip(headers, cells)]
+        labels = None
+        header = " ".join(header.rjust(width) for header, width in zip(headers, widths))
+        if index is not None:
+            labels = np.asarray(index).astype(str)
+            label_width = int(np.max(np.strings.str_len(labels), initial=0))
+            labels = np.strings.ljust(labels, label_width)
+            header = " "*label_width + " " + header
+        yield header
+
+        chunk_rows = max(n, 1) if chunk_rows is None else chunk_rows
+        for start in range(0, n, chunk_rows):
+            stop = start + chunk_rows
+            lines = labels[start:stop] if labels is not None else None
+            for text, width in zip(cells, widths):
+                text = np.strings.rjust(text[start:stop], width)
+                lines = text if lines is None else np.strings.add(np.strings.add(lines, " "), text)
+            yield "\n".join(lines.tolist())
+
+
+    def get_template(self, kind: str, columns: list[ReportColumn]):
+        """
+        Format string for one line of a csv or json lines file, made once per table and file format.
+        :param kind: "csv" or "jsonl"
+        :param columns: Columns written
+        :return: str
+        """
+        key = (kind, tuple(column.name for column in columns))
+        if key not in self.templates:
+            if kind == "csv":
+                self.templates[key] = ",".join(["%s"]*len(columns)) + "\n"
+            else:
+                names = [name.replace("%", "%%") for name in escape_json(np.array(key[1], dtype=str)).tolist()]
+                self.templates[key] = "{" + ", ".join(f'"{name}": %s' for name in names) + "}\n"
+        return self.templates[key]
+
+
+    def format_lines(self, kind: str, data: dict, index=None):
+        """
+        Formats rows as csv or json lines text with one string operation.
+        :param kind: "csv" or "jsonl"
+        :param data: Column name -> array
+        :param index: Row labels
+        :return: str
+        """
+        columns, values = self.get_columns(data, index)
+        cells = []
+        for column, value in zip(columns, values):
+            text = self.format_column(column, value)
+            if column.style == "text" or np.asarray(value).dtype.kind in "OUS":
+                if kind == "jsonl":
+                    text = np.strings.add(np.strings.add('"', escape_json(text)), '"')
+                else:
+                    quote = (np.strings.find(text, ",") >= 0) | (np.strings.find(text, '"') >= 0) | (np.strings.find(text, "\n") >= 0)
+                    text = np.where(quote, np.strings.add(np.strings.add('"', np.strings.replace(text, '"', '""')), '"'), text)
+            elif kind == "jsonl":
+                text = np.where(np.isfinite(np.asarray(value, dtype=float)), text, "null")
+            cells.append(text)
+
+        n = len(cells[0]) if len(cells) != 0 else 0
+        if n == 0:
+            return ""
+        table = np.empty((n, len(cells)), dtype=object)
+        for k, text in enumerate(cells):
+            table[:, k] = text
+        return (self.get_template(kind, columns)*n) % tuple(table.ravel())
+
+
+    def write(self, path: str, data: dict, index=None, chunk_rows: int = 65536):
+        """
+        Writes a whole table to a file, in blocks of rows.
+        :param path: Destination file, the format is picked from the extension
+        :param data: Column name -> array
+        :param index: Row labels
+        :param chunk_rows: Rows written at a time
+        :return:
+        """
+        n = len(np.asarray(data[self.names[0]]))
+        if resolve_path(path).endswith(".txt"):
+            with open(resolve_path(path), "w") as file:
+                for block in self.render_lines(data, index, chunk_rows):
+                    file.write(block + "\n")
+            return
+
+        with ReportWriter(path, self) as writer:
+            for start in range(0, n, chunk_rows):
+                writer.write({name: np.asarray(data[name])[start:start+chunk_rows] for name in self.names},
+                             None if index is None else np.asarray(index)[start:start+chunk_rows])
+
+
+class ReportWriter:
+    """
+    Streams blocks of report rows to a file as they are produced, e.g. one block per fault case, so the
+    whole report is never held in memory. The format is picked from the file extension: ".csv", ".jsonl"
+    or ".parquet". Parquet files need the pyarrow package.
+    """
+    def __init__(self, path: str, table: ReportTable):
+        """
+        Constructor for ReportWriter
+        :param path: Destination file
+        :param table: Layout of the rows
+        """
+        self.path = resolve_path(path)
+        self.table = table
+        self.kind = os.path.splitext(self.path)[1].lstrip(".").lower()
+        if self.kind not in ["csv", "jsonl", "parquet"]:
+            raise ValueError(f"{self.path} is not a .csv, .jsonl or .parquet file")
+        self.rows = 0  # rows written so far
+        self.file = None
+
+
+    def __enter__(self):
+        folder = os.path.dirname(self.path)
+        if folder != "":
+            os.makedirs(folder, exist_ok=True)
+
+        if self.kind != "parquet":
+            self.file = open(self.path, "w", newline="")
+        else:
+            try:
+                import pyarrow
+                import pyarrow.parquet
+            except ImportError:
+                raise ImportError("Writing .parquet reports needs the pyarrow package (pip install pyarrow)") from None
+            self.pyarrow = pyarrow
+            self.file = None  # opened with the schema of the first block
+        return self
+
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+    def write(self, data: dict, index=None):
+        """
+        Appends a block of rows to the file.
+        :param data: Column name -> array of the block's values
+        :param index: Row labels of the block
+        :return:
+        """
+        if self.kind == "parquet":
+            columns, values = self.table.get_columns(data, index)
+            arrays = {}
+            for column, value in zip(columns, values):
+                if column.style == "text" or value.dtype.kind in "OUS":
+                    arrays[column.name] = value.astype(str)
+                else:
+                    arrays[column.name] = value if column.decimals is None else np.round(value.astype(float), column.decimals)
+            block = self.pyarrow.table(arrays)
+            if self.file is None:
+                self.file = self.pyarrow.parquet.ParquetWriter(self.path, block.schema)
+            self.file.write_table(block)
+        else:
+            if self.rows == 0 and self.kind == "csv":
+                columns, _ = self.table.get_columns(data, index)
+                self.file.write(",".join(column.name for column in columns) + "\n")
+            self.file.write(self.table.format_lines(self.kind, data, index))
+        self.rows += len(np.asarray(data[self.table.names[0]]))
+
+
+    def close(self):
+        """
+        Flushes and closes the file.
+        :return:
+        """
+        if self.file is not None:
+            self.file.close()
+        self.file = None
+
+
+# validation tests
+if __name__ == '__main__':
+    import json
+    import time
+    import tempfile
+    import pandas as pd
+
+    rng = np.random.default_rng(0)
+    n = 200000
+    data = {"Name": np.array([f"bus{k}" for k in range(1, n+1)]), "PU Volt": rng.uniform(0.9, 1.1, n),
+            "Angle(Deg)": rng.uniform(-60, 60, n)}
+    table = ReportTable([ReportColumn("Name", style="text"), ReportColumn("PU Volt", 5), ReportColumn("Angle(Deg)", 2)],
+                        index="Number")
+    small = {name: values[:6] for name, values in data.items()}
+    print(table.render(small, np.arange(1, 7)))
+    print("Same as pandas:", table.render(small, np.arange(1, 7)) ==
+          pd.DataFrame({"Name": small["Name"], "PU Volt": small["PU Volt"].round(5),
+                        "Angle(Deg)": small["Angle(Deg)"].round(2)}, index=np.arange(1, 7)).to_string())
+
+    start = time.perf_counter()
+    pd.DataFrame({name: values.round(5) if name != "Name" else values for name, values in data.items()}).to_string()
+    print(f"pandas to_string, {n} rows: {time.perf_counter()-start:.3f} s")
+    start = time.perf_counter()
+    table.render(data, np.arange(1, n+1))
+    print(f"render, {n} rows: {time.perf_counter()-start:.3f} s")
+
+    with tempfile.TemporaryDirectory() as folder:
+        for extension in ["txt", "csv", "jsonl"]:
+            path = os.path.join(folder, f"buses.{extension}")
+            start = time.perf_counter()
+            table.write(path, data, np.arange(1, n+1))
+            print(f"{extension} write, {n} rows: {time.perf_counter()-start:.3f} s")
+        back = pd.read_csv(os.path.join(folder, "buses.csv"))
+        print("csv read back, largest voltage error:", np.max(np.abs(back["PU Volt"] - data["PU Volt"])))
+        with open(os.path.join(folder, "buses.jsonl")) as file:
+            print("first json line:", json.loads(file.readline()))
+        odd = ReportTable([ReportColumn("Name\t1", style="text"), ReportColumn("PU Volt", 5), ReportColumn("P", style="general")])
+        odd.write(os.path.join(folder, "odd.jsonl"), {"Name\t1": np.array(['a "b"\\c', "line\nbreak\x01"]),
+                                                      "PU Volt": np.array([np.nan, 1.0]), "P": np.array([np.inf, np.nan])})
+        with open(os.path.join(folder, "odd.jsonl")) as file:
+            print("missing values and control characters read back:", [json.loads(line) for line in file])
+        try:
+            table.write(os.path.join(folder, "buses.parquet"), data, np.arange(1, n+1))
+            print("parquet rows:", len(pd.read_parquet(os.path.join(folder, "buses.parquet"))))
+        except ImportError as error:
+            print(error)
+
+        # a power flow's bus results straight from the circuit
+        import io
+        import contextlib
+        from Validations import CreateSevenPowerBusSystem
+        circ = CreateSevenPowerBusSystem()
+        with contextlib.redirect_stdout(io.StringIO()):
+            circ.do_newton_raph()
+        circ.write_results(os.path.join(folder, "7bus.csv"))
+        print(pd.read_csv(os.path.join(folder, "7bus.csv")).to_string())
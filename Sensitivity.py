@@ -0,0 +1,205 @@
+"""
+Module for voltage and angle sensitivities to bus injections at a solved power flow
+
+Filename: Sensitivity.py
+Author: Justin Lipner, Bailey Stout
+Date: 2026-10-19
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.linalg import lu_factor, lu_solve
+
+
+class PowerFlowSensitivity:
+    """
+    Sensitivities of the bus voltage angles and magnitudes to real and reactive power injections, from
+    the power flow Jacobian at the solved state. The Jacobian is factored once, the first time it is
+    needed, and every sensitivity after that is triangular solves with the factors, one per injection
+    bus or, with the transposed factors, one per monitored bus. Slack bus quantities and PV bus voltages
+    are held by the generators, so their sensitivities are zero, and so is the effect of an injection
+    at the slack bus or of reactive power at a PV bus.
+    """
+    def __init__(self, solver, V):
+        """
+        Constructor for PowerFlowSensitivity
+        :param solver: NewtonRaphson or SparseNewtonRaphson that solved the power flow
+        :param V: Solved complex bus voltages
+        """
+        self.solver = solver
+        self.V = np.asarray(V, dtype=complex)
+        self.count = solver.count
+        self.powerbase = solver.powerbase
+        self.buses = list(solver.bus_types)
+        self.bus_index = {name: k for k, name in enumerate(self.buses)}
+        self.pvpq, self.pq = solver.calc_bus_sets()
+        self.lu = None
+        self.order = None  # factored order of the unknowns, sparse Jacobians only
+
+
+    def factor(self):
+        """
+        Factors the Jacobian at the solved state, if it isn't already.
+        :return:
+        """
+        if self.lu is not None:
+            return
+        J = self.solver.calc_jacobian(self.V)
+        if sparse.issparse(J):
+            self.lu, self.order = self.solver.factor_jacobian(J)
+        else:
+            self.lu = lu_factor(J)
+
+
+    def solve(self, B, transpose: bool = False):
+        """
+        Solves J X = B, or J^T X = B, with the cached factors.
+        :param B: Right hand sides, one per column
+        :param transpose: Solve with the transposed Jacobian
+        :return: np.ndarray
+        """
+        self.factor()
+        if isinstance(self.lu, tuple):
+            return lu_solve(self.lu, B, trans=1 if transpose else 0)
+        trans = "T" if transpose else "N"
+        if self.order is None:
+            return self.lu.solve(B, trans=trans)
+        X = np.empty_like(B)
+        X[self.order] = self.lu.solve(B[self.order], trans=trans)
+        return X
+
+
+    def calc_rows(self, buses: list[str], kind: str):
+        """
+        Positions of the buses' real or reactive power equations in the Jacobian.
+        :param buses: Bus names
+        :param kind: "P" or "Q"
+        :return: (position in buses, row) np.ndarray of the buses that have the equation
+        """
+        rows = np.full(self.count, -1)
+        if kind == "P":
+            rows[self.pvpq] = np.arange(len(self.pvpq))
+        elif kind == "Q":
+            rows[self.pq] = len(self.pvpq) + np.arange(len(self.pq))
+        else:
+            raise ValueError(f"{kind} is not an injection. Use 'P' or 'Q'")
+        rows = rows[[self.bus_index[bus] for bus in buses]]
+        return np.flatnonzero(rows >= 0), rows[rows >= 0]
+
+
+    def split_state(self, X, columns):
+        """
+        Expands solutions of the Jacobian into angle and magnitude changes at every bus.
+        :param X: Solutions, one per column
+        :param columns: Column labels
+        :return: (angles, magnitudes) pd.DataFrame
+        """
+        angles = np.zeros((self.count, X.shape[1]))
+        magnitudes = np.zeros((self.count, X.shape[1]))
+        angles[self.pvpq] = X[:len(self.pvpq)]
+        magnitudes[self.pq] = X[len(self.pvpq):]
+        return pd.DataFrame(angles, index=self.buses, columns=columns), pd.DataFrame(magnitudes, index=self.buses, columns=columns)
+
+
+    def calc(self, buses: list[str], kind: str = "Q"):
+        """
+        Change of every bus angle and voltage magnitude per MW ("P") or MVAR ("Q") injected at each of the
+        given buses, with one solve per injection bus.
+        :param buses: Injection bus names
+        :param kind: "P" or "Q"
+        :return: (angles in rad per MW or MVAR, magnitudes in pu per MW or MVAR) pd.DataFrame, one column per injection bus
+        """
+        columns, rows = self.calc_rows(buses, kind)
+        B = np.zeros((len(self.pvpq) + len(self.pq), len(buses)))
+        B[rows, columns] = 1e6/self.powerbase
+        return self.split_state(self.solve(B), buses)
+
+
+    def calc_monitored(self, buses: list[str], quantity: str = "V"):
+        """
+        Change of the angle ("angle") or voltage magnitude ("V") at each of the given buses per MW and per MVAR
+        injected at every bus, with one transposed solve per monitored bus.
+        :param buses: Monitored bus names
+        :param quantity: "V" or "angle"
+        :return: (per MW, per MVAR) pd.DataFrame with a row per injection bus and a column per monitored bus
+        """
+        index = np.array([self.bus_index[bus] for bus in buses], dtype=int)
+        rows = np.full(self.count, -1)
+        if quantity == "angle":
+            rows[self.pvpq] = np.arange(len(self.pvpq))
+        elif quantity == "V":
+            rows[self.pq] = len(self.pvpq) + np.arange(len(self.pq))
+        else:
+            raise ValueError(f"{quantity} is not a bus quantity. Use 'V' or 'angle'")
+        held = rows[index] < 0
+        B = np.zeros((len(self.pvpq) + len(self.pq), len(buses)))
+        B[rows[index[~held]], np.flatnonzero(~held)] = 1.0
+        X = self.solve(B, transpose=True)*1e6/self.powerbase
+        return self.split_state(X, buses)
+
+
+    def predict(self, changes: dict):
+        """
+        First order prediction of the bus voltages after a change in injections, from one solve.
+        :param changes: Bus name -> (MW, MVAR) injection change, negative for added load
+        :return: pd.DataFrame with predicted voltages in pu and angles in degrees
+        """
+        b = np.zeros(len(self.pvpq) + len(self.pq))
+        for kind, k in [("P", 0), ("Q", 1)]:
+            columns, rows = self.calc_rows(list(changes), kind)
+            values = np.array([change[k] for change in changes.values()], dtype=float)
+            b[rows] += values[columns]*1e6/self.powerbase
+        angles, magnitudes = self.split_state(self.solve(b[:, None]), ["change"])
+        return pd.DataFrame({"V (pu)": np.abs(self.V) + magnitudes["change"].to_numpy(),
+                             "Angle (deg)": np.rad2deg(np.angle(self.V) + angles["change"].to_numpy())}, index=self.buses)
+
+
+# validation tests
+if __name__ == '__main__':
+    import io
+    import time
+    import contextlib
+    from Validations import CreateSevenPowerBusSystem, CreateSyntheticCase
+
+    circ = CreateSevenPowerBusSystem()
+    with contextlib.redirect_stdout(io.StringIO()):
+        circ.do_newton_raph()
+    angles, magnitudes = circ.sensitivity.calc(list(circ.buses), "Q")
+    print("***7 bus system, dV/dQ (pu per 100 MVAR)***")
+    print((magnitudes*100).round(5).to_string())
+    print()
+
+    # the prediction for 10 MVAR at bus4 against a new solve
+    before = np.array(circ.bus_results["Vpu"])
+    predicted = circ.sensitivity.predict({"bus4": (0, 10)})
+    circ.buses["bus4"].set_power(0, 10e6)
+    with contextlib.redirect_stdout(io.StringIO()):
+        circ.do_newton_raph()
+    print("10 MVAR at bus4, voltage change in pu:")
+    print(pd.DataFrame({"predicted": predicted["V (pu)"].to_numpy() - before, "solved": circ.bus_results["Vpu"] - before},
+                       index=list(circ.buses)).round(6).to_string())
+    print()
+
+    circ = CreateSyntheticCase(10000)
+    with contextlib.redirect_stdout(io.StringIO()):
+        circ.do_newton_raph(sparse=True)
+    sensitivity = circ.sensitivity
+    buses = list(circ.buses)[::50]
+    print(f"***synthetic 10000 bus case, {len(buses)} injection buses***")
+    start = time.perf_counter()
+    sensitivity.factor()
+    print(f"factoring once: {time.perf_counter()-start:.3f} s")
+    start = time.perf_counter()
+    angles, magnitudes = sensitivity.calc(buses, "Q")
+    print(f"dV/dQ for {len(buses)} buses from the factors: {time.perf_counter()-start:.3f} s")
+    start = time.perf_counter()
+    per_MW, per_MVAR = sensitivity.calc_monitored(buses[:10], "V")
+    print(f"V at 10 buses against every injection, transposed: {time.perf_counter()-start:.3f} s")
+    start = time.perf_counter()
+    circ.buses[buses[1]].set_power(0, 1e6)
+    with contextlib.redirect_stdout(io.StringIO()):
+        circ.do_newton_raph(sparse=True)
+    print(f"one re-solve for 1 MVAR at one bus: {time.perf_counter()-start:.3f} s")
+    print("Largest difference between the two:",
+          np.max(np.abs(per_MVAR.loc[buses, buses[:10]].to_numpy() - magnitudes.loc[buses[:10], buses].to_numpy().T)))
@@ -39,4 +39,12 @@ class Settings:
         self.powerbase = p*1e6
 
 
-settings = Settings()
+    def copy(self):
+        """
+        Creates an independent copy so one circuit's changes don't affect another
+        :return: Settings
+        """
+        return Settings(self.powerbase/1e6, self.freq)
+
+
+settings = Settings()  # defaults for new circuits and for elements created outside of a circuit
@@ -0,0 +1,354 @@
+"""
+Module for sizing and placing shunt capacitors and reactors to hold bus voltages within limits
+
+Filename: ShuntCompensation.py
+Author: Justin Lipner, Bailey Stout
+Date: 2026-10-19
+"""
+
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from scipy import sparse
+from scipy.optimize import linprog
+from Circuit import Circuit
+from Solution import SparseNewtonRaphson
+
+worker_circuit = None  # circuit each pool process evaluates plans on, sent once when the process starts
+
+
+def set_worker_circuit(circuit: Circuit):
+    """
+    Process pool initializer, keeps the circuit so plans are sent without it.
+    :param circuit: Circuit to evaluate plans on
+    :return:
+    """
+    global worker_circuit
+    worker_circuit = circuit
+
+
+def solve_with_plan(circuit: Circuit, plan: dict, var_limit: bool = False):
+    """
+    Solves the power flow with a plan's shunts added to the admittance matrix. The circuit is not changed.
+    :param circuit: Circuit to solve
+    :param plan: Bus index -> rated MVAR, positive for capacitors and negative for reactors
+    :param var_limit: Include VAR limiting
+    :return: (solved SparseNewtonRaphson, x)
+    """
+    solver = SparseNewtonRaphson(circuit, var_limit)
+    y = np.zeros(solver.count, dtype=complex)
+    for index, mvar in plan.items():
+        y[index] += 1j*mvar*1e6/solver.powerbase
+    solver.Ybus = (solver.Ybus + sparse.diags(y)).tocsr()
+    x, _ = solver.newton_raph()
+    return solver, x
+
+
+def evaluate_plans(plans: list, circuit: Circuit = None, var_limit: bool = False):
+    """
+    Solves the power flow with each plan's shunts added to the admittance matrix. The circuit is not changed.
+    :param plans: List of dicts of bus index -> rated MVAR, positive for capacitors and negative for reactors
+    :param circuit: Circuit to evaluate on, defaults to the pool process's circuit
+    :param var_limit: Include VAR limiting
+    :return: list of (bus voltage magnitudes, converged)
+    """
+    circuit = worker_circuit if circuit is None else circuit
+    results = []
+    for plan in plans:
+        solver, x = solve_with_plan(circuit, plan, var_limit)
+        results.append((x.to_numpy()[solver.count:, 0], solver.converged))
+    return results
+
+
+class CompensationPlanner:
+    """
+    Finds shunt capacitor and reactor sizes at candidate buses that hold the PQ bus voltages within limits
+    with the least total MVAR. The sizes come from a linear program on the dV/dQ sensitivities at the solved
+    state, taken for every candidate at once from the factored Jacobian. Variants of the plan, the full plan
+    and plans limited to its largest sites or to single sites, are then checked with full power flows in
+    parallel processes, and the sensitivities are taken again at the best plan until one holds the limits.
+    """
+    def __init__(self, circuit: Circuit, candidates: list[str] = None, vmin: float = 0.95, vmax: float = 1.05,
+                 max_mvar: float = 200.0, margin: float = 0.002, max_workers: int = None,
+                 var_limit: bool = False):
+        """
+        Constructor for CompensationPlanner
+        :param circuit: Circuit to compensate
+        :param candidates: Buses where shunts may be placed, defaults to every PQ bus
+        :param vmin: Lowest PQ bus voltage in pu
+        :param vmax: Highest PQ bus voltage in pu
+        :param max_mvar: Largest capacitor or reactor at one bus in MVAR
+        :param margin: Voltage margin in pu kept inside the limits by the linear program
+        :param max_workers: Number of processes checking plans, 1 to check them in this process
+        :param var_limit: Include VAR limiting in the power flows
+        """
+        self.circuit = circuit
+        self.vmin = vmin
+        self.vmax = vmax
+        self.max_mvar = max_mvar
+        self.margin = margin
+        self.max_workers = max_workers
+        self.var_limit = var_limit
+        with circuit.lock:
+            self.buses = [bus.name for bus in sorted(circuit.buses.values(), key=lambda bus: bus.index)]
+            self.monitored = np.sort(np.asarray(circuit.pq_indexes, dtype=int) - 1)
+            if candidates is None:
+                candidates = [self.buses[k] for k in self.monitored]
+            self.candidates = list(candidates)
+            self.candidate_index = np.array([circuit.buses[bus].index-1 for bus in self.candidates], dtype=int)
+        self.plan = None
+        self.voltages = None
+        self.feasible = False
+        self.evaluations = 0
+
+
+    def calc_sensitivity(self, plan: dict):
+        """
+        Solves the power flow with a plan and takes the dV/dQ sensitivities of the monitored buses to
+        every candidate, in one multi-column solve.
+        :param plan: Bus index -> rated MVAR
+        :return: (bus voltage magnitudes, sensitivity in pu per rated MVAR), (None, None) if the power flow
+                 does not converge
+        """
+        solver, _ = solve_with_plan(self.circuit, plan, self.var_limit)
+        if not solver.converged:
+            print("WARNING: The power flow did not converge, so it cannot be linearized.")
+            return None, None
+        sensitivity = solver.get_sensitivity()
+        _, dV = sensitivity.calc(self.candidates, "Q")
+        V = np.abs(sensitivity.V)
+        # a shunt rated at 1 pu voltage supplies its rating times V squared
+        return V, dV.to_numpy()[self.monitored]*V[self.candidate_index]**2
+
+
+    def solve_lp(self, V, A, plan: dict, sites=None):
+        """
+        Least total MVAR of capacitors and reactors that moves the monitored voltages inside the limits,
+        on the linearized voltages V + A q.
+        :param V: Present bus voltage magnitudes
+        :param A: Voltage change of the monitored buses per rated MVAR at each candidate
+        :param plan: Present plan, the sizes found are added to it
+        :param sites: Positions of the candidates allowed, defaults to all
+        :return: dict of bus index -> rated MVAR, None if the limits cannot be met
+        """
+        sites = np.arange(len(self.candidates)) if sites is None else np.asarray(sites, dtype=int)
+        present = np.array([plan.get(self.candidate_index[k], 0.0) for k in sites])
+        A = A[:, sites]
+        n = len(sites)
+        V = V[self.monitored]
+        # q = capacitor - reactor, both at least zero, and the total at each site stays within max_mvar
+        bounds = [(0, self.max_mvar - max(q, 0)) for q in present] + [(0, self.max_mvar + min(q, 0)) for q in present]
+        # most buses are far from the limits, so start with the ones near them and add any the solution violates
+        rows = np.flatnonzero((V < self.vmin + 0.02) | (V > self.vmax - 0.02))
+        change = np.zeros(n)
+        while True:
+            # dV/dQ falls off with distance, entries under a thousandth of the row's largest are dropped
+            A_rows = A[rows]
+            A_rows = sparse.csr_matrix(np.where(np.abs(A_rows) >= 1e-3*np.abs(A_rows).max(axis=1, keepdims=True), A_rows, 0))
+            A_ub = sparse.bmat([[A_rows, -A_rows], [-A_rows, A_rows]], format="csr")
+            b_ub = np.concatenate((self.vmax - self.margin - V[rows], V[rows] - self.vmin - self.margin))
+            result = linprog(np.ones(2*n), A_ub=A_ub, b_ub=b_ub, bounds=bounds, method="highs")
+            if result.status != 0:
+                return None
+            change = result.x[:n] - result.x[n:]
+            predicted = V + A @ change
+            violated = np.flatnonzero((predicted < self.vmin + self.margin - 1e-6) | (predicted > self.vmax - self.margin + 1e-6))
+            violated = np.setdiff1d(violated, rows)
+            if len(violated) == 0:
+                break
+            rows = np.union1d(rows, violated)
+
+        new = dict(plan)
+        for k, q in zip(sites, change):
+            if abs(q) > 1e-3:
+                index = self.candidate_index[k]
+                new[index] = new.get(index, 0.0) + q
+        return {index: q for index, q in new.items() if abs(q) > 1e-3}
+
+
+    def make_variants(self, V, A, plan: dict, largest: int = 5, singles: int = 10):
+        """
+        Plans to check: the full linear program plan, the same limited to its largest sites, and single
+        sites chosen by how much one MVAR there moves the worst voltage.
+        :param V: Present bus voltage magnitudes
+        :param A: Sensitivity of the monitored buses to each candidate
+        :param plan: Present plan
+        :param largest: Most sites in the limited plans
+        :param singles: Number of single site plans
+        :return: list of plans
+        """
+        full = self.solve_lp(V, A, plan)
+        if full is None:
+            return []
+        variants = [full]
+        position = {index: k for k, index in enumerate(self.candidate_index)}
+        order = sorted(full, key=lambda index: -abs(full[index]))
+        for n in range(1, min(largest, len(order))):
+            limited = self.solve_lp(V, A, plan, [position[index] for index in order[:n]])
+            if limited is not None:
+                variants.append(limited)
+
+        worst = int(np.argmax(np.maximum(self.vmin - V[self.monitored], V[self.monitored] - self.vmax)))
+        for k in np.argsort(-np.abs(A[worst]))[:singles]:
+            single = self.solve_lp(V, A, plan, [k])
+            if single is not None:
+                variants.append(single)
+
+        unique = []
+        for variant in variants:
+            if not any(variant.keys() == other.keys() and np.allclose(list(variant.values()), list(other.values()))
+                       for other in unique):
+                unique.append(variant)
+        return unique
+
+
+    def check(self, V):
+        """
+        Largest voltage limit violation of the monitored buses
+        :param V: Bus voltage magnitudes
+        :return: float, zero or less if the limits hold
+        """
+        return float(np.max(np.maximum(self.vmin - V[self.monitored], V[self.monitored] - self.vmax)))
+
+
+    def solve(self, max_rounds: int = 5):
+        """
+        Plans the compensation.
+        :param max_rounds: Linearizations before giving up
+        :return: bool, True if a plan holds the voltage limits
+        """
+        plan = {}
+        V, A = self.calc_sensitivity(plan)
+        self.voltages = V
+        self.evaluations = 0
+        if V is None:
+            self.plan, self.feasible = None, False
+            return False
+        self.feasible = self.check(V) <= 0
+        if self.feasible:
+            self.plan = plan
+            return True
+
+        workers = self.max_workers or os.cpu_count()
+        pool = ProcessPoolExecutor(workers, initializer=set_worker_circuit, initargs=(self.circuit,)) \
+            if workers != 1 else None
+        try:
+            for step in range(max_rounds):
+                variants = self.make_variants(V, A, plan)
+                if len(variants) == 0:
+                    print("The voltage limits cannot be met with the candidate buses and max_mvar.")
+                    break
+
+                if pool is None:
+                    results = evaluate_plans(variants, self.circuit, self.var_limit)
+                else:
+                    chunks = [variants[k::workers] for k in range(workers) if len(variants[k::workers]) != 0]
+                    results = [None]*len(variants)
+                    for k, chunk in zip(range(workers), pool.map(partial(evaluate_plans, var_limit=self.var_limit), chunks)):
+                        for position, result in zip(range(k, len(variants), workers), chunk):
+                            results[position] = result
+                self.evaluations += len(variants)
+
+                feasible = [(sum(abs(q) for q in variant.values()), len(variant), k) for k, (variant, (V_plan, converged))
+                            in enumerate(zip(variants, results)) if converged and self.check(V_plan) <= 0]
+                if len(feasible) != 0:
+                    best = min(feasible)[2]
+                    self.plan, self.voltages = variants[best], results[best][0]
+                    self.feasible = True
+                    return True
+
+                plan = variants[0]  # linearize again at the full plan
+                V, A = self.calc_sensitivity(plan)
+                if V is None:
+                    V = results[0][0]
+                    break
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        self.plan, self.voltages = plan, V
+        return False
+
+
+    def to_frame(self):
+        """
+        The plan as a table
+        :return: pd.DataFrame
+        """
+        rows = [[self.buses[index], "Capacitor" if q > 0 else "Reactor", abs(q), self.voltages[index]]
+                for index, q in sorted(self.plan.items())]
+        return pd.DataFrame(rows, columns=["Bus", "Type", "MVAR", "PU Volt"])
+
+
+    def apply(self, prefix: str = "comp"):
+        """
+        Adds the planned capacitors and reactors to the circuit.
+        :param prefix: Start of the new element names
+        :return:
+        """
+        for index, q in sorted(self.plan.items()):
+            name = f"{prefix}_{self.buses[index]}"
+            if q > 0:
+                self.circuit.add_shunt_capacitor(name, q, self.buses[index])
+            else:
+                self.circuit.add_shunt_reactor(name, -q, self.buses[index])
+
+
+    def print_data(self):
+        """
+        Prints the plan and the voltage range it gives
+        :return:
+        """
+        print(self.to_frame().round(3).to_string(index=False))
+        V = self.voltages[self.monitored]
+        print(f"Total {sum(abs(q) for q in self.plan.values()):.2f} MVAR at {len(self.plan)} buses, PQ bus voltages "
+              f"{V.min():.4f} to {V.max():.4f} pu, limits met = {self.feasible}, {self.evaluations} plans checked")
+
+
+# validation tests
+if __name__ == '__main__':
+    import io
+    import time
+    import contextlib
+    from Validations import CreateSevenPowerBusSystem
+    from CaseImporter import import_case, build_circuit, synthetic_case
+
+    circ = CreateSevenPowerBusSystem()
+    print("***7 bus system, 0.95 to 1.05 pu***")
+    planner = CompensationPlanner(circ)
+    planner.solve()
+    planner.print_data()
+    planner.apply()
+    with contextlib.redirect_stdout(io.StringIO()):
+        circ.do_newton_raph()
+    print("Power flow with the shunts added:", np.round(circ.bus_results["Vpu"], 4))
+    print()
+
+    circ = import_case("Case_Files/case14.m")
+    print("***case14, 0.95 to 1.05 pu***")
+    planner = CompensationPlanner(circ)
+    planner.solve()
+    planner.print_data()
+    print()
+
+    print("***case14 with VAR limits, 0.95 to 1.05 pu***")
+    planner = CompensationPlanner(circ, var_limit=True)
+    planner.solve()
+    planner.print_data()
+    print()
+
+    # a heavily loaded grid with low voltages far from the generators
+    case = synthetic_case(2500)
+    case["bus"]["Qd"] *= 2
+    circ = build_circuit(case, case["name"])
+    print("***synthetic 2500 bus case with heavy reactive load, 0.95 to 1.05 pu***")
+    for max_workers in [1, None]:
+        planner = CompensationPlanner(circ, max_workers=max_workers)
+        start = time.perf_counter()
+        planner.solve()
+        elapsed = time.perf_counter() - start
+        V = planner.voltages[planner.monitored]
+        print(f"max_workers = {max_workers}: {elapsed:.3f} s, {sum(abs(q) for q in planner.plan.values()):.1f} MVAR at "
+              f"{len(planner.plan)} buses, voltages {V.min():.4f} to {V.max():.4f} pu, {planner.evaluations} plans checked")
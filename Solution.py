@@ -10,7 +10,59 @@ Date: 2025-02-24
 from Circuit import Circuit, ThreePhaseFault, UnsymmetricalFaults
 import numpy as np
 import pandas as pd
+import time
 from math import sin, cos
+from scipy import sparse
+from scipy.sparse.linalg import splu, spilu, gmres, LinearOperator
+from scipy.linalg import lu_factor, lu_solve
+from BusOrdering import calc_state_ordering
+
+
+def calc_dS_dV(Ybus, V):
+    """
+    Sparse derivatives of the bus power injections with respect to the voltage angles and magnitudes
+    :param Ybus: Sparse admittance matrix
+    :param V: Complex bus voltages
+    :return: (dS/dangle, dS/dmagnitude) scipy.sparse.csr_matrix
+    """
+    I = Ybus @ V
+    diagV = sparse.diags(V)
+    diagI = sparse.diags(I)
+    diagVnorm = sparse.diags(V/np.abs(V))
+    dS_dd = 1j*diagV @ (diagI - Ybus @ diagV).conj()
+    dS_dV = diagV @ (Ybus @ diagVnorm).conj() + diagI.conj() @ diagVnorm
+    return dS_dd.tocsr(), dS_dV.tocsr()
+
+
+def calc_load_change(load_model, magnitude, powerbase):
+    """
+    Change of the bus injections from the nominal loads, which the bus powers hold, to the loads at the
+    given voltages, and its derivative with respect to the voltage magnitudes
+    :param load_model: Per bus load model arrays from Circuit.get_load_model
+    :param magnitude: Bus voltage magnitudes in pu
+    :param powerbase: System power base
+    :return: (change, d change/d magnitude) np.ndarray of complex pu values per bus
+    """
+    change = []
+    derivative = []
+    for kind, exponent in [("P", "ep"), ("Q", "eq")]:
+        z, i, e, n = load_model[f"{kind}z"], load_model[f"{kind}i"], load_model[f"{kind}e"], load_model[exponent]
+        power = magnitude**n
+        change.append(z*(1 - magnitude**2) + i*(1 - magnitude) + e*(1 - power))
+        derivative.append(-(2*z*magnitude + i + e*n*power/magnitude))
+    return (change[0] + 1j*change[1])/powerbase, (derivative[0] + 1j*derivative[1])/powerbase
+
+
+def calc_tap_branch_values(Y, tap, shift):
+    """
+    Branch entries of transformers with an off nominal complex ratio at their from bus
+    :param Y: Leakage admittances in pu
+    :param tap: Turns ratios in pu
+    :param shift: Phase shifts in radians
+    :return: (yff, yft, ytf, ytt) np.ndarray
+    """
+    t = tap*np.exp(1j*shift)
+    return Y/tap**2, -Y/np.conj(t), -Y/t, Y
 
 
 class NewtonRaphson:
@@ -24,13 +76,29 @@ class NewtonRaphson:
         :param var_limit: Include VAR limiting calculation
         """
         self.circuit = circuit
-        self.buses = self.circuit.buses.copy()
-        self.pv_indexes = self.circuit.pv_indexes.copy()
-        self.pq_indexes = self.circuit.pq_indexes.copy()
+        with circuit.lock:
+            # per solve copies of the circuit data, so a solve never changes the circuit's buses and
+            # solves of the same circuit can run at the same time
+            self.Ybus = self.get_Ybus(circuit)
+            self.count = circuit.count
+            self.powerbase = circuit.powerbase
+            self.bus_types = {name: bus.type for name, bus in circuit.buses.items()}
+            self.bus_power = {name: [bus.real_power, bus.reactive_power] for name, bus in circuit.buses.items()}
+            self.generators = [(gen.bus, gen.name, circuit.buses[gen.bus].index, gen.var_limit)
+                               for gen in circuit.generators.values()]
+            self.voltage_setpoints = np.ones(self.count)  # generator voltages at slack and PV buses
+            for gen in circuit.generators.values():
+                self.voltage_setpoints[circuit.buses[gen.bus].index-1] = gen.voltage
+            self.pv_indexes = circuit.pv_indexes.copy()
+            self.pq_indexes = circuit.pq_indexes.copy()
+            self.slack_index = circuit.slack_index-1
+            load_model = circuit.get_load_model()
+            self.tap_controls = self.get_tap_controls(circuit)
+            self.slack_model = self.get_slack_model(circuit)
+        # loads that change with voltage, None when every load is constant power
+        self.load_model = load_model if load_model["dependent"] else None
         self.pq_and_pv_indexes = None
-        self.slack_index = self.circuit.slack_index-1
-        self.Ymag = np.abs(self.circuit.Ybus)
-        self.theta = np.angle(self.circuit.Ybus)
+        self.Ymag, self.theta = self.calc_polar_Ybus()
         self.tolerance = 0.001
         self.xfull = None
         self.J1 = None
@@ -38,6 +106,122 @@ class NewtonRaphson:
         self.J3 = None
         self.J4 = None
         self.var_limit = var_limit
+        self.converged = None  # set once the solve finishes
+        self.iterations = 0  # number of linear solves taken
+        self.strategy = "full"  # how each Newton step is taken, see set_strategy
+        self.reuse = 4  # most iterations one factorization is used for in dishonest mode
+        self.factorizations = 0  # Jacobian factorizations in the last solve
+        self.factorizations_saved = 0  # iterations of the last solve that reused a factorization
+        self.tap_control = False  # adjust the controlling transformers' taps, see set_tap_control
+        self.tap_rounds = 0  # tap adjustments made in the last solve
+        self.distributed = False  # share the mismatch among the generators, see set_distributed_slack
+        self.slack_values = None  # pu power taken by each slack group in the last solve
+        self.interchange = None  # pu net export of each controlled area in the last solve
+
+
+    def get_tap_controls(self, circuit: Circuit):
+        """
+        Transformers that regulate a bus voltage, as arrays
+        :param circuit: Circuit to solve
+        :return: dict of np.ndarray, None if no transformer regulates a voltage
+        """
+        xfmrs = [xfmr for xfmr in circuit.transformers.values() if xfmr.regulated_bus is not None]
+        if len(xfmrs) == 0:
+            return None
+        return {"name": [xfmr.name for xfmr in xfmrs],
+                "from": np.array([xfmr.bus1.index-1 for xfmr in xfmrs], dtype=int),
+                "to": np.array([xfmr.bus2.index-1 for xfmr in xfmrs], dtype=int),
+                "Y": np.array([xfmr.Ypu for xfmr in xfmrs], dtype=complex),
+                "tap": np.array([xfmr.tap for xfmr in xfmrs], dtype=float),
+                "shift": np.deg2rad([xfmr.shift for xfmr in xfmrs]),
+                "bus": np.array([xfmr.regulated_bus.index-1 for xfmr in xfmrs], dtype=int),
+                "target": np.array([xfmr.target_voltage for xfmr in xfmrs], dtype=float),
+                "min": np.array([xfmr.tap_min for xfmr in xfmrs], dtype=float),
+                "max": np.array([xfmr.tap_max for xfmr in xfmrs], dtype=float),
+                "step": np.array([xfmr.tap_step for xfmr in xfmrs], dtype=float)}
+
+
+    def get_slack_model(self, circuit: Circuit):
+        """
+        Share of each slack group taken at every bus, and the tie line ends of each area with an interchange
+        schedule. Group 0 is the rest of the system, which takes the mismatch the scheduled areas don't.
+        :param circuit: Circuit to solve
+        :return: dict of np.ndarray
+        """
+        areas = np.empty(self.count, dtype=int)
+        areas[[bus.index-1 for bus in circuit.buses.values()]] = [bus.area for bus in circuit.buses.values()]
+        gens = list(circuit.generators.values())
+        index = np.array([circuit.buses[gen.bus].index-1 for gen in gens], dtype=int)
+        slack_area = areas[circuit.slack_index-1]
+        controlled = [area for area in circuit.interchanges if area != slack_area and np.any(areas[index] == area)]
+        if len(controlled) != len(circuit.interchanges):
+            print(f"WARNING: Areas {sorted(set(circuit.interchanges) - set(controlled))} have the slack bus or no "
+                  f"generators, their interchange schedules are not held.")
+
+        # participation factors are normalized within each group, machine ratings stand in for missing ones
+        group = pd.Series(np.arange(1, len(controlled)+1), index=controlled).reindex(areas[index]).fillna(0).to_numpy(dtype=int)
+        weight = np.array([gen.participation for gen in gens], dtype=float)
+        rating = np.array([gen.mva_base for gen in gens], dtype=float)
+        K = np.zeros((self.count, len(controlled)+1))
+        for g in range(len(controlled)+1):
+            members = group == g
+            shares = weight[members] if weight[members].sum() > 0 else rating[members]
+            shares = shares if shares.sum() > 0 else np.ones(len(shares))
+            np.add.at(K[:, g], index[members], shares/shares.sum())
+
+        # an area's export is the flow into the tie lines at their ends inside the area
+        branches = circuit.branches
+        from_bus, to_bus = branches["from"], branches["to"]
+        row = pd.Series(np.arange(len(controlled)), index=controlled)
+        row_from = row.reindex(areas[from_bus]).to_numpy()
+        row_to = row.reindex(areas[to_bus]).to_numpy()
+        tie = areas[from_bus] != areas[to_bus]
+        at_from = tie & ~np.isnan(row_from)
+        at_to = tie & ~np.isnan(row_to)
+        return {"K": K, "groups": ["system"] + [f"area {area}" for area in controlled],
+                "end": np.concatenate((from_bus[at_from], to_bus[at_to])),
+                "other": np.concatenate((to_bus[at_from], from_bus[at_to])),
+                "yee": np.concatenate((branches["yff"][at_from], branches["ytt"][at_to])),
+                "yeo": np.concatenate((branches["yft"][at_from], branches["ytf"][at_to])),
+                "row": np.concatenate((row_from[at_from], row_to[at_to])).astype(int),
+                "target": np.array([circuit.interchanges[area] for area in controlled], dtype=float)*1e6/self.powerbase}
+
+
+    def set_distributed_slack(self, enabled: bool = True):
+        """
+        Turns the distributed slack on or off. The generators then share the mismatch by their participation
+        factors and the areas with an interchange schedule hold it with their own generators, through one
+        slack variable per group solved with the voltages.
+        :param enabled: Use the distributed slack
+        :return:
+        """
+        self.distributed = enabled
+
+
+    def set_tap_control(self, enabled: bool = True):
+        """
+        Turns automatic tap adjustment on or off
+        :param enabled: Adjust the taps of transformers with a regulated bus
+        :return:
+        """
+        self.tap_control = enabled
+
+
+    def set_strategy(self, strategy: str = "full", reuse: int = 4):
+        """
+        Chooses how each Newton step is taken. The full step is the original algorithm. The optimal multiplier
+        (Iwamoto) scales each step to minimize a quadratic model of the mismatch along it, built from the
+        mismatch at the full step, and backtracking halves the step until the mismatch falls enough. Both
+        keep stressed cases from oscillating or diverging. Dishonest Newton reuses one Jacobian factorization
+        for several iterations and factors again when the mismatch stops falling quickly.
+        :param strategy: "full", "iwamoto", "backtracking" or "dishonest"
+        :param reuse: Most iterations one factorization is used for in dishonest mode
+        :return:
+        """
+        if strategy not in ["full", "iwamoto", "backtracking", "dishonest"]:
+            raise ValueError(f"{strategy} is not a Newton strategy. Use 'full', 'iwamoto', 'backtracking' or 'dishonest'")
+        self.strategy = strategy
+        self.reuse = reuse
 
 
     def set_tolerance(self, tol: float):
@@ -49,17 +233,34 @@ class NewtonRaphson:
         self.tolerance = tol
 
 
+    def get_Ybus(self, circuit: Circuit):
+        """
+        Admittance matrix the solver works on
+        :param circuit: Circuit to solve
+        :return: np.ndarray
+        """
+        return circuit.get_Ybus()
+
+
+    def calc_polar_Ybus(self):
+        """
+        Admittance matrix magnitudes and angles used by the Jacobian loops
+        :return: (np.ndarray, np.ndarray)
+        """
+        return np.abs(self.Ybus), np.angle(self.Ybus)
+
+
     def x_setup(self):
         """
         Function to initialize x
         :return:
         """
-        d = np.zeros(self.circuit.count)
-        V = np.ones(self.circuit.count)
+        d = np.zeros(self.count)
+        V = self.voltage_setpoints.copy()
         xfull = np.concatenate((d, V))
 
-        x_indexes = [f"d{i+1}" for i in range(self.circuit.count)]
-        [x_indexes.append(f"V{i+1}") for i in range(self.circuit.count)]
+        x_indexes = [f"d{i+1}" for i in range(self.count)]
+        [x_indexes.append(f"V{i+1}") for i in range(self.count)]
         xfull = pd.DataFrame(xfull, index=x_indexes, columns=["x"])
 
         x = xfull.drop(index=f"d{self.slack_index+1}").drop(
@@ -79,14 +280,15 @@ class NewtonRaphson:
         P = []
         Q = []
  
-        for bus in self.buses:
+        for bus, type in self.bus_types.items():
+            real_power, reactive_power = self.bus_power[bus]
 
-            if self.buses[bus].type == "PQ":
-                P.append(self.buses[bus].real_power/self.circuit.powerbase)
-                Q.append(self.buses[bus].reactive_power/self.circuit.powerbase)
+            if type == "PQ":
+                P.append(real_power/self.powerbase)
+                Q.append(reactive_power/self.powerbase)
 
-            elif self.buses[bus].type == "PV":
-                P.append(self.buses[bus].real_power/self.circuit.powerbase)
+            elif type == "PV":
+                P.append(real_power/self.powerbase)
 
         y = np.concatenate((P, Q))
         indexes = [f"P{i}" for i in self.pq_and_pv_indexes]
@@ -102,9 +304,9 @@ class NewtonRaphson:
         :return:
         """
         y = self.flat_start_y()
-        y_indexes = [f"P{i+1}" for i in range(self.circuit.count)]
-        [y_indexes.append(f"Q{i+1}") for i in range(self.circuit.count)]
-        yfull = pd.DataFrame(np.zeros(self.circuit.count*2), columns=["y"], index=y_indexes)
+        y_indexes = [f"P{i+1}" for i in range(self.count)]
+        [y_indexes.append(f"Q{i+1}") for i in range(self.count)]
+        yfull = pd.DataFrame(np.zeros(self.count*2), columns=["y"], index=y_indexes)
         yfull.update(y)
 
         return yfull, y
@@ -130,8 +332,15 @@ class NewtonRaphson:
         Newton Raphson algorithm for calculating power flow
         :return:
         """
+        if self.strategy != "full" or self.load_model is not None or self.tap_control or self.distributed:
+            return self.solve_vectorized()
+
         iter = 50
-        M = self.circuit.count-1
+        self.factorizations_saved = 0
+        M = self.count-1
+        self.converged = True
+        self.iterations = 0
+        self.factorizations = 0
         
         self.calc_indexes()
         self.xfull, x = self.x_setup()
@@ -139,7 +348,7 @@ class NewtonRaphson:
 
         for i in range(iter):
           # step 1
-          f = self.circuit.compute_power_injection(self.xfull, self.pq_and_pv_indexes, self.pv_indexes, self.pq_indexes)
+          f = self.circuit.compute_power_injection(self.xfull, self.pq_and_pv_indexes, self.pv_indexes, self.pq_indexes, self.Ybus)
           deltay = y - f
 
           if np.max(abs(deltay)) < self.tolerance:  # calculations converged
@@ -156,7 +365,7 @@ class NewtonRaphson:
                   else:  # var limits were exceeded for some generator
                     self.update_indexes(exceeded_gens)
                     iter = 50
-                    M = self.circuit.count-1
+                    M = self.count-1
         
                     self.calc_indexes()
                     self.xfull, x = self.x_setup()
@@ -166,7 +375,7 @@ class NewtonRaphson:
                     for i in range(iter):
 
                         # step 1
-                        f = self.circuit.compute_power_injection(self.xfull, self.pq_and_pv_indexes, self.pv_indexes, self.pq_indexes)
+                        f = self.circuit.compute_power_injection(self.xfull, self.pq_and_pv_indexes, self.pv_indexes, self.pq_indexes, self.Ybus)
                         deltay = y - f
 
                         if np.max(abs(deltay)) < self.tolerance:  # calculations converged
@@ -189,12 +398,15 @@ class NewtonRaphson:
                         # step 3
                         J = np.block([[self.J1.to_numpy(), self.J2.to_numpy()], [self.J3.to_numpy(), self.J4.to_numpy()]])
                         deltax = np.linalg.solve(J, deltay.to_numpy())
+                        self.iterations += 1
+                        self.factorizations += 1
 
                         #step 4
                         x = x + deltax
                         self.xfull.update(x)
 
                     yfull.update(self.calc_y(self.xfull))
+                    self.converged = False
                     print("WARNING: System did not converge.")
 
                     '''end recalc power flow'''
@@ -216,12 +428,15 @@ class NewtonRaphson:
           # step 3
           J = np.block([[self.J1.to_numpy(), self.J2.to_numpy()], [self.J3.to_numpy(), self.J4.to_numpy()]])
           deltax = np.linalg.solve(J, deltay.to_numpy())
+          self.iterations += 1
+          self.factorizations += 1
 
           #step 4
           x = x + deltax
           self.xfull.update(x)
 
         yfull.update(self.calc_y(self.xfull))
+        self.converged = False
         print("WARNING: System did not converge.")
         return self.xfull, yfull
         
@@ -234,7 +449,7 @@ class NewtonRaphson:
         """
         d = self.xfull[self.xfull.index.str.startswith('d')]
         V = self.xfull[self.xfull.index.str.startswith('V')]
-        J1 = np.zeros((self.circuit.count, self.circuit.count))
+        J1 = np.zeros((self.count, self.count))
         for k in self.pq_and_pv_indexes:
             for n in range(M+1):
                 if n+1 == k:
@@ -282,7 +497,7 @@ class NewtonRaphson:
         :param M: Bus count minus one
         :return:
         """
-        J2 = np.zeros((self.circuit.count, self.circuit.count))
+        J2 = np.zeros((self.count, self.count))
         d = self.xfull[self.xfull.index.str.startswith('d')]
         V = self.xfull[self.xfull.index.str.startswith('V')]
         for k in self.pq_and_pv_indexes:
@@ -332,7 +547,7 @@ class NewtonRaphson:
         :param M: Bus count minus one
         :return:
         """
-        J3 = np.zeros((self.circuit.count, self.circuit.count))
+        J3 = np.zeros((self.count, self.count))
         d = self.xfull[self.xfull.index.str.startswith('d')]
         V = self.xfull[self.xfull.index.str.startswith('V')]
 
@@ -385,7 +600,7 @@ class NewtonRaphson:
         :param M: Bus count minus one
         :return:
         """
-        J4 = np.zeros((self.circuit.count, self.circuit.count))
+        J4 = np.zeros((self.count, self.count))
         d = self.xfull[self.xfull.index.str.startswith('d')]
         V = self.xfull[self.xfull.index.str.startswith('V')]
         for k in self.pq_indexes:
@@ -429,13 +644,406 @@ class NewtonRaphson:
             self.J4 = self.J4.drop(index=i-1).drop(columns=i-1)
 
 
+    def calc_bus_sets(self):
+        """
+        Zero based indexes of the buses in the mismatch and Jacobian, in bus order
+        :return: (PQ and PV buses, PQ buses)
+        """
+        pvpq = np.sort(np.concatenate((self.pq_indexes, self.pv_indexes)).astype(int)) - 1
+        pq = np.sort(np.asarray(self.pq_indexes, dtype=int)) - 1
+        return pvpq, pq
+
+
+    def calc_specified_power(self):
+        """
+        Specified complex power injection at every bus
+        :return: np.ndarray of complex pu values
+        """
+        power = np.array(list(self.bus_power.values()), dtype=float).reshape(-1, 2)
+        return (power[:, 0] + 1j*power[:, 1])/self.powerbase
+
+
+    def split_state(self, V):
+        """
+        Splits the solver state into the bus voltages and the distributed slack variables
+        :param V: Complex bus voltages, followed by the slack variables with a distributed slack
+        :return: (complex bus voltages, real slack variables) np.ndarray
+        """
+        return V[:self.count], V[self.count:].real
+
+
+    def calc_interchange(self, V):
+        """
+        Net export of each area with an interchange schedule
+        :param V: Complex bus voltages
+        :return: np.ndarray of pu real power
+        """
+        m = self.slack_model
+        Ve, Vo = V[m["end"]], V[m["other"]]
+        flows = (np.abs(Ve)**2*np.conj(m["yee"]) + Ve*np.conj(m["yeo"]*Vo)).real
+        return np.bincount(m["row"], flows, minlength=len(m["target"]))
+
+
+    def add_slack_equations(self, J, V):
+        """
+        Borders the Jacobian with the slack variables' columns and the rows of the slack bus real power
+        and the area interchanges.
+        :param J: Jacobian of the bus equations, dense or sparse
+        :param V: Complex bus voltages
+        :return: np.ndarray or scipy.sparse.csc_matrix
+        """
+        m = self.slack_model
+        K = m["K"]
+        pvpq, pq = self.calc_bus_sets()
+        n = len(pvpq) + len(pq)
+        s = self.slack_index
+        # the scheduled injections rise with the slack variables
+        C = -np.concatenate((K[pvpq], np.zeros((len(pq), K.shape[1]))))
+        D = np.zeros((K.shape[1], K.shape[1]))
+        D[0] = -K[s]
+
+        y = self.Ybus[s].toarray().ravel() if sparse.issparse(self.Ybus) else np.array(self.Ybus[s])
+        I = y @ V
+        dd = -1j*V[s]*np.conj(y*V)
+        dd[s] += 1j*V[s]*np.conj(I)
+        dv = V[s]*np.conj(y*V/np.abs(V))
+        dv[s] += np.conj(I)*V[s]/np.abs(V[s])
+        R = np.zeros((K.shape[1], n))
+        R[0] = np.concatenate((dd.real[pvpq], dv.real[pq]))
+
+        angle = np.full(self.count, -1)
+        angle[pvpq] = np.arange(len(pvpq))
+        magnitude = np.full(self.count, -1)
+        magnitude[pq] = len(pvpq) + np.arange(len(pq))
+        Ve, Vo = V[m["end"]], V[m["other"]]
+        t = Ve*np.conj(m["yeo"]*Vo)
+        for columns, values in [(angle[m["end"]], (1j*t).real), (angle[m["other"]], (-1j*t).real),
+                                (magnitude[m["end"]], 2*np.abs(Ve)*m["yee"].real + t.real/np.abs(Ve)),
+                                (magnitude[m["other"]], t.real/np.abs(Vo))]:
+            keep = columns >= 0
+            np.add.at(R, (1 + m["row"][keep], columns[keep]), values[keep])
+
+        if sparse.issparse(J):
+            return sparse.bmat([[J, sparse.csr_matrix(C)], [sparse.csr_matrix(R), sparse.csr_matrix(D)]], format="csc")
+        return np.block([[J, C], [R, D]])
+
+
+    def calc_mismatch(self, V, S):
+        """
+        Vectorized power mismatch, specified minus calculated, ordered like y
+        :param V: Complex bus voltages, followed by the slack variables with a distributed slack
+        :param S: Specified complex power injections
+        :return: np.ndarray [P at PQ and PV buses, Q at PQ buses], then P at the slack bus and the area
+                 interchange mismatches with a distributed slack
+        """
+        V, slack = self.split_state(V)
+        pvpq, pq = self.calc_bus_sets()
+        if len(slack) != 0:
+            S = S + self.slack_model["K"] @ slack
+        dS = S - V*np.conj(self.Ybus @ V)
+        if self.load_model is not None:
+            dS += calc_load_change(self.load_model, np.abs(V), self.powerbase)[0]
+        mismatch = np.concatenate((dS.real[pvpq], dS.imag[pq]))
+        if len(slack) == 0:
+            return mismatch
+        return np.concatenate((mismatch, [dS.real[self.slack_index]], self.slack_model["target"] - self.calc_interchange(V)))
+
+
+    def calc_jacobian(self, V):
+        """
+        Vectorized Jacobian [[J1, J2], [J3, J4]] at the given voltages. Gives the same matrix as the
+        calc_J* functions from the complex power derivatives instead of per element loops.
+        :param V: Complex bus voltages, followed by the slack variables with a distributed slack
+        :return: np.ndarray
+        """
+        V, slack = self.split_state(V)
+        pvpq, pq = self.calc_bus_sets()
+        I = self.Ybus @ V
+        Vnorm = V/np.abs(V)
+        dS_dd = 1j*V[:, None]*np.conj(np.diag(I) - self.Ybus*V[None, :])
+        dS_dV = V[:, None]*np.conj(self.Ybus*Vnorm[None, :]) + np.diag(np.conj(I)*Vnorm)
+        if self.load_model is not None:
+            # the specified power depends on the voltage magnitudes too, on the diagonal only
+            dS_dV[np.diag_indices_from(dS_dV)] -= calc_load_change(self.load_model, np.abs(V), self.powerbase)[1]
+        J = np.block([[dS_dd.real[np.ix_(pvpq, pvpq)], dS_dV.real[np.ix_(pvpq, pq)]],
+                      [dS_dd.imag[np.ix_(pq, pvpq)], dS_dV.imag[np.ix_(pq, pq)]]])
+        return J if len(slack) == 0 else self.add_slack_equations(J, V)
+
+
+    def factor_jacobian(self, J):
+        """
+        Factors the Jacobian.
+        :param J: Dense Jacobian
+        :return: (LU factors, None)
+        """
+        return lu_factor(J), None
+
+
+    def solve_factored(self, lu, p, b):
+        """
+        Solves with the factors of the Jacobian.
+        :param lu: Factors from factor_jacobian
+        :param p: Not used by the dense solver
+        :param b: Right hand side
+        :return: np.ndarray
+        """
+        return lu_solve(lu, b)
+
+
+    def prepare_step(self, V):
+        """
+        Factors the Jacobian at the given voltages for the Newton steps that follow.
+        :param V: Complex bus voltages
+        :return: factors for solve_step
+        """
+        return self.factor_jacobian(self.calc_jacobian(V))
+
+
+    def solve_step(self, factors, V, S, mismatch):
+        """
+        Newton update from the factored Jacobian.
+        :param factors: From prepare_step
+        :param V: Complex bus voltages
+        :param S: Specified complex power injections
+        :param mismatch: Mismatch at V
+        :return: np.ndarray
+        """
+        return self.solve_factored(*factors, mismatch)
+
+
+    def calc_injections(self, V):
+        """
+        Calculate the y vector from the bus voltages
+        :param V: Complex bus voltages
+        :return: pd.DataFrame
+        """
+        V = V[:self.count]
+        S = V*np.conj(self.Ybus @ V)
+        y = np.concatenate((S.real, S.imag))
+        y[np.abs(y) < 1e-3] = 0
+        indexes = [f"P{i+1}" for i in range(self.count)] + [f"Q{i+1}" for i in range(self.count)]
+        return pd.DataFrame(y, index=indexes, columns=["y"])
+
+
+    def update_voltages(self, V, dx, step: float = 1.0):
+        """
+        Takes a Newton step, or part of one, from the given voltages.
+        :param V: Complex bus voltages
+        :param dx: Angle and magnitude update
+        :param step: Fraction of the update taken
+        :return: np.ndarray of complex
+        """
+        V, slack = self.split_state(V)
+        pvpq, pq = self.calc_bus_sets()
+        n = len(pvpq) + len(pq)
+        angle = np.angle(V)
+        magnitude = np.abs(V)
+        angle[pvpq] += step*dx[:len(pvpq)]
+        magnitude[pq] += step*dx[len(pvpq):n]
+        V = magnitude*np.exp(1j*angle)
+        return V if len(slack) == 0 else np.concatenate((V, slack + step*dx[n:]))
+
+
+    def calc_step(self, V, S, dx, mismatch):
+        """
+        Length of the Newton step for the chosen strategy.
+        :param V: Complex bus voltages
+        :param S: Specified complex power injections
+        :param dx: Newton update
+        :param mismatch: Mismatch at V
+        :return: (new voltages, mismatch at them, fraction of the step taken)
+        """
+        V_full = self.update_voltages(V, dx)
+        mismatch_full = self.calc_mismatch(V_full, S)
+        if self.strategy == "iwamoto":
+            # along the step the mismatch is close to (1 - mu) a + mu^2 c, with c what the full step leaves;
+            # the multiplier is the root of the derivative of its squared norm that gives the smallest norm
+            A, B, C = mismatch @ mismatch, mismatch @ mismatch_full, mismatch_full @ mismatch_full
+            roots = np.roots([4*C, -6*B, 2*A + 4*B, -2*A])
+            roots = roots[(np.abs(roots.imag) < 1e-9) & (roots.real > 0)].real
+            if len(roots) == 0:
+                return V_full, mismatch_full, 1.0
+            norms = (1 - roots)**2*A + 2*(1 - roots)*roots**2*B + roots**4*C
+            step = min(roots[np.argmin(norms)], 1.0)
+            if abs(step - 1.0) < 1e-3:
+                return V_full, mismatch_full, 1.0
+            V_new = self.update_voltages(V, dx, step)
+            return V_new, self.calc_mismatch(V_new, S), step
+
+        if self.strategy == "backtracking":
+            norm = np.linalg.norm(mismatch)
+            step, V_new, mismatch_new = 1.0, V_full, mismatch_full
+            while np.linalg.norm(mismatch_new) > (1 - 1e-4*step)*norm and step > 1/64:
+                step /= 2
+                V_new = self.update_voltages(V, dx, step)
+                mismatch_new = self.calc_mismatch(V_new, S)
+            return V_new, mismatch_new, step
+
+        return V_full, mismatch_full, 1.0
+
+
+    def iterate(self, V, S):
+        """
+        Newton iterations from the given voltages until the mismatch is within tolerance
+        :param V: Complex bus voltages to start from
+        :param S: Specified complex power injections
+        :return: np.ndarray of complex solved voltages
+        """
+        mismatch = self.calc_mismatch(V, S)
+        factors = None
+        uses = 0  # iterations the current factors have been used for
+        for i in range(50):
+            if np.max(np.abs(mismatch)) < self.tolerance:
+                break
+            if factors is None:
+                factors = self.prepare_step(V)
+                self.factorizations += 1
+                uses = 0
+            else:
+                self.factorizations_saved += 1
+            dx = self.solve_step(factors, V, S, mismatch)
+            self.iterations += 1
+            uses += 1
+            previous = np.max(np.abs(mismatch))
+            V, mismatch, step = self.calc_step(V, S, dx, mismatch)
+            if self.strategy == "iwamoto" and step < 1e-3:
+                # the multiplier falls to zero when the mismatch cannot be reduced along any Newton step
+                print("WARNING: Optimal multiplier is near zero, the case is likely past its loadability limit.")
+                self.converged = False
+                break
+
+            # dishonest Newton keeps the factors while they still cut the mismatch at least in half
+            if self.strategy != "dishonest" or uses >= self.reuse or np.max(np.abs(mismatch)) > 0.5*previous:
+                factors = None
+        else:
+            self.converged = False
+            print("WARNING: System did not converge.")
+        return V
+
+
+    def solve_vectorized(self):
+        """
+        Newton Raphson algorithm on the complex bus voltages, with the step strategy from set_strategy
+        :return: (x, y)
+        """
+        self.converged = True
+        self.iterations = 0
+        self.factorizations = 0
+        self.factorizations_saved = 0
+        self.calc_indexes()
+        limited = False  # VAR limits are applied once, like the original algorithm
+
+        while True:
+            S = self.calc_specified_power()
+            V = self.voltage_setpoints.astype(complex)
+            if self.distributed:
+                V = np.concatenate((V, np.zeros(len(self.slack_model["groups"]))))
+            V = self.iterate(V, S)
+            self.tap_rounds = 0
+            while self.tap_control and self.tap_controls is not None and self.converged and self.tap_rounds < 10:
+                if not self.adjust_taps(V):
+                    break
+                # continues from the last solution, which is already close with the new taps
+                V = self.iterate(V, S)
+                self.tap_rounds += 1
+            V, self.slack_values = self.split_state(V)
+            if self.distributed:
+                self.interchange = self.calc_interchange(V)
+
+            x_indexes = [f"d{i+1}" for i in range(self.count)] + [f"V{i+1}" for i in range(self.count)]
+            self.xfull = pd.DataFrame(np.concatenate((np.angle(V), np.abs(V))), index=x_indexes, columns=["x"])
+            yfull = self.calc_injections(V)
+
+            if self.var_limit == False or limited or not self.converged:
+                return self.xfull, yfull
+
+            exceeded_gens = self.check_var_limit(yfull)
+            if len(exceeded_gens) <= 0:
+                return self.xfull, yfull
+            self.update_indexes(exceeded_gens)
+            self.calc_indexes()
+            limited = True
+
+
+    def calc_tap_derivatives(self, V):
+        """
+        Derivatives of the bus power injections with respect to each controlling transformer's tap
+        :param V: Complex bus voltages
+        :return: np.ndarray of complex, a row per bus and a column per transformer
+        """
+        c = self.tap_controls
+        yff, yft, ytf, ytt = calc_tap_branch_values(c["Y"], c["tap"], c["shift"])
+        Vf, Vt = V[c["from"]], V[c["to"]]
+        columns = np.arange(len(c["tap"]))
+        dS = np.zeros((self.count, len(columns)), dtype=complex)
+        np.add.at(dS, (c["from"], columns), Vf*np.conj(-2*yff/c["tap"]*Vf - yft/c["tap"]*Vt))
+        np.add.at(dS, (c["to"], columns), Vt*np.conj(-ytf/c["tap"]*Vf))
+        return dS
+
+
+    def set_taps(self, taps):
+        """
+        Writes new taps of the controlling transformers into the solver's admittance matrix
+        :param taps: Turns ratios in pu
+        :return:
+        """
+        c = self.tap_controls
+        old = np.column_stack(calc_tap_branch_values(c["Y"], c["tap"], c["shift"]))
+        new = np.column_stack(calc_tap_branch_values(c["Y"], taps, c["shift"]))
+        change = (new - old).T.ravel()
+        rows = np.concatenate((c["from"], c["from"], c["to"], c["to"]))
+        cols = np.concatenate((c["from"], c["to"], c["from"], c["to"]))
+        if sparse.issparse(self.Ybus):
+            self.Ybus = (self.Ybus + sparse.csr_matrix((change, (rows, cols)), shape=self.Ybus.shape)).tocsr()
+        else:
+            self.Ybus = self.Ybus.copy()  # the circuit's matrix is left as it was
+            np.add.at(self.Ybus, (rows, cols), change)
+        c["tap"] = np.asarray(taps, dtype=float).copy()
+
+
+    def adjust_taps(self, V):
+        """
+        Moves the controlling transformers' taps to the whole steps nearest the taps that bring their
+        regulated voltages to target, from the sensitivity of those voltages to the taps at the solved
+        state. One Jacobian factorization serves every transformer, and a regulated bus held by a
+        generator is left alone.
+        :param V: Solved complex bus voltages
+        :return: bool, True if any tap moved
+        """
+        c = self.tap_controls
+        V = V[:self.count]
+        pvpq, pq = self.calc_bus_sets()
+        rows = np.full(self.count, -1)
+        rows[pq] = len(pvpq) + np.arange(len(pq))
+        rows = rows[c["bus"]]
+        active = np.flatnonzero(rows >= 0)
+        if len(active) == 0:
+            return False
+
+        dS = self.calc_tap_derivatives(V)[:, active]
+        lu, p = self.factor_jacobian(self.calc_jacobian(V))
+        self.factorizations += 1
+        # the Newton equations J dx + dS/dt dt = 0 give the state change per unit of tap
+        dx_dt = -self.solve_factored(lu, p, np.concatenate((dS.real[pvpq], dS.imag[pq])))
+        error = c["target"][active] - np.abs(V[c["bus"][active]])
+        change = np.linalg.lstsq(dx_dt[rows[active]], error, rcond=None)[0]
+
+        taps = c["tap"].copy()
+        step = c["step"][active]
+        taps[active] = np.clip(1 + np.round((taps[active] + change - 1)/step)*step, c["min"][active], c["max"][active])
+        if np.all(np.abs(taps - c["tap"]) < 1e-9):
+            return False
+        self.set_taps(taps)
+        return True
+
+
     def calc_y(self, xfull):
         """
         Calculate the y vector from the x vector
         :param xfull: x vector
         :return:
         """
-        N = self.circuit.count
+        N = self.count
         d = xfull[xfull.index.str.startswith('d')]
         V = xfull[xfull.index.str.startswith('V')]
         y = np.zeros(N*2)
@@ -466,6 +1074,30 @@ class NewtonRaphson:
         return y
 
 
+    def get_slack_summary(self):
+        """
+        Power taken by each slack group and the interchange of each scheduled area in the last solve
+        :return: pd.DataFrame
+        """
+        if not self.distributed or self.slack_values is None:
+            return pd.DataFrame()
+        m = self.slack_model
+        scale = self.powerbase/1e6
+        return pd.DataFrame({"Group": m["groups"], "Slack MW": self.slack_values*scale,
+                             "Scheduled export MW": np.concatenate(([np.nan], m["target"]*scale)),
+                             "Export MW": np.concatenate(([np.nan], self.interchange*scale))})
+
+
+    def get_sensitivity(self):
+        """
+        Voltage and angle sensitivities to bus injections at the solved state, from the Jacobian there
+        :return: PowerFlowSensitivity
+        """
+        from Sensitivity import PowerFlowSensitivity
+        x = self.xfull.to_numpy()[:, 0]
+        return PowerFlowSensitivity(self, x[self.count:]*np.exp(1j*x[:self.count]))
+
+
     def check_var_limit(self, yfull):
         """
         Check if any VAR limit has been exceeded
@@ -475,10 +1107,9 @@ class NewtonRaphson:
         Q = yfull[yfull.index.str.startswith('Q')]
         exceeded_gens = {}
 
-        for gen in self.circuit.generators.values():
-            n = self.circuit.buses[gen.bus].index
-            if Q.iloc[n-1, 0] > gen.var_limit/self.circuit.powerbase:
-                exceeded_gens.update({n: [gen.bus, gen.name, n]})
+        for bus, name, n, var_limit in self.generators:
+            if Q.iloc[n-1, 0] > var_limit/self.powerbase:
+                exceeded_gens.update({n: [bus, name, n, var_limit]})
 
         return exceeded_gens
 
@@ -490,13 +1121,259 @@ class NewtonRaphson:
         :return:
         """
         for data in exceeded_gens.values():
-            bus, gen, index = data
-            self.buses[bus].type = "PQ"
-            self.buses[bus].reactive_power = self.circuit.generators[gen].var_limit
+            bus, gen, index, var_limit = data
+            self.bus_types[bus] = "PQ"
+            self.bus_power[bus][1] = var_limit
             self.pq_indexes.append(index)
             self.pv_indexes.remove(index)
 
 
+class SparseNewtonRaphson(NewtonRaphson):
+    """
+    NewtonRaphson algorithm on the sparse admittance matrix and Jacobian, for large systems. The Jacobian
+    unknowns are reordered with a fill reducing bus ordering before each factorization; bus indexes seen
+    by the user are not changed.
+    """
+    def __init__(self, circuit: Circuit, var_limit: bool, ordering: str = "amd"):
+        """
+        Constructor for SparseNewtonRaphson object
+        :param circuit: Circuit to solve
+        :param var_limit: Include VAR limiting calculation
+        :param ordering: "amd" or "rcm" bus ordering, "colamd" to leave the ordering to SuperLU, or None
+                         to factor in bus index order
+        """
+        super().__init__(circuit, var_limit)
+        self.ordering = ordering
+        self.bus_ordering = circuit.get_bus_ordering(ordering) if ordering in ["amd", "rcm"] else None
+        self.buses = list(self.bus_types)
+        self.factor_nnz = 0  # nonzeros in the L and U factors of the last factorization
+
+
+    def get_Ybus(self, circuit: Circuit):
+        """
+        Admittance matrix the solver works on
+        :param circuit: Circuit to solve
+        :return: scipy.sparse.csr_matrix
+        """
+        return circuit.get_Ybus_sparse()
+
+
+    def calc_polar_Ybus(self):
+        """
+        Not used, the sparse Jacobian is built from the complex power derivatives
+        :return: (None, None)
+        """
+        return None, None
+
+
+    def calc_jacobian(self, V):
+        """
+        Sparse Jacobian [[J1, J2], [J3, J4]] at the given voltages
+        :param V: Complex bus voltages, followed by the slack variables with a distributed slack
+        :return: scipy.sparse.csc_matrix
+        """
+        V, slack = self.split_state(V)
+        pvpq, pq = self.calc_bus_sets()
+        dS_dd, dS_dV = calc_dS_dV(self.Ybus, V)
+        if self.load_model is not None:
+            dS_dV = (dS_dV - sparse.diags(calc_load_change(self.load_model, np.abs(V), self.powerbase)[1])).tocsr()
+        J = sparse.bmat([[dS_dd[pvpq][:, pvpq].real, dS_dV[pvpq][:, pq].real],
+                         [dS_dd[pq][:, pvpq].imag, dS_dV[pq][:, pq].imag]], format="csc")
+        return J if len(slack) == 0 else self.add_slack_equations(J, V)
+
+
+    def factor_jacobian(self, J):
+        """
+        Factors the Jacobian in the chosen ordering.
+        :param J: Sparse Jacobian
+        :return: (scipy.sparse.linalg.SuperLU, np.ndarray of the factored order of the unknowns or None)
+        """
+        if self.bus_ordering is None:
+            lu = splu(J, permc_spec="COLAMD" if self.ordering == "colamd" else "NATURAL")
+            p = None
+        else:
+            pvpq, pq = self.calc_bus_sets()
+            p = self.calc_ordering(J, pvpq, pq)
+            lu = splu(J[p][:, p].tocsc(), permc_spec="NATURAL")
+        self.factor_nnz = lu.L.nnz + lu.U.nnz
+        return lu, p
+
+
+    def calc_ordering(self, J, pvpq, pq):
+        """
+        Order of the Jacobian unknowns from the bus ordering, with any distributed slack variables last
+        :param J: Sparse Jacobian
+        :param pvpq: Zero based PQ and PV buses
+        :param pq: Zero based PQ buses
+        :return: np.ndarray
+        """
+        p = calc_state_ordering(self.bus_ordering, pvpq, pq)
+        return np.concatenate((p, np.arange(len(p), J.shape[0])))
+
+
+    def solve_factored(self, lu, p, b):
+        """
+        Solves with the factors of the Jacobian.
+        :param lu: Factors from factor_jacobian
+        :param p: Factored order of the unknowns, or None
+        :param b: Right hand side
+        :return: np.ndarray
+        """
+        if p is None:
+            return lu.solve(b)
+        x = np.empty(b.shape)
+        x[p] = lu.solve(b[p])
+        return x
+
+
+    def solve_jacobian(self, J, mismatch):
+        """
+        Factors the Jacobian in the chosen ordering and solves for the update.
+        :param J: Sparse Jacobian
+        :param mismatch: Power mismatch
+        :return: np.ndarray
+        """
+        lu, p = self.factor_jacobian(J)
+        self.iterations += 1
+        return self.solve_factored(lu, p, mismatch)
+
+
+    def newton_raph(self):
+        """
+        Sparse Newton Raphson algorithm for calculating power flow
+        :return: (x, y)
+        """
+        return self.solve_vectorized()
+
+
+
+class KrylovNewtonRaphson(SparseNewtonRaphson):
+    """
+    Newton-Krylov power flow for very large systems. Each Newton step is solved with GMRES instead of a
+    sparse LU factorization, preconditioned by an incomplete LU of the Jacobian whose fill is capped, so
+    memory grows about linearly with the number of buses. By default the Jacobian-vector products GMRES
+    needs are finite differences of the vectorized mismatch, and the Jacobian is only formed to build the
+    preconditioner, which the dishonest strategy reuses over several Newton iterations.
+    """
+    def __init__(self, circuit: Circuit, var_limit: bool, ordering: str = "amd", jacobian_free: bool = True,
+                 drop_tol: float = 1e-4, fill_factor: float = 10, krylov_tolerance: float = 1e-4,
+                 restart: int = 50, max_inner: int = 500):
+        """
+        Constructor for KrylovNewtonRaphson object
+        :param circuit: Circuit to solve
+        :param var_limit: Include VAR limiting calculation
+        :param ordering: Bus ordering the incomplete LU is built in, "amd", "rcm", "colamd" or None
+        :param jacobian_free: Take Jacobian-vector products from the mismatch instead of the formed Jacobian
+        :param drop_tol: Incomplete LU drop tolerance
+        :param fill_factor: Most nonzeros in the incomplete LU, relative to the Jacobian
+        :param krylov_tolerance: GMRES residual tolerance relative to the mismatch
+        :param restart: GMRES restart length
+        :param max_inner: Most GMRES iterations per Newton step
+        """
+        super().__init__(circuit, var_limit, ordering)
+        self.jacobian_free = jacobian_free
+        self.drop_tol = drop_tol
+        self.fill_factor = fill_factor
+        self.krylov_tolerance = krylov_tolerance
+        self.restart = restart
+        self.max_inner = max_inner
+        self.statistics = []  # one row per Newton iteration of the last solve
+
+
+    def set_krylov_tolerance(self, tol: float, restart: int = None, max_inner: int = None):
+        """
+        Sets the GMRES tolerance and limits
+        :param tol: GMRES residual tolerance relative to the mismatch
+        :param restart: GMRES restart length
+        :param max_inner: Most GMRES iterations per Newton step
+        :return:
+        """
+        self.krylov_tolerance = tol
+        self.restart = self.restart if restart is None else restart
+        self.max_inner = self.max_inner if max_inner is None else max_inner
+
+
+    def prepare_step(self, V):
+        """
+        Builds the incomplete LU preconditioner from the Jacobian at the given voltages.
+        :param V: Complex bus voltages
+        :return: (incomplete LU, factored order of the unknowns or None, Jacobian or None)
+        """
+        J = self.calc_jacobian(V)
+        if self.bus_ordering is None:
+            p = None
+            ilu = spilu(J, drop_tol=self.drop_tol, fill_factor=self.fill_factor,
+                        permc_spec="COLAMD" if self.ordering == "colamd" else "NATURAL")
+        else:
+            pvpq, pq = self.calc_bus_sets()
+            p = self.calc_ordering(J, pvpq, pq)
+            ilu = spilu(J[p][:, p].tocsc(), drop_tol=self.drop_tol, fill_factor=self.fill_factor, permc_spec="NATURAL")
+        self.factor_nnz = ilu.L.nnz + ilu.U.nnz
+        return ilu, p, None if self.jacobian_free else J
+
+
+    def solve_step(self, factors, V, S, mismatch):
+        """
+        Newton update from preconditioned GMRES, or from a sparse LU of the Jacobian when GMRES does not converge.
+        :param factors: From prepare_step
+        :param V: Complex bus voltages
+        :param S: Specified complex power injections
+        :param mismatch: Mismatch at V
+        :return: np.ndarray
+        """
+        start = time.perf_counter()
+        ilu, p, J = factors
+        n = len(mismatch)
+        preconditioner = LinearOperator((n, n), matvec=lambda b: self.solve_factored(ilu, p, b))
+        products = [0]
+
+        def jacobian_product(v):
+            # J v from the change of the mismatch along v, which falls as the power injections rise
+            products[0] += 1
+            if J is not None:
+                return J @ v
+            norm = np.linalg.norm(v)
+            if norm == 0:
+                return np.zeros(n)
+            eps = np.sqrt(np.finfo(float).eps)*(1 + np.linalg.norm(np.abs(V)))/norm
+            return -(self.calc_mismatch(self.update_voltages(V, v, eps), S) - mismatch)/eps
+
+        residuals = []
+        A = LinearOperator((n, n), matvec=jacobian_product)
+        dx, info = gmres(A, mismatch, M=preconditioner, rtol=self.krylov_tolerance, restart=self.restart,
+                         maxiter=max(1, self.max_inner//self.restart), callback=residuals.append, callback_type="pr_norm")
+        if info != 0:
+            # an unconverged GMRES update can send the Newton iterations astray, so this step is solved directly
+            print(f"WARNING: GMRES did not converge in {len(residuals)} iterations. Solving the step with a sparse LU.")
+            ilu_nnz = self.factor_nnz
+            dx = self.solve_factored(*self.factor_jacobian(self.calc_jacobian(V) if J is None else J), mismatch)
+            self.factor_nnz = ilu_nnz  # the statistics report the preconditioner
+            self.factorizations += 1
+        self.statistics.append({"Iteration": len(self.statistics)+1, "Mismatch": np.max(np.abs(mismatch)),
+                                "GMRES iterations": len(residuals), "Jacobian products": products[0],
+                                "GMRES converged": info == 0, "Direct fallback": info != 0, "Preconditioner nnz": self.factor_nnz,
+                                "Time (s)": time.perf_counter() - start})
+        return dx
+
+
+    def solve_vectorized(self):
+        """
+        Newton-Krylov algorithm for calculating power flow
+        :return: (x, y)
+        """
+        self.statistics = []
+        return super().solve_vectorized()
+
+
+    def get_statistics(self):
+        """
+        GMRES statistics of each Newton iteration of the last solve
+        :return: pd.DataFrame
+        """
+        return pd.DataFrame(self.statistics)
+
+
+
 class FastDecoupled():
     """
     Class for FastDecoupled algorithm
@@ -508,17 +1385,31 @@ class FastDecoupled():
         :param var_limit: Include VAR limit in calculation
         """
         self.circuit = circuit
-        self.pv_indexes = self.circuit.pv_indexes.copy()
-        self.pq_indexes = self.circuit.pq_indexes.copy()
-        self.buses = self.circuit.buses.copy()
-        self.slack_index = self.circuit.slack_index-1
-        self.B = pd.DataFrame(np.imag(self.circuit.Ybus))
+        with circuit.lock:
+            # per solve copies of the circuit data, so a solve never changes the circuit's buses and
+            # solves of the same circuit can run at the same time
+            self.Ybus = circuit.get_Ybus()
+            self.count = circuit.count
+            self.powerbase = circuit.powerbase
+            self.bus_types = {name: bus.type for name, bus in circuit.buses.items()}
+            self.bus_power = {name: [bus.real_power, bus.reactive_power] for name, bus in circuit.buses.items()}
+            self.generators = [(gen.bus, gen.name, circuit.buses[gen.bus].index, gen.var_limit)
+                               for gen in circuit.generators.values()]
+            self.voltage_setpoints = np.ones(self.count)  # generator voltages at slack and PV buses
+            for gen in circuit.generators.values():
+                self.voltage_setpoints[circuit.buses[gen.bus].index-1] = gen.voltage
+            self.pv_indexes = circuit.pv_indexes.copy()
+            self.pq_indexes = circuit.pq_indexes.copy()
+            self.slack_index = circuit.slack_index-1
+        self.B = pd.DataFrame(np.imag(self.Ybus))
         self.tolerance = 0.001
         self.xfull = None
         self.yfull = None
         self.J1 = None
         self.J4 = None
         self.var_limit = var_limit
+        self.converged = None  # set once the solve finishes
+        self.iterations = 0  # number of linear solves taken
 
 
     def set_tolerance(self, tol: float):
@@ -538,14 +1429,15 @@ class FastDecoupled():
         P = []
         Q = []
  
-        for bus in self.buses:
+        for bus, type in self.bus_types.items():
+            real_power, reactive_power = self.bus_power[bus]
 
-            if self.buses[bus].type == "PQ":
-                P.append(self.buses[bus].real_power/self.circuit.powerbase)
-                Q.append(self.buses[bus].reactive_power/self.circuit.powerbase)
+            if type == "PQ":
+                P.append(real_power/self.powerbase)
+                Q.append(reactive_power/self.powerbase)
 
-            elif self.buses[bus].type == "PV":
-                P.append(self.buses[bus].real_power/self.circuit.powerbase)
+            elif type == "PV":
+                P.append(real_power/self.powerbase)
 
         y = np.concatenate((P, Q))
         indexes = [f"P{i}" for i in self.pq_and_pv_indexes]
@@ -562,21 +1454,21 @@ class FastDecoupled():
         """
         Vfull_indexes = [f"V{i}" for i in np.sort(np.concatenate((self.pq_indexes, self.pv_indexes)))]
         V_indexes = [f"V{i}" for i in self.pq_indexes]
-        d_indexes = [f"d{i+1}" for i in range(self.circuit.count)]
+        d_indexes = [f"d{i+1}" for i in range(self.count)]
         d_indexes.remove(f"d{self.slack_index+1}")
 
-        Vfull = pd.DataFrame(np.ones(self.circuit.count-1), columns=["x"], index=Vfull_indexes)
-        V = pd.DataFrame(np.ones(self.circuit.count-1-len(self.pv_indexes)), columns=["x"], index=V_indexes)
-        d = pd.DataFrame(np.zeros(self.circuit.count-1), columns=["x"], index=d_indexes)
+        Vfull = pd.DataFrame(np.ones(self.count-1), columns=["x"], index=Vfull_indexes)
+        V = pd.DataFrame(np.ones(self.count-1-len(self.pv_indexes)), columns=["x"], index=V_indexes)
+        d = pd.DataFrame(np.zeros(self.count-1), columns=["x"], index=d_indexes)
         
-        y_indexes = [f"P{i+1}" for i in range(self.circuit.count)]
-        [y_indexes.append(f"Q{i+1}") for i in range(self.circuit.count)]
-        y = pd.DataFrame(np.zeros(self.circuit.count*2), columns=["y"], index=y_indexes)
-
-        x_indexes = [f"d{i+1}" for i in range(self.circuit.count)]
-        [x_indexes.append(f"V{i+1}") for i in range(self.circuit.count)]
-        xfull = np.concatenate((np.zeros(self.circuit.count), 
-                                np.ones(self.circuit.count)))
+        y_indexes = [f"P{i+1}" for i in range(self.count)]
+        [y_indexes.append(f"Q{i+1}") for i in range(self.count)]
+        y = pd.DataFrame(np.zeros(self.count*2), columns=["y"], index=y_indexes)
+
+        x_indexes = [f"d{i+1}" for i in range(self.count)]
+        [x_indexes.append(f"V{i+1}") for i in range(self.count)]
+        xfull = np.concatenate((np.zeros(self.count), 
+                                self.voltage_setpoints))
         xfull = pd.DataFrame(xfull, index=x_indexes, columns=["x"])
         return Vfull, V, d, y, xfull
     
@@ -603,6 +1495,8 @@ class FastDecoupled():
         """
         self.calc_indexes()  # computes all pq and pv indexes
         iter = 75
+        self.converged = True
+        self.iterations = 0
         Vfull, V, d, self.yfull, self.xfull = self.setup()
         y = self.flat_start_y()
         self.calc_J1(Vfull)
@@ -611,7 +1505,7 @@ class FastDecoupled():
         for i in range(iter):
           
           # step 1
-          f = self.circuit.compute_power_injection(self.xfull, self.pq_and_pv_indexes, self.pv_indexes, self.pq_indexes)
+          f = self.circuit.compute_power_injection(self.xfull, self.pq_and_pv_indexes, self.pv_indexes, self.pq_indexes, self.Ybus)
           deltay = y - f
 
           if np.max(np.abs(deltay)) < self.tolerance:
@@ -638,7 +1532,7 @@ class FastDecoupled():
                     for i in range(iter):
 
                         # step 1
-                        f = self.circuit.compute_power_injection(self.xfull, self.pq_and_pv_indexes, self.pv_indexes, self.pq_indexes)
+                        f = self.circuit.compute_power_injection(self.xfull, self.pq_and_pv_indexes, self.pv_indexes, self.pq_indexes, self.Ybus)
                         deltay = y - f
 
                         if np.max(np.abs(deltay)) < self.tolerance:
@@ -651,6 +1545,7 @@ class FastDecoupled():
                         # step 2
                         deltad = np.linalg.solve(self.J1, P.to_numpy())
                         deltaV = np.linalg.solve(self.J4, Q.to_numpy())
+                        self.iterations += 1
 
                         #step 3
                         d = d + deltad
@@ -659,6 +1554,7 @@ class FastDecoupled():
                         self.xfull.update(V)
 
                     self.yfull.update(self.calc_y(self.xfull))
+                    self.converged = False
                     print("WARNING: System did not converge.")
                     
                     '''end recalc power flow'''
@@ -670,6 +1566,7 @@ class FastDecoupled():
           # step 2
           deltad = np.linalg.solve(self.J1, P.to_numpy())
           deltaV = np.linalg.solve(self.J4, Q.to_numpy())
+          self.iterations += 1
 
           #step 3
           d = d + deltad
@@ -678,6 +1575,7 @@ class FastDecoupled():
           self.xfull.update(V)
         
         self.yfull.update(self.calc_y(self.xfull))
+        self.converged = False
         print("WARNING: System did not converge.")
         return self.xfull, self.yfull
     
@@ -715,13 +1613,13 @@ class FastDecoupled():
         :param xfull: x vector
         :return:
         """
-        N = self.circuit.count
+        N = self.count
         d = xfull[xfull.index.str.startswith('d')]
         V = xfull[xfull.index.str.startswith('V')]
         y = np.zeros(N*2)
         indexes = np.zeros(N*2, dtype=object)
-        Ymag = np.abs(self.circuit.Ybus)
-        theta = np.angle(self.circuit.Ybus)
+        Ymag = np.abs(self.Ybus)
+        theta = np.angle(self.Ybus)
 
         for k in range(N):
             sum1 = 0
@@ -756,10 +1654,9 @@ class FastDecoupled():
         Q = yfull[yfull.index.str.startswith('Q')]
         exceeded_gens = {}
 
-        for gen in self.circuit.generators.values():
-            n = self.circuit.buses[gen.bus].index
-            if Q.iloc[n-1, 0] > gen.var_limit/self.circuit.powerbase:
-                exceeded_gens.update({n: [gen.bus, gen.name, n]})
+        for bus, name, n, var_limit in self.generators:
+            if Q.iloc[n-1, 0] > var_limit/self.powerbase:
+                exceeded_gens.update({n: [bus, name, n, var_limit]})
 
         return exceeded_gens
 
@@ -771,9 +1668,9 @@ class FastDecoupled():
         :return:
         """
         for data in exceeded_gens.values():
-            bus, gen, index = data
-            self.buses[bus].type = "PQ"
-            self.buses[bus].reactive_power = self.circuit.generators[gen].var_limit
+            bus, gen, index, var_limit = data
+            self.bus_types[bus] = "PQ"
+            self.bus_power[bus][1] = var_limit
             self.pq_indexes.append(index)
             self.pv_indexes.remove(index)
 
@@ -788,7 +1685,13 @@ class DCPowerFlow():
         :param circuit:
         """
         self.circuit = circuit
-        self.slack_index = self.circuit.slack_index
+        with circuit.lock:
+            self.Ybus = circuit.get_Ybus()
+            self.count = circuit.count
+            self.powerbase = circuit.powerbase
+            self.bus_power = [bus.real_power for bus in circuit.buses.values()]
+            self.generator_count = len(circuit.generators)
+            self.slack_index = circuit.slack_index
         self.Bfull = self.calc_B()
         self.Pfull = self.calc_P()
         self.xfull = self.x_setup()
@@ -800,12 +1703,12 @@ class DCPowerFlow():
         Setup d, V, and x
         :return:
         """
-        d = np.zeros(self.circuit.count)
-        V = np.ones(self.circuit.count)
+        d = np.zeros(self.count)
+        V = np.ones(self.count)
         x = np.concatenate((d, V))
 
-        x_indexes = [f"d{i+1}" for i in range(self.circuit.count)]
-        [x_indexes.append(f"V{i+1}") for i in range(self.circuit.count)]
+        x_indexes = [f"d{i+1}" for i in range(self.count)]
+        [x_indexes.append(f"V{i+1}") for i in range(self.count)]
         x = pd.DataFrame(x, index=x_indexes, columns=["x"])
 
         return x
@@ -817,14 +1720,14 @@ class DCPowerFlow():
         :return:
         """
         P = []
-        Q = np.zeros((self.circuit.count, 1))
+        Q = np.zeros((self.count, 1))
 
-        for bus in self.circuit.buses:
-            P.append(self.circuit.buses[bus].real_power/self.circuit.powerbase)
+        for real_power in self.bus_power:
+            P.append(real_power/self.powerbase)
         
         y = np.concatenate((np.array([P]).T, Q))
-        y_indexes = [f"P{i+1}" for i in range(self.circuit.count)]
-        [y_indexes.append(f"Q{i+1}") for i in range(self.circuit.count)]
+        y_indexes = [f"P{i+1}" for i in range(self.count)]
+        [y_indexes.append(f"Q{i+1}") for i in range(self.count)]
         y = pd.DataFrame(y, index=y_indexes, columns=["y"])
 
         return y
@@ -835,7 +1738,7 @@ class DCPowerFlow():
         Calculate B from Ybus
         :return:
         """
-        B = np.imag(self.circuit.Ybus)
+        B = np.imag(self.Ybus)
         return B
 
 
@@ -846,10 +1749,10 @@ class DCPowerFlow():
         """
         P = []
 
-        for bus in self.circuit.buses:
-            P.append(self.circuit.buses[bus].real_power/self.circuit.powerbase)
+        for real_power in self.bus_power:
+            P.append(real_power/self.powerbase)
         
-        P_indexes = [f"P{i+1}" for i in range(self.circuit.count)]
+        P_indexes = [f"P{i+1}" for i in range(self.count)]
         P = pd.DataFrame(P, index=P_indexes, columns=["y"])
         return P
 
@@ -863,28 +1766,156 @@ class DCPowerFlow():
         P = self.Pfull.drop(index=f"P{self.slack_index}")  # removing slack bus row
         d = np.matmul(-np.linalg.inv(B), P.to_numpy())  # calculating angles
         
-        d_indexes = [f"d{i+1}" for i in range(self.circuit.count)]
+        d_indexes = [f"d{i+1}" for i in range(self.count)]
         d_indexes.remove(f"d{self.slack_index}")
         d = pd.DataFrame(data=d, index=d_indexes, columns=["x"])
         self.xfull.update(d)
 
         # calculating slack bus power injection
-        if len(self.circuit.generators) == 1:  # trivial case when there's only one generator
-            self.Pfull.iloc[self.circuit.slack_index-1, 0] = -P.sum()
+        if self.generator_count == 1:  # trivial case when there's only one generator
+            self.Pfull.iloc[self.slack_index-1, 0] = -P.sum()
             self.yfull.update(self.Pfull)
 
         else:
-            from_bus = self.circuit.slack_index-1
-            temp = pd.DataFrame(data=self.circuit.Ybus[from_bus, :]).drop(index=from_bus)
+            from_bus = self.slack_index-1
+            temp = pd.DataFrame(data=self.Ybus[from_bus, :]).drop(index=from_bus)
             to_bus = [i for i in temp != 0][0] + 1  # you ain't ever seen any witch craft like this. no chatgpt either, came straight from the dome.
             Pslack = np.imag(temp.sum())*(0-self.xfull.iloc[to_bus, 0])  
-            self.Pfull.iloc[self.circuit.slack_index-1, 0] = Pslack
+            self.Pfull.iloc[self.slack_index-1, 0] = Pslack
             self.yfull.update(self.Pfull)
 
         return self.xfull, self.yfull
 
 
 
+class BackwardForwardSweep():
+    """
+    Backward/forward sweep power flow for radial feeders supplied from the slack bus. The backward sweep
+    sums the load and shunt currents from the ends of the feeder toward the source and the forward sweep
+    updates the voltages from the source out, branch by branch. Each branch is written in its two port
+    form, so lines, transformers and series elements all follow the same equations, and parallel branches
+    are added together. Buses are taken in breadth first order, which makes both sweeps triangular solves
+    with matrices factored once per solve, so a sweep is a fixed number of O(N) array operations.
+    """
+    def __init__(self, circuit: Circuit, max_iterations: int = 100):
+        """
+        Constructor for BackwardForwardSweep object
+        :param circuit: Radial circuit to solve
+        :param max_iterations: Most sweeps before giving up
+        """
+        self.circuit = circuit
+        with circuit.lock:
+            tree = circuit.get_tree_ordering()
+            self.Ybus = circuit.get_Ybus_sparse()
+            branches = circuit.branches
+            self.count = circuit.count
+            self.powerbase = circuit.powerbase
+            buses = sorted(circuit.buses.values(), key=lambda bus: bus.index)
+            self.bus_power = np.array([[bus.real_power, bus.reactive_power] for bus in buses], dtype=float)
+            load_model = circuit.get_load_model()
+            slack = circuit.slack_index-1
+            # a feeder supplied from a slack bus without a generator is held at the bus's own voltage
+            self.source_voltage = next((gen.voltage for gen in circuit.generators.values()
+                                        if circuit.buses[gen.bus].index-1 == slack), buses[slack].Vpu)
+        if tree is None:
+            raise ValueError(f"{circuit.name} is not radial. Use the Newton-Raphson power flow")
+        self.order, self.parent = tree
+        # load model arrays in breadth first order, None when every load is constant power
+        self.load_model = {key: value[self.order] for key, value in load_model.items() if key != "dependent"} \
+            if load_model["dependent"] else None
+        self.max_iterations = max_iterations
+        self.tolerance = 0.001
+        self.converged = None  # set once the solve finishes
+        self.iterations = 0  # number of sweeps taken
+        self.calc_sweep_matrices(branches)
+
+
+    def set_tolerance(self, tol: float):
+        """
+        Sets the power mismatch tolerance in pu
+        :param tol: Tolerance
+        :return:
+        """
+        self.tolerance = tol
+
+
+    def calc_sweep_matrices(self, branches: dict):
+        """
+        Writes every bus's feeding branch in its two port form, in breadth first order, and factors the sweeps.
+        With V and I the voltage and the current drawn at the branch's child end, and Vp at its parent end,
+        the forward sweep is V = a Vp + c I and the current drawn from the parent end is d I + e V.
+        :param branches: Branch arrays from calc_branch_arrays
+        :return:
+        """
+        n = self.count
+        position = np.empty(n, dtype=int)
+        position[self.order] = np.arange(n)
+        from_bus, to_bus = branches["from"], branches["to"]
+        Y = np.column_stack((branches["yff"], branches["yft"], branches["ytf"], branches["ytt"]))
+
+        shunt = from_bus == to_bus
+        self.yshunt = np.zeros(n, dtype=complex)
+        np.add.at(self.yshunt, position[from_bus[shunt]], Y[shunt].sum(axis=1))
+
+        # orient every branch from the parent bus to the child bus, then add up parallel branches
+        from_bus, to_bus, Y = from_bus[~shunt], to_bus[~shunt], Y[~shunt]
+        reverse = self.parent[from_bus] == to_bus
+        child = np.where(reverse, from_bus, to_bus)
+        Y = np.where(reverse[:, None], Y[:, ::-1], Y)
+        Ychild = np.zeros((n, 4), dtype=complex)
+        np.add.at(Ychild, position[child], Y)
+        yff, yft, ytf, ytt = Ychild[1:].T
+
+        k = np.arange(1, n)  # every bus but the root, by position
+        p = position[self.parent[self.order[1:]]]
+        self.c = np.zeros(n, dtype=complex)
+        self.c[1:] = -1/ytt
+        forward = sparse.csc_matrix((np.concatenate((np.ones(n), ytf/ytt)), (np.concatenate((np.arange(n), k)), np.concatenate((np.arange(n), p)))), shape=(n, n))
+        backward = sparse.csc_matrix((np.concatenate((np.ones(n), yff/ytf)), (np.concatenate((np.arange(n), p)), np.concatenate((np.arange(n), k)))), shape=(n, n))
+        self.E = sparse.csr_matrix((yft - yff*ytt/ytf, (p, k)), shape=(n, n))
+        # both matrices are triangular in breadth first order, so their factors have no fill
+        self.forward = splu(forward, permc_spec="NATURAL", diag_pivot_thresh=0)
+        self.backward = splu(backward, permc_spec="NATURAL", diag_pivot_thresh=0)
+        self.Ybus_ordered = self.Ybus[self.order][:, self.order].tocsr()
+
+
+    def backward_forward_sweep(self):
+        """
+        Backward/forward sweep algorithm for calculating power flow
+        :return: (x, y)
+        """
+        self.converged = True
+        self.iterations = 0
+        S = ((self.bus_power[:, 0] + 1j*self.bus_power[:, 1])/self.powerbase)[self.order]
+        V = np.full(self.count, self.source_voltage, dtype=complex)
+        rhs = np.empty(self.count, dtype=complex)
+
+        for i in range(self.max_iterations):
+            Sv = S if self.load_model is None else S + calc_load_change(self.load_model, np.abs(V), self.powerbase)[0]
+            mismatch = Sv - V*np.conj(self.Ybus_ordered @ V)
+            if np.max(np.abs(mismatch[1:]), initial=0) < self.tolerance:
+                break
+            I = self.backward.solve(-np.conj(Sv/V) + self.yshunt*V + self.E @ V)
+            rhs[:] = self.c*I
+            rhs[0] = self.source_voltage
+            V = self.forward.solve(rhs)
+            self.iterations += 1
+        else:
+            self.converged = False
+            print("WARNING: System did not converge.")
+
+        Vbus = np.empty(self.count, dtype=complex)
+        Vbus[self.order] = V
+        x_indexes = [f"d{i+1}" for i in range(self.count)] + [f"V{i+1}" for i in range(self.count)]
+        x = pd.DataFrame(np.concatenate((np.angle(Vbus), np.abs(Vbus))), index=x_indexes, columns=["x"])
+        S = Vbus*np.conj(self.Ybus @ Vbus)
+        y = np.concatenate((S.real, S.imag))
+        y[np.abs(y) < 1e-3] = 0
+        y_indexes = [f"P{i+1}" for i in range(self.count)] + [f"Q{i+1}" for i in range(self.count)]
+        return x, pd.DataFrame(y, index=y_indexes, columns=["y"])
+
+
+
 class ThreePhaseFaultParameters():
     """
     Class for three-phase fault solution
@@ -0,0 +1,350 @@
+"""
+Module for weighted least squares state estimation from telemetry, with bad data detection
+
+Filename: StateEstimation.py
+Author: Justin Lipner, Bailey Stout
+Date: 2026-10-19
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.linalg import splu
+from scipy.stats import chi2
+from Circuit import Circuit
+from Solution import calc_dS_dV
+from BranchResults import calc_branch_matrices, calc_dSbr_dV
+
+measurement_types = ["V", "P", "Q", "Pf", "Qf", "Pt", "Qt"]  # in the order of the stacked measurement functions
+
+
+class StateEstimator:
+    """
+    Weighted least squares state estimator. Measurements are bus voltage magnitudes ("V", pu), bus power
+    injections ("P", "Q", MW and MVAR) and branch flows at the from or to end ("Pf", "Qf", "Pt", "Qt",
+    MW and MVAR), each with a standard deviation in the same units. The measurement Jacobian is built from
+    the sparse Ybus with the same power derivatives the sparse Newton-Raphson uses, and each Gauss-Newton
+    step solves the sparse gain matrix. Bad data is removed one measurement at a time with the largest
+    normalized residual test.
+    """
+    def __init__(self, circuit: Circuit, tolerance: float = 1e-5, max_iterations: int = 20):
+        """
+        Constructor for StateEstimator
+        :param circuit: Circuit the telemetry comes from
+        :param tolerance: Largest state update in pu or radians to stop at
+        :param max_iterations: Gauss-Newton iterations before giving up
+        """
+        self.circuit = circuit
+        self.tolerance = tolerance
+        self.max_iterations = max_iterations
+        with circuit.lock:
+            self.Ybus = circuit.get_Ybus_sparse()
+            self.count = circuit.count
+            self.powerbase = circuit.powerbase
+            self.slack_index = circuit.slack_index-1
+            self.buses = [bus.name for bus in sorted(circuit.buses.values(), key=lambda bus: bus.index)]
+            branches = circuit.calc_branch_arrays()
+
+        series = branches["from"] != branches["to"]
+        self.branches = {key: value[series] for key, value in branches.items()}
+        self.bus_index = {name: k for k, name in enumerate(self.buses)}
+        self.branch_index = {name: k for k, name in enumerate(self.branches["name"])}
+        self.Cf, self.Ct, self.Yf, self.Yt = calc_branch_matrices(self.branches, self.count)
+        self.angle_states = np.delete(np.arange(self.count), self.slack_index)  # the slack angle is the reference
+
+        self.state = None  # (angles, magnitudes) of the last estimate, the next one starts from it
+        self.voltages = None
+        self.results = None
+        self.removed = []
+        self.converged = None
+        self.iterations = 0
+        self.objective = 0.0
+        self.chi2_limit = 0.0
+
+
+    def prepare(self, measurements: pd.DataFrame):
+        """
+        Converts measurements to per unit arrays and their rows in the stacked measurement functions.
+        :param measurements: DataFrame with type, location, value and sigma columns
+        :return: (rows, z, sigma) np.ndarray
+        """
+        nb, nl = self.count, len(self.branch_index)
+        offsets = dict(zip(measurement_types, [0, nb, 2*nb, 3*nb, 3*nb+nl, 3*nb+2*nl, 3*nb+3*nl]))
+        kinds = measurements["type"].to_numpy()
+        unknown = ~np.isin(kinds, measurement_types)
+        if unknown.any():
+            raise ValueError(f"{sorted(set(kinds[unknown]))} are not measurement types. Use {measurement_types}")
+
+        positions = np.array([self.bus_index.get(location, -1) if kind in ["V", "P", "Q"] else self.branch_index.get(location, -1)
+                              for kind, location in zip(kinds, measurements["location"])], dtype=int)
+        if np.any(positions < 0):
+            missing = measurements["location"].to_numpy()[positions < 0]
+            raise ValueError(f"{list(missing[:5])} are not buses or branches of {self.circuit.name}")
+
+        scale = np.where(kinds == "V", 1.0, 1e6/self.powerbase)
+        rows = np.array([offsets[kind] for kind in kinds]) + positions
+        return rows, measurements["value"].to_numpy(dtype=float)*scale, measurements["sigma"].to_numpy(dtype=float)*scale
+
+
+    def calc_measurements(self, V, rows):
+        """
+        Measurement functions h(x) and the sparse measurement Jacobian H at the given voltages
+        :param V: Complex bus voltages
+        :param rows: Rows of the measurements in the stacked measurement functions
+        :return: (h, H) with H columns [angles of non slack buses, magnitudes]
+        """
+        S = V*np.conj(self.Ybus @ V)
+        dS_dd, dS_dV = calc_dS_dV(self.Ybus, V)
+        Sf, dSf_dd, dSf_dV = calc_dSbr_dV(self.Cf, self.Yf, V)
+        St, dSt_dd, dSt_dV = calc_dSbr_dV(self.Ct, self.Yt, V)
+
+        h = np.concatenate((np.abs(V), S.real, S.imag, Sf.real, Sf.imag, St.real, St.imag))[rows]
+        H = sparse.bmat([[sparse.csr_matrix((self.count, self.count)), sparse.identity(self.count)],
+                         [dS_dd.real, dS_dV.real], [dS_dd.imag, dS_dV.imag],
+                         [dSf_dd.real, dSf_dV.real], [dSf_dd.imag, dSf_dV.imag],
+                         [dSt_dd.real, dSt_dV.real], [dSt_dd.imag, dSt_dV.imag]], format="csr")
+        columns = np.concatenate((self.angle_states, self.count + np.arange(self.count)))
+        return h, H[rows][:, columns]
+
+
+    def factor_gain(self, H, weights):
+        """
+        Factors the gain matrix H^T W H. It is symmetric positive definite when the network is observable, so
+        it is factored without pivoting in a symmetric fill reducing ordering, which gives its Cholesky factors.
+        :param H: Measurement Jacobian
+        :param weights: Inverse measurement variances
+        :return: scipy.sparse.linalg.SuperLU, None if the measurements do not make the network observable
+        """
+        G = (H.T @ sparse.diags(weights) @ H).tocsc()
+        try:
+            return splu(G, permc_spec="MMD_AT_PLUS_A", diag_pivot_thresh=0.0, options={"SymmetricMode": True})
+        except RuntimeError:
+            return None
+
+
+    def start_point(self, warm_start: bool):
+        """
+        Starting state: the last estimate, else the circuit's last power flow, else a flat start.
+        :param warm_start: Use the last estimate
+        :return: (angles, magnitudes)
+        """
+        if warm_start and self.state is not None:
+            return self.state[0].copy(), self.state[1].copy()
+        with self.circuit.lock:
+            results = self.circuit.bus_results
+            if "Vpu" in results:
+                return np.array(results["angle"], dtype=float), np.array(results["Vpu"], dtype=float)
+        return np.zeros(self.count), np.ones(self.count)
+
+
+    def gauss_newton(self, rows, z, sigma, angle, magnitude):
+        """
+        Weighted least squares solution by Gauss-Newton iterations on the normal equations.
+        :param rows: Measurement rows
+        :param z: Measured values in pu
+        :param sigma: Standard deviations in pu
+        :param angle: Starting angles
+        :param magnitude: Starting magnitudes
+        :return: (angle, magnitude, lu, H, converged), lu is None if the network is not observable
+        """
+        weights = 1/sigma**2
+        nangles = len(self.angle_states)
+        for i in range(self.max_iterations):
+            h, H = self.calc_measurements(magnitude*np.exp(1j*angle), rows)
+            lu = self.factor_gain(H, weights)
+            if lu is None:
+                return angle, magnitude, None, H, False
+            dx = lu.solve(H.T @ (weights*(z - h)))
+            angle[self.angle_states] += dx[:nangles]
+            magnitude += dx[nangles:]
+            self.iterations += 1
+            if np.max(np.abs(dx)) < self.tolerance:
+                h, H = self.calc_measurements(magnitude*np.exp(1j*angle), rows)
+                return angle, magnitude, lu, H, True
+        return angle, magnitude, lu, H, False
+
+
+    def calc_normalized_residuals(self, residuals, sigma, H, lu, chunk: int = 512):
+        """
+        Residuals divided by their standard deviations, from the diagonal of the residual covariance
+        R - H G^-1 H^T. The diagonal is found a block of measurements at a time from the gain factors.
+        :param residuals: Measured minus estimated values
+        :param sigma: Standard deviations
+        :param H: Measurement Jacobian at the estimate
+        :param lu: Factors of the gain matrix
+        :param chunk: Measurements per block
+        :return: np.ndarray
+        """
+        weights = 1/sigma**2
+        covariance = np.empty(len(residuals))
+        H = H.tocsr()
+        for start in range(0, len(residuals), chunk):
+            block = H[start:start+chunk]
+            X = lu.solve(block.T.toarray())
+            covariance[start:start+chunk] = np.asarray(block.multiply(X.T).sum(axis=1)).ravel()
+        omega = sigma**2 - covariance
+        omega = np.maximum(omega, 1e-12*sigma**2)  # critical measurements have no redundancy
+        return np.abs(residuals)/np.sqrt(omega)
+
+
+    def estimate(self, measurements: pd.DataFrame, bad_data: bool = True, threshold: float = 3.0,
+                 max_removals: int = 10, candidates: int = None, warm_start: bool = True):
+        """
+        Estimates the bus voltages from the measurements. With bad data detection the measurement with the
+        largest normalized residual above the threshold is removed and the state estimated again, until
+        none is left or max_removals measurements are gone. Each normalized residual takes a solve with the
+        gain matrix, so on large cases candidates can limit the test to the measurements with the largest
+        weighted residuals. That is a heuristic: a measurement with little redundancy can have a small
+        weighted residual and still the largest normalized one, and it is then missed.
+        :param measurements: DataFrame with type, location, value and sigma columns
+        :param bad_data: Detect and remove bad data
+        :param threshold: Normalized residual above which a measurement is bad
+        :param max_removals: Most measurements to remove
+        :param candidates: Number of measurements tested each pass, those with the largest weighted residuals,
+                           None to test every measurement
+        :param warm_start: Start from the last estimate
+        :return: bool, True if the estimate converged
+        """
+        rows, z, sigma = self.prepare(measurements)
+        active = np.ones(len(rows), dtype=bool)
+        angle, magnitude = self.start_point(warm_start)
+        self.iterations = 0
+        self.removed = []
+        normalized = np.full(len(rows), np.nan)
+
+        while True:
+            if active.sum() < 2*self.count - 1:
+                print(f"WARNING: {active.sum()} measurements cannot make {self.count} buses observable.")
+                self.converged = False
+                return False
+
+            angle, magnitude, lu, H, self.converged = self.gauss_newton(rows[active], z[active], sigma[active], angle, magnitude)
+            if lu is None:
+                print("WARNING: The measurements do not make the network observable.")
+                return False
+
+            h, _ = self.calc_measurements(magnitude*np.exp(1j*angle), rows)
+            residuals = z - h
+            normalized[active] = np.nan
+            if not bad_data:
+                break
+            indexes = np.flatnonzero(active)
+            tested = np.arange(len(indexes))
+            if candidates is not None and candidates < len(indexes):
+                tested = np.argsort(-np.abs(residuals[indexes])/sigma[indexes])[:candidates]
+            normalized[indexes[tested]] = self.calc_normalized_residuals(residuals[indexes[tested]], sigma[indexes[tested]],
+                                                                         H[tested], lu)
+            worst = int(np.nanargmax(np.where(active, normalized, np.nan)))
+            if normalized[worst] <= threshold or len(self.removed) >= max_removals:
+                break
+            active[worst] = False
+            self.removed.append(worst)
+
+        self.state = (angle.copy(), magnitude.copy())
+        self.voltages = magnitude*np.exp(1j*angle)
+        self.objective = float(np.sum((residuals[active]/sigma[active])**2))
+        self.chi2_limit = float(chi2.ppf(0.99, active.sum() - (2*self.count - 1)))
+        scale = np.where(measurements["type"].to_numpy() == "V", 1.0, self.powerbase/1e6)
+        self.results = measurements[["type", "location", "value", "sigma"]].copy().reset_index(drop=True)
+        self.results["estimate"] = h*scale
+        self.results["normalized residual"] = normalized
+        self.results["removed"] = ~active
+        if not self.converged:
+            print("WARNING: State estimation did not converge.")
+        return self.converged
+
+
+    def simulate_measurements(self, V=None, sigma_v: float = 0.004, sigma_power: float = 1.0, flows: str = "from",
+                              rng=None):
+        """
+        Builds a measurement set from a known state: every bus voltage magnitude and injection, and the
+        flow at one or both ends of every branch.
+        :param V: Complex bus voltages, defaults to the circuit's last power flow
+        :param sigma_v: Voltage standard deviation in pu
+        :param sigma_power: Power standard deviation in MW and MVAR
+        :param flows: "from", "to" or "both" branch ends
+        :param rng: np.random.Generator to add measurement noise, None for exact measurements
+        :return: pd.DataFrame with type, location, value and sigma columns
+        """
+        V = self.circuit.voltages if V is None else V
+        kinds = ["V", "P", "Q"] + {"from": ["Pf", "Qf"], "to": ["Pt", "Qt"], "both": ["Pf", "Qf", "Pt", "Qt"]}[flows]
+        names = {kind: self.buses if kind in ["V", "P", "Q"] else list(self.branches["name"]) for kind in kinds}
+        measurements = pd.DataFrame({"type": np.concatenate([[kind]*len(names[kind]) for kind in kinds]),
+                                     "location": np.concatenate([names[kind] for kind in kinds])})
+        measurements["sigma"] = np.where(measurements["type"] == "V", sigma_v, sigma_power)
+        measurements["value"] = 0.0
+        rows, _, _ = self.prepare(measurements)
+        scale = np.where(measurements["type"] == "V", 1.0, self.powerbase/1e6)
+        measurements["value"] = self.calc_measurements(np.asarray(V, dtype=complex), rows)[0]*scale
+        if rng is not None:
+            measurements["value"] += measurements["sigma"]*rng.standard_normal(len(measurements))
+        return measurements[["type", "location", "value", "sigma"]]
+
+
+    def apply(self):
+        """
+        Stores the estimated state in the circuit, like a power flow solution.
+        :return:
+        """
+        S = self.voltages*np.conj(self.Ybus @ self.voltages)
+        N = self.count
+        x_indexes = [f"d{i+1}" for i in range(N)] + [f"V{i+1}" for i in range(N)]
+        y_indexes = [f"P{i+1}" for i in range(N)] + [f"Q{i+1}" for i in range(N)]
+        x = pd.DataFrame(np.concatenate((np.angle(self.voltages), np.abs(self.voltages))), index=x_indexes, columns=["x"])
+        y = pd.DataFrame(np.concatenate((S.real, S.imag)), index=y_indexes, columns=["y"])
+        self.circuit.apply_results(x, y)
+
+
+    def print_data(self):
+        """
+        Prints the objective, the chi-square test and any bad data removed
+        :return:
+        """
+        print(f"Converged = {self.converged} in {self.iterations} iterations, J(x) = {self.objective:.2f} "
+              f"(chi-square 99 % limit {self.chi2_limit:.2f})")
+        if len(self.removed) != 0:
+            print("Bad data removed:")
+            print(self.results.iloc[self.removed].round(4).to_string())
+
+
+# validation tests
+if __name__ == '__main__':
+    import io
+    import time
+    import contextlib
+    from Validations import CreateSevenPowerBusSystem, CreateSyntheticCase
+
+    circ = CreateSevenPowerBusSystem()
+    with contextlib.redirect_stdout(io.StringIO()):
+        circ.do_newton_raph()
+    estimator = StateEstimator(circ)
+    measurements = estimator.simulate_measurements(rng=np.random.default_rng(0))
+    measurements.loc[(measurements["type"] == "P") & (measurements["location"] == "bus3"), "value"] += 40  # bad telemetry
+    print("***7 bus system, 40 MW error on the bus3 injection***")
+    estimator.estimate(measurements, warm_start=False)
+    estimator.print_data()
+    print("Largest voltage error:", np.max(np.abs(estimator.voltages - circ.voltages)))
+    print()
+
+    circ = CreateSyntheticCase(5000)
+    with contextlib.redirect_stdout(io.StringIO()):
+        circ.do_newton_raph(sparse=True)
+    estimator = StateEstimator(circ)
+    rng = np.random.default_rng(1)
+    true_V = circ.voltages
+    measurements = estimator.simulate_measurements(true_V, rng=rng)
+    print(f"***synthetic 5000 bus case, {len(measurements)} measurements***")
+    # with this many measurements a few good ones pass 3 standard deviations, so the threshold is raised, and
+    # only the 200 largest weighted residuals are tested for speed
+    for cycle in range(3):
+        # each cycle the telemetry is refreshed and one measurement is corrupted
+        measurements = estimator.simulate_measurements(true_V, rng=rng)
+        bad = rng.integers(len(measurements))
+        measurements.loc[bad, "value"] += 30*measurements.loc[bad, "sigma"]
+        start = time.perf_counter()
+        estimator.estimate(measurements, threshold=5.0, candidates=200, warm_start=cycle > 0)
+        elapsed = time.perf_counter() - start
+        print(f"cycle {cycle}: {elapsed:.3f} s, {estimator.iterations} iterations, corrupted "
+              f"{measurements.loc[bad, ['type', 'location']].values.tolist()}, removed "
+              f"{estimator.results.iloc[estimator.removed][['type', 'location']].values.tolist()}, "
+              f"largest voltage error {np.max(np.abs(estimator.voltages - true_V)):.2e}")
@@ -2,6 +2,7 @@ from math import floor, log10
 import numpy as np
 import os
 import pandas as pd
+from MatrixIO import read_complex_excel, write_complex_csv, resolve_path
 
 def custom_round(x, decimals):
     # For numbers >= 1, round normally.
@@ -21,30 +22,14 @@ def custom_round_complex(z, decimals):
                    custom_round(z.imag, decimals))
 
 
-def to_csv(data, name: str):
-    data_str = np.array(
-    [[f"{val.real:.6f} + {val.imag:.6f}j" for val in row] for row in data])
-    desktop_path = os.path.join(os.path.expanduser("~"), "Desktop", name + ".csv")
-    np.savetxt(desktop_path, data_str, delimiter=",", fmt="%s")
+def to_csv(data, name: str, folder: str = None):
+    if folder is None:
+        folder = os.path.join(os.path.expanduser("~"), "Desktop")
+    write_complex_csv(data, os.path.join(folder, name + ".csv"))
 
 
 def read_excel(path):
-    main_dir = os.path.dirname(os.path.realpath(__file__))
-    dir = os.path.join(main_dir, path)
-
-    dataframe = pd.read_excel(dir)
-    dataframe = dataframe.fillna(0)  # converts all NaN values to 0
-    n = len(dataframe) - 1
-    data = []
-
-    for i in range(n):
-        data.append(dataframe.iloc[i+1, 2:])
-    
-    #  this line of code converts the string literals in data into properly formatted complex strings
-    data = [[val.replace(" ", "").replace("j", "") + "j" if isinstance(val, str) else val for val in row] for row in data]
-    data = np.array(data, dtype=complex)  # converts data into a numpy array with complex entries
-
-    return data
+    return read_complex_excel(path)
 
 
 def compare(Ybus, pwrworld):
@@ -55,14 +40,13 @@ def compare(Ybus, pwrworld):
     print("difference = ", '\n', diff, '\n')
 
 
-def read_jacobian(M):
+def read_jacobian(M, path=os.path.join("Excel_Files", "fivepowerbusystem_flatstart_jacobian_matrix.csv")):
         csv_J1 = np.zeros((M, M), dtype=float)
         csv_J2 = np.zeros((M, M), dtype=float)
         csv_J3 = np.zeros((M, M), dtype=float)
         csv_J4 = np.zeros((M, M), dtype=float)
 
-        main_dir = os.path.dirname(os.path.realpath(__file__))
-        file_path = os.path.join(main_dir, r"Excel_Files\fivepowerbusystem_flatstart_jacobian_matrix.csv")
+        file_path = resolve_path(path)
 
         df = pd.read_csv(file_path, header=None, skiprows=3, dtype=str)
         df = df.apply(pd.to_numeric, errors='coerce')
@@ -0,0 +1,323 @@
+"""
+Module for network topology processing: finds electrical islands and solves each one on its own
+
+Filename: Topology.py
+Author: Justin Lipner, Bailey Stout
+Date: 2026-10-19
+"""
+
+import copy
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from Circuit import Circuit
+
+
+def find_islands(num_buses: int, from_bus, to_bus):
+    """
+    Groups buses into connected components with union-find.
+    :param num_buses: Number of buses
+    :param from_bus: Zero based from bus of each in service branch
+    :param to_bus: Zero based to bus of each in service branch
+    :return: np.ndarray of island numbers per bus, numbered in order of each island's lowest bus
+    """
+    parent = list(range(num_buses))
+
+    def root(k):
+        while parent[k] != k:
+            parent[k] = parent[parent[k]]  # path halving
+            k = parent[k]
+        return k
+
+    for f, t in zip(np.asarray(from_bus).tolist(), np.asarray(to_bus).tolist()):
+        a, b = root(f), root(t)
+        if a != b:
+            parent[max(a, b)] = min(a, b)  # lowest bus stays the root
+
+    roots = np.array([root(k) for k in range(num_buses)], dtype=int)
+    return np.unique(roots, return_inverse=True)[1]
+
+
+class Island:
+    """
+    Class to hold one electrical island of a circuit
+    """
+    def __init__(self, number: int, buses: list[str], indexes, generators: list[str], slack: str):
+        """
+        Constructor for Island
+        :param number: Island number
+        :param buses: Bus names in index order
+        :param indexes: Zero based bus indexes in the full circuit
+        :param generators: Generators in the island
+        :param slack: Slack bus of the island, None when the island has no generation
+        """
+        self.number = number
+        self.buses = buses
+        self.indexes = np.asarray(indexes, dtype=int)
+        self.generators = generators
+        self.slack = slack
+        self.energized = slack is not None
+        self.circuit = None  # circuit of just this island, built before solving
+        self.converged = None
+        self.iterations = 0
+        self.solve_time = 0.0
+        self.tap_controls = None  # final taps of the island's controlling transformers
+
+
+class TopologyProcessor:
+    """
+    Splits a circuit into its electrical islands after branch outages. Each energized island gets its own
+    slack bus and is solved as a separate circuit, and buses with no path to a generator are dropped.
+    """
+    def __init__(self, circuit: Circuit, outages: list[str] = None):
+        """
+        Constructor for TopologyProcessor
+        :param circuit: Circuit to process
+        :param outages: Names of lines, transformers and series reactors or capacitors that are out of service
+        """
+        self.circuit = circuit
+        self.outages = set() if outages is None else set(outages)
+        self.islands = []
+        self.dead_buses = []
+
+        with circuit.lock:
+            branch_elements = {**circuit.transmission_lines, **circuit.transformers, **circuit.reactors, **circuit.capacitors,
+                               **circuit.equivalents}
+            unknown = [name for name in self.outages if name not in branch_elements]
+            if len(unknown) != 0:
+                print(f"{unknown[:5]} are not branches. They are ignored.")
+            in_service = [element for name, element in branch_elements.items() if name not in self.outages]
+            from_bus = [element.bus1.index-1 for element in in_service]
+            to_bus = [element.bus2.index-1 for element in in_service]
+            self.labels = find_islands(circuit.count, from_bus, to_bus)
+
+            names = np.array(list(circuit.buses), dtype=object)
+            indexes = np.array([bus.index-1 for bus in circuit.buses.values()])
+            names = names[np.argsort(indexes)]
+            for number in range(self.labels.max()+1 if circuit.count else 0):
+                island_indexes = np.flatnonzero(self.labels == number)
+                buses = names[island_indexes].tolist()
+                generators = [gen.name for gen in circuit.generators.values() if self.labels[circuit.buses[gen.bus].index-1] == number]
+                island = Island(number, buses, island_indexes, generators, self.choose_slack(buses, generators))
+                self.islands.append(island)
+                if not island.energized:
+                    self.dead_buses.extend(buses)
+
+
+    def choose_slack(self, buses: list[str], generators: list[str]):
+        """
+        Keeps the circuit's slack bus if it is in the island, otherwise uses the bus of the island's largest generator.
+        :param buses: Bus names in the island
+        :param generators: Generator names in the island
+        :return: str, None if the island has no generators
+        """
+        if len(generators) == 0:
+            return None
+        if self.circuit.slack_bus in buses:
+            return self.circuit.slack_bus
+        largest = max(generators, key=lambda name: self.circuit.generators[name].real_power)
+        return self.circuit.generators[largest].bus
+
+
+    def build_island(self, island: Island):
+        """
+        Builds a circuit with only the island's buses and in service elements, sharing the full circuit's settings.
+        :param island: Energized island
+        :return: Circuit
+        """
+        circuit = self.circuit
+        sub = Circuit(f"{circuit.name} island {island.number}", circuit.settings)
+        sub.add_buses(island.buses, [circuit.buses[bus].base_kv/1e3 for bus in island.buses])
+        for bus in island.buses:
+            sub.buses[bus].real_power = circuit.buses[bus].real_power
+            sub.buses[bus].reactive_power = circuit.buses[bus].reactive_power
+            sub.buses[bus].area = circuit.buses[bus].area
+
+        in_island = set(island.buses)
+        for source, target in [(circuit.transmission_lines, sub.transmission_lines), (circuit.transformers, sub.transformers),
+                               (circuit.reactors, sub.reactors), (circuit.capacitors, sub.capacitors), (circuit.shunts, sub.shunts),
+                               (circuit.equivalents, sub.equivalents)]:
+            for name, element in source.items():
+                if name in self.outages or element.bus1.name not in in_island:
+                    continue
+                element = copy.copy(element)  # keeps the calculated parameters, only the bus connections change
+                element.bus1 = sub.buses[element.bus1.name]
+                element.bus2 = sub.buses[element.bus2.name]
+                if getattr(element, "regulated_bus", None) is not None:
+                    element.regulated_bus = sub.buses.get(element.regulated_bus.name)
+                target[name] = element
+
+        sub.loads = {name: load for name, load in circuit.loads.items() if load.bus in in_island}
+        sub.generators = {name: circuit.generators[name] for name in island.generators}
+        areas = {sub.buses[bus].area for bus in island.buses}
+        sub.interchanges = {area: export for area, export in circuit.interchanges.items() if area in areas}
+        gen_buses = {gen.bus for gen in sub.generators.values()}
+        for bus in sub.buses.values():
+            bus.type = "Slack" if bus.name == island.slack else "PV" if bus.name in gen_buses else "PQ"
+        sub.slack_bus = island.slack
+        sub.slack_index = sub.buses[island.slack].index
+        sub.pv_indexes = [bus.index for bus in sub.buses.values() if bus.type == "PV"]
+        sub.pq_indexes = [bus.index for bus in sub.buses.values() if bus.type == "PQ"]
+        sub.mark_changed()
+        return sub
+
+
+    def solve_island(self, island: Island, method: str, var_limit: bool, sparse: bool, ordering: str = "amd",
+                     strategy: str = "full", reuse: int = 4, krylov: bool = False, tap_control: bool = False,
+                     distributed_slack: bool = False):
+        """
+        Solves the power flow of one island. The remaining options are those of Circuit.do_newton_raph.
+        :param island: Energized island
+        :param method: "newton_raph", "fast_decoupled" or "dc_power_flow"
+        :param var_limit: Include VAR limiting
+        :param sparse: Use the sparse Newton-Raphson solver
+        :return: (x, y) as arrays in island bus order
+        """
+        from Solution import NewtonRaphson, SparseNewtonRaphson, KrylovNewtonRaphson, FastDecoupled, DCPowerFlow
+        start = time.perf_counter()
+        sub = island.circuit
+        island.converged = True
+        island.iterations = 0
+
+        if sub.count == 1:  # a lone slack bus only supplies its own shunts
+            if method == "dc_power_flow":
+                V, S = 1.0, 0j
+            else:
+                V = next(gen.voltage for gen in sub.generators.values() if gen.bus == island.slack)
+                S = V**2*np.conj(sub.get_Ybus()[0, 0])
+            x = np.array([0.0, V])
+            y = np.array([S.real, S.imag])
+        else:
+            if method == "newton_raph":
+                if krylov:
+                    solver = KrylovNewtonRaphson(sub, var_limit, ordering)
+                elif sparse:
+                    solver = SparseNewtonRaphson(sub, var_limit, ordering)
+                else:
+                    solver = NewtonRaphson(sub, var_limit)
+                solver.set_strategy(strategy, reuse)
+                solver.set_tap_control(tap_control)
+                solver.set_distributed_slack(distributed_slack)
+                x, y = solver.newton_raph()
+                if tap_control:
+                    island.tap_controls = solver.tap_controls
+            elif method == "fast_decoupled":
+                solver = FastDecoupled(sub, var_limit)
+                x, y = solver.fast_decoupled()
+            else:
+                solver = DCPowerFlow(sub)
+                x, y = solver.dc_power_flow()
+            x, y = x.to_numpy()[:, 0], y.to_numpy()[:, 0]
+            island.converged = getattr(solver, "converged", True)
+            island.iterations = getattr(solver, "iterations", 1)
+
+        island.solve_time = time.perf_counter() - start
+        return x, y
+
+
+    def solve(self, method: str = "newton_raph", var_limit: bool = False, sparse: bool = False,
+              max_workers: int = None, parallel_size: int = 1000, **options):
+        """
+        Solves every energized island and collects the results in the full circuit's bus order. Dead buses
+        are given zero voltage. Islands of at least parallel_size buses are solved in parallel threads when
+        there are several of them.
+        :param method: "newton_raph", "fast_decoupled" or "dc_power_flow"
+        :param var_limit: Include VAR limiting
+        :param sparse: Use the sparse Newton-Raphson solver
+        :param max_workers: Number of threads, 1 to solve every island in turn
+        :param parallel_size: Smallest island worth a thread of its own
+        :param options: Newton-Raphson options passed to every island, see solve_island
+        :return: (x, y) DataFrames, like the solvers return
+        """
+        energized = [island for island in self.islands if island.energized]
+        with self.circuit.lock:
+            for island in energized:
+                island.circuit = self.build_island(island)
+
+        large = [island for island in energized if len(island.buses) >= parallel_size]
+        if len(large) < 2 or max_workers == 1:
+            large = []
+        small = [island for island in energized if island not in large]
+
+        results = {}
+        if len(large) != 0:
+            with ThreadPoolExecutor(max_workers) as pool:
+                futures = {island.number: pool.submit(self.solve_island, island, method, var_limit, sparse, **options)
+                           for island in large}
+                for island in small:
+                    results[island.number] = self.solve_island(island, method, var_limit, sparse, **options)
+                results.update({number: future.result() for number, future in futures.items()})
+        else:
+            for island in small:
+                results[island.number] = self.solve_island(island, method, var_limit, sparse, **options)
+
+        N = self.circuit.count
+        x = np.zeros(2*N)
+        y = np.zeros(2*N)
+        for island in energized:
+            island_x, island_y = results[island.number]
+            n = len(island.buses)
+            x[island.indexes] = island_x[:n]
+            x[N + island.indexes] = island_x[n:]
+            y[island.indexes] = island_y[:n]
+            y[N + island.indexes] = island_y[n:]
+
+        x_indexes = [f"d{i+1}" for i in range(N)] + [f"V{i+1}" for i in range(N)]
+        y_indexes = [f"P{i+1}" for i in range(N)] + [f"Q{i+1}" for i in range(N)]
+        return pd.DataFrame(x, index=x_indexes, columns=["x"]), pd.DataFrame(y, index=y_indexes, columns=["y"])
+
+
+    def print_data(self):
+        """
+        Prints a summary of the islands
+        :return:
+        """
+        data = [[island.number, len(island.buses), len(island.generators), island.slack, island.converged,
+                 island.iterations, round(island.solve_time, 4)] for island in self.islands]
+        datadf = pd.DataFrame(data, columns=["Island", "Buses", "Generators", "Slack", "Converged", "Iterations", "Time (s)"])
+        print(datadf.to_string(index=False))
+        if len(self.dead_buses) != 0:
+            print(f"De-energized buses: {self.dead_buses}")
+
+
+# validation tests
+if __name__ == '__main__':
+    import io
+    import contextlib
+    from Validations import CreateSevenPowerBusSystem, CreateSyntheticCase
+    from CaseImporter import import_case
+
+    circ = CreateSevenPowerBusSystem()
+    print("***7 bus system, T2, L2 and L3 out of service***")
+    topology = circ.do_island_power_flow(["T2", "L2", "L3"])
+    topology.print_data()
+    print()
+
+    circ = import_case("Case_Files/case14.m")
+    lines_to_14 = [name for name, line in circ.transmission_lines.items() if "bus14" in [line.bus1.name, line.bus2.name]]
+    print(f"***case14, {lines_to_14} out of service***")
+    with contextlib.redirect_stdout(io.StringIO()):
+        topology = circ.do_island_power_flow(lines_to_14)
+    topology.print_data()
+    # the Newton-Raphson options reach the island solvers, here bus14's lost load is shared by every generator
+    circ.set_participation_factors(list(circ.generators), 1.0)
+    with contextlib.redirect_stdout(io.StringIO()):
+        circ.do_island_power_flow(lines_to_14, distributed_slack=True)
+    print("With a distributed slack, generator MW:", np.round([gen.real_power/1e6 for gen in circ.generators.values()], 2))
+    print()
+
+    circ = CreateSyntheticCase(10000)
+
+    # opening every branch between rows 50 and 51 of the 100 x 100 grid splits it in half
+    middle = [name for name, element in {**circ.transmission_lines, **circ.transformers}.items()
+              if 4900 < min(element.bus1.index, element.bus2.index) <= 5000 and abs(element.bus1.index - element.bus2.index) == 100]
+    print(f"***synthetic 10000 bus grid, {len(middle)} branches out of service***")
+    for max_workers in [1, None]:
+        topology = TopologyProcessor(circ, middle)
+        start = time.perf_counter()
+        x, y = topology.solve(sparse=True, max_workers=max_workers)
+        elapsed = time.perf_counter() - start
+        topology.print_data()
+        print(f"max_workers = {max_workers}: {elapsed:.3f} s")
+        print()
@@ -6,10 +6,11 @@ Author: Justin Lipner
 Date: 2025-02-03
 """
 
+import numpy as np
 import pandas as pd
 from Bus import Bus
 from math import atan, sin, cos
-from Settings import settings
+from Settings import Settings, settings as default_settings
 
 
 class Transformer:
@@ -17,8 +18,9 @@ class Transformer:
     Transformer class to hold transformer information
     """
 
-    def __init__(self, name: str, type: str, bus1: Bus, bus2: Bus, power_rating: float,
-                 impedance_percent: float, x_over_r_ratio: float, gnd_impedance=None):
+    def __init__(self, name: str, type: str, bus1: Bus, bus2: Bus, power_rating: float = None,
+                 impedance_percent: float = None, x_over_r_ratio: float = None, gnd_impedance=None,
+                 flag: bool = True, settings: Settings = None):
         """
         Constructor for Transformer objects
         :param name: Name of transformer
@@ -28,20 +30,100 @@ class Transformer:
         :param impedance_percent: Impedance percent
         :param x_over_r_ratio: X/R Ratio
         :param gnd_impedance: Impedance that grounds the Wye side
+        :param flag: Calculate impedances from the ratings, False when they are set afterwards
+        :param settings: System settings, defaults to the global settings
         """
         self.name = name
+        self.settings = default_settings if settings is None else settings
         self.type = type
         self.bus1 = bus1
         self.bus2 = bus2
-        self.power_rating = power_rating*1e6
+        self.power_rating = power_rating*1e6 if flag else None
         self.impedance_percent = impedance_percent
         self.x_over_r_ratio = x_over_r_ratio
         self.Znpu = gnd_impedance
-        self.Zpu = self.calc_impedance()
-        self.Ypu = 1/self.Zpu
-        self.Y0pu = None
-        self.yprim = self.calc_yprim()
-        self.yprim0 = self.calc_yprim0()
+        self.tap = 1.0  # off nominal turns ratio at bus1, in pu
+        self.shift = 0.0  # phase shift from bus1 to bus2, in degrees
+        # automatic tap control, see set_control
+        self.regulated_bus = None
+        self.target_voltage = None
+        self.tap_min = 0.9
+        self.tap_max = 1.1
+        self.tap_step = 0.00625
+
+        if flag:
+            self.Zpu = self.calc_impedance()
+            self.Ypu = 1/self.Zpu
+            self.Y0pu = self.calc_Y0pu()
+            self.yprim = self.calc_yprim()
+            self.yprim0 = self.calc_yprim0()
+
+        else:
+            # "Bypass" path: impedances are set by from_parameters/from_arrays
+            self.Zpu = None
+            self.Ypu = None
+            self.Y0pu = None
+            self.yprim = None
+            self.yprim0 = None
+
+
+    @classmethod
+    def from_parameters(cls, name: str, type: str, bus1: Bus, bus2: Bus, R: float, X: float,
+                        gnd_impedance=None, settings: Settings = None) -> "Transformer":
+        """
+        Creates a transformer from its per unit resistance and reactance on the system base.
+        :param name: Name of transformer
+        :param type: Connection type
+        :param bus1: First bus connection
+        :param bus2: Second bus connection
+        :param R: per unit resistance
+        :param X: per unit reactance
+        :param gnd_impedance: Impedance that grounds the Wye side
+        :param settings: System settings, defaults to the global settings
+        :return: Transformer
+        """
+        xfmr = cls(name, type, bus1, bus2, gnd_impedance=gnd_impedance, flag=False, settings=settings)
+        xfmr.Zpu = R + 1j*X
+        xfmr.Ypu = 1/xfmr.Zpu
+        xfmr.Y0pu = xfmr.calc_Y0pu()
+        xfmr.yprim = xfmr.calc_yprim()
+        xfmr.yprim0 = xfmr.calc_yprim0()
+        return xfmr
+
+
+    @classmethod
+    def from_arrays(cls, names: list[str], types: list[str], buses1: list[Bus], buses2: list[Bus],
+                    R, X, settings: Settings = None, taps=None, shifts=None) -> list["Transformer"]:
+        """
+        Creates many ungrounded transformers from per unit parameter arrays. Admittances are computed
+        for all transformers at once and the yprim DataFrames are not built; the circuit assembles
+        Ybus from calc_branch_values instead.
+        :param names: Names of transformers
+        :param types: Connection types
+        :param buses1: First bus connections
+        :param buses2: Second bus connections
+        :param R: per unit resistances
+        :param X: per unit reactances
+        :param settings: System settings, defaults to the global settings
+        :param taps: Off nominal turns ratios at the first buses, 1 by default
+        :param shifts: Phase shifts in degrees, 0 by default
+        :return: list[Transformer]
+        """
+        Zpu = np.asarray(R, dtype=float) + 1j*np.asarray(X, dtype=float)
+        Ypu = 1/Zpu
+        taps = np.ones(len(names)) if taps is None else np.broadcast_to(np.asarray(taps, dtype=float), len(names))
+        shifts = np.zeros(len(names)) if shifts is None else np.broadcast_to(np.asarray(shifts, dtype=float), len(names))
+
+        xfmrs = []
+        for k, name in enumerate(names):
+            xfmr = cls(name, types[k], buses1[k], buses2[k], flag=False, settings=settings)
+            xfmr.Zpu = complex(Zpu[k])
+            xfmr.Ypu = complex(Ypu[k])
+            xfmr.Y0pu = 0
+            xfmr.tap = float(taps[k])
+            xfmr.shift = float(shifts[k])
+            xfmrs.append(xfmr)
+        return xfmrs
 
 
     def calc_impedance(self):
@@ -51,20 +133,63 @@ class Transformer:
         """
         theta = atan(self.x_over_r_ratio)
         R = self.impedance_percent * cos(theta) / 100
-        R = R*settings.powerbase/self.power_rating  # updating pu to system power base
+        R = R*self.settings.powerbase/self.power_rating  # updating pu to system power base
 
         X = self.impedance_percent * sin(theta) / 100
-        X = X*settings.powerbase/self.power_rating  # updating pu to system power base
+        X = X*self.settings.powerbase/self.power_rating  # updating pu to system power base
         Zpu = R+1j*X
         return Zpu
     
 
+    def set_tap(self, tap: float = None, shift: float = None):
+        """
+        Changes the off nominal turns ratio and phase shift, updating yprim if it has been built
+        :param tap: Turns ratio at bus1 in pu, unchanged if None
+        :param shift: Phase shift from bus1 to bus2 in degrees, unchanged if None
+        :return:
+        """
+        self.tap = self.tap if tap is None else float(tap)
+        self.shift = self.shift if shift is None else float(shift)
+        if self.yprim is not None:
+            self.yprim = self.calc_yprim()
+
+
+    def set_control(self, bus: Bus, voltage: float, tap_min: float = 0.9, tap_max: float = 1.1, tap_step: float = 0.00625):
+        """
+        Sets the tap to hold a bus voltage when the power flow adjusts taps
+        :param bus: Regulated bus
+        :param voltage: Target voltage in pu
+        :param tap_min: Lowest tap
+        :param tap_max: Highest tap
+        :param tap_step: Tap step, taps are kept at whole steps from 1
+        :return:
+        """
+        self.regulated_bus = bus
+        self.target_voltage = voltage
+        self.tap_min = tap_min
+        self.tap_max = tap_max
+        self.tap_step = tap_step
+
+
+    def calc_Y0pu(self):
+        """
+        Calculates the zero sequence admittance through the grounded Wye side
+        :return: Per-unit admittance (complex)
+        """
+        if self.Znpu == None:
+            return 0
+
+        Z = 3*self.Znpu + self.Zpu
+        return 1/Z
+
+
     def calc_yprim(self):
         """
         Establish yprim matrix to be used in system admittance matrix
         :return: Admittance matrix (np.array(list[list[]])
         """
-        yprim = [[self.Ypu, -self.Ypu], [-self.Ypu, self.Ypu]]
+        yff, yft, ytf, ytt = self.calc_branch_values()
+        yprim = [[yff, yft], [ytf, ytt]]
         bus1 = self.bus1.index
         bus2 = self.bus2.index
         df = pd.DataFrame(yprim, index=[bus1, bus2], columns=[bus1, bus2])
@@ -76,40 +201,44 @@ class Transformer:
         Establish yprim zero sequence matrix to be used in system admittance matrix
         :return: Admittance matrix (np.array(list[list[]])
         """
+        yff, yft, ytf, ytt = self.calc_branch_values(0)
+        yprim0 = [[yff, yft], [ytf, ytt]]
+        bus1 = self.bus1.index
+        bus2 = self.bus2.index
+        df = pd.DataFrame(yprim0, index=[bus1, bus2], columns=[bus1, bus2])
+        return df
+
+
+    def calc_branch_values(self, sequence: int = 1):
+        """
+        Establish the yprim entries as a flat tuple for vectorized admittance matrix assembly
+        :param sequence: 1 for positive sequence, 0 for zero sequence, 2 for negative sequence, which is
+                         shifted the other way
+        :return: (yff, yft, ytf, ytt)
+        """
+        if sequence in [1, 2]:
+            if self.tap == 1 and self.shift == 0:
+                return self.Ypu, -self.Ypu, -self.Ypu, self.Ypu
+            # ideal transformer with complex ratio t:1 at bus1 in series with the leakage admittance
+            t = self.tap*np.exp(1j*np.deg2rad(self.shift if sequence == 1 else -self.shift))
+            return self.Ypu/abs(t)**2, -self.Ypu/np.conj(t), -self.Ypu/t, self.Ypu
+
         if self.Znpu == None:
-            yprim0 = [[0, 0], [0, 0]]
-            self.Y0pu = 0
-            bus1 = self.bus1.index
-            bus2 = self.bus2.index
-            df = pd.DataFrame(yprim0, index=[bus1, bus2], columns=[bus1, bus2])
-            return df
+            return 0, 0, 0, 0
 
         # calculates the zero sequence primitive matrix based on the connection type
         match self.type:
             case "Y-Y":
-                Z = 3*self.Znpu + self.Zpu
-                self.Y0pu = 1/Z
-                yprim0 = [[self.Y0pu, -self.Y0pu], [-self.Y0pu, self.Y0pu]]
+                return self.Y0pu, -self.Y0pu, -self.Y0pu, self.Y0pu
 
             case "Y-D":
-                Z = 3*self.Znpu + self.Zpu
-                self.Y0pu = 1/Z
-                yprim0 = [[self.Y0pu, 0], [0, 0]]
+                return self.Y0pu, 0, 0, 0
 
             case "D-Y":
-                Z = 3*self.Znpu + self.Zpu
-                self.Y0pu = 1/Z
-                yprim0 = [[0, 0], [0, self.Y0pu]]
+                return 0, 0, 0, self.Y0pu
 
-            case "D-D":
-                Z = 3*self.Znpu + self.Zpu
-                self.Y0pu = 1/Z
-                yprim0 = [[0, 0], [0, 0]]
-
-        bus1 = self.bus1.index
-        bus2 = self.bus2.index
-        df = pd.DataFrame(yprim0, index=[bus1, bus2], columns=[bus1, bus2])
-        return df
+            case _:
+                return 0, 0, 0, 0
 
 
 # validation tests 
@@ -0,0 +1,261 @@
+"""
+Module for classical model transient stability: swing equation simulation and critical clearing times
+
+Filename: TransientStability.py
+Author: Justin Lipner, Bailey Stout
+Date: 2026-10-19
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from Circuit import Circuit
+from NetworkReduction import kron_reduce
+
+
+class TransientStability:
+    """
+    Transient stability with the classical machine model: a constant voltage behind each generator's
+    sub-transient reactance, set from the solved power flow, constant mechanical power, and loads as
+    constant admittances. The network is Kron reduced to the machines' internal nodes once per topology
+    (pre-fault, fault-on, post-fault) and the reductions are cached, so the swing equations only need the
+    small reduced matrices. Many cases are integrated together with a fixed step RK4, vectorized over cases
+    and machines, which is what the batched critical clearing time search runs on.
+    """
+    def __init__(self, circuit: Circuit, dt: float = 0.001):
+        """
+        Constructor for TransientStability
+        :param circuit: Circuit object with a solved power flow
+        :param dt: Integration step in s
+        """
+        if circuit.voltages is None:
+            raise ValueError(f"Run a power flow on {circuit.name} before a transient stability study")
+        with circuit.lock:
+            gens = list(circuit.generators.values())
+            missing = [gen.name for gen in gens if gen.X1 == 0]
+            if len(missing) != 0:
+                raise ValueError(f"{missing[:5]} have no sub-transient reactance for the classical model")
+            V = np.asarray(circuit.voltages, dtype=complex)
+            Ybus = circuit.get_Ybus_sparse()
+            loads = circuit.calc_load_admittances()
+            load = circuit.calc_load_power(np.abs(V))
+            self.branches = circuit.calc_branch_arrays(1)
+            self.bus_index = {name: bus.index-1 for name, bus in circuit.buses.items()}
+            self.generators = [gen.name for gen in gens]
+            self.gen_bus = np.array([self.bus_index[gen.bus] for gen in gens], dtype=int)
+            mva = np.array([gen.mva_base for gen in gens], dtype=float)
+            self.H = np.array([gen.H for gen in gens], dtype=float)*mva/circuit.powerbase  # on the system base
+            self.D = np.array([gen.D for gen in gens], dtype=float)*mva/circuit.powerbase
+            X = np.array([gen.X1 for gen in gens], dtype=complex)
+            self.omega = 2*np.pi*circuit.settings.freq
+        self.dt = dt
+
+        # each bus's generation from the solved flow, shared by machine rating where a bus has several
+        S = V*np.conj(Ybus @ V) + load
+        share = mva/np.bincount(self.gen_bus, mva, minlength=len(V))[self.gen_bus]
+        Sg = S[self.gen_bus]*share
+        E = V[self.gen_bus] + X*np.conj(Sg/V[self.gen_bus])
+        self.E = np.abs(E)
+        self.delta0 = np.angle(E)
+        self.Pm = Sg.real
+        self.y = 1/X
+        shunts = loads + np.bincount(self.gen_bus, self.y.real, len(V)) + 1j*np.bincount(self.gen_bus, self.y.imag, len(V))
+        self.Ybb = (Ybus + sparse.diags(shunts)).tocsr()  # the machines' reactances and the loads included
+        self.reduced = {}  # (fault bus, outage) -> reduced admittance matrix
+        self.stable = None  # will become a bool after simulate
+
+
+    def calc_reduced(self, fault_bus: str = None, outage: str = None):
+        """
+        Admittance matrix between the machines' internal nodes, with a bolted three phase fault at a bus and/or
+        an element out of service. Each topology is reduced once.
+        :param fault_bus: Name of the faulted bus, None for no fault
+        :param outage: Name of an element out of service, None for the intact network
+        :return: np.ndarray
+        """
+        key = (fault_bus, outage)
+        if key in self.reduced:
+            return self.reduced[key]
+        G, N = len(self.y), self.Ybb.shape[0]
+        Ybb = self.Ybb
+        if outage is not None:
+            k = np.flatnonzero(self.branches["name"] == outage)
+            if len(k) == 0:
+                raise ValueError(f"{outage} is not an element of the circuit")
+            k = k[0]
+            i, j = self.branches["from"][k], self.branches["to"][k]
+            values = [self.branches[entry][k] for entry in ["yff", "yft", "ytf", "ytt"]]
+            Ybb = Ybb - sparse.csr_matrix((values, ([i, i, j, j], [i, j, i, j])), shape=(N, N))
+
+        coupling = sparse.csr_matrix((-self.y, (np.arange(G), self.gen_bus)), shape=(G, N))
+        Y = sparse.bmat([[sparse.diags(self.y), coupling], [coupling.T, Ybb]]).tocsr()
+        keep = np.arange(G + N)
+        if fault_bus is not None:
+            if fault_bus not in self.bus_index:
+                raise ValueError(f"{fault_bus} is not a bus of the circuit")
+            keep = np.delete(keep, G + self.bus_index[fault_bus])  # a bolted fault holds the bus at the reference
+        Yred = kron_reduce(Y[keep][:, keep], np.arange(G))
+        self.reduced[key] = Yred
+        return Yred
+
+
+    def calc_derivatives(self, delta, speed, Y):
+        """
+        Swing equations of every machine in every case.
+        :param delta: Rotor angles in rad, a row per case
+        :param speed: Speed deviations in pu, a row per case
+        :param Y: Reduced admittance matrix of each case
+        :return: (d delta/dt, d speed/dt) np.ndarray
+        """
+        E = self.E*np.exp(1j*delta)
+        Pe = (E*np.conj((Y @ E[:, :, None])[:, :, 0])).real
+        return self.omega*speed, (self.Pm - Pe - self.D*speed)/(2*self.H)
+
+
+    def integrate(self, Yfault, Ypost, clear_times, t_end: float = 3.0, record: bool = False):
+        """
+        Integrates a batch of cases with RK4 from the pre-fault equilibrium. A case switches from its fault-on
+        to its post-fault matrix at the step nearest its clearing time, and is unstable once two machines are
+        more than 180 degrees apart, after which it is no longer integrated unless the angles are recorded.
+        :param Yfault: Fault-on reduced matrix of each case
+        :param Ypost: Post-fault reduced matrix of each case
+        :param clear_times: Clearing time of each case in s
+        :param t_end: Simulated time in s
+        :param record: Keep the rotor angles of every step
+        :return: (stable per case, list of rotor angle arrays per step or None)
+        """
+        clear_times = np.asarray(clear_times, dtype=float)
+        delta = np.tile(self.delta0, (len(clear_times), 1))
+        speed = np.zeros_like(delta)
+        unstable = np.zeros(len(clear_times), dtype=bool)
+        history = [delta.copy()] if record else None
+        running = np.arange(len(clear_times))  # cases still being integrated
+        Y = np.array(Yfault)
+        faulted = np.ones(len(clear_times), dtype=bool)
+        dt = self.dt
+        for step in range(int(round(t_end/dt))):
+            cleared = faulted & (step*dt + dt/2 >= clear_times)
+            Y[cleared] = Ypost[cleared]
+            faulted &= ~cleared
+            d, w, Yr = delta[running], speed[running], Y[running]
+            k1 = self.calc_derivatives(d, w, Yr)
+            k2 = self.calc_derivatives(d + dt/2*k1[0], w + dt/2*k1[1], Yr)
+            k3 = self.calc_derivatives(d + dt/2*k2[0], w + dt/2*k2[1], Yr)
+            k4 = self.calc_derivatives(d + dt*k3[0], w + dt*k3[1], Yr)
+            delta[running] = d + dt/6*(k1[0] + 2*k2[0] + 2*k3[0] + k4[0])
+            speed[running] = w + dt/6*(k1[1] + 2*k2[1] + 2*k3[1] + k4[1])
+            unstable[running] |= np.ptp(delta[running], axis=1) > np.pi
+            if record:
+                history.append(delta.copy())
+            else:  # an unstable case is decided, so it drops out of the batch
+                running = running[~unstable[running]]
+                if len(running) == 0:
+                    break
+        return ~unstable, history
+
+
+    def simulate(self, fault_bus: str, clear_time: float, outage: str = None, t_end: float = 3.0):
+        """
+        Rotor angles through a bolted three phase fault cleared after clear_time, by taking out an element if
+        one is given.
+        :param fault_bus: Name of the faulted bus
+        :param clear_time: Clearing time in s
+        :param outage: Name of the element the protection takes out, None if the fault clears by itself
+        :param t_end: Simulated time in s
+        :return: pd.DataFrame of rotor angles in degrees relative to the center of inertia, a row per step
+        """
+        Yfault = self.calc_reduced(fault_bus, None)[None]
+        Ypost = self.calc_reduced(None, outage)[None]
+        stable, history = self.integrate(Yfault, Ypost, [clear_time], t_end, record=True)
+        self.stable = bool(stable[0])
+        delta = np.array(history)[:, 0, :]
+        delta = delta - (delta @ self.H/self.H.sum())[:, None]
+        time = pd.Index(np.arange(len(delta))*self.dt, name="Time (s)")
+        return pd.DataFrame(np.rad2deg(delta), index=time, columns=self.generators)
+
+
+    def calc_critical_clearing_times(self, cases: list, t_max: float = 1.0, tolerance: float = 0.002, t_end: float = 3.0):
+        """
+        Critical clearing time of many fault cases by bisection, with every case still being narrowed down
+        integrated together in each round.
+        :param cases: (fault bus, outage or None) of each case
+        :param t_max: Longest clearing time searched, in s
+        :param tolerance: Width of the final bracket in s
+        :param t_end: Simulated time of each run in s
+        :return: pd.DataFrame with a row per case, CCT inf for cases still stable when cleared at t_max
+        """
+        Yfault = np.stack([self.calc_reduced(bus, None) for bus, outage in cases])
+        Ypost = np.stack([self.calc_reduced(None, outage) for bus, outage in cases])
+        lower = np.zeros(len(cases))
+        upper = np.full(len(cases), float(t_max))
+        always, _ = self.integrate(Yfault, Ypost, upper, t_end)
+        active = np.flatnonzero(~always)
+        while len(active) != 0 and np.max(upper[active] - lower[active]) > tolerance:
+            middle = (lower[active] + upper[active])/2
+            stable, _ = self.integrate(Yfault[active], Ypost[active], middle, t_end)
+            lower[active[stable]] = middle[stable]
+            upper[active[~stable]] = middle[~stable]
+        return pd.DataFrame({"Fault bus": [bus for bus, outage in cases], "Outage": [outage for bus, outage in cases],
+                             "CCT (s)": np.where(always, np.inf, lower)})
+
+
+# validation tests
+if __name__ == '__main__':
+    import io
+    import time
+    import contextlib
+    from Validations import CreateSevenPowerBusSystem, CreateSyntheticCase
+
+    # one machine against an infinite bus, where the equal area criterion gives the critical clearing time
+    circ = Circuit("SMIB")
+    circ.add_bus("bus1", 20)
+    circ.add_bus("bus2", 20)
+    circ.add_generator("Infinite", "bus2", 1.0, 0, 1e-6, 1e-6, 1e-6, mva_base=100)
+    circ.add_generator("Gen1", "bus1", 1.0, 80, 0.2, 0.2, 0.05, mva_base=100)
+    circ.add_tlines_from_parameters(["L1"], ["bus1"], ["bus2"], [0.0], [0.3], [0.0])
+    circ.set_generator_dynamics(["Infinite", "Gen1"], [1e6, 5.0])
+    with contextlib.redirect_stdout(io.StringIO()):
+        circ.do_newton_raph(sparse=True)
+    stability = TransientStability(circ, dt=0.0005)
+    Pmax = stability.E[0]*stability.E[1]/0.5
+    delta0 = stability.delta0[1] - stability.delta0[0]
+    delta_c = np.arccos(np.sin(delta0)*(np.pi - 2*delta0) - np.cos(delta0))
+    expected = np.sqrt(4*5.0*(delta_c - delta0)/(stability.omega*stability.Pm[1]))
+    result = stability.calc_critical_clearing_times([("bus1", None)], tolerance=0.0005)
+    print("***single machine against an infinite bus***")
+    print(f"Pe at the pre-fault angles less Pm: {np.max(np.abs(stability.calc_derivatives(stability.delta0[None], np.zeros((1, 2)), stability.calc_reduced()[None])[1])):.2e}")
+    print(f"CCT {result['CCT (s)'][0]:.4f} s, equal area criterion {expected:.4f} s")
+    print()
+
+    circ = CreateSevenPowerBusSystem()
+    with contextlib.redirect_stdout(io.StringIO()):
+        circ.do_newton_raph()
+    circ.set_generator_dynamics(["Gen1", "Gen2"], [4.0, 6.0], [1.0, 1.0])
+    stability = TransientStability(circ)
+    print("***7 bus system***")
+    angles = stability.simulate("bus4", 0.1, "L6")
+    print(f"Fault at bus4 cleared in 0.1 s by L6: {'stable' if stability.stable else 'unstable'}, "
+          f"largest angle from the center of inertia {angles.abs().max().max():.1f} degrees")
+    cases = [(bus, line) for line in ["L1", "L2", "L3", "L4", "L5", "L6"] for bus in
+             [circ.transmission_lines[line].bus1.name, circ.transmission_lines[line].bus2.name]]
+    print(stability.calc_critical_clearing_times(cases).to_string())
+    print()
+
+    circ = CreateSyntheticCase(500)
+    for gen in circ.generators.values():  # MATPOWER cases carry no machine reactances
+        gen.X1 = gen.calc_X1(0.25)
+    with contextlib.redirect_stdout(io.StringIO()):
+        circ.do_newton_raph(sparse=True)
+    stability = TransientStability(circ)
+    lines = list(circ.transmission_lines.values())[::10]
+    cases = [(line.bus1.name, line.name) for line in lines]
+    print(f"***synthetic 500 bus case, {len(stability.generators)} machines, {len(cases)} fault cases***")
+    start = time.perf_counter()
+    batched = stability.calc_critical_clearing_times(cases)
+    print(f"batched critical clearing times: {time.perf_counter()-start:.3f} s")
+    start = time.perf_counter()
+    single = pd.concat([stability.calc_critical_clearing_times([case]) for case in cases[:5]])
+    elapsed = time.perf_counter() - start
+    print(f"one case at a time, first 5 cases: {elapsed:.3f} s, about {elapsed/5*len(cases):.1f} s for every case")
+    print("Same critical clearing times:", np.array_equal(batched["CCT (s)"][:5].to_numpy(), single["CCT (s)"].to_numpy()))
+    print(batched.sort_values("CCT (s)").head(5).to_string())
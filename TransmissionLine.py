@@ -9,8 +9,9 @@ Date: 2025-01-23
 from Bundle import Bundle
 from Geometry import Geometry
 from Conductor import Conductor
-from Settings import settings
+from Settings import Settings, settings as default_settings
 from Bus import Bus
+import numpy as np
 import pandas as pd
 from math import pi, log
 from Constants import j, epsilon, mi2m
@@ -23,7 +24,7 @@ class TransmissionLine:
     """
 
     def __init__(self, name: str, bus1: Bus, bus2: Bus, bundle: Bundle = None, geometry: Geometry = None,
-                 length: float = None, flag: bool = True):
+                 length: float = None, flag: bool = True, settings: Settings = None):
         """
         Constructor for TransmissionLine object
         :param name: Name of transmission line
@@ -32,17 +33,19 @@ class TransmissionLine:
         :param bundle: Bundle information
         :param geometry: Geometry information
         :param length: Length of line
-        :param f: frequency of line
+        :param flag: Calculate impedances from bundle and geometry, False when they are set afterwards
+        :param settings: System settings, defaults to the global settings
         """ 
         
         self.name = name
+        self.settings = default_settings if settings is None else settings
         self.bus1 = bus1
         self.bus2 = bus2
         self.bundle = bundle
         self.geometry = geometry
         self.length = length
-        self.freq = settings.freq
-        self.powerbase = settings.powerbase
+        self.freq = self.settings.freq
+        self.powerbase = self.settings.powerbase
         self.Zbase = self.bus1.base_kv**2/self.powerbase
 
         if flag:
@@ -67,17 +70,55 @@ class TransmissionLine:
 
     
     @classmethod
-    def from_parameters(cls, name: str, bus1: Bus, bus2: Bus, R: float, X: float, B: float) -> "TransmissionLine":
-        line = cls(name, bus1, bus2, flag=False)
+    def from_parameters(cls, name: str, bus1: Bus, bus2: Bus, R: float, X: float, B: float,
+                        settings: Settings = None) -> "TransmissionLine":
+        line = cls(name, bus1, bus2, flag=False, settings=settings)
         line.R = R
         line.X = X 
         line.Zseries = R + j*X
         line.Yseries = custom_round_complex(1/line.Zseries, 2)
         line.Yshunt = j*custom_round(B, 2)
+        line.Z0series = 2.5*line.Zseries
+        line.Y0series = 1/line.Z0series
         line.yprim = line.calc_yprim()
         return line
 
 
+    @classmethod
+    def from_arrays(cls, names: list[str], buses1: list[Bus], buses2: list[Bus], R, X, B,
+                    settings: Settings = None) -> list["TransmissionLine"]:
+        """
+        Creates many transmission lines from per unit parameter arrays. Admittances are computed for all
+        lines at once and, unlike from_parameters, are not rounded. The yprim DataFrames are not built;
+        the circuit assembles Ybus from calc_branch_values instead.
+        :param names: Names of transmission lines
+        :param buses1: First bus connections
+        :param buses2: Second bus connections
+        :param R: per unit resistances
+        :param X: per unit reactances
+        :param B: per unit shunt admittances
+        :param settings: System settings, defaults to the global settings
+        :return: list[TransmissionLine]
+        """
+        Zseries = np.asarray(R, dtype=float) + j*np.asarray(X, dtype=float)
+        Yseries = 1/Zseries
+        Y0series = 1/(2.5*Zseries)
+        Yshunt = j*np.asarray(B, dtype=float)
+
+        lines = []
+        for k, name in enumerate(names):
+            line = cls(name, buses1[k], buses2[k], flag=False, settings=settings)
+            line.R = Zseries[k].real
+            line.X = Zseries[k].imag
+            line.Zseries = complex(Zseries[k])
+            line.Z0series = 2.5*line.Zseries
+            line.Yseries = complex(Yseries[k])
+            line.Y0series = complex(Y0series[k])
+            line.Yshunt = complex(Yshunt[k])
+            lines.append(line)
+        return lines
+
+
     def calc_R(self):
         """
         Calculate line series resistance from bundle information and length
@@ -119,10 +160,10 @@ class TransmissionLine:
         Calculate yprim for admittance matrix
         :return:
         """
-        Y = self.Yseries + self.Yshunt/2
+        yff, yft, ytf, ytt = self.calc_branch_values()
         bus1 = self.bus1.index
         bus2 = self.bus2.index
-        yprim = [[Y, -Y+self.Yshunt/2], [-Y+self.Yshunt/2, Y]]
+        yprim = [[yff, yft], [ytf, ytt]]
 
         df = pd.DataFrame(yprim, index=[bus1, bus2], columns=[bus1, bus2])
         return df
@@ -133,15 +174,26 @@ class TransmissionLine:
         Calculate yprim for admittance matrix
         :return:
         """
-        Y0 = self.Y0series + self.Yshunt/2
+        yff, yft, ytf, ytt = self.calc_branch_values(0)
         bus1 = self.bus1.index
         bus2 = self.bus2.index
-        yprim = [[Y0, -Y0+self.Yshunt/2], [-Y0+self.Yshunt/2, Y0]]
+        yprim = [[yff, yft], [ytf, ytt]]
 
         df = pd.DataFrame(yprim, index=[bus1, bus2], columns=[bus1, bus2])
         return df
 
 
+    def calc_branch_values(self, sequence: int = 1):
+        """
+        Calculate the yprim entries as a flat tuple for vectorized admittance matrix assembly
+        :param sequence: 1 for positive sequence, 0 for zero sequence
+        :return: (yff, yft, ytf, ytt)
+        """
+        Yseries = self.Yseries if sequence == 1 else self.Y0series
+        Y = Yseries + self.Yshunt/2
+        return Y, -Y+self.Yshunt/2, -Y+self.Yshunt/2, Y
+
+
 # validation tests
 def validation1():
     from TransmissionLine import TransmissionLine
@@ -1,6 +1,12 @@
+import io
+import time
+import contextlib
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 
 from Circuit import Circuit, ThreePhaseFault, UnsymmetricalFaults
+from CaseImporter import build_circuit, synthetic_case
+from Solution import NewtonRaphson, SparseNewtonRaphson, KrylovNewtonRaphson, BackwardForwardSweep
 from Settings import settings
 from Tools import read_excel, compare, read_jacobian, display_jacobian
 from numpy import round
@@ -41,6 +47,13 @@ def CreateSevenPowerBusSystem():
     return circ
 
 
+def CreateSyntheticCase(n=2000, load_scale=1.0, gen_scale=1.0):
+    case = synthetic_case(n)
+    case["bus"][["Pd", "Qd"]] *= load_scale
+    case["gen"]["Pg"] *= gen_scale
+    return build_circuit(case, case["name"])
+
+
 def SevenPowerBusSystemValidation():
     circ = CreateSevenPowerBusSystem()
     #circ.change_slack("bus1", "bus7")
@@ -226,4 +239,312 @@ def ReactorCorrectionValidation():
 
     print("After Correction:")
     circ2.add_shunt_reactor("reactor1", 80, "bus2")
-    circ2.do_newton_raph()
\ No newline at end of file
+    circ2.do_newton_raph()
+
+def ConcurrentSolveValidation(threads=8):
+    print("***CONCURRENT SOLVE VALIDATION***")
+    print()
+    circ = CreateSevenPowerBusSystem()
+    circ.generators["Gen2"].var_limit = 40e6
+    types = {name: bus.type for name, bus in circ.buses.items()}
+    x, y = NewtonRaphson(circ, True).newton_raph()
+
+    # VAR limiting used to change the shared buses, so solves of the same circuit corrupted each other
+    with ThreadPoolExecutor(threads) as pool:
+        results = list(pool.map(lambda _: NewtonRaphson(circ, True).newton_raph(), range(threads)))
+    same = all(x.equals(result[0]) and y.equals(result[1]) for result in results)
+    print(f"{threads} concurrent VAR limited solves match: {same}")
+    print(f"Bus types unchanged: {types == {name: bus.type for name, bus in circ.buses.items()}}")
+
+    # each circuit has its own settings
+    other = Circuit("OtherBase")
+    other.change_power_base(200)
+    circ2 = CreateSevenPowerBusSystem()
+    print(f"Power bases: {other.powerbase/1e6} MVA and {circ2.powerbase/1e6} MVA, "
+          f"Ybus unchanged: {np.array_equal(circ2.calc_Ybus(), circ.Ybus)}")
+    print()
+
+
+def CreateRadialFeeder(n=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    circ = Circuit(f"Feeder{n}")
+    names = [f"node{k}" for k in range(n)]
+    circ.add_buses(names, np.full(n, 12.47))
+
+    # each node hangs off one of the few nodes before it, giving long laterals
+    parent = [0] + [int(rng.integers(max(0, k-5), k)) for k in range(1, n)]
+    circ.add_tlines_from_parameters([f"Seg{k}" for k in range(1, n)], [names[parent[k]] for k in range(1, n)], names[1:],
+                                    np.full(n-1, 2e-4), np.full(n-1, 4e-4), np.full(n-1, 1e-5))
+    circ.add_generators(["Source"], ["node0"], [1.02], [0], mva_bases=[100])
+    circ.add_loads([f"Load{k}" for k in range(1, n)], names[1:], rng.uniform(0.005, 0.02, n-1)*3000/n, rng.uniform(0.002, 0.01, n-1)*3000/n)
+    circ.add_shunt_capacitor("Cap1", 0.5, names[n//2])
+    return circ
+
+
+def RadialFeederValidation(n=5000):
+    print("***BACKWARD/FORWARD SWEEP VALIDATION***")
+    print()
+    for size in [60, n]:
+        circ = CreateRadialFeeder(size)
+        start = time.perf_counter()
+        sweep = BackwardForwardSweep(circ)
+        sweep.set_tolerance(1e-8)
+        x, y = sweep.backward_forward_sweep()
+        sweep_time = time.perf_counter() - start
+
+        solvers = [("sparse Newton-Raphson", SparseNewtonRaphson(circ, False))]
+        if size <= 60:
+            solvers.append(("dense Newton-Raphson", NewtonRaphson(circ, False)))
+        print(f"{size} node feeder, backward/forward sweep: {sweep.iterations} sweeps, {sweep_time:.3f} s")
+        for name, solver in solvers:
+            start = time.perf_counter()
+            solver.set_tolerance(1e-8)
+            x2, y2 = solver.newton_raph()
+            print(f"    {name}: {time.perf_counter()-start:.3f} s, largest voltage difference "
+                  f"{np.max(np.abs(x.to_numpy()-x2.to_numpy())):.2e}")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        circ.do_backward_forward_sweep()
+    print(f"Lowest voltage {circ.bus_results['Vpu'].min():.4f} pu")
+    print()
+    CreateSevenPowerBusSystem().do_backward_forward_sweep()
+    print()
+
+
+def NewtonStrategyValidation(n=2500):
+    print("***NEWTON STEP STRATEGY VALIDATION***")
+    print()
+    # the last loading is past the point where the case has a solution
+    for scale in [1.0, 3.5, 4.5]:
+        circ = CreateSyntheticCase(n, scale, scale)
+        print(f"synthetic {n} bus case at {scale} times its load:")
+        for strategy in ["full", "iwamoto", "backtracking", "dishonest"]:
+            solver = SparseNewtonRaphson(circ, False)
+            solver.set_strategy(strategy)
+            solver.set_tolerance(1e-6)
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                x, y = solver.newton_raph()
+            print(f"    {strategy:12s} converged = {solver.converged!s:5s} {solver.iterations:2d} iterations, "
+                  f"{solver.factorizations:2d} factorizations, {solver.factorizations_saved:2d} saved, "
+                  f"{time.perf_counter()-start:.3f} s, lowest voltage {x.to_numpy()[solver.count:].min():.4f} pu")
+    print()
+
+
+def NewtonKrylovValidation(n=20000):
+    print("***NEWTON-KRYLOV VALIDATION***")
+    print()
+    circ = CreateSyntheticCase(n)
+
+    solvers = [("sparse LU", SparseNewtonRaphson(circ, False), "full"),
+               ("GMRES + ILU", KrylovNewtonRaphson(circ, False), "full"),
+               ("GMRES + reused ILU", KrylovNewtonRaphson(circ, False), "dishonest")]
+    for name, solver, strategy in solvers:
+        solver.set_strategy(strategy)
+        solver.set_tolerance(1e-6)
+        start = time.perf_counter()
+        x, y = solver.newton_raph()
+        elapsed = time.perf_counter() - start
+        if name == "sparse LU":
+            reference = x.to_numpy()
+        print(f"{name}: {elapsed:.3f} s, {solver.iterations} iterations, {solver.factorizations} factorizations, "
+              f"{solver.factor_nnz} factor nonzeros, largest difference {np.max(np.abs(x.to_numpy()-reference)):.1e}")
+    print(solvers[-1][1].get_statistics().round(5).to_string(index=False))
+    print()
+
+
+def LoadModelValidation(n=20000):
+    print("***VOLTAGE DEPENDENT LOAD VALIDATION***")
+    print()
+
+    # every solver should reach a voltage where the loads draw exactly their modelled power
+    circ = CreateSevenPowerBusSystem()
+    circ.set_load_models(list(circ.loads), zip_p=(0.4, 0.3, 0.3), zip_q=(0.2, 0.2, 0.6))
+    for name, solver in [("dense", NewtonRaphson(circ, False)), ("sparse", SparseNewtonRaphson(circ, False))]:
+        solver.set_tolerance(1e-10)
+        x, y = solver.newton_raph()
+        Vpu = x.to_numpy()[circ.count:, 0]
+        J = solver.calc_jacobian(Vpu*np.exp(1j*x.to_numpy()[:circ.count, 0]))
+        print(f"7 bus system, ZIP loads, {name} Newton-Raphson: {solver.iterations} iterations, voltages {np.round(Vpu, 5)}")
+    load = circ.calc_load_power(Vpu)*circ.powerbase/1e6
+    print(f"Load1 at {Vpu[2]:.5f} pu: {load[2].real:.3f} MW, {load[2].imag:.3f} MVAR, "
+          f"bus3 injection {y.to_numpy()[2, 0]*circ.powerbase/1e6:.3f} MW, {y.to_numpy()[circ.count+2, 0]*circ.powerbase/1e6:.3f} MVAR")
+
+    # the Jacobian against finite differences of the mismatch
+    V = Vpu*np.exp(1j*x.to_numpy()[:circ.count, 0])
+    S = solver.calc_specified_power()
+    pvpq, pq = solver.calc_bus_sets()
+    dx = np.zeros(len(pvpq) + len(pq))
+    numeric = np.empty((len(dx), len(dx)))
+    for k in range(len(dx)):
+        dx[k] = 1e-6
+        numeric[:, k] = -(solver.calc_mismatch(solver.update_voltages(V, dx), S) - solver.calc_mismatch(solver.update_voltages(V, -dx), S))/2e-6
+        dx[k] = 0
+    print(f"Largest Jacobian difference from finite differences: {np.max(np.abs(J.toarray() - numeric)):.1e}")
+
+    circ.set_load_models(["Load2"], exponent_p=1.5, exponent_q=3)
+    with contextlib.redirect_stdout(io.StringIO()):
+        circ.do_newton_raph()
+    print(f"Exponential Load2: {np.round(circ.bus_results['Vpu'], 5)}")
+    print()
+
+    feeder = CreateRadialFeeder(2000)
+    feeder.set_load_models(list(feeder.loads), zip_p=(0.5, 0.2, 0.3), exponent_q=2)
+    sweep = BackwardForwardSweep(feeder)
+    sweep.set_tolerance(1e-8)
+    x, y = sweep.backward_forward_sweep()
+    solver = SparseNewtonRaphson(feeder, False)
+    solver.set_tolerance(1e-8)
+    x2, y2 = solver.newton_raph()
+    print(f"2000 node feeder, ZIP loads: {sweep.iterations} sweeps, {solver.iterations} Newton iterations, "
+          f"largest voltage difference {np.max(np.abs(x.to_numpy()-x2.to_numpy())):.2e}")
+    print()
+
+    circ = CreateSyntheticCase(n)
+    print(f"synthetic {n} bus case, {len(circ.loads)} loads")
+    for name, fractions in [("constant power", (0, 0, 1)), ("ZIP", (0.3, 0.3, 0.4))]:
+        start = time.perf_counter()
+        circ.set_load_models(list(circ.loads), zip_p=fractions, zip_q=fractions)
+        circ.get_load_model()
+        modelled = time.perf_counter() - start
+        solver = SparseNewtonRaphson(circ, False)
+        solver.set_tolerance(1e-8)
+        start = time.perf_counter()
+        x, y = solver.newton_raph()
+        if name == "constant power":
+            reference = x.to_numpy()
+        print(f"    {name}: modelled in {modelled:.3f} s, {solver.iterations} iterations, {time.perf_counter()-start:.3f} s, "
+              f"largest voltage change {np.max(np.abs(x.to_numpy()-reference)[circ.count:]):.4f} pu")
+    with contextlib.redirect_stdout(io.StringIO()):
+        circ.do_newton_raph(sparse=True)
+    start = time.perf_counter()
+    loads = circ.calc_load_admittances()
+    print(f"Load admittances for every bus in {time.perf_counter()-start:.4f} s, total "
+          f"{np.sum(loads*circ.bus_results['Vpu']**2).real*circ.powerbase/1e6:.1f} MW at the solved voltages, "
+          f"{sum(load.real_power for load in circ.loads.values())/1e6:.1f} MW nominal")
+    print()
+
+
+def TapControlValidation(n=2000, controls=20):
+    print("***TAP CHANGING AND PHASE SHIFTING TRANSFORMER VALIDATION***")
+    print()
+
+    # an off nominal tap against the same transformer written as its pi equivalent
+    circ = CreateSevenPowerBusSystem()
+    circ.set_transformer_taps(["T1"], 1.05)
+    Y = circ.transformers["T1"].Ypu
+    print("T1 at 1.05 tap, yprim:")
+    print(np.round(np.array(circ.transformers["T1"].calc_branch_values()).reshape(2, 2), 4))
+    print("pi equivalent, Y/t in series with Y(1-t)/t^2 and Y(t-1)/t shunts:")
+    print(np.round(np.array([[Y/1.05 + Y*(1-1.05)/1.05**2, -Y/1.05], [-Y/1.05, Y/1.05 + Y*(1.05-1)/1.05]]), 4))
+    with contextlib.redirect_stdout(io.StringIO()):
+        circ.do_newton_raph()
+    dense = circ.bus_results["Vpu"].copy()
+    with contextlib.redirect_stdout(io.StringIO()):
+        circ.do_newton_raph(sparse=True)
+    print(f"Dense and sparse solutions differ by {np.max(np.abs(dense - circ.bus_results['Vpu'])):.1e} pu")
+
+    circ.set_transformer_taps(["T2"], shifts=-5)
+    with contextlib.redirect_stdout(io.StringIO()):
+        circ.do_newton_raph()
+    print(f"T2 shifted -5 degrees, angles {np.round(np.rad2deg(circ.bus_results['angle']), 3)}")
+    print()
+
+    # tap control on T1 holding bus2 at 0.98 pu, against solving every tap position
+    circ = CreateSevenPowerBusSystem()
+    circ.add_tap_control("T1", "bus2", 0.98)
+    start = time.perf_counter()
+    solver = NewtonRaphson(circ, False)
+    solver.set_tap_control()
+    solver.set_tolerance(1e-8)
+    x, y = solver.newton_raph()
+    elapsed = time.perf_counter() - start
+    print(f"Tap control: tap {solver.tap_controls['tap'][0]:.5f} after {solver.tap_rounds} adjustments, "
+          f"{solver.iterations} iterations, {elapsed:.3f} s, bus2 at {x.to_numpy()[circ.count+1, 0]:.5f} pu")
+    start = time.perf_counter()
+    errors = {}
+    for tap in 1 + np.arange(-16, 17)*0.00625:
+        circ.set_transformer_taps(["T1"], tap)
+        solver = NewtonRaphson(circ, False)
+        solver.set_strategy("backtracking")
+        solver.set_tolerance(1e-8)
+        with contextlib.redirect_stdout(io.StringIO()):
+            x, y = solver.newton_raph()
+        errors[tap] = abs(x.to_numpy()[circ.count+1, 0] - 0.98)
+    best = min(errors, key=errors.get)
+    print(f"Solving all 33 positions: best tap {best:.5f}, {time.perf_counter()-start:.3f} s")
+    print()
+
+    circ = CreateSyntheticCase(n)
+    rng = np.random.default_rng(0)
+    buses = list(rng.choice(list(circ.buses), controls, replace=False))
+    names = [f"LV{k}" for k in range(controls)]
+    circ.add_buses(names, np.full(controls, 13.8))
+    circ.add_transformers_from_parameters([f"TX{k}" for k in range(controls)], buses, names,
+                                          np.full(controls, 0.005), np.full(controls, 0.08))
+    circ.add_loads([f"LVLoad{k}" for k in range(controls)], names, rng.uniform(20, 60, controls), rng.uniform(10, 30, controls))
+    for k in range(controls):
+        circ.add_tap_control(f"TX{k}", names[k], 1.0)
+    solver = SparseNewtonRaphson(circ, False)
+    solver.set_tap_control()
+    solver.set_tolerance(1e-8)
+    start = time.perf_counter()
+    x, y = solver.newton_raph()
+    V = x.to_numpy()[:, 0][circ.count + np.array([circ.buses[name].index-1 for name in names])]
+    print(f"synthetic {n} bus case with {controls} tap changers: {solver.tap_rounds} adjustments, {solver.iterations} "
+          f"iterations, {solver.factorizations} factorizations, {time.perf_counter()-start:.3f} s")
+    print(f"Regulated voltages {V.min():.4f} to {V.max():.4f} pu, taps {solver.tap_controls['tap'].min():.5f} "
+          f"to {solver.tap_controls['tap'].max():.5f}")
+    print()
+
+
+def DistributedSlackValidation(n=2000):
+    print("***DISTRIBUTED SLACK AND AREA INTERCHANGE VALIDATION***")
+    print()
+
+    # the bordered Jacobian against finite differences of the mismatch
+    circ = CreateSevenPowerBusSystem()
+    circ.set_bus_areas(["bus4", "bus5", "bus6", "bus7"], 2)
+    circ.add_area_interchange(2, 50)
+    solver = NewtonRaphson(circ, False)
+    solver.set_distributed_slack()
+    solver.set_tolerance(1e-10)
+    x, y = solver.newton_raph()
+    print(f"7 bus system, area 2 exporting 50 MW: {solver.iterations} iterations")
+    print(solver.get_slack_summary().round(3).to_string(index=False))
+    state = np.concatenate((x.to_numpy()[circ.count:, 0]*np.exp(1j*x.to_numpy()[:circ.count, 0]), solver.slack_values))
+    S = solver.calc_specified_power()
+    J = solver.calc_jacobian(state)
+    numeric = np.empty(J.shape)
+    for k in range(J.shape[0]):
+        dx = np.zeros(J.shape[0])
+        dx[k] = 1e-6
+        numeric[:, k] = -(solver.calc_mismatch(solver.update_voltages(state, dx), S) -
+                          solver.calc_mismatch(solver.update_voltages(state, -dx), S))/2e-6
+    print(f"Largest Jacobian difference from finite differences: {np.max(np.abs(J - numeric)):.1e}")
+    print()
+
+    # load grows everywhere while the generator schedules stay put; with a single slack the whole change
+    # flows to one corner of the grid and the solve fails even for a few percent
+    for scale in [1.0, 1.05, 1.1]:
+        circ = CreateSyntheticCase(n, load_scale=scale)
+        circ.set_bus_areas(list(circ.buses), np.arange(circ.count)*4//circ.count + 1)
+        print(f"synthetic {n} bus case, 4 areas, load at {scale} times the generation:")
+        for name, distributed in [("single slack", False), ("distributed slack", True)]:
+            solver = SparseNewtonRaphson(circ, False)
+            solver.set_distributed_slack(distributed)
+            solver.set_tolerance(1e-8)
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                x, y = solver.newton_raph()
+            print(f"    {name:17s} converged = {solver.converged!s:5s} {solver.iterations:2d} iterations, "
+                  f"{time.perf_counter()-start:.3f} s")
+        circ.add_area_interchange(2, 100)
+        circ.add_area_interchange(3, -200)
+        solver = SparseNewtonRaphson(circ, False)
+        solver.set_distributed_slack()
+        solver.set_tolerance(1e-8)
+        x, y = solver.newton_raph()
+        print(f"    with interchange schedules: {solver.iterations} iterations")
+        print(solver.get_slack_summary().round(3).to_string(index=False))
+    print()
@@ -0,0 +1,469 @@
+"""
+Module for building and modifying the bus impedance matrix directly, one element at a time
+
+Filename: ZbusBuilding.py
+Author: Justin Lipner, Bailey Stout
+Date: 2026-10-19
+"""
+
+import numpy as np
+from Circuit import Circuit
+from FaultScreening import assemble_sparse, calc_Zbus
+
+
+class ZbusBuilder:
+    """
+    Bus impedance matrix built with the Zbus modification rules, so elements can be added to or removed from
+    an existing Zbus for O(N^2) each instead of inverting the admittance matrix again:
+        1. a new bus connected to the reference
+        2. a new bus connected to an existing bus
+        3. an existing bus connected to the reference
+        4. a branch between two existing buses
+    Rules 2 and 4 are applied to the element's full 2x2 admittance, so lines with charging and off-nominal
+    or phase shifting transformers are added exactly. A negated admittance removes the element. Buses are
+    keyed by any hashable name and stored in the order they were added.
+    """
+    def __init__(self, tolerance: float = 1e-9):
+        """
+        Constructor for ZbusBuilder
+        :param tolerance: Smallest pivot accepted before a change is treated as cutting buses off from the reference
+        """
+        self.tolerance = tolerance
+        self.index = {}  # bus -> position in Z
+        self.buffer = np.zeros((0, 0), dtype=complex)  # grown by doubling so new buses don't copy Z every time
+
+
+    @classmethod
+    def from_matrix(cls, Z, buses, tolerance: float = 1e-9):
+        """
+        Starts from an impedance matrix found some other way, such as one sparse factorization.
+        :param Z: Impedance matrix
+        :param buses: Bus names in the order of Z
+        :param tolerance: Smallest pivot accepted before a change is treated as cutting buses off from the reference
+        :return: ZbusBuilder
+        """
+        builder = cls(tolerance)
+        builder.index = {bus: k for k, bus in enumerate(buses)}
+        builder.buffer = np.array(Z, dtype=complex)
+        return builder
+
+
+    @property
+    def Z(self):
+        """
+        Impedance matrix of the buses added so far, in the order they were added.
+        :return: np.ndarray
+        """
+        size = len(self.index)
+        return self.buffer[:size, :size]
+
+
+    def grow(self, bus):
+        """
+        Makes room for one more bus.
+        :param bus: Name of the new bus
+        :return: Position of the new bus
+        """
+        size = len(self.index)
+        if size == len(self.buffer):
+            buffer = np.zeros((max(2*size, 16),)*2, dtype=complex)
+            buffer[:size, :size] = self.Z
+            self.buffer = buffer
+        self.index[bus] = size
+        return size
+
+
+    def add_bus(self, bus, z: complex):
+        """
+        Rule 1: a new bus connected to the reference through impedance z.
+        :param bus: Name of the new bus
+        :param z: Impedance to the reference in pu
+        :return:
+        """
+        if bus in self.index:
+            raise ValueError(f"{bus} is already in Zbus")
+        n = self.grow(bus)
+        self.buffer[n, :n] = 0
+        self.buffer[:n, n] = 0
+        self.buffer[n, n] = z
+
+
+    def add_shunt(self, bus, y: complex):
+        """
+        Rule 3, or rule 1 for a new bus: admittance y from the bus to the reference,
+        Z' = Z - Z[:, k] Z[k, :] y/(1 + y Z[k, k]).
+        :param bus: Name of the bus
+        :param y: Admittance in pu, negative to remove one
+        :return: True if Zbus was changed
+        """
+        if y == 0:
+            return True
+        if bus not in self.index:
+            self.add_bus(bus, 1/y)
+            return True
+        k = self.index[bus]
+        Z = self.Z
+        pivot = 1 + y*Z[k, k]
+        if abs(pivot) < self.tolerance:
+            print(f"WARNING: removing {y:.4g} pu at {bus} leaves buses without a path to the reference. No changes to Zbus.")
+            return False
+        Z -= np.outer(Z[:, k], Z[k, :])*(y/pivot)
+        return True
+
+
+    def add_branch(self, bus1, bus2, yprim):
+        """
+        Rule 2 or 4 for an element between two buses. With a new bus n on an existing bus k, the element's
+        shunt seen from k (yff - yft ytf/ytt) is added by rule 3 and n is bordered onto Z:
+            Z[:, n] = -Z[:, k] yft/ytt, Z[n, :] = -ytf Z[k, :]/ytt, Z[n, n] = 1/ytt + ytf yft Z[k, k]/ytt^2
+        which for a series impedance z is the classic Z[:, n] = Z[:, k], Z[n, n] = Z[k, k] + z. Between existing
+        buses the Woodbury identity gives Z' = Z - (Z U) Y (I + U^T Z U Y)^-1 (U^T Z), U = [e1, e2], a rank one
+        change for a series impedance.
+        :param bus1: Name of the from bus
+        :param bus2: Name of the to bus
+        :param yprim: 2x2 element admittance [[yff, yft], [ytf, ytt]] in pu, negated to remove the element
+        :return: True if Zbus was changed, False if neither bus is in Zbus yet and the element has no path to the
+                 reference, or the change would leave buses without a path to the reference
+        """
+        yprim = np.asarray(yprim, dtype=complex).reshape(2, 2)
+        if bus1 == bus2:
+            return self.add_shunt(bus1, yprim.sum())
+        if bus1 not in self.index and bus2 not in self.index:
+            # rule 1 for a pair of new buses, possible when the element itself has a path to the reference
+            if abs(np.linalg.det(yprim)) < self.tolerance*np.max(np.abs(yprim))**2:
+                return False
+            n = self.grow(bus1)
+            self.grow(bus2)
+            self.buffer[:n+2, n:n+2] = 0
+            self.buffer[n:n+2, :n+2] = 0
+            self.buffer[n:n+2, n:n+2] = np.linalg.inv(yprim)
+            return True
+        if bus1 not in self.index:  # the new bus is always the second one
+            bus1, bus2 = bus2, bus1
+            yprim = yprim[::-1, ::-1]
+        (yff, yft), (ytf, ytt) = yprim
+
+        if bus2 not in self.index:
+            if ytt == 0:
+                return False
+            k = self.index[bus1]
+            if not self.add_shunt(bus1, yff - yft*ytf/ytt):
+                return False
+            Z = self.Z
+            column = -Z[:, k]*yft/ytt
+            row = -ytf*Z[k, :]/ytt
+            diagonal = 1/ytt + ytf*yft*Z[k, k]/ytt**2
+            n = self.grow(bus2)
+            self.buffer[:n, n] = column
+            self.buffer[n, :n] = row
+            self.buffer[n, n] = diagonal
+            return True
+
+        ends = [self.index[bus1], self.index[bus2]]
+        Z = self.Z
+        ZU = Z[:, ends]
+        A = np.eye(2) + ZU[ends] @ yprim
+        if abs(np.linalg.det(A)) < self.tolerance:
+            print(f"WARNING: this change between {bus1} and {bus2} leaves buses without a path to the reference. No changes to Zbus.")
+            return False
+        Z -= ZU @ (yprim @ np.linalg.inv(A)) @ Z[ends, :]
+        return True
+
+
+    def add_impedance(self, bus1, bus2, z: complex):
+        """
+        The classic rules for a single impedance: to the reference when bus2 is None, otherwise between the buses.
+        :param bus1: Name of a bus
+        :param bus2: Name of the other bus, or None for the reference
+        :param z: Impedance in pu, negative to remove one
+        :return: True if Zbus was changed
+        """
+        if bus2 is None:
+            return self.add_shunt(bus1, 1/z)
+        y = 1/z
+        return self.add_branch(bus1, bus2, [[y, -y], [-y, y]])
+
+
+    def get_Zbus(self, buses):
+        """
+        Impedance matrix in a given bus order. Buses that were never connected to the reference have an infinite
+        driving point impedance and no transfer impedances.
+        :param buses: Bus names in the order wanted
+        :return: np.ndarray
+        """
+        positions = np.array([self.index.get(bus, -1) for bus in buses], dtype=int)
+        present = positions >= 0
+        Z = np.zeros((len(buses), len(buses)), dtype=complex)
+        Z[np.ix_(present, present)] = self.Z[np.ix_(positions[present], positions[present])]
+        Z[~present, ~present] = np.inf
+        return Z
+
+
+class SequenceZbus:
+    """
+    Positive, zero and negative sequence fault Zbus matrices of a circuit, with the generators and loads modeled
+    as ThreePhaseFault and UnsymmetricalFaults model them, kept current as elements are added, removed or changed.
+    Pass it to the fault classes to skip their matrix inversions.
+    """
+    def __init__(self, circuit: Circuit, factor: bool = True):
+        """
+        Constructor for SequenceZbus
+        :param circuit: Circuit object
+        :param factor: Start from one sparse factorization of each sequence, otherwise build the matrices
+                       element by element with the modification rules
+        """
+        self.circuit = circuit
+        self.factor = factor
+        self.builders = {sequence: ZbusBuilder() for sequence in [1, 0, 2]}
+        self.elements = {sequence: {} for sequence in [1, 0, 2]}  # name -> (from, to, yprim) as added
+        self.shunts = {sequence: np.zeros(0, dtype=complex) for sequence in [1, 0, 2]}  # generator and load shunts
+        with circuit.lock:
+            shunts, shunts0, shunts2 = circuit.calc_fault_shunts()
+            for sequence, shunt in zip([1, 0, 2], [shunts, shunts0, shunts2]):
+                self.build(sequence, circuit.calc_branch_arrays(sequence), shunt)
+
+
+    def build(self, sequence: int, branches: dict, shunts):
+        """
+        Builds one sequence matrix. Element by element, every bus with a shunt is added by rule 1, then the
+        branches are added breadth first from those buses by rules 2 and 4. Buses never reached have no path
+        to the reference.
+        :param sequence: 0, 1 or 2
+        :param branches: Branch arrays from calc_branch_arrays
+        :param shunts: Generator and load admittances per bus
+        :return:
+        """
+        builder = self.builders[sequence]
+        elements = self.elements[sequence]
+        total = np.array(shunts, dtype=complex)
+        self.shunts[sequence] = total.copy()
+        yprims = np.stack((branches["yff"], branches["yft"], branches["ytf"], branches["ytt"]), axis=1).reshape(-1, 2, 2)
+        coupled = (branches["from"] != branches["to"]) & ((branches["yft"] != 0) | (branches["ytf"] != 0))
+        for name, i, j, yprim, couples in zip(branches["name"], branches["from"], branches["to"], yprims, coupled):
+            elements[name] = (i, j, yprim)
+            if not couples:  # shunt elements, and branches with no coupling in this sequence
+                if i == j:
+                    total[i] += yprim.sum()
+                else:
+                    total[i] += yprim[0, 0]
+                    total[j] += yprim[1, 1]
+
+        if self.factor:
+            Z, grounded = calc_Zbus(assemble_sparse(branches, len(total), shunts))
+            buses = np.flatnonzero(grounded)
+            self.builders[sequence] = ZbusBuilder.from_matrix(Z[np.ix_(buses, buses)], buses, builder.tolerance)
+            return
+
+        for bus in np.flatnonzero(total != 0):
+            builder.add_bus(bus, 1/total[bus])
+
+        incident = {}
+        for k in np.flatnonzero(coupled):
+            incident.setdefault(branches["from"][k], []).append(k)
+            incident.setdefault(branches["to"][k], []).append(k)
+        added = np.zeros(len(yprims), dtype=bool)
+        queue = list(builder.index)
+        for start in [None, *np.flatnonzero(coupled)]:
+            if start is not None:  # a part of the network grounded only through branch charging
+                i, j = branches["from"][start], branches["to"][start]
+                if added[start] or i in builder.index or j in builder.index:
+                    continue
+                added[start] = builder.add_branch(i, j, yprims[start])
+                queue = [i, j] if added[start] else []
+            while len(queue) != 0:
+                bus = queue.pop(0)
+                for k in incident.get(bus, []):
+                    if added[k]:
+                        continue
+                    i, j = branches["from"][k], branches["to"][k]
+                    new = j if i == bus else i
+                    fresh = new not in builder.index
+                    added[k] = builder.add_branch(i, j, yprims[k])
+                    if fresh and new in builder.index:
+                        queue.append(new)
+
+
+    def find_element(self, name: str):
+        """
+        An element's buses and admittances in each sequence, as the circuit has it now.
+        :param name: Element name
+        :return: dict of sequence -> (from, to, yprim), empty if the circuit has no such element
+        """
+        values = {}
+        for sequence in [1, 0, 2]:
+            branches = self.circuit.calc_branch_arrays(sequence)
+            k = np.flatnonzero(branches["name"] == name)
+            if len(k) != 0:
+                k = k[0]
+                yprim = np.array([[branches["yff"][k], branches["yft"][k]], [branches["ytf"][k], branches["ytt"][k]]])
+                values[sequence] = (branches["from"][k], branches["to"][k], yprim)
+        return values
+
+
+    def add_element(self, name: str):
+        """
+        Adds an element that was added to the circuit after the matrices were built. A new bus must be
+        connected to a bus that is already in the matrices.
+        :param name: Element name
+        :return:
+        """
+        if name in self.elements[1]:
+            print(f"{name} is already in Zbus. No changes to Zbus.")
+            return
+        values = self.find_element(name)
+        if len(values) == 0:
+            print(f"{name} does not exist. No changes to Zbus.")
+            return
+        for sequence, (i, j, yprim) in values.items():
+            builder = self.builders[sequence]
+            if not builder.add_branch(i, j, yprim):
+                print(f"WARNING: {name} could not be added to the sequence {sequence} Zbus.")
+            self.elements[sequence][name] = (i, j, yprim)
+
+
+    def remove_element(self, name: str):
+        """
+        Removes an element from the matrices, with the admittances it was added with.
+        :param name: Element name
+        :return:
+        """
+        if name not in self.elements[1]:
+            print(f"{name} does not exist. No changes to Zbus.")
+            return
+        for sequence in [1, 0, 2]:
+            if name in self.elements[sequence]:
+                i, j, yprim = self.elements[sequence][name]
+                if self.builders[sequence].add_branch(i, j, -yprim):
+                    del self.elements[sequence][name]
+
+
+    def update_element(self, name: str):
+        """
+        Applies a change to an element already in the matrices, such as a new transformer tap, as one
+        modification with the difference of its admittances.
+        :param name: Element name
+        :return:
+        """
+        if name not in self.elements[1]:
+            self.add_element(name)
+            return
+        values = self.find_element(name)
+        for sequence in [1, 0, 2]:
+            old = self.elements[sequence].get(name)
+            new = values.get(sequence)
+            i, j = (old or new)[:2]
+            change = (new[2] if new is not None else 0) - (old[2] if old is not None else 0)
+            if self.builders[sequence].add_branch(i, j, change):
+                if new is None:
+                    self.elements[sequence].pop(name, None)
+                else:
+                    self.elements[sequence][name] = new
+
+
+    def update_shunts(self):
+        """
+        Applies changes to the generator and load admittances, such as a new power flow solution or an added
+        machine, with one rule 3 modification per changed bus.
+        :return:
+        """
+        with self.circuit.lock:
+            shunts = dict(zip([1, 0, 2], self.circuit.calc_fault_shunts()))
+        for sequence, shunt in shunts.items():
+            old = np.zeros(len(shunt), dtype=complex)
+            old[:len(self.shunts[sequence])] = self.shunts[sequence]
+            change = shunt - old
+            for bus in np.flatnonzero(np.abs(change) > 1e-12):
+                if self.builders[sequence].add_shunt(bus, change[bus]):
+                    old[bus] = shunt[bus]
+            self.shunts[sequence] = old
+
+
+    def get_Zbus(self, sequence: int = 1):
+        """
+        Fault impedance matrix of one sequence in bus index order.
+        :param sequence: 1 for positive, 0 for zero, 2 for negative sequence
+        :return: np.ndarray
+        """
+        return self.builders[sequence].get_Zbus(range(self.circuit.count))
+
+
+# validation tests
+if __name__ == '__main__':
+    import io
+    import time
+    import contextlib
+    from Circuit import ThreePhaseFault, UnsymmetricalFaults
+    from Validations import CreateSevenPowerBusSystem, CreateSyntheticCase
+
+    def difference(zbus, circuit):
+        """
+        Largest difference from inverting each sequence's fault admittance matrix.
+        """
+        circuit.get_Ybus()
+        fault = UnsymmetricalFaults(circuit, 1)
+        return max(np.max(np.abs(zbus.get_Zbus(sequence) - np.linalg.inv(Y)))
+                   for sequence, Y in [(1, fault.Ypbus), (0, fault.Y0bus), (2, fault.Ynbus)])
+
+    circ = CreateSevenPowerBusSystem()
+    with contextlib.redirect_stdout(io.StringIO()):
+        circ.do_newton_raph()
+    zbus = SequenceZbus(circ, factor=False)
+    print("***7 bus system***")
+    print("Built element by element, largest difference from inversion:", difference(zbus, circ))
+    with contextlib.redirect_stdout(io.StringIO()):
+        inverted = UnsymmetricalFaults(circ, 4)
+        inverted.SLG_fault_values()
+        built = UnsymmetricalFaults(circ, 4, zbus)
+        built.SLG_fault_values()
+    print(f"SLG at bus4: {abs(inverted.Ifn):.6f} pu inverted, {abs(built.Ifn):.6f} pu built")
+
+    # the network grows by a new bus and a line, a line is taken out, and a tap changes
+    circ.add_bus("bus8", 230)
+    circ.add_tline_from_geometry("L7", "bus5", "bus8", "Bundle7bus", "Geometry7bus", 15)
+    circ.add_tline_from_geometry("L8", "bus8", "bus3", "Bundle7bus", "Geometry7bus", 12)
+    zbus.add_element("L7")
+    zbus.add_element("L8")
+    with contextlib.redirect_stdout(io.StringIO()):
+        circ.do_newton_raph()
+    zbus.update_shunts()  # the loads are modeled at the new solution
+    print("After adding bus8, L7 and L8:", difference(zbus, circ))
+    del circ.transmission_lines["L6"]
+    circ.mark_changed()
+    zbus.remove_element("L6")
+    print("After removing L6:", difference(zbus, circ))
+    with contextlib.redirect_stdout(io.StringIO()):
+        circ.set_transformer_taps(["T1"], [1.05], [5.0])
+    zbus.update_element("T1")
+    print("After setting T1 to 1.05 at 5 degrees:", difference(zbus, circ))
+    print()
+
+    circ = CreateSyntheticCase(1000)
+    for gen in circ.generators.values():  # MATPOWER cases carry no machine reactances
+        gen.X1 = gen.calc_X1(0.2)
+        gen.X2 = gen.calc_X2(0.2)
+    with contextlib.redirect_stdout(io.StringIO()):
+        circ.do_newton_raph(sparse=True)
+    print(f"***synthetic 1000 bus case, {len(circ.transmission_lines) + len(circ.transformers)} branches***")
+    start = time.perf_counter()
+    built = SequenceZbus(circ, factor=False)
+    print(f"building all three sequences element by element: {time.perf_counter()-start:.3f} s")
+    start = time.perf_counter()
+    zbus = SequenceZbus(circ)
+    print(f"starting all three from one sparse factorization each: {time.perf_counter()-start:.3f} s")
+    print("Largest difference between the two:", max(np.max(np.abs(built.get_Zbus(sequence) - zbus.get_Zbus(sequence)))
+                                                      for sequence in [1, 0, 2]))
+    circ.get_Ybus()
+    start = time.perf_counter()
+    fault = UnsymmetricalFaults(circ, 1)
+    inversion = time.perf_counter() - start
+    print(f"UnsymmetricalFaults with its three inversions: {inversion:.3f} s")
+    print("Largest difference from inversion:", difference(zbus, circ))
+
+    circ.add_tline_from_parameters("New", "bus10", "bus990", 0.01, 0.1, 0.02)
+    start = time.perf_counter()
+    zbus.add_element("New")
+    print(f"adding a line to all three: {time.perf_counter()-start:.4f} s")
+    start = time.perf_counter()
+    UnsymmetricalFaults(circ, 1, zbus)
+    print(f"UnsymmetricalFaults from the maintained matrices: {time.perf_counter()-start:.4f} s")
+    print("Largest difference from inversion:", difference(zbus, circ))